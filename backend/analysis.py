@@ -8,7 +8,16 @@ import time
 import re
 from concurrent.futures import ThreadPoolExecutor
 from kis_api import kis_client
+from quote_service import get_quote, get_quotes, get_market_snapshot
+from ref_price import get_prev_close
+from v2_state import (SignalState, FilterState, V2Inputs, serialize as serialize_v2,
+                      buy_transitions, sell_transitions, needs_sell_record,
+                      SIG1, SIG2, SIG3, FINAL, ALL_SIGS)
 from sms import send_sms
+import metrics
+from applog import get_logger, DEBUG
+import market_calendar as mcal
+from market_calendar import KST, NY
 from db import (
     load_market_candles, 
     save_market_candles,
@@ -25,6 +34,8 @@ from db import (
     save_v2_sell_signal
 )
 
+log = get_logger("analysis")
+
 # Global Cache for Historical Data
 _DATA_CACHE = {
     "30m": None,
@@ -32,9 +43,11 @@ _DATA_CACHE = {
     "1d": None,
     "market": None,
     "regime": None,
+    "stock_analysis": None,
     "last_fetch_realtime": 0,
     "last_fetch_longterm": 0
 }
+_LOADED_TICKERS = set()   # tickers load_data_from_db has read at least once (with or without rows)
 
 
 # Stock Names Mapping
@@ -62,13 +75,10 @@ MARKET_INDICATORS = {
 }
 
 def get_current_time_str():
-    kst = pytz.timezone('Asia/Seoul')
-    est = pytz.timezone('US/Eastern')
-    from datetime import timezone
     now_utc = datetime.now(timezone.utc)
     
-    now_kst = now_utc.astimezone(kst)
-    now_est = now_utc.astimezone(est)
+    now_kst = now_utc.astimezone(KST)
+    now_est = now_utc.astimezone(NY)
     
     return {
         "kst": now_kst.strftime("%Y-%m-%d %H:%M:%S"),
@@ -77,23 +87,11 @@ def get_current_time_str():
     }
 
 def get_current_time_str_sms():
-    kst = pytz.timezone('Asia/Seoul')
-    now_kst = datetime.now(timezone.utc).astimezone(kst)
-    return now_kst.strftime("%Y.%m.%d %H:%M")
+    return mcal.now_kst().strftime("%Y.%m.%d %H:%M")
 
 def is_market_open():
-    """Checks if US Market is currently open (Regular Hours)"""
-    est = pytz.timezone('US/Eastern')
-    now_est = datetime.now(timezone.utc).astimezone(est)
-    
-    # Check Weekend
-    if now_est.weekday() >= 5: return False
-    
-    # Regular Hours: 09:30 - 16:00
-    market_start = now_est.replace(hour=9, minute=30, second=0, microsecond=0)
-    market_end = now_est.replace(hour=16, minute=0, second=0, microsecond=0)
-    
-    return market_start <= now_est <= market_end
+    """Checks if US Market is currently open (Regular Hours, NYSE holidays / early closes aware)"""
+    return mcal.is_regular_session()
 
 
 def refresh_market_indices():
@@ -101,27 +99,16 @@ def refresh_market_indices():
     try:
         print("🌍 refreshing Market Indices to DB...")
         from db import update_market_indices
-        data_list = []
+        # One batched download per cycle, shared with the price job / quote service
+        snap = get_market_snapshot(list(MARKET_INDICATORS.values()))
+        data_list = [{
+            'ticker': name, # Use Key as Ticker ID in DB
+            'name': tic_sym,
+            'price': snap[tic_sym]['price'],
+            'change': snap[tic_sym]['change']
+        } for name, tic_sym in MARKET_INDICATORS.items() if tic_sym in snap]
         for name, tic_sym in MARKET_INDICATORS.items():
-            try:
-                t = yf.Ticker(tic_sym)
-                # Fetch minimal history to get Last and Change
-                hist = t.history(period="5d")
-                if not hist.empty:
-                    val = hist['Close'].iloc[-1]
-                    change = 0.0
-                    if len(hist) >= 2:
-                        prev = hist['Close'].iloc[-2]
-                        change = ((val - prev) / prev) * 100
-                    
-                    data_list.append({
-                        'ticker': name, # Use Key as Ticker ID in DB
-                        'name': tic_sym,
-                        'price': float(val),
-                        'change': float(change)
-                    })
-            except Exception as e:
-                print(f"Index Fetch Error {name}: {e}")
+            if tic_sym not in snap: print(f"Index Fetch Error {name}: no data")
         
         if data_list:
             update_market_indices(data_list)
@@ -132,6 +119,7 @@ def refresh_market_indices():
     return False
 
 
+@metrics.timed("candle_update")
 def update_market_data(tickers=None, override_period=None):
     """
     BACKGROUND TASK ONLY.
@@ -157,14 +145,14 @@ def update_market_data(tickers=None, override_period=None):
         print(f"Update: Fetching Real-time (30m, 5m) Period={fetch_period}...")
         
         # Fetch from yfinance
-        new_30m = yf.download(tickers_str, period=fetch_period, interval="30m", prepost=True, group_by='ticker', threads=True, progress=False, timeout=20)
-        new_5m = yf.download(tickers_str, period=fetch_period, interval="5m", prepost=True, group_by='ticker', threads=True, progress=False, timeout=20)
+        with metrics.external("yfinance", "download"):
+            new_30m = yf.download(tickers_str, period=fetch_period, interval="30m", prepost=True, group_by='ticker', threads=True, progress=False, timeout=20)
+        with metrics.external("yfinance", "download"):
+            new_5m = yf.download(tickers_str, period=fetch_period, interval="5m", prepost=True, group_by='ticker', threads=True, progress=False, timeout=20)
         
-        # Save to DB
-        CORE_TICKERS = ["SOXL", "SOXS", "UPRO"]
+        # Save to DB (every fetched ticker: managed stocks are read back from market_candles,
+        # only the core tickers also have Ver3 tables)
         for ticker in target_list:
-            if ticker not in CORE_TICKERS: continue
-            
             # Save 30m
             try:
                 df = None
@@ -188,16 +176,17 @@ def update_market_data(tickers=None, override_period=None):
         # Update Long-term (Regime Data)
         print("Update: Fetching Daily data for Market Regime...")
         reg_tickers = ["UPRO", "^GSPC", "^IXIC", "SPY"]
-        new_regime = yf.download(reg_tickers, period="6mo", interval="1d", group_by='ticker', threads=False, progress=False, timeout=20)
+        with metrics.external("yfinance", "download"):
+            new_regime = yf.download(reg_tickers, period="6mo", interval="1d", group_by='ticker', threads=False, progress=False, timeout=20)
         if not new_regime.empty: 
             _DATA_CACHE["regime"] = new_regime
             # Save 1d data for Regime tickers if needed? Ideally yes but skipping for speed for now.
         
         # Save 1d for Stocks
         print("Update: Fetching Long-term (1d) for Stocks...")
-        new_1d = yf.download(tickers_str, period="6mo", interval="1d", group_by='ticker', threads=False, progress=False, timeout=10)
+        with metrics.external("yfinance", "download"):
+            new_1d = yf.download(tickers_str, period="6mo", interval="1d", group_by='ticker', threads=False, progress=False, timeout=10)
         for ticker in target_list:
-            if ticker not in CORE_TICKERS: continue
             try:
                 df = None
                 if isinstance(new_1d.columns, pd.MultiIndex) and ticker in new_1d.columns: df = new_1d[ticker]
@@ -219,6 +208,34 @@ def update_market_data(tickers=None, override_period=None):
     except Exception as e:
         print(f"Background Update Error: {e}")
 
+def _load_ver3_candles(ticker):
+    """{ticker}_candle_data rows -> 5m DataFrame (Close, Volume) on a NY-aware index, or None"""
+    from db import get_connection
+    try:
+        query = f"SELECT candle_date, hour, minute, close_price, volume FROM {ticker.lower()}_candle_data ORDER BY candle_date ASC, hour ASC, minute ASC"
+        conn = get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(query)
+                rows = cursor.fetchall()
+        finally:
+            conn.close()
+        if not rows: return None
+
+        raw = pd.DataFrame(rows)
+        # Vectorized datetime build (replaces per-row strptime + localize)
+        ts = (pd.to_datetime(raw['candle_date'].astype(str))
+              + pd.to_timedelta(raw['hour'].astype(int), unit='h')
+              + pd.to_timedelta(raw['minute'].astype(int), unit='m'))
+        idx = mcal.localize_index(ts).rename('Datetime')
+        df = pd.DataFrame({'Close': raw['close_price'].astype(float).to_numpy(),
+                           'Volume': raw['volume'].astype('int64').to_numpy()}, index=idx)
+        return df[df.index.notna()]
+    except Exception as e:
+        print(f"Ver3 Table Load Error ({ticker}): {e}")
+        return None
+
+@metrics.timed("candle_load")
 def load_data_from_db(target_list=None):
     """Reloads _DATA_CACHE from DB (Fast)"""
     global _DATA_CACHE
@@ -236,36 +253,13 @@ def load_data_from_db(target_list=None):
         cache_1d = {}
         
         for ticker in target_list:
+            # Ver 3.0 Engine: Validated Tables (5m base rows -> 5m as-is, 30m resampled)
+            df5_raw = _load_ver3_candles(ticker) if ticker in ["SOXL", "SOXS", "UPRO"] else None
+
             # 30m
             df30 = None
-            if ticker in ["SOXL", "SOXS", "UPRO"]:
-                # Ver 3.0 Engine: Validated Tables
-                from db import get_connection
-                try:
-                    query = f"SELECT candle_date, hour, minute, close_price, volume FROM {ticker.lower()}_candle_data ORDER BY candle_date ASC, hour ASC, minute ASC"
-                    conn = get_connection()
-                    with conn.cursor() as cursor:
-                        cursor.execute(query)
-                        rows = cursor.fetchall()
-                    
-                    if rows:
-                        data = []
-                        ny_tz = pytz.timezone('America/New_York')
-                        for r in rows:
-                            # Construct datetime
-                            dt_str = f"{r['candle_date']} {r['hour']:02d}:{r['minute']:02d}:00"
-                            dt_obj = datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S")
-                            dt_obj = ny_tz.localize(dt_obj)
-                            data.append({
-                                'Datetime': dt_obj,
-                                'Close': float(r['close_price']),
-                                'Volume': int(r['volume'])
-                            })
-                        df30_raw = pd.DataFrame(data).set_index('Datetime')
-                        # Resample to 30m
-                        df30 = df30_raw.resample('30min').agg({'Close': 'last', 'Volume': 'sum'}).dropna()
-                except Exception as e:
-                    print(f"Ver3 Table Load Error ({ticker}): {e}")
+            if df5_raw is not None:
+                df30 = df5_raw.resample('30min').agg({'Close': 'last', 'Volume': 'sum'}).dropna()
 
             if df30 is None:
                 # Fallback to Legacy
@@ -276,33 +270,7 @@ def load_data_from_db(target_list=None):
                 cache_30m[ticker] = df30
             
             # 5m
-            df5 = None
-            if ticker in ["SOXL", "SOXS", "UPRO"]:
-                 # Already fetched rows above? Let's just re-use logic since it's cheap (300 rows)
-                 # Actually better to start from df30_raw above if we had scope.
-                 # Let's repeat for now for simplicity or cache 'raw' in a local var?
-                 # Re-fetching 300 rows is instant.
-                 try:
-                    query = f"SELECT candle_date, hour, minute, close_price, volume FROM {ticker.lower()}_candle_data ORDER BY candle_date ASC, hour ASC, minute ASC"
-                    conn = get_connection()
-                    with conn.cursor() as cursor:
-                       cursor.execute(query)
-                       rows = cursor.fetchall()
-                    if rows:
-                        data = []
-                        ny_tz = pytz.timezone('America/New_York')
-                        for r in rows:
-                            dt_str = f"{r['candle_date']} {r['hour']:02d}:{r['minute']:02d}:00"
-                            dt_obj = datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S")
-                            dt_obj = ny_tz.localize(dt_obj)
-                            data.append({
-                                'Datetime': dt_obj,
-                                'Close': float(r['close_price']),
-                                'Volume': int(r['volume'])
-                            })
-                        df5 = pd.DataFrame(data).set_index('Datetime')
-                        # It is already 5m base.
-                 except: pass
+            df5 = df5_raw
 
             if df5 is None:
                 df5 = load_market_candles(ticker, "5m", limit=2000)
@@ -320,31 +288,32 @@ def load_data_from_db(target_list=None):
         # KIS Live Patching (Fast, Direct Broker API)
         # We do this on LOAD so the cache always has the latest live price on top of DB history
         try:
-            from kis_api import kis_client
             EXCHANGE_MAP = {"SOXL": "NYS", "SOXS": "NYS", "UPRO": "NYS"}
-            for ticker in ["SOXL", "SOXS", "UPRO"]:
-                if ticker in cache_30m or ticker in cache_5m:
-                    kis = kis_client.get_price(ticker, exchange=EXCHANGE_MAP.get(ticker))
-                    if kis and kis['price'] > 0:
-                        if ticker in cache_30m: 
-                            # Safe update last row
-                            # cache_30m[ticker].iloc[-1, cache_30m[ticker].columns.get_loc('Close')] = kis['price'] 
-                            # Better: Append or Update intelligently? Just update close for now.
-                            idx = cache_30m[ticker].index[-1]
-                            cache_30m[ticker].at[idx, 'Close'] = kis['price']
-                            
-                        if ticker in cache_5m: 
-                            idx = cache_5m[ticker].index[-1]
-                            cache_5m[ticker].at[idx, 'Close'] = kis['price']
-                            
+            patch = [t for t in ["SOXL", "SOXS", "UPRO"] if t in cache_30m or t in cache_5m]
+            with metrics.stage("kis_patch"):
+                live = get_quotes(patch, exchanges=EXCHANGE_MAP) if patch else {}
+            for ticker in patch:
+                kis = live.get(ticker)
+                if kis and kis['price'] > 0:
+                    if ticker in cache_30m: 
+                        # Safe update last row
+                        # cache_30m[ticker].iloc[-1, cache_30m[ticker].columns.get_loc('Close')] = kis['price'] 
+                        # Better: Append or Update intelligently? Just update close for now.
+                        idx = cache_30m[ticker].index[-1]
+                        cache_30m[ticker].at[idx, 'Close'] = kis['price']
+                        
+                    if ticker in cache_5m: 
+                        idx = cache_5m[ticker].index[-1]
+                        cache_5m[ticker].at[idx, 'Close'] = kis['price']
+                        
         except Exception as e: print(f"KIS Patch Error: {e}")
 
-        # Update Cache
-        if cache_30m: _DATA_CACHE["30m"] = cache_30m
-        if cache_5m: _DATA_CACHE["5m"] = cache_5m
-        if cache_1d: _DATA_CACHE["1d"] = cache_1d
+        # Update Cache (merge: a reload for a few tickers must not evict the others)
+        for key, fresh in (("30m", cache_30m), ("5m", cache_5m), ("1d", cache_1d)):
+            if fresh: _DATA_CACHE[key] = {**(_DATA_CACHE[key] or {}), **fresh}
         
         _DATA_CACHE["last_fetch_realtime"] = time.time()
+        _LOADED_TICKERS.update(target_list)
         print(f"✅ Cache Refreshed from DB: {len(cache_30m)} tickers")
         
     except Exception as e:
@@ -358,9 +327,12 @@ def fetch_data(tickers=None, force=False, override_period=None):
     """
     global _DATA_CACHE
     
-    # If cache is empty, try loading from DB immediately
+    # If cache is empty (or misses requested tickers), try loading from DB immediately
     if _DATA_CACHE["30m"] is None:
         load_data_from_db(tickers)
+    elif tickers and not force:
+        missing = [t for t in tickers if t not in _LOADED_TICKERS]
+        if missing: load_data_from_db(missing)
         
     # If force=True (Scheduler), run the update logic
     if force:
@@ -459,602 +431,545 @@ def parse_strategy_config(strategy_str):
         
     return config
 
-def analyze_ticker(ticker, df_30mRaw, df_5mRaw, df_1dRaw, market_vol_score=0, is_held=False, real_time_info=None, holdings_data=None, strategy_info=None):
-    # Retrieve Stock Name
-    stock_name = TICKER_NAMES.get(ticker, ticker)
-    
-    try:
-        # Match ticker using MultiIndex or Flat
-        df_30 = None
-        df_5 = None
-        df_1d = None
-
-        if isinstance(df_30mRaw.columns, pd.MultiIndex):
-            if ticker in df_30mRaw.columns.levels[0]:
-                df_30 = df_30mRaw[ticker].copy()
-                df_30.dropna(subset=['Close'], inplace=True)
-        elif ticker in df_30mRaw.columns:
-             pass 
-
-        if isinstance(df_5mRaw.columns, pd.MultiIndex):
-            if ticker in df_5mRaw.columns.levels[0]:
-                df_5 = df_5mRaw[ticker].copy()
-                df_5.dropna(subset=['Close'], inplace=True)
-                
-        if df_1dRaw is not None:
-            if isinstance(df_1dRaw.columns, pd.MultiIndex):
-                if ticker in df_1dRaw.columns.levels[0]:
-                    df_1d = df_1dRaw[ticker].copy()
-                    df_1d.dropna(subset=['Close'], inplace=True)
-        
-        if df_30 is None or df_5 is None or df_30.empty or df_5.empty:
-            return {"ticker": ticker, "name": stock_name, "error": "No data"}
-            
-        # ... (Technical Analysis Logic remains mostly same, need to ensure return dict has 'name')
-        
-        # Calculate Indicators 30m
-        df_30['SMA10'] = calculate_sma(df_30['Close'], 10)
-        df_30['SMA30'] = calculate_sma(df_30['Close'], 30)
-        df_30['RSI'] = calculate_rsi(df_30['Close'])
-        
-        # Bollinger Bands & MACD
-        df_30['BB_Mid'] = df_30['Close'].rolling(window=20).mean()
-        df_30['BB_Std'] = df_30['Close'].rolling(window=20).std()
-        df_30['BB_Upper'] = df_30['BB_Mid'] + (2 * df_30['BB_Std'])
-        df_30['BB_Lower'] = df_30['BB_Mid'] - (2 * df_30['BB_Std'])
-        
-        exp12 = df_30['Close'].ewm(span=12, adjust=False).mean()
-        exp26 = df_30['Close'].ewm(span=26, adjust=False).mean()
-        df_30['MACD'] = exp12 - exp26
-        df_30['Signal'] = df_30['MACD'].ewm(span=9, adjust=False).mean()
-        df_30['RSI'] = calculate_rsi(df_30['Close'], 14)
+def _pick_ticker_frame(data, ticker):
+    """
+    Extract one ticker's candles from cache data.
+    Supports dict {ticker: DataFrame} (DB cache) and yfinance MultiIndex DataFrame.
+    Returns a copy with empty Close rows dropped, or None.
+    """
+    if data is None: return None
+    df = None
+    if isinstance(data, dict):
+        df = data.get(ticker)
+    elif hasattr(data, 'columns') and isinstance(data.columns, pd.MultiIndex):
+        if ticker in data.columns.levels[0]:
+            df = data[ticker]
+    if df is None or df.empty or 'Close' not in df.columns: return None
+    return df.dropna(subset=['Close']).copy()
+
+# --- analyze_ticker Pipeline ---
+# Indicator kinds usable through TickerContext.indicator(tf, kind, length)
+_INDICATOR_FUNCS = {
+    "sma": calculate_sma,
+    "ema": calculate_ema,
+    "rsi": calculate_rsi,
+    "ewm": lambda s, n: s.ewm(span=n, adjust=False).mean(),   # MACD legs
+    "mean": lambda s, n: s.rolling(window=n).mean(),          # Bollinger mid
+    "std": lambda s, n: s.rolling(window=n).std(),            # Bollinger width
+}
 
-        # 5m
-        df_5['SMA10'] = calculate_sma(df_5['Close'], 10)
-        df_5['SMA30'] = calculate_sma(df_5['Close'], 30)
-        
-        # Values
-        current_price = df_30['Close'].iloc[-1]
-        
-        # [FIX] Calculate Daily Change using KIS API Daily Data (Most Reliable for "Yesterday Close")
-        change_pct = 0.0
-        prev_close_price = 0.0
-        
-        # Try KIS Daily first
+class TickerContext:
+    """
+    Per-call state for analyze_ticker.
+    Holds the ticker frames, the live quote (fetched at most once) and every
+    indicator series computed so far, so no stage fetches or computes twice.
+    Stage outputs are plain attributes; per-stage timings (ms) go to `timings`.
+    """
+    def __init__(self, ticker, df_30, df_5, df_1d, real_time_info=None):
+        self.ticker = ticker
+        self.frames = {"30m": df_30, "5m": df_5, "1d": df_1d}
+        self.df_30 = df_30
+        self.df_5 = df_5
+        self.df_1d = df_1d
+        self._quote = real_time_info
+        self._quote_loaded = real_time_info is not None
+        self._ind = {}
+        self.timings = {}
+
+    def quote(self):
+        """Live consensus quote {'price','diff','rate',...} (prefetched or fetched once)"""
+        if not self._quote_loaded:
+            self._quote_loaded = True
+            try:
+                self._quote = get_quote(self.ticker)
+            except Exception as e:
+                print(f"Quote Error ({self.ticker}): {e}")
+                self._quote = None
+        return self._quote
+
+    def indicator(self, tf, kind, length):
+        """Memoized indicator series on frames[tf]['Close']"""
+        key = (tf, kind, length)
+        if key not in self._ind:
+            self._ind[key] = _INDICATOR_FUNCS[kind](self.frames[tf]['Close'], length)
+        return self._ind[key]
+
+    def require(self, inputs):
+        """Materialize declared stage inputs ('quote' or (tf, kind, length))"""
+        for req in inputs:
+            if req == "quote": self.quote()
+            else: self.indicator(*req)
+
+
+def _scan_cross(df, fast, slow, lookback):
+    """Most recent fast/slow cross within lookback bars -> (type, idx, time)"""
+    for i in range(1, lookback):
+        if i >= len(df): break
+        c_f = fast.iloc[-i]
+        c_s = slow.iloc[-i]
+        p_f = fast.iloc[-(i+1)]
+        p_s = slow.iloc[-(i+1)]
+
+        if p_f <= p_s and c_f > c_s:
+            return 'gold', -i, df.index[-i]
+        elif p_f >= p_s and c_f < c_s:
+            return 'dead', -i, df.index[-i]
+    return None, -1, ""
+
+
+def _stage_indicators(ctx):
+    df_30, df_5 = ctx.df_30, ctx.df_5
+
+    # 30m: SMA / RSI / Bollinger / MACD / EMA
+    df_30['SMA10'] = ctx.indicator("30m", "sma", 10)
+    df_30['SMA30'] = ctx.indicator("30m", "sma", 30)
+    df_30['RSI'] = ctx.indicator("30m", "rsi", 14)
+
+    df_30['BB_Mid'] = ctx.indicator("30m", "mean", 20)
+    df_30['BB_Std'] = ctx.indicator("30m", "std", 20)
+    df_30['BB_Upper'] = df_30['BB_Mid'] + (2 * df_30['BB_Std'])
+    df_30['BB_Lower'] = df_30['BB_Mid'] - (2 * df_30['BB_Std'])
+
+    df_30['MACD'] = ctx.indicator("30m", "ewm", 12) - ctx.indicator("30m", "ewm", 26)
+    df_30['Signal'] = df_30['MACD'].ewm(span=9, adjust=False).mean()
+
+    # EMA for UPRO/TMF strategy ("EMA 15/50 Golden Cross" -> 30m)
+    df_30['EMA15'] = ctx.indicator("30m", "ema", 15)
+    df_30['EMA50'] = ctx.indicator("30m", "ema", 50)
+
+    # 5m
+    df_5['SMA10'] = ctx.indicator("5m", "sma", 10)
+    df_5['SMA30'] = ctx.indicator("5m", "sma", 30)
+
+
+def _stage_price(ctx):
+    """Current price (Realtime > 30m Close) and daily change vs previous close (KIS diff > 1D DF)"""
+    ctx.current_price = ctx.df_30['Close'].iloc[-1]
+    ctx.change_pct = 0.0
+    prev_close_price = 0.0
+    prev_close_source = "None"
+
+    q = ctx.quote()
+    if q and float(q.get('price') or 0) > 0:
+        ctx.current_price = float(q['price'])
+
+    # Daily reference close (resolved once per session, shared with triple filter / V2)
+    ref = get_prev_close(ctx.ticker)
+    if ref:
+        prev_close_price = float(ref['price'])
+        prev_close_source = f"Ref_{ref['source']}"
+    elif q and q.get('diff') is not None:
+        # KIS diff is vs. yesterday close -> Prev = Current - Diff
+        prev_close_price = ctx.current_price - float(q['diff'])
+        prev_close_source = "KIS_Diff_Calc"
+
+    df_1d = ctx.df_1d
+    if prev_close_price == 0 and df_1d is not None and not df_1d.empty:
+        # Fallback to DF: assume last is today, second last is yesterday
+        if len(df_1d) >= 2:
+            prev_close_price = float(df_1d['Close'].iloc[-2])
+            prev_close_source = "DF_Iloc[-2]"
+        else:
+            prev_close_price = float(df_1d['Close'].iloc[-1])
+            prev_close_source = "DF_Iloc[-1]"
+
+    if prev_close_price > 0:
+        ctx.change_pct = ((ctx.current_price - prev_close_price) / prev_close_price) * 100
+        print(f"[{ctx.ticker}] Daily Change: {ctx.change_pct:.2f}% (Curr: {ctx.current_price}, Prev: {prev_close_price}, Src: {prev_close_source})")
+
+
+def _stage_cross(ctx):
+    """Default SMA10/30 (30m) cross, box pattern and 5m volume ratio"""
+    df_30, df_5 = ctx.df_30, ctx.df_5
+
+    ctx.last_sma10 = df_30['SMA10'].iloc[-1]
+    ctx.last_sma30 = df_30['SMA30'].iloc[-1]
+    ctx.last_5m_sma10 = df_5['SMA10'].iloc[-1]
+    ctx.last_5m_sma30 = df_5['SMA30'].iloc[-1]
+    ctx.is_box, ctx.box_high, ctx.box_low, ctx.box_pct = check_box_pattern(df_30)
+
+    # Lookback 60 bars for better coverage
+    ctx.cross_type, ctx.cross_idx, ctx.signal_time = _scan_cross(df_30, df_30['SMA10'], df_30['SMA30'], 60)
+
+    # Trend Following Fallback
+    if ctx.cross_type is None:
+        ctx.cross_type = 'gold' if ctx.last_sma10 > ctx.last_sma30 else 'dead'
+        ctx.signal_time = df_30.index[-1]
+
+    # Volume Ratio (5m)
+    ctx.vol_ratio = 0.0
+    if not df_5.empty and len(df_5) > 20:
+        curr_vol = df_5['Volume'].iloc[-1]
+        avg_vol = df_5['Volume'].iloc[-21:-1].mean()
+        if avg_vol > 0:
+            ctx.vol_ratio = (curr_vol / avg_vol) * 100
+
+
+def _stage_strategy(ctx):
+    """Cheongan 2.1: Dynamic Strategy Overlay (DB Driven, managed_stocks.buy_strategy)"""
+    ctx.strategy_desc = "Standard Formula"
+    pass_filter = True
+    if not ctx.strategy_info: return
+
+    df_30, df_1d = ctx.df_30, ctx.df_1d
+    st_conf = parse_strategy_config(ctx.strategy_info.get('buy_strategy', ''))
+    desc_log = []
+
+    # 1. Custom MA Cross Check (if different from default SMA 10/30)
+    if st_conf['ma_type'] != 'sma' or st_conf['ma_fast'] != 10 or st_conf['ma_slow'] != 30:
+        kind = 'ema' if st_conf['ma_type'] == 'ema' else 'sma'
+        # Shared cache: e.g. SMA10/50 reuses the SMA10 already computed
+        fast = ctx.indicator("30m", kind, st_conf['ma_fast'])
+        slow = ctx.indicator("30m", kind, st_conf['ma_slow'])
+        desc_log.append(f"Strat:{kind.upper()}{st_conf['ma_fast']}/{st_conf['ma_slow']}")
+
+        c_ma_cross, c_idx, c_sig_time = _scan_cross(df_30, fast, slow, 50)
+
+        # Override Global Result
+        ctx.cross_type = c_ma_cross
+        ctx.cross_idx = c_idx
+        if c_sig_time: ctx.signal_time = c_sig_time
+
+    # 2. Box Filter
+    if st_conf['box_tol'] and ctx.cross_type == 'gold':
+        c_is_box, c_box_high, _, _ = check_box_pattern(df_30, tolerance=st_conf['box_tol'])
+        if c_is_box:
+            if ctx.current_price > c_box_high:
+                desc_log.append(f"BoxBreak(>{st_conf['box_tol']}%):OK")
+            else:
+                pass_filter = False
+                desc_log.append(f"BoxBreak:Fail(Price<=High)")
+        else:
+            # No box -> lenient pass unless explicitly strict
+            desc_log.append("NoBox:Pass")
+
+    # 3. Volume Filter
+    if st_conf['vol_req'] and ctx.cross_type == 'gold':
+        if ctx.vol_ratio < st_conf['vol_req']:
+            pass_filter = False
+            desc_log.append(f"Vol({ctx.vol_ratio:.0f}% < {st_conf['vol_req']}%)")
+
+    # 4. RSI Filter (Min)
+    if st_conf['rsi_min'] and ctx.cross_type == 'gold':
+        rsi_val = df_30['RSI'].iloc[-1]
+        if rsi_val < st_conf['rsi_min']:
+            pass_filter = False
+            desc_log.append(f"RSI({rsi_val:.1f} < {st_conf['rsi_min']})")
+
+    # 5. Daily MA Filter
+    if (st_conf['daily_ema200'] or st_conf['daily_sma200']) and ctx.cross_type == 'gold':
+        if df_1d is not None and len(df_1d) >= 200:
+            d_close = df_1d['Close'].iloc[-1]
+            if st_conf['daily_ema200']:
+                ma_val = ctx.indicator("1d", "ema", 200).iloc[-1]
+                lbl = "EMA200"
+            else:
+                ma_val = ctx.indicator("1d", "sma", 200).iloc[-1]
+                lbl = "SMA200"
+
+            if d_close < ma_val:
+                pass_filter = False
+                desc_log.append(f"Daily{lbl}:Fail(Close<MA)")
+            else:
+                desc_log.append(f"Daily{lbl}:OK")
+        else:
+            desc_log.append("DailyMA:NoData")
+
+    if desc_log: ctx.strategy_desc = ", ".join(desc_log)
+
+    # Filter failed -> ignore the Gold Cross (falls to Observe)
+    if not pass_filter and ctx.cross_type == 'gold':
+        ctx.cross_type = None
+
+
+def _stage_position(ctx):
+    """Technical position + user holding overlay"""
+    current_price = ctx.current_price
+
+    # Force Signal Time to Current Real-time Update (User Request)
+    # Since we use Real-time Price and re-evaluate Breakout/Position,
+    # we update the signal timestamp to reflect the latest analysis time.
+    ctx.signal_time = datetime.now(KST)
+
+    # Validation
+    position = "관망"
+    valid = True
+    if ctx.cross_type == 'gold':
+        if ctx.last_5m_sma10 < ctx.last_5m_sma30: valid = False
+        if ctx.is_box and not current_price > ctx.box_high: valid = False
+        position = "🔴 매수 진입" if ctx.cross_idx == -1 else "🔴 매수 유지" if valid else "관망 (매수 신호 무효화)"
+    elif ctx.cross_type == 'dead':
+        if ctx.last_5m_sma10 > ctx.last_5m_sma30: valid = False
+        if ctx.is_box and not current_price < ctx.box_low: valid = False
+        position = "🔹 매도 진입" if ctx.cross_idx == -1 else "🔵 매도 유지" if valid else "관망 (매도 신호 무효화)"
+
+        if current_price > ctx.box_high: position = "✨ 박스권 돌파 성공 (상단)"
+        elif current_price < ctx.box_low: position = "✨ 박스권 돌파 성공 (하단)"
+
+    # === User Holding Based Position Overlay ===
+    # If Held: Buy/Hold/Observe -> "매수 유지", Sell -> "매도"
+    # If Not Held: Buy -> "매수", Sell/Observe -> "미보유"
+    tech_position = position
+    if ctx.is_held:
+        if "매도" in tech_position or "하단" in tech_position:
+            position = "🔹 매도"
+        else:
+            position = "🔴 매수 유지"
+    else:
+        if "매수" in tech_position or "상단" in tech_position:
+            position = "🔴 매수"
+        else:
+            position = "미보유"
+    ctx.position = position
+
+    # Format Time
+    ctx.formatted_signal_time = "-"
+    if ctx.signal_time != "":
         try:
-            daily_data = kis_client.get_daily_price(ticker)
-            if daily_data and len(daily_data) > 0:
-                # daily_data[0] usually contains today's live data in 'stck_clpr' or prev close in 'stck_prpr'?
-                # KIS output2 fields: stck_bsop_date(Date), stck_clpr(Close), prdy_vrss(Diff), prdy_ctrt(Rate)
-                # Note: For Overseas, output2[0] is the most recent day.
-                # If market is open, output2[0] is TODAY. detailed fields might differ.
-                # output2[0]['stck_clpr'] is Close.
-                # output2[1]['stck_clpr'] is Yesterday Close.
-                
-                # Careful: We need Yesterday's Close to compare with Current Price.
-                # Let's verify date of data[0].
-                # But simply, we can infer prev_close from current_price and rate if we trust rate?
-                # No, user said rate was wrong. 
-                # Let's get output2[1] (Yesterday) directly.
-                
-                if len(daily_data) > 1:
-                     # Check if data[0] is today. 
-                     # If data[0] date == today, then previous close is data[1]['ovrs_nmix_prpr'] (for index) or 'close'?
-                     # For overseas stock KIS get_daily_price returns: 
-                     # { 'sign':..., 'symb':..., 'date':..., 'clos':... } (keys might differ depending on endpoint)
-                     # Based on kis_api.py: returns output2. keys are usually acronyms.
-                     # "clos" is likely close. let's assume 'clos' or similar.
-                     # Actually, looking at kis_api.py, it returns raw dict.
-                     
-                     # Let's rely on calculation:
-                     # If we can get a stable previous close.
-                     pass 
+            st_target = ctx.signal_time
+            if st_target.tzinfo is None:
+                st_target = st_target.replace(tzinfo=pytz.utc)
+            st_kst = st_target.astimezone(KST)
+            ctx.formatted_signal_time = f"{st_kst.strftime('%m/%d %H:%M')} KST"
+        except:
+            ctx.formatted_signal_time = str(ctx.signal_time)
+
+
+def _stage_score(ctx):
+    """Cheongan Scoring Engine (User Rules)"""
+    df_30 = ctx.df_30
+    current_price = ctx.current_price
+    position = ctx.position
+    recent_cross_type = ctx.cross_type
+
+    ctx.macd = float(df_30['MACD'].iloc[-1])
+    ctx.macd_sig = float(df_30['Signal'].iloc[-1])
+    ctx.rsi_val = float(df_30['RSI'].iloc[-1])
+    macd, signal, rsi_val = ctx.macd, ctx.macd_sig, ctx.rsi_val
+
+    news_prob = 50
+    if rsi_val > 60: news_prob += 10
+    if rsi_val < 40: news_prob -= 10
+    if recent_cross_type == 'gold': news_prob += 20
+    if recent_cross_type == 'dead': news_prob -= 20
+    ctx.news_prob = max(0, min(100, news_prob))
+
+    t30 = 'UP' if ctx.last_sma10 > ctx.last_sma30 else 'DOWN'
+    t5 = 'UP' if ctx.last_5m_sma10 > ctx.last_5m_sma30 else 'DOWN'
+    is_buy_signal = "매수" in position or "상단" in position
+    is_sell_signal = "매도" in position or "하단" in position
+    is_observing = not (is_buy_signal or is_sell_signal)
+
+    base_main = 20 if not is_observing else 10
+    base_confluence = 10 if t30 == t5 else -10
+
+    # Auxiliary Indicators (Max 20)
+    aux_rsi = 0
+    aux_macd = 0
+    aux_bb = 0
+    aux_cross = 0
+
+    bb_mid = float(df_30['BB_Mid'].iloc[-1])
+
+    # (1) RSI (+5)
+    if is_buy_signal or (is_observing and t30=='UP'):
+        if 45 <= rsi_val <= 75: aux_rsi = 5
+    elif is_sell_signal or (is_observing and t30=='DOWN'):
+        if 25 <= rsi_val <= 55: aux_rsi = 5
+
+    # (2) MACD (+5)
+    if is_buy_signal or (is_observing and t30=='UP'):
+        if macd > signal: aux_macd = 5
+    elif is_sell_signal or (is_observing and t30=='DOWN'):
+        if macd < signal: aux_macd = 5
+
+    # (3) Bollinger Trend (+5)
+    if is_buy_signal or (is_observing and t30=='UP'):
+        if current_price > bb_mid: aux_bb = 5
+    elif is_sell_signal or (is_observing and t30=='DOWN'):
+        if current_price < bb_mid: aux_bb = 5
+
+    # (4) Cross Type Match (+5)
+    if (is_buy_signal and recent_cross_type == 'gold') or \
+       (is_sell_signal and recent_cross_type == 'dead'):
+        aux_cross = 5
+
+    base_score = base_main + base_confluence + aux_rsi + aux_macd + aux_bb + aux_cross
+    base_score = max(0, min(50, base_score))
+
+    # 2. Trend Score
+    sig_price = current_price
+    bars_since = 0
+    if ctx.cross_idx < 0: # Valid cross index
+        try:
+            sig_price = df_30['Close'].iloc[ctx.cross_idx]
+            bars_since = abs(ctx.cross_idx)
         except:
-             pass
+            pass
+
+    trend_score = 0
+    if is_buy_signal and current_price > sig_price:
+        trend_score = 10
+    elif is_sell_signal and current_price < sig_price:
+        trend_score = 10
+
+    # 3. Reliability Score
+    reliability_score = 0
+    if not is_observing and bars_since >= 2:
+        raw_diff_pct = ((current_price - sig_price) / sig_price) * 100
+        profit_rate = raw_diff_pct if is_buy_signal else -raw_diff_pct
+
+        if 1.5 <= profit_rate < 3.0:
+            reliability_score = 5
+        elif 3.0 <= profit_rate < 5.0:
+            reliability_score = 8
+        elif profit_rate >= 5.0:
+            reliability_score = 5
+        elif -5.0 < profit_rate <= -3.0:
+            reliability_score = -3
+        elif profit_rate <= -5.0:
+            reliability_score = -7
+
+    # 4. Breakout Score
+    breakout_score = 0
+    if not is_observing and bars_since >= 2:
+        recent_12h = df_30.iloc[-24:]
+        # Ver3 tables only carry Close/Volume -> fall back to Close range
+        high_col = 'High' if 'High' in recent_12h.columns else 'Close'
+        low_col = 'Low' if 'Low' in recent_12h.columns else 'Close'
+        prev_12h_high = recent_12h[high_col].iloc[:-1].max()
+        prev_12h_low = recent_12h[low_col].iloc[:-1].min()
+
+        if is_buy_signal and current_price >= prev_12h_high:
+            breakout_score = 10
+        elif is_sell_signal and current_price <= prev_12h_low:
+            breakout_score = 10
+
+    # 5. Market / Defensive Sell Score
+    market_score = ctx.market_vol_score
+    # [User Request] 박스권 불필요 매도 방지 로직
+    if is_sell_signal:
+        if ctx.market_vol_score < 5: market_score = -10
+        if t5 == 'UP': market_score -= 10
+        if ctx.is_box: market_score -= 20
+
+    # PnL Score Adjustment
+    pnl_impact = 0
+    holdings_data = ctx.holdings_data
+    if ctx.is_held and is_sell_signal and holdings_data and ctx.ticker in holdings_data and isinstance(holdings_data[ctx.ticker], dict):
+        avg_price = holdings_data[ctx.ticker].get('avg_price', 0)
+        if avg_price > 0:
+            pnl_pct_held = ((current_price - avg_price) / avg_price) * 100
+            if pnl_pct_held > 0:
+                pnl_impact = pnl_pct_held * 5
+            else:
+                pnl_impact = abs(pnl_pct_held) * 10
+
+    # Technical Sell Proposal Boost (+10)
+    if is_sell_signal:
+        bb_low = float(df_30['BB_Lower'].iloc[-1])
+        if current_price < bb_low:
+            pnl_impact += 10
+
+    # 6. Total Score
+    final_score = base_score + trend_score + reliability_score + breakout_score + market_score + pnl_impact
+    ctx.final_score = int(max(0, min(100, final_score)))
+    ctx.score_details = {
+        "base": base_score,
+        "trend": trend_score,
+        "reliability": reliability_score,
+        "breakout": breakout_score,
+        "market": market_score,
+        "pnl": pnl_impact
+    }
 
-        # Re-implementing simplified logic:
-        # 1. Get Current Price (Realtime > KIS > YF)
-        current_price_realtime = 0.0
-        if real_time_info:
-            current_price_realtime = float(real_time_info['price'])
-        elif (kp := kis_client.get_price(ticker)):
-             current_price_realtime = kp['price']
-        
-        if current_price_realtime > 0:
-            current_price = current_price_realtime
 
-        # 2. Get Prev Close (KIS Daily > 1D DF)
-        prev_close_source = "None"
-        try:
-            d_data = kis_client.get_daily_price(ticker)
-            if d_data and len(d_data) >= 2:
-                # KIS Daily returns list. [0] is recent.
-                # If [0] is today (based on date/time), use [1]['clos'].
-                # Actually KIS Daily keys: 'xymd' (Date), 'clos' (Close), 'open', 'high', 'low'
-                today_str = datetime.now(pytz.timezone('Asia/Seoul')).strftime("%Y%m%d") # KIS uses KST/Local dates usually? Or US?
-                # US Market Daily Date is usually Local Date (US).
-                # Safest: Use [1]['clos'] if [0] looks like today or if we just want "Previous Day Record".
-                # Actually, KIS often provides 'base' price in price query?
-                
-                # Let's try to interpret df_1d again with very strict logic, cross checked with KIS.
-                # Better: Use KIS get_price 'base' (Yesterday Close) if available.
-                # get_price returns 'price', 'diff', 'rate'. 
-                # Yesterday Close = Price - Diff.
-                kp_curr = kis_client.get_price(ticker)
-                if kp_curr:
-                     curr_p = kp_curr['price']
-                     diff = kp_curr['diff'] # This is comparison to yesterday.
-                     # If diff is valid, Prev = Current - Diff.
-                     if curr_p > 0:
-                         prev_close_price = curr_p - diff
-                         prev_close_source = "KIS_Diff_Calc"
-        except Exception as e:
-            print(f"KIS PrevClose Calc Error: {e}")
-            
-        if prev_close_price == 0 and df_1d is not None and not df_1d.empty:
-             # Fallback to DF
-             if len(df_1d) >= 2:
-                 # Assume last is today, second last is yesterday
-                 prev_close_price = float(df_1d['Close'].iloc[-2])
-                 prev_close_source = "DF_Iloc[-2]"
-             else:
-                 prev_close_price = float(df_1d['Close'].iloc[-1])
-                 prev_close_source = "DF_Iloc[-1]"
-        
-        if prev_close_price > 0:
-             change_pct = ((current_price - prev_close_price) / prev_close_price) * 100
-             print(f"[{ticker}] Daily Change: {change_pct:.2f}% (Curr: {current_price}, Prev: {prev_close_price}, Src: {prev_close_source})")
-        else:
-             # Last resort: use YF prev 30m? No, that's bad.
-             pass
+def _stage_extras(ctx):
+    """[Ver 3.9] Market Intelligence + Cross History (display only)"""
+    ctx.new_metrics = calculate_market_intelligence(ctx.df_30, rsi_series=ctx.indicator("30m", "rsi", 14))
+    ctx.cross_history = get_cross_history(ctx.df_30, ctx.df_5)
+
+
+# (stage name, function, declared inputs). Inputs are materialized through the
+# context before the stage runs; anything else a stage needs (e.g. custom
+# strategy MAs) goes through ctx.indicator() and hits the same cache.
+ANALYSIS_PIPELINE = [
+    ("indicators", _stage_indicators, [
+        ("30m", "sma", 10), ("30m", "sma", 30), ("30m", "rsi", 14),
+        ("30m", "mean", 20), ("30m", "std", 20), ("30m", "ewm", 12), ("30m", "ewm", 26),
+        ("30m", "ema", 15), ("30m", "ema", 50), ("5m", "sma", 10), ("5m", "sma", 30),
+    ]),
+    ("price", _stage_price, ["quote"]),
+    ("cross", _stage_cross, []),
+    ("strategy", _stage_strategy, []),
+    ("position", _stage_position, []),
+    ("score", _stage_score, []),
+    ("extras", _stage_extras, [("30m", "rsi", 14)]),
+]
+
+def run_ticker_pipeline(ctx, pipeline=None):
+    """Run stages in order, recording per-stage wall time (ms) in ctx.timings"""
+    for name, stage, inputs in (pipeline or ANALYSIS_PIPELINE):
+        t0 = time.perf_counter()
+        ctx.require(inputs)
+        stage(ctx)
+        dt = time.perf_counter() - t0
+        ctx.timings[name] = round(dt * 1000, 2)
+        metrics.observe("stage_seconds", dt, stage=f"analyze_{name}")
+    return ctx
 
-        # ... (rest of function) ...
-        
-        # [MODIFIED] Step 3 Logic: Always show 5m Status
 
-        
-        # ... inside return dict ...
-        # Assuming these lines are part of a larger dictionary return,
-        # and the instruction is to ensure they are present and use the variables.
-        # The provided "Code Edit" snippet seems to be a partial return dictionary.
-        # I will uncomment the lines that directly match the instruction.
-        # "step1_status": "골든크로스" if recent_cross_type == 'gold' else "데드크로스",
-        # "step2_status": f"박스권 상단돌파 ({box_pct:.1f}%)" if is_box_up else "대기 (돌파미확인)",
+def analyze_ticker(ticker, df_30mRaw, df_5mRaw, df_1dRaw, market_vol_score=0, is_held=False, real_time_info=None, holdings_data=None, strategy_info=None):
+    # Retrieve Stock Name
+    stock_name = TICKER_NAMES.get(ticker) or (strategy_info or {}).get('name') or ticker
 
-             
+    try:
+        # Match ticker using Dict (DB Cache) or MultiIndex
+        df_30 = _pick_ticker_frame(df_30mRaw, ticker)
+        df_5 = _pick_ticker_frame(df_5mRaw, ticker)
+        df_1d = _pick_ticker_frame(df_1dRaw, ticker)
 
-        
-        # Signal Detection (Previous Logic)
-        last_sma10 = df_30['SMA10'].iloc[-1]
-        last_sma30 = df_30['SMA30'].iloc[-1]
-        last_5m_sma10 = df_5['SMA10'].iloc[-1]
-        last_5m_sma30 = df_5['SMA30'].iloc[-1]
-        is_box, box_high, box_low, box_pct = check_box_pattern(df_30)
-        
-        position = "관망"
-        recent_cross_type = None 
-        signal_time = ""
-        cross_idx = -1
-        
-        # [MODIFIED] Persistent Signal Check:
-        # Check DB for the last known signal to maintain state even if app restarted or gaps exist.
-        last_db_signal = None
-        try:
-             from db import check_last_signal
-             last_db_signal = check_last_signal(ticker)
-        except: pass
-        
-        for i in range(1, 60): # Increased lookback to 60 for better coverage
-            if i >= len(df_30): break
-            c_sma10 = df_30['SMA10'].iloc[-i]
-            # ... (Rest of cross detection logic)
-            c_sma30 = df_30['SMA30'].iloc[-i]
-            p_sma10 = df_30['SMA10'].iloc[-(i+1)]
-            p_sma30 = df_30['SMA30'].iloc[-(i+1)]
-            
-            if p_sma10 <= p_sma30 and c_sma10 > c_sma30:
-                recent_cross_type = 'gold'
-                cross_idx = -i
-                signal_time = df_30.index[-i]
-                break
-            elif p_sma10 >= p_sma30 and c_sma10 < c_sma30:
-                recent_cross_type = 'dead'
-                cross_idx = -i
-                signal_time = df_30.index[-i]
-                break
-        
-        # Trend Following Fallback
-        if recent_cross_type is None:
-            if last_sma10 > last_sma30:
-                 recent_cross_type = 'gold'
-            else:
-                 recent_cross_type = 'dead'
-            signal_time = df_30.index[-1]
+        if df_30 is None or df_5 is None or df_30.empty or df_5.empty:
+            return {"ticker": ticker, "name": stock_name, "error": "No data"}
 
-            if last_sma10 > last_sma30:
-                 recent_cross_type = 'gold'
-            else:
-                 recent_cross_type = 'dead'
-            signal_time = df_30.index[-1]
-
-        # Calculate Extra Indicators for Strategy
-        # Volume Ratio (5m)
-        vol_ratio = 0.0
-        if not df_5.empty and len(df_5) > 20:
-            curr_vol = df_5['Volume'].iloc[-1]
-            avg_vol = df_5['Volume'].iloc[-21:-1].mean()
-            if avg_vol > 0:
-                vol_ratio = (curr_vol / avg_vol) * 100
-        
-        # EMA for UPRO/TMF (15, 50, 200) on 30m? Or 30m?
-        # Strategy says "EMA 15/50 Golden Cross" -> assume 30m
-        df_30['EMA15'] = calculate_ema(df_30['Close'], 15)
-        df_30['EMA50'] = calculate_ema(df_30['Close'], 50)
-        
-        last_ema15 = df_30['EMA15'].iloc[-1]
-        last_ema50 = df_30['EMA50'].iloc[-1]
-        
-        # === Cheongan 2.1: Dynamic Strategy Overlay (DB Driven) ===
-        strategy_desc = "Standard Formula"
-        pass_filter = True
-        
-        if strategy_info:
-             # Parse
-             st_conf = parse_strategy_config(strategy_info.get('buy_strategy', ''))
-             desc_log = []
-             
-             # 1. Custom MA Cross Check (if different from default SMA 10/30)
-             if st_conf['ma_type'] != 'sma' or st_conf['ma_fast'] != 10 or st_conf['ma_slow'] != 30:
-                 # Re-calculate Cross
-                 c_ma_cross = None
-                 c_idx = -1
-                 c_sig_time = ""
-                 
-                 # Calc indicators on df_30
-                 fast_col = f"MA_FAST_{st_conf['ma_fast']}"
-                 slow_col = f"MA_SLOW_{st_conf['ma_slow']}"
-                 
-                 if st_conf['ma_type'] == 'ema':
-                     df_30[fast_col] = calculate_ema(df_30['Close'], st_conf['ma_fast'])
-                     df_30[slow_col] = calculate_ema(df_30['Close'], st_conf['ma_slow'])
-                     desc_log.append(f"Strat:EMA{st_conf['ma_fast']}/{st_conf['ma_slow']}")
-                 else:
-                     df_30[fast_col] = calculate_sma(df_30['Close'], st_conf['ma_fast'])
-                     df_30[slow_col] = calculate_sma(df_30['Close'], st_conf['ma_slow'])
-                     desc_log.append(f"Strat:SMA{st_conf['ma_fast']}/{st_conf['ma_slow']}")
-                     
-                 # Scan for cross
-                 for i in range(1, 50):
-                     if i >= len(df_30): break
-                     c_f = df_30[fast_col].iloc[-i]
-                     c_s = df_30[slow_col].iloc[-i]
-                     p_f = df_30[fast_col].iloc[-(i+1)]
-                     p_s = df_30[slow_col].iloc[-(i+1)]
-                     
-                     if p_f <= p_s and c_f > c_s:
-                         c_ma_cross = 'gold'
-                         c_idx = -i
-                         c_sig_time = df_30.index[-i]
-                         break
-                     elif p_f >= p_s and c_f < c_s:
-                         c_ma_cross = 'dead'
-                         c_idx = -i
-                         c_sig_time = df_30.index[-i]
-                         break
-                 
-                 # Override Global Result
-                 recent_cross_type = c_ma_cross
-                 cross_idx = c_idx
-                 if c_sig_time: signal_time = c_sig_time
-                 
-             # 2. Box Filter
-             if st_conf['box_tol']:
-                 if recent_cross_type == 'gold':
-                     c_is_box, c_box_high, _, _ = check_box_pattern(df_30, tolerance=st_conf['box_tol'])
-                     if c_is_box:
-                         if current_price > c_box_high:
-                             desc_log.append(f"BoxBreak(>{st_conf['box_tol']}%):OK")
-                         else:
-                             pass_filter = False
-                             desc_log.append(f"BoxBreak:Fail(Price<=High)")
-                     else:
-                         # Strategy usually implies we want to catch the breakout.
-                         # If no box, we pass (lenient) or fail?
-                         # Let's say lenient for now unless explicitly strict.
-                         desc_log.append("NoBox:Pass")
-
-             # 3. Volume Filter
-             if st_conf['vol_req']:
-                 if recent_cross_type == 'gold':
-                      if vol_ratio < st_conf['vol_req']:
-                          pass_filter = False
-                          desc_log.append(f"Vol({vol_ratio:.0f}% < {st_conf['vol_req']}%)")
-
-             # 4. RSI Filter (Min)
-             if st_conf['rsi_min']:
-                  if recent_cross_type == 'gold':
-                      rsi_val = df_30['RSI'].iloc[-1]
-                      if rsi_val < st_conf['rsi_min']:
-                          pass_filter = False
-                          desc_log.append(f"RSI({rsi_val:.1f} < {st_conf['rsi_min']})")
-                          
-             # 5. Daily MA Filter
-             if st_conf['daily_ema200'] or st_conf['daily_sma200']:
-                 if recent_cross_type == 'gold':
-                     if df_1d is not None and len(df_1d) >= 200:
-                          d_close = df_1d['Close'].iloc[-1]
-                          ma_val = 0
-                          if st_conf['daily_ema200']:
-                              ma_val = calculate_ema(df_1d['Close'], 200).iloc[-1]
-                              lbl = "EMA200"
-                          else:
-                              ma_val = calculate_sma(df_1d['Close'], 200).iloc[-1]
-                              lbl = "SMA200"
-                              
-                          if d_close < ma_val:
-                              pass_filter = False
-                              desc_log.append(f"Daily{lbl}:Fail(Close<MA)")
-                          else:
-                              desc_log.append(f"Daily{lbl}:OK")
-                     else:
-                          desc_log.append("DailyMA:NoData") 
-
-             if desc_log: strategy_desc = ", ".join(desc_log)
-        
-        # Force "Observing" if filter failed
-        if not pass_filter and recent_cross_type == 'gold':
-             # If filter failed, we ignore the Gold Cross
-             recent_cross_type = None 
-             # Logic fallthrough to 'Trend Following Fallback' or just 'Observe'
-             # If we set recent_cross_type to None, it hits fallback.
-             # Better to specificy "Weak" or "Filtered".
-             pass
-        
-        # Force Signal Time to Current Real-time Update (User Request)
-        # Since we use Real-time Price and re-evaluate Breakout/Position,
-        # we update the signal timestamp to reflect the latest analysis time.
-        kst = pytz.timezone('Asia/Seoul')
-        signal_time = datetime.now(kst)
-
-        # Validation
-        valid = True
-        if recent_cross_type == 'gold':
-            if last_5m_sma10 < last_5m_sma30: valid = False
-            if is_box:
-                if current_price > box_high: pass
-                else: valid = False
-            position = "🔴 매수 진입" if cross_idx == -1 else "🔴 매수 유지" if valid else "관망 (매수 신호 무효화)"
-        elif recent_cross_type == 'dead':
-            if last_5m_sma10 > last_5m_sma30: valid = False
-            if is_box:
-                 if current_price < box_low: pass
-                 else: valid = False
-            position = "🔹 매도 진입" if cross_idx == -1 else "🔵 매도 유지" if valid else "관망 (매도 신호 무효화)"
-            
-            if current_price > box_high: position = "✨ 박스권 돌파 성공 (상단)"
-            elif current_price < box_low: position = "✨ 박스권 돌파 성공 (하단)"
-            
-        # === User Holding Based Position Overlay ===
-        # If Held: Buy/Hold/Observe -> "매수 유지", Sell -> "매도"
-        # If Not Held: Buy -> "매수", Sell/Observe -> "미보유"
-        
-        algo_position = position # Save algo string for scoring?
-        # Actually score depends on `is_buy_signal` derived from `position` text.
-        # Refined Logic:
-        # We need to construct a display string (`final_position`) AND ensure scoring logic uses the ALGO signal, not the display string?
-        # User said "보유하고 있지 않은 종목은 ... 미보유라고 하면되". 
-        # But for Scoring? "미보유" typically scores 0 (Base 20 if observes?).
-        # If I change `position` string, downstream logic (`is_buy_signal`) changes.
-        
-        # Let's derive `is_buy_signal` etc. from `position` BEFORE overriding it for display?
-        # But `analyze_ticker` returns `position` for display.
-        # I should keep `position` as the final display string.
-        # But calculate Scores based on technicals (Algo Position).
-        # However, if I display "미보유", the Dashboard shouldn't show "Buy Score 80".
-        # If "미보유" (Not Held & Sell/Observe), maybe score should reflect that?
-        # User didn't specify Score changes for Holding status. "종목별 상세분석에서도 매수하고 있는 경우 매수 유지로 하고 ... " -> talking about Display.
-        # But logic says "없는 종목의 경우 매수 신호가 나오면 매수".
-        
-        # Strategy:
-        # 1. Calculate Technical Position (`tech_position`).
-        # 2. Derive User Display Position (`user_position`) based on `is_held`.
-        # 3. Use `tech_position` for Scoring? Or `user_position`?
-        # If I have "미보유", it generally means "Do nothing".
-        
-        # Let's implement the User Rules for `position` string variable.
-        
-        tech_position = position
-        
-        if is_held:
-            # Holding
-            if "매도" in tech_position or "하단" in tech_position:
-                 position = "🔹 매도"
-            else:
-                 # Buy, Buy Hold, Observe -> Maintain Buy
-                 position = "🔴 매수 유지"
-        else:
-            # Check for specific signals to alert
-            if "매수" in tech_position or "상단" in tech_position:
-                 position = "🔴 매수"
-            else:
-                  # Sell, Sell Hold, Observe -> Not Held
-                  position = "미보유"
-            
-        # Format Time
-        formatted_signal_time = "-"
-        if signal_time != "":
-            try:
-                # Handle Timezone
-                st_target = signal_time
-                if st_target.tzinfo is None:
-                    st_target = st_target.replace(tzinfo=pytz.utc)
-                
-                st_kst = st_target.astimezone(pytz.timezone('Asia/Seoul'))
-                formatted_signal_time = f"{st_kst.strftime('%m/%d %H:%M')} KST"
-            except:
-                formatted_signal_time = str(signal_time)
-
-        macd = float(df_30['MACD'].iloc[-1])
-        signal = float(df_30['Signal'].iloc[-1])
-        rsi_val = float(df_30['RSI'].iloc[-1])
-        
-        news_prob = 50
-        if rsi_val > 60: news_prob += 10
-        if rsi_val < 40: news_prob -= 10
-        if recent_cross_type == 'gold': news_prob += 20
-        if recent_cross_type == 'dead': news_prob -= 20
-        news_prob = max(0, min(100, news_prob))
-        
-        # === Cheongan Scoring Engine (User Rules) ===
-        t30 = 'UP' if last_sma10 > last_sma30 else 'DOWN'
-        t5 = 'UP' if last_5m_sma10 > last_5m_sma30 else 'DOWN'
-        is_buy_signal = "매수" in position or "상단" in position
-        is_sell_signal = "매도" in position or "하단" in position
-        is_observing = not (is_buy_signal or is_sell_signal)
-
-
-        base_main = 20 if not is_observing else 10
-        base_confluence = 10 if t30 == t5 else -10
-        
-        # Auxiliary Indicators (Max 20)
-        aux_rsi = 0
-        aux_macd = 0
-        aux_bb = 0
-        aux_cross = 0
-        
-        bb_mid = float(df_30['BB_Mid'].iloc[-1])
-        
-        # (1) RSI (+5)
-        if is_buy_signal or (is_observing and t30=='UP'):
-            if 45 <= rsi_val <= 75: aux_rsi = 5
-        elif is_sell_signal or (is_observing and t30=='DOWN'):
-            if 25 <= rsi_val <= 55: aux_rsi = 5
-            
-        # (2) MACD (+5)
-        if is_buy_signal or (is_observing and t30=='UP'):
-            if macd > signal: aux_macd = 5
-        elif is_sell_signal or (is_observing and t30=='DOWN'):
-            if macd < signal: aux_macd = 5
-            
-        # (3) Bollinger Trend (+5)
-        if is_buy_signal or (is_observing and t30=='UP'):
-            if current_price > bb_mid: aux_bb = 5
-        elif is_sell_signal or (is_observing and t30=='DOWN'):
-            if current_price < bb_mid: aux_bb = 5
-            
-        # (4) Cross Type Match (+5)
-        if (is_buy_signal and recent_cross_type == 'gold') or \
-           (is_sell_signal and recent_cross_type == 'dead'):
-            aux_cross = 5
-            
-        base_score = base_main + base_confluence + aux_rsi + aux_macd + aux_bb + aux_cross
-        base_score = max(0, min(50, base_score))
-
-        # 2. Trend Score
-        # Signal Price & Bars
-        sig_price = current_price
-        bars_since = 0
-        if cross_idx < 0: # Valid cross index
-            try:
-                sig_price = df_30['Close'].iloc[cross_idx]
-                bars_since = abs(cross_idx)
-            except:
-                pass
+        ctx = TickerContext(ticker, df_30, df_5, df_1d, real_time_info=real_time_info)
+        ctx.market_vol_score = market_vol_score
+        ctx.is_held = is_held
+        ctx.holdings_data = holdings_data
+        ctx.strategy_info = strategy_info
+        run_ticker_pipeline(ctx)
+
+        signal_time = ctx.signal_time
+        current_price = ctx.current_price
+        change_pct = ctx.change_pct
+        rsi_val, macd, signal = ctx.rsi_val, ctx.macd, ctx.macd_sig
 
-        trend_score = 0
-        if is_buy_signal and current_price > sig_price:
-            trend_score = 10
-        elif is_sell_signal and current_price < sig_price:
-            trend_score = 10
-        
-        # 3. Reliability Score
-        reliability_score = 0
-        if not is_observing and bars_since >= 2:
-            raw_diff_pct = ((current_price - sig_price) / sig_price) * 100
-            profit_rate = raw_diff_pct if is_buy_signal else -raw_diff_pct
-            
-            if 1.5 <= profit_rate < 3.0:
-                reliability_score = 5
-            elif 3.0 <= profit_rate < 5.0:
-                reliability_score = 8
-            elif profit_rate >= 5.0:
-                reliability_score = 5
-            elif -5.0 < profit_rate <= -3.0:
-                reliability_score = -3
-            elif profit_rate <= -5.0:
-                reliability_score = -7
-
-        # 4. Breakout Score
-        breakout_score = 0
-        if not is_observing and bars_since >= 2:
-            recent_12h = df_30.iloc[-24:]
-            prev_12h_high = recent_12h['High'].iloc[:-1].max()
-            prev_12h_low = recent_12h['Low'].iloc[:-1].min()
-            
-            if is_buy_signal and current_price >= prev_12h_high:
-                breakout_score = 10
-            elif is_sell_signal and current_price <= prev_12h_low:
-                breakout_score = 10
-
-        # 5. Market / Defensive Sell Score
-        market_score = market_vol_score
-        # [User Request] 박스권 불필요 매도 방지 로직
-        if is_sell_signal:
-            if market_vol_score < 5: market_score = -10
-            if t5 == 'UP': market_score -= 10
-            if is_box: market_score -= 20
-
-        # PnL Score Adjustment
-        pnl_impact = 0
-        if is_held and is_sell_signal and holdings_data and ticker in holdings_data and isinstance(holdings_data[ticker], dict):
-             avg_price = holdings_data[ticker].get('avg_price', 0)
-             if avg_price > 0:
-                 pnl_pct_held = ((current_price - avg_price) / avg_price) * 100
-                 if pnl_pct_held > 0:
-                     pnl_impact = pnl_pct_held * 5
-                 else:
-                     pnl_impact = abs(pnl_pct_held) * 10
-
-        # Technical Sell Proposal Boost (+10)
-        if is_sell_signal:
-            bb_low = float(df_30['BB_Lower'].iloc[-1])
-            if current_price < bb_low:
-                pnl_impact += 10
-
-        # [Ver 3.9] Market Intelligence (Refactored)
-        new_metrics = calculate_market_intelligence(df_30)
-        
-        # 6. Total Score
-        final_score = base_score + trend_score + reliability_score + breakout_score + market_score + pnl_impact
-        final_score = int(max(0, min(100, final_score)))
-        
-        score_interpretation = get_score_interpretation(final_score, position)
-        
         result = {
             "ticker": ticker,
             "name": stock_name,
             "current_price": float(current_price) if pd.notnull(current_price) else None,
             "daily_change": float(change_pct) if pd.notnull(change_pct) else 0.0,
             "change_pct": float(change_pct) if pd.notnull(change_pct) else 0.0,
-            "position": position,
-            "last_cross_type": recent_cross_type,
-            "signal_time": formatted_signal_time,
+            "position": ctx.position,
+            "last_cross_type": ctx.cross_type,
+            "signal_time": ctx.formatted_signal_time,
             "signal_time_raw": signal_time.strftime('%Y-%m-%d %H:%M:%S') if signal_time != "" else None, 
-            "is_box": bool(is_box),
-            "box_high": float(box_high) if pd.notnull(box_high) else 0.0,
-            "box_low": float(box_low) if pd.notnull(box_low) else 0.0,
+            "is_box": bool(ctx.is_box),
+            "box_high": float(ctx.box_high) if pd.notnull(ctx.box_high) else 0.0,
+            "box_low": float(ctx.box_low) if pd.notnull(ctx.box_low) else 0.0,
             "rsi": float(rsi_val) if pd.notnull(rsi_val) else None,
             "macd": float(macd) if pd.notnull(macd) else None,
             "macd_sig": float(signal) if pd.notnull(signal) else None,
-            "prob_up": float(news_prob),
-            "score": final_score,
-            "score_interpretation": score_interpretation,
-            "new_metrics": new_metrics,
-            "score_details": score_details,
-            "news_items": stock_news,
+            "prob_up": float(ctx.news_prob),
+            "score": ctx.final_score,
+            "score_interpretation": get_score_interpretation(ctx.final_score, ctx.position),
+            "new_metrics": ctx.new_metrics,
+            "score_details": ctx.score_details,
+            "news_items": [],
             "is_held": is_held,
-            "strategy_result": strategy_desc,
-            "cross_history": get_cross_history(df_30, df_5)
+            "strategy_result": ctx.strategy_desc,
+            "cross_history": ctx.cross_history,
+            "stage_ms": ctx.timings
         }
         return result
     
@@ -1098,13 +1013,10 @@ def generate_trade_guidelines(results, market_data, regime_info, total_capital=1
     elif isinstance(held_tickers, dict):
          iterator = held_tickers.items()
 
+    result_prices = {r['ticker']: r.get('current_price', 0) for r in results}
     for ticker, info in iterator:
-        curr_price = info.get('avg_price', 0)
-        # Find current price in results
-        for r in results:
-            if r['ticker'] == ticker:
-                curr_price = r.get('current_price', 0)
-                break
+        # Current price from results (avg price if the ticker was not analyzed)
+        curr_price = result_prices.get(ticker, info.get('avg_price', 0))
         
         qty = info.get('qty', 0)
         current_holdings_value += (qty * curr_price)
@@ -1211,6 +1123,104 @@ def generate_trade_guidelines(results, market_data, regime_info, total_capital=1
 # Legacy regime functions removed.
 
 
+# --- Per-Stock Analysis Stage (managed_stocks) ---
+# Bounded worker pool: KIS allows ~20 req/s, keep concurrency well below that.
+ANALYSIS_MAX_WORKERS = 8
+ANALYSIS_TICKER_TIMEOUT = 20   # seconds per ticker (KIS calls + indicators)
+ANALYSIS_STAGE_TIMEOUT = 45    # whole stage must finish inside the 1-min monitor interval
+CORE_TICKERS = ["SOXL", "SOXS", "UPRO"]
+
+def get_active_managed_stocks():
+    """Active managed_stocks rows (buy_strategy drives the strategy overlay)"""
+    try:
+        from db import get_managed_stocks
+        return [s for s in (get_managed_stocks() or []) if s.get('is_active', True)]
+    except Exception as e:
+        print(f"Managed Stocks Load Error: {e}")
+        return []
+
+def prefetch_quotes(tickers, max_workers=ANALYSIS_MAX_WORKERS):
+    """
+    Fetch live quotes for all tickers concurrently (once per cycle) via the quote service.
+    Returns {ticker: {'price', 'diff', 'rate', 'exchange', 'source', ...}}; failed tickers are omitted.
+    """
+    from kis_api import get_exchange_code
+    if not tickers: return {}
+    return get_quotes(tickers, exchanges={t: get_exchange_code(t) for t in tickers})
+
+def run_stock_analysis(stocks, data_30m, data_5m, data_1d, quotes=None, market_vol_score=0, held_tickers=None):
+    """
+    Run analyze_ticker for every managed stock on a bounded thread pool.
+    - Candles/quotes are prefetched once and shared (read-only) by all workers.
+    - A ticker exceeding ANALYSIS_TICKER_TIMEOUT is reported as a timeout result;
+      the stage as a whole returns by ANALYSIS_STAGE_TIMEOUT with partial results.
+    Returns list of result dicts in managed_stocks order.
+    """
+    from concurrent.futures import wait, FIRST_COMPLETED
+    if not stocks: return []
+    quotes = quotes or {}
+
+    holdings = {}
+    for h in (held_tickers or []):
+        if isinstance(h, dict) and h.get('ticker'):
+            holdings[h['ticker']] = h
+
+    started = {}
+
+    def _task(stock):
+        ticker = stock['ticker']
+        started[ticker] = time.time()
+        held = holdings.get(ticker)
+        res = analyze_ticker(
+            ticker, data_30m, data_5m, data_1d,
+            market_vol_score=market_vol_score,
+            is_held=bool(held and (held.get('qty') or 0) > 0),
+            real_time_info=quotes.get(ticker),
+            holdings_data=holdings,
+            strategy_info=stock
+        )
+        res['target_ratio'] = int(stock.get('target_ratio') or 0)
+        res['held_qty'] = int(held.get('qty') or 0) if held else 0
+        return res
+
+    stage_start = time.time()
+    results = {}
+    pool = ThreadPoolExecutor(max_workers=ANALYSIS_MAX_WORKERS, thread_name_prefix="analysis")
+    try:
+        futures = {pool.submit(_task, s): s for s in stocks}
+        pending = set(futures)
+        while pending:
+            now = time.time()
+            if now - stage_start >= ANALYSIS_STAGE_TIMEOUT: break
+            done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+            for fut in done:
+                ticker = futures[fut]['ticker']
+                try:
+                    results[ticker] = fut.result()
+                except Exception as e:
+                    results[ticker] = {"ticker": ticker, "name": futures[fut].get('name') or ticker, "error": str(e)}
+
+            # Per-ticker timeout (running thread is abandoned, its result ignored)
+            for fut in list(pending):
+                ticker = futures[fut]['ticker']
+                t0 = started.get(ticker)
+                if t0 and time.time() - t0 > ANALYSIS_TICKER_TIMEOUT:
+                    pending.discard(fut)
+                    results[ticker] = {"ticker": ticker, "name": futures[fut].get('name') or ticker, "error": "timeout"}
+
+        for fut in pending:
+            fut.cancel()
+            ticker = futures[fut]['ticker']
+            results.setdefault(ticker, {"ticker": ticker, "name": futures[fut].get('name') or ticker, "error": "timeout"})
+    finally:
+        # Don't block the cycle on abandoned workers
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    failed = sum(1 for r in results.values() if 'error' in r)
+    print(f"✅ Stock Analysis: {len(results) - failed}/{len(stocks)} OK ({time.time() - stage_start:.1f}s)")
+    return [results[s['ticker']] for s in stocks if s['ticker'] in results]
+
+
 def run_analysis(held_tickers=[], force_update=False):
     print("Starting Analysis Run...")
     
@@ -1239,8 +1249,12 @@ def run_analysis(held_tickers=[], force_update=False):
     
     # -------------------------------------------------------------
 
-    # 1. Fetch Market Data (Only for SOXL, SOXS, UPRO)
-    data_30m, data_5m, data_1d, market_data, regime_daily_data = fetch_data(active_tickers, force=force_update)
+    # Managed stocks (per-stock analysis stage)
+    managed_stocks = get_active_managed_stocks()
+    fetch_tickers = active_tickers + [s['ticker'] for s in managed_stocks if s['ticker'] not in active_tickers]
+
+    # 1. Fetch Market Data (Master + Managed Stocks)
+    data_30m, data_5m, data_1d, market_data, regime_daily_data = fetch_data(fetch_tickers, force=force_update)
     
     # 2. Determine Market Regime (V2.3 Master Signal)
     regime_info = determine_market_regime_v2(regime_daily_data, data_30m, data_5m)
@@ -1249,12 +1263,18 @@ def run_analysis(held_tickers=[], force_update=False):
     # Calculate Market Volatility Score (V2.3: Replaced by Master Signals, but keeping variable for compatibility)
     market_vol_score = 5 if regime_info.get('regime') in ['Bull', 'Bear'] else -5
     
-    # 3. No individual stock analysis - MASTER CONTROL TOWER only
-    results = []  # Empty - we only show MASTER CONTROL TOWER
-    
     # Fetch Holdings & Capital (for display only)
     held_tickers = get_current_holdings()
     total_capital = get_total_capital()
+
+    # 3. Per-Stock Analysis (parallel, cached between scheduler runs)
+    results = _DATA_CACHE.get("stock_analysis")
+    if force_update or results is None:
+        quotes = prefetch_quotes([s['ticker'] for s in managed_stocks])
+        results = run_stock_analysis(managed_stocks, data_30m, data_5m, data_1d,
+                                     quotes=quotes, market_vol_score=market_vol_score,
+                                     held_tickers=held_tickers)
+        _DATA_CACHE["stock_analysis"] = results
     
     # 4. Generate Trade Guidelines (Simplified)cators Data with Change %
     indicators = {}
@@ -1307,28 +1327,16 @@ def run_analysis(held_tickers=[], force_update=False):
     # Calculate Market Volatility Score (V2.3: Replaced by Master Signals, but keeping variable for compatibility)
     market_vol_score = 5 if regime_info.get('regime') in ['Bull', 'Bear'] else -5
 
-    # --- JSON CLEANUP (Remove NaN) ---
-    def clean_nan(obj):
-        if isinstance(obj, list):
-            return [clean_nan(i) for i in obj]
-        elif isinstance(obj, dict):
-            return {k: clean_nan(v) for k, v in obj.items()}
-        elif isinstance(obj, float) and (np.isnan(obj) or np.isinf(obj)):
-            return 0.0
-        return obj
-
-    final_results = clean_nan(results)
-    final_indicators = clean_nan(indicators)
-    final_regime = clean_nan(regime_info)
-
+    # NaN/Inf/Decimal are handled once by report_store.dumps (per cycle)
     return {
         "timestamp": get_current_time_str(),
-        "stocks": final_regime.get('stocks', []),
-        "market": final_indicators,
+        "stocks": regime_info.get('stocks', []),
+        "stock_analysis": results,
+        "market": indicators,
         "insight": insight_text,
-        "strategy_list": clean_nan(strategy_list),
-        "total_assets": clean_nan(total_assets),
-        "market_regime": final_regime.get('market_regime', {})
+        "strategy_list": strategy_list,
+        "total_assets": total_assets,
+        "market_regime": regime_info.get('market_regime', {})
     }
 
 # --- 2026 Project: New Regime Logic V2 ---
@@ -1358,34 +1366,8 @@ def analyze_30m_box(df_30m):
     except: return "ERROR_EXCEPTION", 0,0,0
 
 
-def get_us_reg_close(df):
-    """Find the last close price from US regular hours (09:30-16:00 ET) before current day"""
-    try:
-        if df.empty: return None
-        # Convert index to ET
-        df_et = df.copy()
-        df_et.index = df_et.index.tz_convert('US/Eastern')
-        
-        # Filter for regular hours (9:30 to 16:00)
-        reg_hours = df_et.between_time('09:30', '16:00')
-        if reg_hours.empty: return None
-        
-        # Get last date in reg_hours
-        last_date = reg_hours.index[-1].date()
-        # Find the close of the last bar of the PREVIOUS regular trading day
-        prev_reg_days = reg_hours[reg_hours.index.date < last_date]
-        if prev_reg_days.empty:
-            # If only one day in data, return the first available reg hour close as fallback
-            return float(reg_hours['Close'].iloc[-1])
-            
-        prev_date = prev_reg_days.index[-1].date()
-        prev_day_close = prev_reg_days[prev_reg_days.index.date == prev_date]['Close'].iloc[-1]
-        return float(prev_day_close)
-    except:
-        return None
-
+@metrics.timed("triple_filter")
 def check_triple_filter(ticker, data_30m, data_5m):
-    print("FUNCTION ENTERED check_triple_filter")
     """
     Cheongan V2.5 Master Filter Logic
     Order: Step 1 (5m Timing), Step 2 (30m Trend), Step 3 (2% Strength)
@@ -1416,21 +1398,16 @@ def check_triple_filter(ticker, data_30m, data_5m):
         result["current_price"] = 4.20
         result["daily_change"] = -1.5
     
-    # Debug print
-    print(f"DEBUG: Checking {ticker}")
+    log.debug("triple_filter.check", ticker=ticker)
     
     try:
         # 1. Load Persisted State
         all_states = get_global_config("triple_filter_states", {})
-        state = all_states.get(ticker, {
-            "final_met": False, "signal_time": None,
-            "step1_done_time": None,
-            "step2_done_time": None, "step2_done_price": None,
-            "step3_done_time": None, "step3_done_pct": None
-        })
+        state = FilterState.from_json(all_states.get(ticker))
 
         # 2. Get Price & Data
-        kis_data = kis_client.get_price(ticker)
+        with metrics.stage("kis_patch"):
+            kis_data = get_quote(ticker)
         kis_price = kis_data['price'] if kis_data else None
 
         df30 = None
@@ -1444,16 +1421,11 @@ def check_triple_filter(ticker, data_30m, data_5m):
         elif hasattr(data_5m, 'columns'): df5 = data_5m # Support Single DF input
 
         # Check for missing OR stale data (휴장일 대응)
+        # Session-aware: weekends/NYSE holidays do not count, a feed gap inside sessions does
         data_is_stale = False
         if df30 is not None and not df30.empty:
             try:
-                latest_candle_time = df30.index[-1]
-                if latest_candle_time.tzinfo is None:
-                    latest_candle_time = latest_candle_time.replace(tzinfo=timezone.utc)
-                time_since_last_candle = datetime.now(timezone.utc) - latest_candle_time
-                # If last candle is older than 12 hours, consider it stale
-                if time_since_last_candle.total_seconds() > 172800:  # 48 hours (Include Weekend)
-                    data_is_stale = True
+                data_is_stale = mcal.is_stale(df30.index[-1])
             except:
                 pass
         
@@ -1463,19 +1435,19 @@ def check_triple_filter(ticker, data_30m, data_5m):
                  result["current_price"] = float(df30['Close'].iloc[-1])
                  
             # Preserve state even if data fetch fails OR is stale (Holiday or Rate Limit)
-            if state.get("final_met"):
+            if state.has(FINAL):
                 result["final"] = True
-                result["step1"] = True if state.get("step1_done_time") else False
-                result["step2"] = True if state.get("step2_done_time") else False
-                result["step3"] = True if state.get("step3_done_time") else False
-                result["signal_time"] = state.get("signal_time")
-                result["step2_color"] = state.get("step2_color")
-                result["step3_color"] = state.get("step3_color")
+                result["step1"] = bool(state.step1_time)
+                result["step2"] = bool(state.step2_time)
+                result["step3"] = bool(state.step3_time)
+                result["signal_time"] = state.signal_time
+                result["step2_color"] = state.step2_color
+                result["step3_color"] = state.step3_color
                 
                 # Restore Details
-                if state.get("step1_done_time"): result["step_details"]["step1"] = f"진입: {state['step1_done_time']}"
-                if state.get("step2_done_time"): result["step_details"]["step2"] = f"돌파: {state['step2_done_price']}$"
-                if state.get("step3_done_time"): result["step_details"]["step3"] = f"진입: {state['step3_done_time']}"
+                if state.step1_time: result["step_details"]["step1"] = f"진입: {state.step1_time}"
+                if state.step2_time: result["step_details"]["step2"] = f"돌파: {state.step2_price}$"
+                if state.step3_time: result["step_details"]["step3"] = f"진입: {state.step3_time}"
             return result
 
         # Force Numeric and Sync KIS
@@ -1489,12 +1461,10 @@ def check_triple_filter(ticker, data_30m, data_5m):
                 df5.iloc[-1, df5.columns.get_loc('Close')] = kis_price
                 df5.iloc[-1, df5.columns.get_loc('Close')] = kis_price
         except Exception as e:
-            print(f"TRIPLE FILTER ERROR ({ticker}): {e}")
+            log.error("triple_filter.data_error", every=60, key=ticker, ticker=ticker, error=e)
             return result
 
         current_price = float(df30['Close'].iloc[-1])
-        kst = pytz.timezone('Asia/Seoul')
-        us_et = pytz.timezone('America/New_York')
         
         # Try to get Chart Time (Signal Time) instead of Server Time
         try:
@@ -1511,7 +1481,7 @@ def check_triple_filter(ticker, data_30m, data_5m):
                 chart_time = chart_time.replace(tzinfo=timezone.utc)
             
             # Convert to KST (Korean Time)
-            chart_time_kst = chart_time.astimezone(kst)
+            chart_time_kst = chart_time.astimezone(KST)
             
             # Display in KST
             signal_timestamp_str = chart_time_kst.strftime("%Y-%m-%d %H:%M:%S")
@@ -1523,7 +1493,7 @@ def check_triple_filter(ticker, data_30m, data_5m):
             
         except Exception as e:
              # Fallback
-             now_time_str = datetime.now(kst).strftime("%Y-%m-%d %H:%M (KST)")
+             now_time_str = datetime.now(KST).strftime("%Y-%m-%d %H:%M (KST)")
              now_utc = datetime.now(timezone.utc)
 
     # --- CALCULATIONS ---
@@ -1540,39 +1510,12 @@ def check_triple_filter(ticker, data_30m, data_5m):
         filter2_met = False
         prev_close = None
         try:
-            # Fetch 1-day data directly for prev close calculation (Priority: KIS > DF)
-            import yfinance as yf # Keep import if needed, but we try KIS first
-            
-            # [FIX] Priority 1: KIS Daily Data
-            try:
-                k_daily = kis_client.get_daily_price(ticker)
-                if k_daily and len(k_daily) > 1:
-                     # KIS Daily usually returns [0]=Today(Live/Close), [1]=Yesterday.
-                     # We want Yesterday Close.
-                     prev_close = float(k_daily[1]['clos']) # Assuming 'clos' key or use safe get if unsure of key mapping in raw dict
-                     # Actually raw dict keys from KIS API are usually short. 
-                     # Let's rely on my previous knowledge or fallback.
-                     # But safer is to use the robust DF logic IF KIS fails or is ambiguous.
-            except: pass
-
-            # [FIX] Priority 2: 1D DF with Date Logic (Smart)
-            if not prev_close:
-                ticker_obj = yf.Ticker(ticker)
-                df_1d = ticker_obj.history(period="5d", interval="1d")
-                
-                if df_1d is not None and not df_1d.empty:
-                     est_tz = pytz.timezone('US/Eastern')
-                     today_est = datetime.now(est_tz).date()
-                     last_lbl = df_1d.index[-1]
-                     last_date = last_lbl.date() if hasattr(last_lbl, 'date') else last_lbl
-                     
-                     if last_date >= today_est:
-                         if len(df_1d) >= 2:
-                             prev_close = float(df_1d['Close'].iloc[-2])
-                             print(f"DEBUG {ticker}: Today Candle ({last_date}). PrevClose(iloc[-2])={prev_close}")
-                     else:
-                         prev_close = float(df_1d['Close'].iloc[-1])
-                         print(f"DEBUG {ticker}: Last Candle Old ({last_date}). PrevClose(iloc[-1])={prev_close}")
+            # Prev close: daily reference service (same value V2 / analyze_ticker use) > consensus quote
+            ref = get_prev_close(ticker)
+            if ref:
+                prev_close = float(ref['price'])
+            elif kis_data and kis_data.get('prev_close'):
+                prev_close = float(kis_data['prev_close'])
 
             is_breakout = False
             target_v = 0
@@ -1585,9 +1528,9 @@ def check_triple_filter(ticker, data_30m, data_5m):
             
             if is_breakout:
                  filter2_met = True
-                 if not state.get("step2_done_time"):
-                     state["step2_done_time"] = now_time_str
-                     state["step2_done_price"] = current_price
+                 if not state.step2_time:
+                     state.step2_time = now_time_str
+                     state.step2_price = current_price
                      # Save History
                      try:
                          from db import save_signal
@@ -1607,9 +1550,10 @@ def check_triple_filter(ticker, data_30m, data_5m):
             result["daily_change"] = round(change_pct, 2)
 
         except Exception as e:
-            print(f"Filter 2 Error ({ticker}): {e}")
-            import traceback
-            traceback.print_exc()
+            log.error("triple_filter.filter2_error", every=60, key=ticker, ticker=ticker, error=e)
+            if log.enabled(DEBUG):
+                import traceback
+                traceback.print_exc()
             result["target"] = 0
             filter2_met = False
 
@@ -1635,7 +1579,7 @@ def check_triple_filter(ticker, data_30m, data_5m):
         except:
             save_v2_buy_signal = None
 
-        manage_id = state.get("manage_id")
+        manage_id = state.manage_id
 
         # Step 1: 5m Golden Cross (Timing)
         result["step1"] = filter3_met # [SWAPPED]
@@ -1643,13 +1587,13 @@ def check_triple_filter(ticker, data_30m, data_5m):
             result["step1_color"] = None
             result["step1_status"] = "현재 골든크로스 (진입적합)"
             # Only set Y if not already Y
-            if not state.get("buy_sig1_yn") == 'Y':
-                 state["buy_sig1_yn"] = 'Y' 
+            if not state.has(SIG1):
+                 state.set(SIG1)
                  if manage_id and save_v2_buy_signal:
                      save_v2_buy_signal(manage_id, 'sig1', current_price)
             
-            if not state.get("step1_done_time"):
-                state["step1_done_time"] = now_time_str
+            if not state.step1_time:
+                state.step1_time = now_time_str
         else:
             result["step1_color"] = "yellow"
             result["step1_status"] = "현재 데드크로스 (대기)"
@@ -1662,8 +1606,8 @@ def check_triple_filter(ticker, data_30m, data_5m):
             # However, if Step 2 is already Y, we shouldn't kill the cycle? 
             # If Step 2 is Y, we are already in breakout. 
             # If Step 2 is N, we are waiting. If Step 1 fails while waiting, we should Go Back.
-            if state.get("buy_sig1_yn") == 'Y' and state.get("buy_sig2_yn") != 'Y':
-                 state["buy_sig1_yn"] = 'N'
+            if state.has(SIG1) and not state.has(SIG2):
+                 state.set(SIG1, False)
                  if manage_id and save_v2_buy_signal:
                      # Use 'N' status (requires save_v2_buy_signal update or manual update)
                      # save_v2_buy_signal currently hardcodes 'Y'? Let's check db.py again or use manual_update_signal
@@ -1677,24 +1621,22 @@ def check_triple_filter(ticker, data_30m, data_5m):
         # Step 2: +2% Breakout
         change_pct = result.get("daily_change", 0)
         
-        # DEBUG PRINTS
-        print(f"DEBUG: Ticker={ticker}, Filter2Met={filter2_met}, ManageID={manage_id}, ChangePct={change_pct}")
+        log.debug("triple_filter.step2", ticker=ticker, filter2_met=filter2_met, manage_id=manage_id, change_pct=change_pct)
         
         if filter2_met: 
-             if not state.get("buy_sig2_yn") == 'Y':
-                 state["buy_sig2_yn"] = 'Y'
-                 print(f"DEBUG: Attempting to SAVE Sig2 for {manage_id}")
+             if not state.has(SIG2):
+                 state.set(SIG2)
                  if manage_id and save_v2_buy_signal:
                      res = save_v2_buy_signal(manage_id, 'sig2', current_price)
-                     print(f"DEBUG: Save Result = {res}")
+                     log.debug("triple_filter.save_sig2", ticker=ticker, manage_id=manage_id, result=res)
 
         if change_pct >= 2:
             result["step2"] = True
             result["step2_color"] = None
             result["step2_status"] = "박스권 돌파"
-            if not state.get("step2_done_time"):
-                state["step2_done_time"] = now_time_str
-                state["step2_done_price"] = current_price
+            if not state.step2_time:
+                state.step2_time = now_time_str
+                state.step2_price = current_price
         elif change_pct <= -2:
             result["step2"] = False
             result["step2_color"] = "red"
@@ -1709,28 +1651,26 @@ def check_triple_filter(ticker, data_30m, data_5m):
         if filter1_met:
             result["step3_color"] = None
             result["step3_status"] = "추세 확정"
-            if not state.get("buy_sig3_yn") == 'Y':
-                 state["buy_sig3_yn"] = 'Y'
+            if not state.has(SIG3):
+                 state.set(SIG3)
                  if manage_id and save_v2_buy_signal:
                      save_v2_buy_signal(manage_id, 'sig3', current_price)
 
-            if not state.get("step3_done_time"):
-                state["step3_done_time"] = now_time_str
+            if not state.step3_time:
+                state.step3_time = now_time_str
         else:
             result["step3_color"] = "red"
             result["step3_status"] = "주의 (데드크로스)"
 
         # FINAL ENTRY SIGNAL
         # [FIX] Use Latched DB Status for Strict "All Done" Check
-        all_met = (state.get("buy_sig1_yn") == 'Y' and 
-                   state.get("buy_sig2_yn") == 'Y' and 
-                   state.get("buy_sig3_yn") == 'Y')
+        all_met = state.has(ALL_SIGS)
 
         if all_met:
             result["final"] = True
-            if not state.get("final_met"):
-                state["final_met"] = True
-                state["signal_time"] = now_time_str
+            if not state.has(FINAL):
+                state.set(FINAL)
+                state.signal_time = now_time_str
              
                 # Update Final in DB
                 if manage_id and save_v2_buy_signal:
@@ -1738,121 +1678,112 @@ def check_triple_filter(ticker, data_30m, data_5m):
                 
                 # ... (rest of notification logic)
                 try:
-                    ny_tz = pytz.timezone('America/New_York')
-                    kst_tz = pytz.timezone('Asia/Seoul')
-                    
                     if now_utc.tzinfo is None:
                         now_utc_aware = now_utc.replace(tzinfo=timezone.utc)
                     else:
                         now_utc_aware = now_utc
                     
-                    time_kst_formatted = now_utc_aware.astimezone(kst_tz).strftime('%Y-%m-%d %H:%M')
-                    time_ny_formatted = now_utc_aware.astimezone(ny_tz).strftime('%Y-%m-%d %H:%M')
+                    time_kst_formatted = now_utc_aware.astimezone(KST).strftime('%Y-%m-%d %H:%M')
+                    time_ny_formatted = now_utc_aware.astimezone(NY).strftime('%Y-%m-%d %H:%M')
                 except:
                     time_kst_formatted = now_time_str
                     time_ny_formatted = ''
                 
                 try:
-                    from db import save_signal, get_connection
-                    with get_connection() as conn:
-                        with conn.cursor() as cursor:
-                            # Check recent BUY to avoid duplicates
-                            cursor.execute("SELECT id FROM signal_history WHERE ticker=%s AND signal_type='BUY (MASTER)' AND created_at >= NOW() - INTERVAL 30 MINUTE LIMIT 1", (ticker,))
-                            if not cursor.fetchone(): 
-                                save_signal({
-                                    'ticker': ticker, 'name': f"Master Signal ({ticker})",
-                                    'signal_type': "BUY (MASTER)", 
-                                    'signal_reason': "진입조건 완성 (30분추세+박스돌파+5분타이밍)",
-                                    'position': f"진입조건완성: 1.30분추세 2.박스돌파 3.5분타이밍\n시간: {now_time_str}\n가격: ${current_price}",
-                                    'current_price': current_price, 'signal_time_raw': now_utc,
-                                    'time_kst': time_kst_formatted,
-                                    'time_ny': time_ny_formatted,
-                                    'is_sent': True, 'score': 100, 'interpretation': "마스터 트리플 필터 진입"
-                                })
+                    import notify_index
+                    from db import save_signal
+                    # Check recent BUY to avoid duplicates
+                    if not notify_index.seen_signal(ticker, signal_type="BUY (MASTER)", minutes=30):
+                        save_signal({
+                            'ticker': ticker, 'name': f"Master Signal ({ticker})",
+                            'signal_type': "BUY (MASTER)", 
+                            'signal_reason': "진입조건 완성 (30분추세+박스돌파+5분타이밍)",
+                            'position': f"진입조건완성: 1.30분추세 2.박스돌파 3.5분타이밍\n시간: {now_time_str}\n가격: ${current_price}",
+                            'current_price': current_price, 'signal_time_raw': now_utc,
+                            'time_kst': time_kst_formatted,
+                            'time_ny': time_ny_formatted,
+                            'is_sent': True, 'score': 100, 'interpretation': "마스터 트리플 필터 진입"
+                        }, critical=True)
                 except Exception as e:
                     print(f"Master Signal Save Error: {e}")
         else:
             result["final"] = False
             # If any condition breaks, reset final_met
-            if state.get("final_met"):
-                state["final_met"] = False
-                state["signal_time"] = None
+            if state.has(FINAL):
+                state.set(FINAL, False)
+                state.signal_time = None
 
 
         # --- POST-ENTRY WARNINGS (Only if currently in FINAL state) ---
         if result.get("final"):
-            result["signal_time"] = state.get("signal_time", now_time_str)
+            result["signal_time"] = state.signal_time or now_time_str
             
             # Warning 1: 5m Dead Cross (filter3_met is False) -> Yellow
             if not filter3_met:
                 result["step3_color"] = "yellow"
-                state["step3_color"] = "yellow"
+                state.step3_color = "yellow"
                 result["step3"] = False # Visually not met (Warning)
                 # Send SMS/History
                 try:
-                    from db import save_signal, get_connection
-                    with get_connection() as conn:
-                        with conn.cursor() as cursor:
-                            # Use WARNING (5M) type
-                            cursor.execute("SELECT id FROM signal_history WHERE ticker=%s AND signal_type='WARNING (5M)' AND created_at >= NOW() - INTERVAL 30 MINUTE LIMIT 1", (ticker,))
-                            if not cursor.fetchone():
-                                save_signal({
-                                    'ticker': ticker, 'name': f"Warning ({ticker})",
-                                    'signal_type': "WARNING (5M)", 
-                                    'position': f"🟡 Yellow 경보: 5분봉 데드크로스 발생\n행동: 보유 주식 30% 매도\n현재가: ${current_price}\n시간: {now_time_str}",
-                                    'current_price': current_price, 'signal_time_raw': now_utc,
-                                    'is_sent': True, 'score': -50, 'interpretation': "단기 조정 경고"
-                                })
+                    import notify_index
+                    from db import save_signal
+                    # Use WARNING (5M) type
+                    if not notify_index.seen_signal(ticker, signal_type="WARNING (5M)", minutes=30):
+                        save_signal({
+                            'ticker': ticker, 'name': f"Warning ({ticker})",
+                            'signal_type': "WARNING (5M)", 
+                            'position': f"🟡 Yellow 경보: 5분봉 데드크로스 발생\n행동: 보유 주식 30% 매도\n현재가: ${current_price}\n시간: {now_time_str}",
+                            'current_price': current_price, 'signal_time_raw': now_utc,
+                            'is_sent': True, 'score': -50, 'interpretation': "단기 조정 경고"
+                        })
                 except Exception as e:
                     print(f"Master Signal 5M Warning Save Error: {e}")
             else:
-                state["step3_color"] = None
+                state.step3_color = None
 
             # Warning 2: Price dropped below entry price -> Orange
-            entry_price = state.get("step2_done_price")
+            entry_price = state.step2_price
             if entry_price and current_price < entry_price:
                 result["step2_color"] = "orange"
-                state["step2_color"] = "orange"
+                state.step2_color = "orange"
                 try:
-                    from db import save_signal, get_connection
-                    with get_connection() as conn:
-                        with conn.cursor() as cursor:
-                            cursor.execute("SELECT id FROM signal_history WHERE ticker=%s AND signal_type='WARNING (BOX)' AND created_at >= NOW() - INTERVAL 30 MINUTE LIMIT 1", (ticker,))
-                            if not cursor.fetchone():
-                                price_drop_pct = ((current_price - entry_price) / entry_price) * 100
-                                save_signal({
-                                    'ticker': ticker, 'name': f"Warning ({ticker})",
-                                    'signal_type': "WARNING (BOX)", 
-                                    'position': f"🟠 Orange 경보: 현재가가 진입가격보다 하락\n행동: 보유 주식 30% 매도\n진입: ${entry_price:.2f}, 현재: ${current_price:.2f} ({price_drop_pct:+.1f}%)\n시간: {now_time_str}",
-                                    'current_price': current_price, 'signal_time_raw': now_utc,
-                                    'is_sent': True, 'score': -30, 'interpretation': "모멘텀 약화 경고"
-                                })
+                    import notify_index
+                    from db import save_signal
+                    if not notify_index.seen_signal(ticker, signal_type="WARNING (BOX)", minutes=30):
+                        price_drop_pct = ((current_price - entry_price) / entry_price) * 100
+                        save_signal({
+                            'ticker': ticker, 'name': f"Warning ({ticker})",
+                            'signal_type': "WARNING (BOX)", 
+                            'position': f"🟠 Orange 경보: 현재가가 진입가격보다 하락\n행동: 보유 주식 30% 매도\n진입: ${entry_price:.2f}, 현재: ${current_price:.2f} ({price_drop_pct:+.1f}%)\n시간: {now_time_str}",
+                            'current_price': current_price, 'signal_time_raw': now_utc,
+                            'is_sent': True, 'score': -30, 'interpretation': "모멘텀 약화 경고"
+                        })
                 except Exception as e:
                     print(f"Master Signal Box Warning Save Error: {e}")
             else:
-                state["step2_color"] = None
+                state.step2_color = None
 
         # --- PREPARE DETAILED LOGS ---
-        if state.get("step1_done_time"): 
-            result["step_details"]["step1"] = f"진입: {state['step1_done_time']}"
+        if state.step1_time: 
+            result["step_details"]["step1"] = f"진입: {state.step1_time}"
         else:
              result["step_details"]["step1"] = f"대기 중 (SMA10: {sma10_30:.2f} / 30: {sma30_30:.2f})"
              
-        if state.get("step2_done_time"): 
-            result["step_details"]["step2"] = f"진입: {state['step2_done_time']}"
+        if state.step2_time: 
+            result["step_details"]["step2"] = f"진입: {state.step2_time}"
         else:
             diff_pct = 0
             if target_v > 0:
                 diff_pct = ((current_price / target_v) - 1) * 100
             result["step_details"]["step2"] = f"대기 중 (목표: ${target_v}, 현재: {diff_pct:.1f}%)"
             
-        if state.get("step3_done_time"): 
-            result["step_details"]["step3"] = f"진입: {state['step3_done_time']}"
+        if state.step3_time: 
+            result["step_details"]["step3"] = f"진입: {state.step3_time}"
         else:
             result["step_details"]["step3"] = f"대기 중 (5분 추세 확인 필요)"
 
         # Save & Clean
-        all_states[ticker] = state
+        all_states[ticker] = state.to_json()
         set_global_config("triple_filter_states", all_states)
 
         # Note: No "SAFETY NET" - we trust real-time filter checks
@@ -1877,10 +1808,10 @@ def check_triple_filter(ticker, data_30m, data_5m):
         result["is_sell_signal"] = bool(result.get("is_sell_signal", False))
         
         # Add entry price and current price for Frontend display
-        result["entry_price"] = float(state.get("step2_done_price") or 0)
+        result["entry_price"] = float(state.step2_price or 0)
         result["current_price"] = float(current_price)
 
-        print(f"DEBUG: {ticker} current_price={result.get('current_price')}, daily_change={result.get('daily_change')}")
+        log.debug("triple_filter.price", ticker=ticker, current_price=result.get('current_price'), daily_change=result.get('daily_change'))
 
 
 
@@ -1912,7 +1843,7 @@ def check_triple_filter(ticker, data_30m, data_5m):
                             # Convert to KST string for user request
                             # Assuming index is NY time (from earlier fetching logic)
                             # Convert NY -> KST
-                            latest_kst = latest.astimezone(pytz.timezone('Asia/Seoul'))
+                            latest_kst = latest.astimezone(KST)
                             return latest_kst.strftime("%Y-%m-%d %H:%M:%S")
                     except:
                         pass
@@ -1970,23 +1901,25 @@ def check_triple_filter(ticker, data_30m, data_5m):
                 }
                 
             except Exception as e:
-                print(f"Logging Market Indicators Failed ({ticker}): {e}")
+                log.warning("triple_filter.indicators_log_failed", every=300, key=ticker, ticker=ticker, error=e)
 
-            print(f"DEBUG: {ticker} New Metrics: {result.get('new_metrics')}")
+            log.debug("triple_filter.metrics", ticker=ticker, new_metrics=result.get('new_metrics'))
 
     except Exception as e:
-        print(f"Triple Filter Error ({ticker}): {e}")
-        import traceback
-        traceback.print_exc()
+        log.error("triple_filter.error", every=60, key=ticker, ticker=ticker, error=e)
+        if log.enabled(DEBUG):
+            import traceback
+            traceback.print_exc()
     
     return result
 
 # --- Antigravity V2.1 Helper Functions ---
 
 # --- Helper Functions for Market Intelligence ---
-def calculate_market_intelligence(df):
+def calculate_market_intelligence(df, rsi_series=None):
     """
     Calculate advanced metrics: Vol Ratio, ATR, Pivot R1, RSI
+    rsi_series: precomputed RSI(14) to reuse (analyze_ticker pipeline)
     """
     metrics = {}
     try:
@@ -2031,7 +1964,8 @@ def calculate_market_intelligence(df):
 
         # 4. RSI (14) - Include it here for easy access
         try:
-             rsi_series = ta.rsi(df['Close'], length=14)
+             if rsi_series is None:
+                 rsi_series = ta.rsi(df['Close'], length=14)
              if rsi_series is not None:
                  metrics['rsi'] = round(rsi_series.iloc[-1], 2)
              else:
@@ -2450,79 +2384,51 @@ def get_cross_history(df_30, df_5):
         "gold_5m": []
     }
     
-    tz_kr = pytz.timezone('Asia/Seoul')
-    tz_ny = pytz.timezone('America/New_York')
-    
-    # helper
-    def fmt_time(dt):
-        if dt.tzinfo is None: 
-            # DB & YFinance data is naive NY Time. Localize it correctly.
-            try:
-                dt = tz_ny.localize(dt)
-            except:
-                dt = dt.replace(tzinfo=tz_ny)
+    # DB & YFinance data is naive NY Time (market_calendar localizes it)
+    fmt_time = mcal.fmt_kr_ny
+
+    def last_cross(d, kind):
+        # Latest bar i (>= 2) where SMA10 crossed SMA30 (vectorized scan)
+        c_10 = d['SMA10'].to_numpy(dtype=float)
+        c_30 = d['SMA30'].to_numpy(dtype=float)
+        p_10, p_30 = c_10[:-1], c_30[:-1]
+        c_10, c_30 = c_10[1:], c_30[1:]
+        if kind == 'gold':
+            hit = (p_10 <= p_30) & (c_10 > c_30)
+        else:
+            hit = (p_10 >= p_30) & (c_10 < c_30)
+        hit[:1] = False  # i starts at 2
+        idx = np.flatnonzero(hit)
+        return int(idx[-1]) + 1 if len(idx) else None
+
+    def entry(d, i, label):
+        t = fmt_time(d.index[i])
         return {
-            "kr": dt.astimezone(tz_kr).strftime('%m-%d %H:%M'),
-            "ny": dt.astimezone(tz_ny).strftime('%m-%d %H:%M')
+            "time_kr": t["kr"], "time_ny": t["ny"],
+            "price": f"{float(d['Close'].iloc[i]):.2f}",
+            "type": label
         }
 
     # 1. 30m Golden Crosses
     if df_30 is not None and not df_30.empty and len(df_30) > 30:
-        d30 = df_30.copy()
-        d30 = d30[~d30.index.duplicated(keep='last')]
+        d30 = df_30[~df_30.index.duplicated(keep='last')].copy()
         d30['SMA10'] = ta.sma(d30['Close'], length=10)
         d30['SMA30'] = ta.sma(d30['Close'], length=30)
-        
-        # Look back deeper
-        scan_depth = len(d30) - 1
-        for i in range(len(d30)-1, 1, -1): 
-            if i < 1: break
-            c_10 = d30['SMA10'].iloc[i]
-            c_30 = d30['SMA30'].iloc[i]
-            p_10 = d30['SMA10'].iloc[i-1]
-            p_30 = d30['SMA30'].iloc[i-1]
-            
-            # Gold Cross
-            if p_10 <= p_30 and c_10 > c_30:
-                t = fmt_time(d30.index[i])
-                history["gold_30m"].append({
-                    "time_kr": t["kr"], "time_ny": t["ny"],
-                    "price": f"{float(d30['Close'].iloc[i]):.2f}",
-                    "type": "골든크로스 (30분)"
-                })
+        i = last_cross(d30, 'gold')
+        if i is not None:
+            history["gold_30m"].append(entry(d30, i, "골든크로스 (30분)"))
     
     # 2. 5m Crosses
     if df_5 is not None and not df_5.empty and len(df_5) > 30:
-        d5 = df_5.copy()
-        d5 = d5[~d5.index.duplicated(keep='last')]
+        d5 = df_5[~df_5.index.duplicated(keep='last')].copy()
         d5['SMA10'] = ta.sma(d5['Close'], length=10)
         d5['SMA30'] = ta.sma(d5['Close'], length=30)
-        
-        # Look back deeper
-        scan_depth = len(d5) - 1
-        for i in range(len(d5)-1, 1, -1): 
-            if i < 1: break
-            c_10 = d5['SMA10'].iloc[i]
-            c_30 = d5['SMA30'].iloc[i]
-            p_10 = d5['SMA10'].iloc[i-1]
-            p_30 = d5['SMA30'].iloc[i-1]
-            
-            # Dead Cross
-            if p_10 >= p_30 and c_10 < c_30:
-                t = fmt_time(d5.index[i])
-                history["dead_5m"].append({
-                    "time_kr": t["kr"], "time_ny": t["ny"],
-                    "price": f"{float(d5['Close'].iloc[i]):.2f}",
-                    "type": "데드크로스 (5분)"
-                })
-            # Gold Cross
-            elif p_10 <= p_30 and c_10 > c_30:
-                t = fmt_time(d5.index[i])
-                history["gold_5m"].append({
-                    "time_kr": t["kr"], "time_ny": t["ny"],
-                    "price": f"{float(d5['Close'].iloc[i]):.2f}",
-                    "type": "골든크로스 (5분)"
-                })
+        i = last_cross(d5, 'dead')
+        if i is not None:
+            history["dead_5m"].append(entry(d5, i, "데드크로스 (5분)"))
+        i = last_cross(d5, 'gold')
+        if i is not None:
+            history["gold_5m"].append(entry(d5, i, "골든크로스 (5분)"))
 
     # Limit to latest 1 (User Request)
     history["gold_30m"] = history["gold_30m"][:1]
@@ -2580,28 +2486,8 @@ def determine_market_regime_v2(daily_data=None, data_30m=None, data_5m=None):
         # [NEW] Inject Cheongan V2 Status
         if t in ['SOXL', 'SOXS']:
             try:
-                # Convert dates/decimals to serializable format if needed, 
-                # but run_analysis usually does this at the end or FastAPI handles it via custom encoder?
-                # Actually, main.py's get_v2_status uses a helper serialize().
-                # We should do similar or rely on results being dicts.
-                # DB returns Decimals/Datetimes. JSON response will fail if not handled.
-                # check_triple_filter likely handles its own.
-                # Let's add them as is, but we might need to handle serialization in main.py or here.
-                # Ideally, we convert them here to be safe.
-                
                 v2_buy = get_v2_buy_status(t)
                 v2_sell = get_v2_sell_status(t)
-                
-                def serialize_v2(obj):
-                    if not obj: return None
-                    new = dict(obj)
-                    for k, v in new.items():
-                        if isinstance(v, (datetime, pd.Timestamp)):
-                             new[k] = v.strftime('%Y-%m-%d %H:%M:%S')
-                        elif hasattr(v, '__float__'): # Decimal
-                             new[k] = float(v)
-                    return new
-
                 results[t]['v2_buy'] = serialize_v2(v2_buy)
                 results[t]['v2_sell'] = serialize_v2(v2_sell)
             except Exception as e:
@@ -2722,10 +2608,45 @@ if __name__ == "__main__":
 
 
 # --- Cheongan V2 Signal Analysis ---
+# (side, step) -> (print emoji, history event, SMS label, SMS detail; None = transition reason)
+_V2_EVENTS = {
+    ("buy", "sig1"): ("🚀", "1차매수신호", "1차매수(5분봉/V2)", None),
+    ("buy", "sig2"): ("🚀", "2차매수신호", "2차매수(박스권/V2)", None),
+    ("buy", "sig3"): ("🚀", "3차매수신호", "3차매수(30분봉/V2)", "30분봉 추세확정"),
+    ("buy", "final"): ("🚀", "최종진입완료", "최종매수(V2)", "트리플필터완성"),
+    ("sell", "sig1"): ("📉", "1차청산신호", "1차청산(5분봉/V2)", "단기조정/하락추세"),
+    ("sell", "sig2"): ("📉", "2차청산신호", "2차청산(손절/V2)", None),
+    ("sell", "sig3"): ("📉", "3차청산신호", "3차청산(30분봉/V2)", "추세이탈/전량매도"),
+    ("sell", "final"): ("🏁", "최종청산완료", "최종청산(V2)", "매매종료(추세끝)"),
+}
+
+
+def _apply_v2(ticker, manage_id, t):
+    """Persist one V2 transition (+ history / SMS). Returns False when the DB write failed."""
+    if not t.on:
+        # Auto-reset: the latched sell signal lost its condition
+        try:
+            from db import manual_update_signal
+            manual_update_signal(manage_id, f"{t.side}{t.step[-1]}", 0, 'N')
+            print(f"📈 {ticker} {t.side.capitalize()} Signal {t.step[-1]} Reset (Condition Lost)")
+        except: pass
+        return True
+
+    save = save_v2_buy_signal if t.side == "buy" else save_v2_sell_signal
+    if not save(manage_id, t.step, t.price):
+        return False
+    emoji, event, label, detail = _V2_EVENTS[(t.side, t.step)]
+    print(f"{emoji} {ticker} V2 {t.side.capitalize()} {t.step} Detected! ({t.reason}) [{manage_id}]")
+    log_history(manage_id, ticker, event, t.reason, t.price, critical=(t.step == "final"))
+    send_sms(ticker, label, t.price, get_current_time_str_sms(), detail or t.reason)
+    return True
+
+
+@metrics.timed("v2_state_machine")
 def run_v2_signal_analysis():
     """
     Cheongan V2 3-Step Buy/Sell Logic Implementation
-    Run via Scheduler (Every 5 mins)
+    Run via Scheduler (every 5m bar close, see bar_trigger)
     """
     print(f"[{datetime.now()}] 🔄 V2 Signal Analysis Started...")
     
@@ -2756,6 +2677,12 @@ def run_v2_signal_analysis():
             if not isinstance(df_30.index, pd.DatetimeIndex):
                 df_30.index = pd.to_datetime(df_30.index)
             
+            # Ver3 tables store Close/Volume only -> derive missing OHLC from Close
+            df_5 = df_5.copy(); df_30 = df_30.copy()
+            for frame in (df_5, df_30):
+                for col in ('Open', 'High', 'Low'):
+                    if col not in frame.columns: frame[col] = frame['Close']
+
             # Resample and take last close (Handle ticks)
             # using '5min' for pandas < 2.2, '5min' is standard alias
             df_5 = df_5.resample('5min').agg({
@@ -2774,12 +2701,11 @@ def run_v2_signal_analysis():
             # 30m
             df_30['ma10'] = df_30['Close'].rolling(window=10).mean()
             df_30['ma30'] = df_30['Close'].rolling(window=30).mean()
-            df_30['box_high'] = df_30['High'].rolling(window=20).max().shift(1) # Past 20 bars high (excluding current)
-            df_30['vol_ma5'] = df_30['Volume'].rolling(window=5).mean()
             
-            # 1D (Prev Close)
-            prev_close = 0
-            if data_1d is not None and ticker in data_1d:
+            # 1D (Prev Close): daily reference close, 1D frame only as a fallback
+            ref = get_prev_close(ticker)
+            prev_close = float(ref['price']) if ref else 0
+            if not prev_close and data_1d is not None and ticker in data_1d:
                 d1 = data_1d[ticker]
                 if not d1.empty:
                     if len(d1) >= 2:
@@ -2789,265 +2715,47 @@ def run_v2_signal_analysis():
             
             # Current Values
             curr_price = float(df_5['Close'].iloc[-1])
-            curr_vol_30 = float(df_30['Volume'].iloc[-1])
-            curr_vol_ma_30 = float(df_30['vol_ma5'].iloc[-1]) if not pd.isna(df_30['vol_ma5'].iloc[-1]) else 0
-            box_high = float(df_30['box_high'].iloc[-1]) if not pd.isna(df_30['box_high'].iloc[-1]) else 0
             
             # [NEW] Patch Price/PrevClose from KIS (Authoritative Source)
             try:
-                from kis_api import kis_client
-                kis_p = kis_client.get_price(ticker)
+                with metrics.stage("kis_patch"):
+                    kis_p = get_quote(ticker)
                 if kis_p:
-                    # diff is signed (e.g., 0.06 or -0.10)
-                    # prev_close = current - diff
-                    # But wait, diff is (current - prev). So prev = current - diff.
-                    # e.g. 2.44 (+0.06) -> Prev = 2.38. Correct.
+                    # diff is signed (current - prev): only used when the reference close is unavailable
+                    # e.g. 2.44 (+0.06) -> Prev = 2.38
                     curr_price = float(kis_p['price'])
-                    k_diff = float(kis_p['diff'])
-                    prev_close = curr_price - k_diff
-                    print(f"  🎯 KIS Patch {ticker}: Price={curr_price}, Prev={prev_close:.2f}")
+                    if not ref:
+                        prev_close = curr_price - float(kis_p['diff'])
+                    log.debug("v2.kis_patch", ticker=ticker, price=curr_price, prev_close=prev_close)
             except Exception as e:
                 print(f"  ⚠️ KIS Price Patch Failed: {e}")
             
-            # 5m Indicators
-            ma10_5 = df_5['ma10'].iloc[-1]
-            ma30_5 = df_5['ma30'].iloc[-1]
-            prev_ma10_5 = df_5['ma10'].iloc[-2]
-            prev_ma30_5 = df_5['ma30'].iloc[-2]
-            
-            # 30m Indicators
-            ma10_30 = df_30['ma10'].iloc[-1]
-            ma30_30 = df_30['ma30'].iloc[-1]
-            prev_ma10_30 = df_30['ma10'].iloc[-2]
-            prev_ma30_30 = df_30['ma30'].iloc[-2]
-            
-            # --- Logic Checking ---
-            
+            x = V2Inputs.from_frames(df_5, df_30, curr_price, prev_close)
+
             # --- BUY SIDE ---
-            buy_record = get_v2_buy_status(ticker)
-                        
-            # Sig 1: 5m GC (Strict Cross) or Trend Maintenance (Catch-up)
-            is_5m_gc_cross = (prev_ma10_5 <= prev_ma30_5) and (ma10_5 > ma30_5)
-            is_5m_trend_up = (ma10_5 > ma30_5)
-            
-            cond_box = curr_price > box_high
-            cond_2pct = (prev_close > 0) and (curr_price > prev_close * 1.02)
-            # cond_vol = (curr_vol_ma_30 > 0) and (curr_vol_30 > curr_vol_ma_30 * 1.5)
-            # [FIX] Align with Dashboard: Remove strict volume/box requirement, prioritize 2% gain
-            # But keeping box check is safer. Let's remove Vol only.
-            is_sig2 = cond_2pct # cond_box and cond_2pct (Relaxed)
-            
-            is_30m_gc = (prev_ma10_30 <= prev_ma30_30) and (ma10_30 > ma30_30)
-            is_30m_trend_up = (ma10_30 > ma30_30) # [NEW] For Catch-up
-            
-            
-            # Check if we can start a new cycle
-            can_start_new = False
-            
-            if not buy_record:
-                can_start_new = True
-            elif buy_record['final_buy_yn'] == 'Y':
-                # Existing Buy Completed. Check if Sold/Closed.
-                # Must check the Sell Record corresponding to this Buy Cycle
-                last_sell = get_v2_sell_status(ticker)
-                
-                if last_sell and last_sell['manage_id'] == buy_record['manage_id']:
-                    # If Sell is Finalized (Y), then we are free to start new.
-                    if last_sell['final_sell_yn'] == 'Y':
-                        can_start_new = True
-                    else:
-                        # Holding (Sell not finished). Do NOT start new.
-                        can_start_new = False
-                        # print(f"  🔒 {ticker} Holding Active (ManageID: {buy_record['manage_id']}). No new cycle.")
+            buy = SignalState.from_row("buy", get_v2_buy_status(ticker))
+            sell = SignalState.from_row("sell", get_v2_sell_status(ticker))
+            for t in buy_transitions(buy, sell, x):
+                if t.step == 'sig1':
+                    # sig1 always opens a new cycle
+                    manage_id = f"{ticker}{mcal.now_kst().strftime('%Y%m%d_%H%M')}"
                 else:
-                    # Logic Gap: Buy Complete but No Sell Record Found?
-                    # This implies the auto-create failed or manual sync issue.
-                    # Strict Rule: Do not start new if possibly holding.
-                    # However, if it's very old, maybe? But user wants Strict.
-                    # Let's assume strict: If Buy Y and No Sell Y -> Locked.
-                    # But wait, if I just fixed the bug, the sell record might be missing for OLD ones?
-                    # No, I fixed it. So new ones will have it.
-                    # For safety, if Buy is Y, we REQUIRE Sell Y to restart.
-                    can_start_new = False
-                    # Exception: If user manually closed via DB?
-            else:
-                # Buy Cycle In Progress (final_buy_yn = 'N')
-                can_start_new = False
-
-            if can_start_new:
-                # Start NEW cycle
-                # Catch-up: If Cross happened OR Trend is already UP (and we have no record)
-                if is_5m_gc_cross or is_5m_trend_up:
-                    kst_now = datetime.now(timezone.utc).astimezone(pytz.timezone('Asia/Seoul'))
-                    manage_id = f"{ticker}{kst_now.strftime('%Y%m%d_%H%M')}"
-                    
-                    if save_v2_buy_signal(manage_id, 'sig1', curr_price):
-                        msg_type = "5분봉 GC" if is_5m_gc_cross else "5분봉 상승추세(Catch-up)"
-                        print(f"🚀 {ticker} V2 Buy Signal 1 Detect! ({msg_type}) Started {manage_id}")
-                        log_history(manage_id, ticker, "1차매수신호", msg_type, curr_price)
-                        
-                        # SMS
-                        sms_time = get_current_time_str_sms()
-                        send_sms(ticker, "1차매수(5분봉/V2)", curr_price, sms_time, msg_type)
-            
-            # If not starting new, we might be continuing existing
-            elif buy_record and buy_record['final_buy_yn'] == 'N':
-                # Active Buy Cycle
-                manage_id = buy_record['manage_id']
-                
-                # Check Sig 2
-                # [NEW] Check for User Custom Target Price first
-                custom_buy_target = buy_record.get('target_box_price')
-                is_sig2_met = False
-                sig2_reason = "Box+2%"
-                
-                if custom_buy_target and float(custom_buy_target) > 0:
-                    is_sig2_met = (curr_price >= float(custom_buy_target))
-                    sig2_reason = f"지정가도달(${custom_buy_target})"
-                else:
-                    # [FIX] Use Buy Signal 1 Price as baseline if available, otherwise Fallback to Day Logic
-                    baseline_price = float(buy_record.get('buy_sig1_price') or 0)
-                    if baseline_price > 0:
-                         is_sig2_met = (curr_price >= baseline_price * 1.02) # +2% from Entry
-                         sig2_reason = f"진입대비+2%(${baseline_price:.2f})"
-                    else:
-                         is_sig2_met = is_sig2 # Fallback to Day Gain logic if no Entry Price
-                
-                if buy_record['buy_sig2_yn'] == 'N' and is_sig2_met:
-                    if save_v2_buy_signal(manage_id, 'sig2', curr_price):
-                        print(f"🚀 {ticker} V2 Buy Signal 2 ({sig2_reason}) Detected!")
-                        log_history(manage_id, ticker, "2차매수신호", sig2_reason, curr_price)
-                        send_sms(ticker, "2차매수(박스권/V2)", curr_price, get_current_time_str_sms(), sig2_reason)
-                        
-                # Check Sig 3
-                # [FIX] Allow Catch-up (Trend Up) even if strict cross missed
-                if buy_record['buy_sig3_yn'] == 'N' and (is_30m_gc or is_30m_trend_up):
-                     if save_v2_buy_signal(manage_id, 'sig3', curr_price):
-                        msg_type = "30분봉 GC" if is_30m_gc else "30분봉 상승추세(Catch-up)"
-                        print(f"🚀 {ticker} V2 Buy Signal 3 (30m GC/Trend) Detected! ({msg_type})")
-                        log_history(manage_id, ticker, "3차매수신호", msg_type, curr_price)
-                        
-                        sms_time = get_current_time_str_sms()
-                        send_sms(ticker, "3차매수(30분봉/V2)", curr_price, sms_time, "30분봉 추세확정")
-
-                # [FIX] Check for Final Signal Completion (All 3 Met)
-                # Must re-read record or rely on variables
-                # Ideally, check if all flags are 'Y' now
-                
-                # Reload to be sure? Or check logic vars?
-                # Logic vars:
-                # Sig1 = (buy_record['buy_sig1_yn']=='Y') or (just set)
-                # But safer to check DB or memory state. 
-                # Let's perform a lightweight check based on what we processed.
-                
-                # Check DB for current status to ensure atomic finalization
-                # We can use get_v2_buy_status(ticker) again or rely on flow.
-                # Since we just updated DB, we should re-fetch to confirm ALL 'Y'.
-                updated_buy = get_v2_buy_status(ticker)
-                if updated_buy and updated_buy['manage_id'] == manage_id:
-                     if (updated_buy['buy_sig1_yn'] == 'Y' and 
-                         updated_buy['buy_sig2_yn'] == 'Y' and 
-                         updated_buy['buy_sig3_yn'] == 'Y' and
-                         updated_buy['final_buy_yn'] == 'N'):
-                         
-                         if save_v2_buy_signal(manage_id, 'final', curr_price):
-                             print(f"🚀 {ticker} V2 Buy Cycle FINALIZED! All Signals Met.")
-                             log_history(manage_id, ticker, "최종진입완료", "Triple Filter Complete", curr_price)
-                             send_sms(ticker, "최종매수(V2)", curr_price, get_current_time_str_sms(), "트리플필터완성")
+                    manage_id = buy.manage_id
+                if not _apply_v2(ticker, manage_id, t): break
+            # buy is left as read at the start of the pass: a buy finalized just now gets its
+            # sell record and sell-side evaluation on the next pass (unchanged from before)
 
             # --- SELL SIDE (Position Management) ---
-            sell_record = get_v2_sell_status(ticker)
-
             # [FIX] If Buy is Finalized but no Sell Record exists, create it now
-            if not sell_record and buy_record and buy_record['final_buy_yn'] == 'Y':
-                # Only create if not already handled (check manage_id)
-                # But sell_record is None, so create it.
+            if needs_sell_record(buy, sell):
                 from db import create_v2_sell_record
-                manage_id = buy_record['manage_id']
-                # Assume entry price is final_buy_price or current price
-                entry_price = buy_record['final_buy_price'] if buy_record['final_buy_price'] else curr_price
-                if create_v2_sell_record(manage_id, ticker, entry_price):
-                     print(f"  ✨ Creating Sell Record for {ticker} (Buy Completed at {entry_price})")
-                     sell_record = get_v2_sell_status(ticker) # Reload
-
-            if sell_record:
-                manage_id = sell_record['manage_id']
-                
-                # Sig 1: 5m DC
-                is_5m_dc = (prev_ma10_5 >= prev_ma30_5) and (ma10_5 < ma30_5)
-                is_5m_trend_down = (ma10_5 < ma30_5) # [NEW] Catch-up
-
-                # [FIX] Allow Catch-up for 5m DC
-                if (is_5m_dc or is_5m_trend_down):
-                     if sell_record['sell_sig1_yn'] == 'N':
-                         if save_v2_sell_signal(manage_id, 'sig1', curr_price):
-                             msg_type = "5분봉 DC" if is_5m_dc else "5분봉 하락추세(Catch-up)"
-                             print(f"📉 {ticker} V2 Sell Signal 1 (5m DC) Detected! ({msg_type})")
-                             log_history(manage_id, ticker, "1차청산신호", msg_type, curr_price)
-                             send_sms(ticker, "1차청산(5분봉/V2)", curr_price, get_current_time_str_sms(), "단기조정/하락추세")
-                else:
-                    # [NEW] Auto-Reset Sell Signal 1
-                    if sell_record['sell_sig1_yn'] == 'Y':
-                        # If Signal 2 hasn't triggered yet, we can reset Sig 1?
-                        # Even if Sig 2 triggered, if 5m trend recovers (Golden Cross), Signal 1 (Dead Cross) is invalid.
-                        # So Reset is valid.
-                         try:
-                             from db import manual_update_signal
-                             manual_update_signal(manage_id, 'sell1', 0, 'N')
-                             print(f"📈 {ticker} Sell Signal 1 Reset (Condition Lost)")
-                         except: pass
-
-                # Sig 2: Stop Loss / Profit Taking (Real Price Support)
-                if sell_record['sell_sig2_yn'] == 'N':
-                    # Determine Entry / Base Price
-                    base_price = 0
-                    custom_stop_price = sell_record.get('target_stop_price')
-                    reason_msg = "손절/익절"
-                    
-                    if custom_stop_price and float(custom_stop_price) > 0:
-                        base_price = float(custom_stop_price)
-                        reason_msg = f"지정가이탈(${base_price})"
-                        # print(f"  🔍 {ticker} Custom Stop Check: ${base_price}")
-                    else:
-                        if buy_record and buy_record.get('real_buy_yn') == 'Y' and buy_record.get('real_buy_price'):
-                            base_price = float(buy_record['real_buy_price'])
-                        else:
-                            base_price = float(buy_record['final_buy_price']) if buy_record and buy_record.get('final_buy_price') else 0
-                    
-                    if base_price > 0 and curr_price < base_price:
-                         if save_v2_sell_signal(manage_id, 'sig2', curr_price):
-                             print(f"📉 {ticker} V2 Sell Signal 2 ({reason_msg}) Detected!")
-                             log_history(manage_id, ticker, "2차청산신호", reason_msg, curr_price)
-                             send_sms(ticker, "2차청산(손절/V2)", curr_price, get_current_time_str_sms(), reason_msg)
-
-                         
-                # Sig 3: 30m DC
-                is_30m_dc = (prev_ma10_30 >= prev_ma30_30) and (ma10_30 < ma30_30)
-                is_30m_trend_down = (ma10_30 < ma30_30) # [NEW] Catch-up
-                
-                # [FIX] Allow Catch-up for 30m DC (Major Exit)
-                if (is_30m_dc or is_30m_trend_down):
-                    if sell_record['sell_sig3_yn'] == 'N':
-                         if save_v2_sell_signal(manage_id, 'sig3', curr_price):
-                             msg_type = "30분봉 DC" if is_30m_dc else "30분봉 하락추세(Catch-up)"
-                             print(f"📉 {ticker} V2 Sell Signal 3 (30m DC) Detected! ({msg_type})")
-                             log_history(manage_id, ticker, "3차청산신호", msg_type, curr_price)
-                             send_sms(ticker, "3차청산(30분봉/V2)", curr_price, get_current_time_str_sms(), "추세이탈/전량매도")
-                else:
-                    # [NEW] Auto-Reset Sell Signal 3
-                    if sell_record['sell_sig3_yn'] == 'Y':
-                         try:
-                             from db import manual_update_signal
-                             manual_update_signal(manage_id, 'sell3', 0, 'N')
-                             print(f"📈 {ticker} Sell Signal 3 Reset (Condition Lost)")
-                         except: pass
-
-                # Final Exit Logic (Sig 3 triggers Final)
-                if sell_record['sell_sig3_yn'] == 'Y' and sell_record['final_sell_yn'] == 'N':
-                     if save_v2_sell_signal(manage_id, 'final', curr_price):
-                         print(f"🏁 {ticker} V2 Sell Cycle FINALIZED (Trend Broken)")
-                         log_history(manage_id, ticker, "최종청산완료", "30분봉 추세종료", curr_price)
-                         send_sms(ticker, "최종청산(V2)", curr_price, get_current_time_str_sms(), "매매종료(추세끝)")
+                entry = buy.price(FINAL) or curr_price
+                if create_v2_sell_record(buy.manage_id, ticker, entry):
+                    print(f"  ✨ Creating Sell Record for {ticker} (Buy Completed at {entry})")
+                    sell = SignalState.from_row("sell", get_v2_sell_status(ticker))  # Reload
+
+            for t in sell_transitions(buy, sell, x):
+                _apply_v2(ticker, sell.manage_id, t)
 
         except Exception as e:
             print(f"❌ Error analyzing {ticker}: {e}")
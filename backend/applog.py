@@ -0,0 +1,104 @@
+"""
+Leveled Structured Logging
+key=value log lines on top of stdlib logging, with per-key rate limiting for
+hot paths. Disabled levels return before any formatting, so debug calls in
+per-tick code cost one level check.
+
+Usage:
+  log = get_logger("analysis")
+  log.debug("triple_filter.check", ticker=ticker)
+  log.info("v2.patch", every=60, ticker=ticker, price=price)   # at most once per 60s
+Level: env LOG_LEVEL (default INFO).
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+_configured = False
+_config_lock = threading.Lock()
+
+
+def _configure():
+    global _configured
+    with _config_lock:
+        if _configured: return
+        root = logging.getLogger("money")
+        if not root.handlers:
+            h = logging.StreamHandler(sys.stdout)
+            h.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s", "%Y-%m-%d %H:%M:%S"))
+            root.addHandler(h)
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        root.propagate = False
+        _configured = True
+
+
+def _fmt_value(v):
+    if isinstance(v, float):
+        return f"{v:.4f}".rstrip("0").rstrip(".")
+    s = str(v)
+    return f'"{s}"' if (" " in s or not s) else s
+
+
+class StructLogger:
+    """event + key=value fields; `every=<sec>` rate-limits per (event, key)"""
+
+    def __init__(self, name):
+        _configure()
+        self._log = logging.getLogger(f"money.{name}")
+        self._last = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def enabled(self, level):
+        return self._log.isEnabledFor(level)
+
+    def _emit(self, level, event, fields, every=None, key=None):
+        if not self._log.isEnabledFor(level): return
+        if every:
+            rk = (event, key)
+            now = time.monotonic()
+            with self._lock:
+                if now - self._last.get(rk, -every) < every:
+                    self._suppressed[rk] = self._suppressed.get(rk, 0) + 1
+                    return
+                self._last[rk] = now
+                dropped = self._suppressed.pop(rk, 0)
+            if dropped: fields["suppressed"] = dropped
+        msg = event + ("" if not fields else " " + " ".join(f"{k}={_fmt_value(v)}" for k, v in fields.items()))
+        self._log.log(level, msg)
+
+    def debug(self, event, every=None, key=None, **fields):
+        self._emit(DEBUG, event, fields, every, key)
+
+    def info(self, event, every=None, key=None, **fields):
+        self._emit(INFO, event, fields, every, key)
+
+    def warning(self, event, every=None, key=None, **fields):
+        self._emit(WARNING, event, fields, every, key)
+
+    def error(self, event, every=None, key=None, **fields):
+        self._emit(ERROR, event, fields, every, key)
+
+
+_loggers = {}
+
+
+def get_logger(name):
+    lg = _loggers.get(name)
+    if lg is None:
+        lg = _loggers[name] = StructLogger(name)
+    return lg
+
+
+def set_level(level):
+    """Runtime level change (e.g. 'DEBUG' while investigating)"""
+    _configure()
+    logging.getLogger("money").setLevel(str(level).upper())
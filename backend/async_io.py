@@ -0,0 +1,30 @@
+"""
+Async Offload Helpers
+Blocking pymysql / KIS (requests) / yfinance calls run on dedicated, bounded
+thread pools so async endpoints never block the event loop, and a burst of
+requests queues here instead of exhausting the DB pool or the KIS rate limit.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# DB: below PooledDB maxconnections (10) so scheduler jobs always get a connection
+DB_MAX_WORKERS = 8
+# External APIs: KIS allows ~20 req/s, yfinance is slow and rate limited
+EXT_MAX_WORKERS = 4
+
+_db_executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix="db-io")
+_ext_executor = ThreadPoolExecutor(max_workers=EXT_MAX_WORKERS, thread_name_prefix="ext-io")
+
+
+async def run_db(fn, *args, **kwargs):
+    """Run a blocking db.* function on the DB pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, partial(fn, *args, **kwargs))
+
+
+async def run_ext(fn, *args, **kwargs):
+    """Run a blocking KIS / yfinance / HTTP call on the external-API pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_ext_executor, partial(fn, *args, **kwargs))
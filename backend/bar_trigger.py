@@ -0,0 +1,82 @@
+"""
+Bar-Close Triggers
+Cron triggers aligned to exchange time: the signal jobs fire SETTLE_SEC after
+each bar closes (NY :00/:05/...), instead of on intervals counted from process
+start. The delay gives yfinance / KIS time to publish the finished bar.
+
+A job run declares the bar it evaluates with bar_context(); db.save_signal,
+db.log_history and sms.send_sms call mark(), which records the time from that
+bar's close to the signal being saved / the SMS being queued in the histogram
+bar_signal_latency_seconds{source, stage}. Outside a bar_context mark() is a
+no-op (manual API calls, tests).
+
+Usage:
+  scheduler.add_job(v2_cycle, 'cron', id='v2_signal', **cron_kwargs(5))
+  with bar_context("v2", 5): run_v2_signal_analysis()
+  mark("saved")   /   mark("sms")
+"""
+
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import timedelta
+
+import market_calendar as mcal
+import metrics
+
+SETTLE_SEC = 20          # wait after the bar close before evaluating it
+LATENCY_BUCKETS = (5, 10, 20, 30, 45, 60, 90, 120, 180, 240, 300, 600)
+RECENT = 256             # samples per (source, stage) kept for status()
+
+metrics.register_buckets("bar_signal_latency_seconds", LATENCY_BUCKETS)
+
+_ctx = threading.local()
+_lock = threading.Lock()
+_recent = {}             # (source, stage) -> deque of seconds
+
+
+def cron_kwargs(interval_min, settle_sec=SETTLE_SEC):
+    """APScheduler 'cron' arguments firing settle_sec after every interval_min bar close (NY time)"""
+    minute = "*" if interval_min == 1 else f"*/{interval_min}"
+    return {"minute": minute, "second": settle_sec, "timezone": "America/New_York"}
+
+
+def last_bar_close(interval_min, now=None):
+    """Aware NY close time of the latest interval_min bar closed at or before now"""
+    t = mcal.to_ny(now) if now is not None else mcal.now_ny()
+    t = t.replace(second=0, microsecond=0)
+    return t - timedelta(minutes=t.minute % interval_min)
+
+
+@contextmanager
+def bar_context(source, interval_min):
+    """Attribute signals / SMS raised inside the block to the bar that just closed"""
+    prev = getattr(_ctx, "bar", None)
+    _ctx.bar = (source, last_bar_close(interval_min))
+    try:
+        yield _ctx.bar[1]
+    finally:
+        _ctx.bar = prev
+
+
+def mark(stage):
+    """Record bar close -> now for the current bar_context (no-op outside one)"""
+    bar = getattr(_ctx, "bar", None)
+    if bar is None: return None
+    source, close = bar
+    latency = max(0.0, (mcal.now_ny() - close).total_seconds())
+    metrics.observe("bar_signal_latency_seconds", latency, source=source, stage=stage)
+    with _lock:
+        _recent.setdefault((source, stage), deque(maxlen=RECENT)).append(latency)
+    return latency
+
+
+def status():
+    """Recent latency quantiles per source / stage"""
+    out = {}
+    with _lock:
+        items = {k: sorted(v) for k, v in _recent.items()}
+    for (source, stage), xs in sorted(items.items()):
+        q = lambda p: round(xs[min(len(xs) - 1, int(p * len(xs)))], 1)
+        out.setdefault(source, {})[stage] = {"n": len(xs), "p50": q(0.5), "p95": q(0.95), "max": round(xs[-1], 1)}
+    return {"settle_sec": SETTLE_SEC, "buckets": list(LATENCY_BUCKETS), "latency": out}
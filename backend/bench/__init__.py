@@ -0,0 +1 @@
+"""Local benchmark harness (fake KIS, yfinance replay, SQLite stand-in)"""
@@ -0,0 +1,135 @@
+"""
+Fake KIS Open API Server
+Local HTTP server answering the KIS endpoints kis_api.KisApi calls (token,
+price, dailyprice, inquire-time-itemchartprice) with deterministic data and
+a configurable per-request latency, so benchmarks never hit the live broker.
+"""
+
+import json
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytz
+
+NY = pytz.timezone('America/New_York')
+KST = pytz.timezone('Asia/Seoul')
+
+
+def base_price(symbol):
+    """Stable pseudo price per symbol (same value across runs)"""
+    return 10.0 + (zlib.crc32(symbol.encode()) % 9000) / 100.0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay(self):
+        srv = self.server
+        with srv.stats_lock:
+            srv.calls[urlparse(self.path).path] = srv.calls.get(urlparse(self.path).path, 0) + 1
+        if srv.latency_ms:
+            time.sleep(srv.latency_ms / 1000.0)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length: self.rfile.read(length)
+        self._delay()
+        if self.path.startswith("/oauth2/tokenP"):
+            expiry = (datetime.now() + timedelta(hours=23)).strftime("%Y-%m-%d %H:%M:%S")
+            return self._send({"access_token": "bench-token", "access_token_token_expired": expiry})
+        self._send({"rt_cd": "1", "msg1": "unknown path"}, 404)
+
+    def do_GET(self):
+        self._delay()
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        symbol = q.get("SYMB", "SOXL")
+        p = base_price(symbol)
+
+        if url.path.endswith("/quotations/price"):
+            diff = round(p * 0.012, 4)
+            return self._send({"rt_cd": "0", "output": {
+                "last": f"{p:.4f}", "diff": f"{diff:.4f}", "rate": "1.20",
+                "base": f"{p - diff:.4f}", "tvol": "1000000"}})
+
+        if url.path.endswith("/quotations/dailyprice"):
+            today = datetime.now().date()
+            rows = []
+            for i in range(100):
+                d = today - timedelta(days=i)
+                c = p * (1 - 0.001 * i)
+                rows.append({"xymd": d.strftime("%Y%m%d"), "clos": f"{c:.4f}", "open": f"{c * 0.995:.4f}",
+                             "high": f"{c * 1.01:.4f}", "low": f"{c * 0.99:.4f}", "tvol": "1000000"})
+            return self._send({"rt_cd": "0", "output2": rows})
+
+        if url.path.endswith("/inquire-time-itemchartprice"):
+            nmin = int(q.get("NMIN", "5") or 5)
+            # KIS rows carry exchange-local (xymd/xhms) and KST (kymd/khms) bar start times
+            # Only extended-session bars (weekdays 04:00-20:00 NY), like the real feed
+            end = datetime.now(NY).replace(second=0, microsecond=0, tzinfo=None)
+            end -= timedelta(minutes=end.minute % nmin)
+            if q.get("NEXT") == "1" and q.get("KEYB"):  # continuation: bars older than KEYB
+                end = datetime.strptime(q["KEYB"], "%Y%m%d%H%M%S") - timedelta(minutes=nmin)
+            horizon = datetime.now(NY).replace(tzinfo=None) - timedelta(days=self.server.minute_history_days)
+            rows, t, i = [], end, 0
+            while len(rows) < int(q.get("NREC", "120") or 120) and t > horizon:
+                m = t.hour * 60 + t.minute
+                if t.weekday() < 5 and 240 <= m < 1200:
+                    k = NY.localize(t).astimezone(KST)
+                    c = p * (1 + 0.002 * ((i % 7) - 3))
+                    rows.append({"xymd": t.strftime("%Y%m%d"), "xhms": t.strftime("%H%M%S"),
+                                 "kymd": k.strftime("%Y%m%d"), "khms": k.strftime("%H%M%S"),
+                                 "open": f"{c:.4f}", "high": f"{c * 1.002:.4f}", "low": f"{c * 0.998:.4f}",
+                                 "last": f"{c:.4f}", "evol": "5000", "vol": "5000"})
+                    i += 1
+                t -= timedelta(minutes=nmin)
+            more = "Y" if t > horizon else "N"
+            return self._send({"rt_cd": "0", "output1": {"next": "1", "more": more}, "output2": rows})
+
+        self._send({"rt_cd": "1", "msg1": "unknown path"}, 404)
+
+
+class FakeKisServer:
+    """ThreadingHTTPServer on 127.0.0.1 (port 0 = pick a free port)"""
+
+    def __init__(self, latency_ms=0, port=0, minute_history_days=10):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency_ms = latency_ms
+        self.httpd.minute_history_days = minute_history_days
+        self.httpd.calls = {}
+        self.httpd.stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def calls(self):
+        return dict(self.httpd.calls)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-kis", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,295 @@
+"""
+Backend Benchmark Suite
+Runs load_data_from_db, run_analysis, run_v2_signal_analysis and the hot API
+endpoints against local stand-ins (fake KIS server, yfinance replay, SQLite
+seeded with candles) and reports latency percentiles. A JSON baseline can be
+saved and later compared to catch regressions (non-zero exit on regression).
+
+Usage (from backend/):
+  python bench/run_bench.py                          # print table
+  python bench/run_bench.py --save-baseline          # write bench/baseline.json
+  python bench/run_bench.py --compare --tolerance 0.25
+  python bench/run_bench.py --record                 # capture real yfinance fixtures (network)
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from bench.fake_kis import FakeKisServer
+from bench.sqlite_mysql import SqliteDB
+from bench import yf_replay
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+CORE_TICKERS = ["SOXL", "SOXS", "UPRO"]
+ENDPOINTS = [
+    "/api/report",
+    "/api/signals?limit=5",
+    "/api/v2/status/SOXL",
+    "/api/managed-stocks",
+    "/api/metrics",
+]
+
+# Columns the production schema gained through manual ALTERs (not created by init_db)
+SCHEMA_PATCHES = {
+    "managed_stocks": {"quantity": "DECIMAL(18,6) DEFAULT 0", "avg_price": "DECIMAL(18,6) DEFAULT 0",
+                       "currency": "VARCHAR(10) DEFAULT 'USD'", "is_manual_price": "BOOLEAN DEFAULT 0",
+                       "exchange": "VARCHAR(10)"},
+    "signal_history": {"signal_reason": "TEXT", "time_kst": "VARCHAR(30)", "time_ny": "VARCHAR(30)",
+                       "score": "INT DEFAULT 0", "interpretation": "TEXT"},
+    "buy_stock": {"target_box_price": "DECIMAL(18,6)"},
+    "sell_stock": {"target_stop_price": "DECIMAL(18,6)", "sell_mode": "VARCHAR(20)",
+                   "created_at": "DATETIME DEFAULT CURRENT_TIMESTAMP"},
+}
+
+
+def percentile(values, p):
+    if not values: return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(p / 100.0 * (len(values) - 1)))))
+    return values[k]
+
+
+def summarize(samples):
+    return {
+        "n": len(samples),
+        "p50_ms": round(percentile(samples, 50), 2),
+        "p95_ms": round(percentile(samples, 95), 2),
+        "p99_ms": round(percentile(samples, 99), 2),
+        "mean_ms": round(statistics.mean(samples), 2) if samples else 0.0,
+        "max_ms": round(max(samples), 2) if samples else 0.0,
+    }
+
+
+@contextlib.contextmanager
+def quiet(enabled=True):
+    """Swallow the analysis print() noise while timing"""
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def timed(fn, iterations, warmup=1, before=None, verbose=False):
+    samples = []
+    for i in range(warmup + iterations):
+        if before: before()
+        with quiet(not verbose):
+            t0 = time.perf_counter()
+            fn()
+            ms = (time.perf_counter() - t0) * 1000
+        if i >= warmup:
+            samples.append(ms)
+    return samples
+
+
+# --- Environment ---
+def setup_env(args):
+    """Start stand-ins and patch the app modules. Order matters: kis_client is built at import."""
+    kis = FakeKisServer(latency_ms=args.latency_ms).start()
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    os.environ["KIS_URL_BASE"] = kis.url
+    os.environ["KIS_TOKEN_FILE"] = os.path.join(workdir, "kis_token.json")
+
+    yf_replay.install()
+
+    import db
+    import metrics
+    store = SqliteDB(args.db or os.path.join(workdir, "bench.db"))
+    db.get_connection = lambda: metrics.CountingConnection(store.get_connection())
+
+    import sms
+    import analysis
+    noop = lambda *a, **k: True
+    sms.send_sms = noop
+    analysis.send_sms = noop
+    return kis, store, workdir
+
+
+def seed(store, verbose=False):
+    import db
+    import analysis
+
+    with quiet(not verbose):
+        db.init_db()
+    for table, cols in SCHEMA_PATCHES.items():
+        store.ensure_columns(table, cols)
+
+    conn = store.get_connection()
+    with conn.cursor() as cursor:
+        cursor.execute("INSERT INTO global_config (key_name, value_json) VALUES (%s, %s) "
+                       "ON DUPLICATE KEY UPDATE value_json=VALUES(value_json)", ("sms_enabled", "false"))
+
+        # Ver3 validated tables (5m base rows, NY time)
+        for t in CORE_TICKERS:
+            df = yf_replay.load_candles(t, "5m", "5d")
+            rows = [(i + 1, ts.date(), 'Y' if ts.minute % 30 == 0 else 'N', ts.hour, ts.minute,
+                     float(r.Close), int(r.Volume), 'bench')
+                    for i, (ts, r) in enumerate(df.iterrows())]
+            cursor.execute(f"DELETE FROM {t.lower()}_candle_data")
+            cursor.executemany(f"INSERT INTO {t.lower()}_candle_data (seq, candle_date, is_30m, hour, minute, "
+                               f"close_price, volume, source) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", rows)
+    conn.commit()
+
+    # market_candles through the real writer (same code path as update_market_data)
+    tickers = sorted(set(CORE_TICKERS) | {s['ticker'] for s in db.get_managed_stocks() or []})
+    with quiet(not verbose):
+        for t in tickers:
+            db.save_market_candles(t, "30m", yf_replay.load_candles(t, "30m", "60d"), "bench")
+            db.save_market_candles(t, "5m", yf_replay.load_candles(t, "5m", "7d"), "bench")
+            db.save_market_candles(t, "1d", yf_replay.load_candles(t, "1d", "1y"), "bench")
+        analysis.refresh_market_indices()
+    return tickers
+
+
+# --- Targets ---
+def bench_functions(args):
+    import analysis
+    from report_store import publish_report
+
+    results = {}
+    reset_stock_cache = lambda: analysis._DATA_CACHE.pop("stock_analysis", None)
+
+    results["load_data_from_db"] = timed(lambda: analysis.load_data_from_db(analysis.TARGET_TICKERS),
+                                         args.iterations, verbose=args.verbose)
+    results["run_analysis"] = timed(lambda: analysis.run_analysis(), args.iterations,
+                                    before=reset_stock_cache, verbose=args.verbose)
+    results["run_analysis_cached"] = timed(lambda: analysis.run_analysis(), args.iterations, verbose=args.verbose)
+    results["run_analysis_force"] = timed(lambda: analysis.run_analysis(force_update=True),
+                                          args.heavy_iterations, verbose=args.verbose)
+    results["run_v2_signal_analysis"] = timed(analysis.run_v2_signal_analysis,
+                                              args.heavy_iterations, verbose=args.verbose)
+
+    with quiet(not args.verbose):
+        publish_report(analysis.run_analysis())
+    return results
+
+
+def bench_endpoints(args):
+    from fastapi.testclient import TestClient
+    with quiet(not args.verbose):
+        import main
+    client = TestClient(main.app)  # no `with`: skip startup (scheduler, init_db against MySQL)
+
+    results = {}
+    for ep in ENDPOINTS:
+        def call(ep=ep):
+            r = client.get(ep)
+            if r.status_code >= 400:
+                raise RuntimeError(f"{ep} -> HTTP {r.status_code}")
+        results[f"GET {ep}"] = timed(call, args.iterations * 5, warmup=2, verbose=args.verbose)
+    return results
+
+
+# --- Baseline ---
+def compare(summary, baseline, tolerance, min_delta_ms):
+    """Returns list of regression messages (p50/p95 above baseline * (1 + tolerance))"""
+    regressions = []
+    for name, cur in summary["targets"].items():
+        base = baseline.get("targets", {}).get(name)
+        if not base: continue
+        for key in ("p50_ms", "p95_ms"):
+            limit = base[key] * (1 + tolerance)
+            if cur[key] > limit and cur[key] - base[key] > min_delta_ms:
+                regressions.append(f"{name} {key}: {cur[key]} > {base[key]} (+{tolerance:.0%})")
+    return regressions
+
+
+def print_table(summary, baseline=None):
+    print(f"=== Benchmark ({summary['meta']['iterations']} iters, KIS latency {summary['meta']['kis_latency_ms']}ms) ===")
+    print(f"{'target':<34}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'base p50':>11}")
+    for name, s in summary["targets"].items():
+        base = (baseline or {}).get("targets", {}).get(name, {}).get("p50_ms", "-")
+        print(f"{name:<34}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}{base:>11}")
+    print(f"KIS calls: {summary['meta']['kis_calls']}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--iterations", type=int, default=10, help="samples per fast target")
+    ap.add_argument("--heavy-iterations", type=int, default=3, help="samples for force/V2 runs")
+    ap.add_argument("--latency-ms", type=float, default=5, help="fake KIS per-request latency")
+    ap.add_argument("--db", default=None, help="SQLite file (default: temp dir)")
+    ap.add_argument("--only", default="", help="comma list: functions,endpoints")
+    ap.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, default=None)
+    ap.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, default=None)
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    ap.add_argument("--min-delta-ms", type=float, default=2.0, help="ignore regressions smaller than this")
+    ap.add_argument("--json", action="store_true", help="print JSON summary only")
+    ap.add_argument("--verbose", action="store_true", help="keep analysis output")
+    ap.add_argument("--record", action="store_true", help="record real yfinance fixtures and exit")
+    args = ap.parse_args()
+
+    if args.record:
+        yf_replay.record(CORE_TICKERS + ["IONQ", "TSLA", "TMF", "GOOGL", "AAAU", "UFO", "^GSPC", "^IXIC", "SPY"])
+        return
+
+    kis, store, _ = setup_env(args)
+    try:
+        tickers = seed(store, args.verbose)
+        only = set(filter(None, args.only.split(","))) or {"functions", "endpoints"}
+        raw = {}
+        if "functions" in only:
+            raw.update(bench_functions(args))
+        if "endpoints" in only:
+            if "functions" not in only:
+                import analysis
+                from report_store import publish_report
+                with quiet(not args.verbose):
+                    publish_report(analysis.run_analysis())
+            raw.update(bench_endpoints(args))
+        summary = {
+            "meta": {
+                "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "python": sys.version.split()[0],
+                "iterations": args.iterations,
+                "heavy_iterations": args.heavy_iterations,
+                "kis_latency_ms": args.latency_ms,
+                "tickers": tickers,
+                "kis_calls": kis.calls,
+            },
+            "targets": {name: summarize(s) for name, s in raw.items()},
+        }
+    finally:
+        kis.stop()
+
+    baseline = None
+    if args.compare and os.path.exists(args.compare):
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_table(summary, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"✅ Baseline saved: {args.save_baseline}")
+
+    if args.compare:
+        if baseline is None:
+            print(f"⚠️ No baseline at {args.compare}")
+            return
+        regressions = compare(summary, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("❌ Regressions:")
+            for r in regressions: print(f"  - {r}")
+            sys.exit(1)
+        print("✅ No regressions vs baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+SQLite stand-in for the MySQL host
+Minimal pymysql-like connection (DictCursor rows, `with conn.cursor()`,
+`with conn`, commit/close) so db.py runs unmodified against a local file.
+MySQL-only SQL used in this repo is rewritten to SQLite on execute().
+"""
+
+import re
+import sqlite3
+import threading
+import decimal
+from datetime import datetime, date
+
+import numpy as np
+
+sqlite3.register_adapter(decimal.Decimal, float)
+sqlite3.register_adapter(np.float64, float)
+sqlite3.register_adapter(np.float32, float)
+sqlite3.register_adapter(np.int64, int)
+sqlite3.register_adapter(np.int32, int)
+sqlite3.register_adapter(np.bool_, bool)
+sqlite3.register_adapter(datetime, lambda v: v.strftime('%Y-%m-%d %H:%M:%S'))
+sqlite3.register_adapter(date, lambda v: v.isoformat())
+
+
+def _conv_datetime(raw):
+    s = raw.decode()
+    try:
+        return datetime.strptime(s[:19], '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        try:
+            return datetime.strptime(s[:10], '%Y-%m-%d')
+        except ValueError:
+            return s
+
+
+def _conv_date(raw):
+    try:
+        return date.fromisoformat(raw.decode()[:10])
+    except ValueError:
+        return raw.decode()
+
+
+sqlite3.register_converter("DATETIME", _conv_datetime)
+sqlite3.register_converter("TIMESTAMP", _conv_datetime)
+sqlite3.register_converter("DATE", _conv_date)
+
+_UNIT = {"DAY": "days", "HOUR": "hours", "MINUTE": "minutes", "SECOND": "seconds"}
+
+_REWRITES = [
+    (re.compile(r"\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY", re.I), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"\bAUTO_INCREMENT\b", re.I), ""),
+    (re.compile(r"COMMENT\s+'(?:[^']|'')*'", re.I), ""),
+    (re.compile(r"ON\s+UPDATE\s+CURRENT_TIMESTAMP", re.I), ""),
+    (re.compile(r",\s*UNIQUE\s+(?:INDEX|KEY)\s+\w+\s*(\([^)]*\))", re.I), r", UNIQUE \1"),
+    (re.compile(r",\s*(?:INDEX|KEY)\s+\w+\s*\([^)]*\)", re.I), ""),
+    (re.compile(r"\)\s*ENGINE\s*=.*$", re.I | re.S), ")"),
+    (re.compile(r"\s+AFTER\s+\w+", re.I), ""),
+    (re.compile(r"ADD\s+COLUMN\s+IF\s+NOT\s+EXISTS", re.I), "ADD COLUMN"),
+    (re.compile(r"\bTRUNCATE\s+(?:TABLE\s+)?(\w+)", re.I), r"DELETE FROM \1"),
+    (re.compile(r"DATE_SUB\(\s*NOW\(\)\s*,\s*INTERVAL\s+(%s|\d+)\s+(\w+)\s*\)", re.I),
+     lambda m: f"datetime('now','localtime','-' || {m.group(1)} || ' {_UNIT.get(m.group(2).upper(), 'days')}')"),
+    (re.compile(r"NOW\(\)\s*-\s*INTERVAL\s+'(\d+)\s+(\w+?)s?'", re.I),
+     lambda m: f"datetime('now','localtime','-{m.group(1)} {_UNIT.get(m.group(2).upper(), 'minutes')}')"),
+    (re.compile(r"NOW\(\)\s*-\s*INTERVAL\s+(%s|\d+)\s+(\w+)", re.I),
+     lambda m: f"datetime('now','localtime','-' || {m.group(1)} || ' {_UNIT.get(m.group(2).upper(), 'days')}')"),
+    (re.compile(r"\bNOW\(\)", re.I), "datetime('now','localtime')"),
+    (re.compile(r"\bCURDATE\(\)", re.I), "date('now','localtime')"),
+    (re.compile(r"ON\s+DUPLICATE\s+KEY\s+UPDATE", re.I), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"VALUES\((\w+)\)", re.I), r"excluded.\1"),
+    (re.compile(r"%s"), "?"),
+]
+
+_CACHE = {}
+
+
+def translate(sql):
+    """MySQL dialect -> SQLite (memoized per statement text)"""
+    out = _CACHE.get(sql)
+    if out is None:
+        out = sql
+        for pat, rep in _REWRITES:
+            out = pat.sub(rep, out)
+        _CACHE[sql] = out
+    return out
+
+
+class Cursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._cur = conn._raw.cursor()
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, sql, params=None):
+        with self._conn._lock:
+            self._cur.execute(translate(sql), tuple(params) if params is not None else ())
+        self.rowcount = self._cur.rowcount
+        self.lastrowid = self._cur.lastrowid
+        return self.rowcount
+
+    def executemany(self, sql, seq):
+        with self._conn._lock:
+            self._cur.executemany(translate(sql), [tuple(p) for p in seq])
+        self.rowcount = self._cur.rowcount
+        return self.rowcount
+
+    def _row(self, r):
+        return None if r is None else dict(zip([d[0] for d in self._cur.description], r))
+
+    def fetchone(self):
+        return self._row(self._cur.fetchone())
+
+    def fetchall(self):
+        rows = self._cur.fetchall()
+        if not rows: return []
+        cols = [d[0] for d in self._cur.description]
+        return [dict(zip(cols, r)) for r in rows]
+
+    def fetchmany(self, size=1):
+        return [self._row(r) for r in self._cur.fetchmany(size)]
+
+    def close(self):
+        self._cur.close()
+
+
+class Connection:
+    """One shared sqlite3 handle; statements serialized with a lock (like a single MySQL session)"""
+
+    def __init__(self, raw, lock):
+        self._raw = raw
+        self._lock = lock
+
+    def cursor(self, *args, **kwargs):
+        return Cursor(self)
+
+    def commit(self):
+        with self._lock:
+            self._raw.commit()
+
+    def rollback(self):
+        with self._lock:
+            self._raw.rollback()
+
+    def ping(self, reconnect=True):
+        return True
+
+    def close(self):
+        pass  # shared handle stays open (mirrors returning a pooled connection)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None: self.commit()
+        else: self.rollback()
+
+
+class SqliteDB:
+    """Factory used as a drop-in for db.get_connection"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._raw = sqlite3.connect(path, check_same_thread=False,
+                                    detect_types=sqlite3.PARSE_DECLTYPES)
+        self._raw.execute("PRAGMA journal_mode=WAL")
+        self._raw.execute("PRAGMA synchronous=NORMAL")
+
+    def get_connection(self):
+        return Connection(self._raw, self._lock)
+
+    def columns(self, table):
+        return {r[1] for r in self._raw.execute(f"PRAGMA table_info({table})")}
+
+    def ensure_columns(self, table, cols):
+        """Add columns the live schema grew via manual ALTERs (not in init_db)"""
+        have = self.columns(table)
+        for name, decl in cols.items():
+            if name not in have:
+                self._raw.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+        self._raw.commit()
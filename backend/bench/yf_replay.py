@@ -0,0 +1,121 @@
+"""
+yfinance Replay Fixture
+Replaces yf.download / yf.Ticker().history with recorded candles
+(bench/fixtures/{ticker}_{interval}.csv.gz) or, when no recording exists,
+a deterministic synthetic random walk. `record()` captures real data once.
+"""
+
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+NY_TZ = "America/New_York"
+
+_PERIOD_DAYS = {"1d": 1, "5d": 5, "7d": 7, "1mo": 30, "60d": 60, "3mo": 90, "6mo": 182, "1y": 365, "2y": 730}
+_INTERVAL_MIN = {"1m": 1, "2m": 2, "5m": 5, "15m": 15, "30m": 30, "60m": 60, "1h": 60, "1d": 1440}
+
+
+def _fixture_path(ticker, interval):
+    safe = ticker.replace("^", "_").replace("=", "_")
+    return os.path.join(FIXTURE_DIR, f"{safe}_{interval}.csv.gz")
+
+
+def synthetic_candles(ticker, interval="5m", days=5, end=None):
+    """Deterministic OHLCV random walk (seeded by ticker+interval), NY-time index"""
+    end = pd.Timestamp(end or pd.Timestamp.now(tz=NY_TZ)).tz_convert(NY_TZ)
+    step = _INTERVAL_MIN.get(interval, 5)
+    if step >= 1440:
+        idx = pd.bdate_range(end=end.normalize(), periods=max(days * 5 // 7, 2), tz=NY_TZ)
+    else:
+        start = (end - pd.Timedelta(days=days + 2)).floor("D")
+        idx = pd.date_range(start, end.floor(f"{step}min"), freq=f"{step}min", tz=NY_TZ)
+        mins = idx.hour * 60 + idx.minute
+        idx = idx[(idx.dayofweek < 5) & (mins >= 4 * 60) & (mins < 20 * 60)]  # prepost session
+    n = len(idx)
+    rng = np.random.default_rng(zlib.crc32(f"{ticker}:{interval}".encode()))
+    base = 10.0 + (zlib.crc32(ticker.encode()) % 9000) / 100.0
+    scale = 0.02 if step >= 1440 else 0.003
+    close = base * np.exp(np.cumsum(rng.normal(0, scale, n)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, scale / 2, n)) * close
+    return pd.DataFrame({
+        "Open": open_,
+        "High": np.maximum(open_, close) + spread,
+        "Low": np.minimum(open_, close) - spread,
+        "Close": close,
+        "Volume": rng.integers(10_000, 2_000_000, n).astype(float),
+    }, index=pd.DatetimeIndex(idx, name="Datetime"))
+
+
+def load_candles(ticker, interval="5m", period="5d", days=None):
+    """Recorded fixture if present (trimmed to period), else synthetic"""
+    days = days or _PERIOD_DAYS.get(period, 5)
+    path = _fixture_path(ticker, interval)
+    if os.path.exists(path):
+        df = pd.read_csv(path, index_col=0, parse_dates=True)
+        if df.index.tz is None:
+            df.index = df.index.tz_localize("UTC")
+        df.index = df.index.tz_convert(NY_TZ)
+        return df[df.index >= df.index[-1] - pd.Timedelta(days=days)]
+    return synthetic_candles(ticker, interval, days)
+
+
+def _load_range(ticker, interval, period, start, end):
+    """period=... or yfinance-style start/end (end exclusive, naive = NY)"""
+    if start is None:
+        return load_candles(ticker, interval, period)
+    ts = lambda v: pd.Timestamp(v).tz_localize(NY_TZ) if pd.Timestamp(v).tz is None else pd.Timestamp(v)
+    lo = ts(start)
+    df = load_candles(ticker, interval, days=max(1, (pd.Timestamp.now(tz=NY_TZ) - lo).days + 1))
+    df = df[df.index >= lo]
+    return df[df.index < ts(end)] if end is not None else df
+
+
+def _download(tickers, period="5d", interval="1d", group_by="column", start=None, end=None, **kwargs):
+    if isinstance(tickers, str):
+        tickers = tickers.split()
+    frames = {t: _load_range(t, interval, period, start, end) for t in tickers}
+    if len(tickers) == 1 and group_by != "ticker":
+        return frames[tickers[0]]
+    # yfinance group_by='ticker' layout: columns (ticker, field)
+    return pd.concat(frames, axis=1)
+
+
+class _Ticker:
+    def __init__(self, symbol, *args, **kwargs):
+        self.ticker = symbol
+
+    def history(self, period="1mo", interval="1d", **kwargs):
+        return load_candles(self.ticker, interval, period)
+
+    @property
+    def fast_info(self):
+        df = load_candles(self.ticker, "1d", "5d")
+        return {"last_price": float(df["Close"].iloc[-1]),
+                "previous_close": float(df["Close"].iloc[-2]) if len(df) > 1 else float(df["Close"].iloc[-1])}
+
+
+def install():
+    """Patch the yfinance module in place (affects every `import yfinance as yf`)"""
+    import yfinance as yf
+    yf.download = _download
+    yf.Ticker = _Ticker
+    return yf
+
+
+def record(tickers, intervals=(("5m", "30d"), ("30m", "60d"), ("1d", "6mo"))):
+    """Capture real yfinance candles into bench/fixtures (run once, with network)"""
+    import yfinance as yf
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for t in tickers:
+        for interval, period in intervals:
+            df = yf.Ticker(t).history(period=period, interval=interval, prepost=True)
+            if df is None or df.empty:
+                print(f"⚠️ No data: {t} {interval}")
+                continue
+            df = df[["Open", "High", "Low", "Close", "Volume"]]
+            df.to_csv(_fixture_path(t, interval), compression="gzip")
+            print(f"✅ Recorded {t} {interval}: {len(df)} rows")
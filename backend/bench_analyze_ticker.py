@@ -0,0 +1,84 @@
+"""
+analyze_ticker Benchmark
+- Synthetic 30m/5m/1d candles + fake KIS client with fixed latency (no network / DB)
+- Reports per-ticker latency, KIS calls per ticker and per-stage timing (stage_ms)
+
+Usage: python bench_analyze_ticker.py [--tickers 20] [--kis-ms 80] [--prefetch]
+"""
+import sys
+import os
+import time
+import argparse
+import statistics
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import analysis
+
+
+class FakeKis:
+    """Stand-in for kis_client: sleeps kis_ms per call and counts calls"""
+    def __init__(self, kis_ms):
+        self.delay = kis_ms / 1000.0
+        self.calls = {"get_price": 0, "get_daily_price": 0}
+
+    def get_price(self, symbol, exchange=None):
+        self.calls["get_price"] += 1
+        time.sleep(self.delay)
+        return {"price": 20.0, "diff": 0.3, "rate": 1.5}
+
+    def get_daily_price(self, symbol, exchange=None):
+        self.calls["get_daily_price"] += 1
+        time.sleep(self.delay)
+        return [{"clos": "20.0"}, {"clos": "19.7"}]
+
+
+def make_frame(periods, freq, seed):
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range("2026-01-05 04:00", periods=periods, freq=freq, tz="America/New_York")
+    close = 20 + np.cumsum(rng.normal(0, 0.2, periods))
+    return pd.DataFrame({"Close": close, "Volume": rng.integers(1000, 5000, periods)}, index=idx)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickers", type=int, default=20)
+    ap.add_argument("--kis-ms", type=float, default=80.0)
+    ap.add_argument("--prefetch", action="store_true", help="pass real_time_info like run_stock_analysis does")
+    args = ap.parse_args()
+
+    fake = FakeKis(args.kis_ms)
+    analysis.kis_client = fake
+
+    tickers = [f"T{i:02d}" for i in range(args.tickers)]
+    d30 = {t: make_frame(300, "30min", i) for i, t in enumerate(tickers)}
+    d5 = {t: make_frame(1500, "5min", i + 1000) for i, t in enumerate(tickers)}
+    d1 = {t: make_frame(180, "1D", i + 2000) for i, t in enumerate(tickers)}
+    strategy = {"buy_strategy": "EMA 15/50 골든크로스, RSI 50 이상, 거래량 150%"}
+
+    latencies = []
+    stage_totals = {}
+    for t in tickers:
+        rt = {"price": 20.0, "diff": 0.3, "rate": 1.5} if args.prefetch else None
+        t0 = time.perf_counter()
+        res = analysis.analyze_ticker(t, d30, d5, d1, real_time_info=rt, strategy_info=strategy)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        if "error" in res:
+            print(f"{t}: error {res['error']}")
+        for k, v in (res.get("stage_ms") or {}).items():
+            stage_totals.setdefault(k, []).append(v)
+
+    n = len(tickers)
+    print(f"\n=== analyze_ticker x{n} (KIS latency {args.kis_ms:.0f}ms, prefetch={args.prefetch}) ===")
+    print(f"latency ms: p50={statistics.median(latencies):.1f} mean={statistics.mean(latencies):.1f} max={max(latencies):.1f}")
+    print(f"KIS calls/ticker: get_price={fake.calls['get_price'] / n:.2f} get_daily_price={fake.calls['get_daily_price'] / n:.2f}")
+    if stage_totals:
+        print("stage ms (mean):")
+        for k, v in stage_totals.items():
+            print(f"  {k:<12} {statistics.mean(v):8.2f}")
+
+
+if __name__ == "__main__":
+    main()
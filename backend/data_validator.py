@@ -1,12 +1,20 @@
 """
 Data Validation and Auto-Fill Module
-Ensures sufficient candle data for accurate SMA calculations
+Ensures sufficient candle data for accurate SMA calculations, and finds
+missing bars in market_candles against the session calendar so backfill
+only requests the exact gaps (paginated KIS minute walk for recent bars, merged
+yfinance start/end ranges for older ones).
 """
 
 from db import load_market_candles, save_market_candles, get_connection
 import yfinance as yf
 import pandas as pd
-from datetime import datetime
+import threading
+import time as _time
+from datetime import datetime, time, timedelta
+
+import market_calendar as mcal
+import metrics
 
 # Minimum required candles for accurate analysis
 MIN_CANDLES_30M = 50  # For SMA30 calculation with buffer
@@ -146,5 +154,314 @@ def validate_all_tickers(tickers=['SOXL', 'SOXS', 'UPRO']):
     
     return results
 
+# --- Session-aware gap detection & targeted backfill ---
+GAP_TICKERS = ['SOXL', 'SOXS', 'UPRO']          # tickers persisted to market_candles
+GAP_TIMEFRAMES = {'5m': 5, '30m': 30, '1d': None}
+GAP_LOOKBACK_DAYS = {'5m': 20, '30m': 35, '1d': 120}  # trading days, inside cleanup_old_candles retention
+SETTLE_MINUTES = 10      # newest bars belong to the 5-min update job
+MERGE_GAP_DAYS = 2       # yfinance windows this close (trading days) share one request
+
+_backfill_lock = threading.Lock()
+_UNFILLABLE = {}         # (ticker, timeframe) -> {Timestamp}: source returned data but not this bar
+_BACKFILL_STATUS = {"last_run": None}
+
+
+def expected_bar_times(timeframe, start_day, end_day, now=None):
+    """Naive NY bar times the calendar says should exist in [start_day, end_day] (closed bars only)"""
+    now_ny = mcal.to_ny(now) if now is not None else mcal.now_ny()
+    days = mcal.trading_days(start_day, end_day)
+    settle = timedelta(minutes=SETTLE_MINUTES)
+
+    if timeframe == '1d':
+        done = [d for d in days if mcal.session_bounds(d)["close"] + settle <= now_ny]
+        return pd.DatetimeIndex([pd.Timestamp(d) for d in done])
+
+    step = GAP_TIMEFRAMES[timeframe]
+    cutoff = now_ny.replace(tzinfo=None) - timedelta(minutes=step) - settle
+    idx = pd.DatetimeIndex([]).append([mcal.bar_starts(d, step) for d in days]) if days else pd.DatetimeIndex([])
+    return idx[idx <= cutoff]
+
+
+def stored_bar_times(ticker, timeframe, since):
+    """candle_time of stored bars since `since` (naive NY), time column only"""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT candle_time FROM market_candles WHERE ticker=%s AND timeframe=%s AND candle_time >= %s",
+                           (ticker, timeframe, since))
+            rows = cursor.fetchall()
+    idx = pd.DatetimeIndex(pd.to_datetime([r['candle_time'] for r in rows]))
+    return idx.normalize() if timeframe == '1d' else idx
+
+
+def _merge_ranges(missing, timeframe):
+    """Consecutive missing bars -> [(first, last)]"""
+    ranges = []
+    step = GAP_TIMEFRAMES[timeframe]
+    for ts in missing:
+        if ranges:
+            prev = ranges[-1][1]
+            adjacent = (mcal.next_trading_day(prev.date()) == ts.date() if timeframe == '1d'
+                        else ts - prev == pd.Timedelta(minutes=step))
+            if adjacent:
+                ranges[-1][1] = ts
+                continue
+        ranges.append([ts, ts])
+    return [tuple(r) for r in ranges]
+
+
+def find_gaps(ticker, timeframe, now=None):
+    """
+    Missing bars for one (ticker, timeframe) over its lookback window
+
+    Returns:
+        dict with expected/stored counts, missing DatetimeIndex, merged ranges,
+        and kis_floor (oldest bar the KIS minute pagination reaches; None for 1d)
+    """
+    today = (mcal.to_ny(now) if now is not None else mcal.now_ny()).date()
+    start_day = today
+    for _ in range(GAP_LOOKBACK_DAYS[timeframe]):
+        start_day = mcal.previous_trading_day(start_day)
+
+    expected = expected_bar_times(timeframe, start_day, today, now)
+    stored = stored_bar_times(ticker, timeframe, datetime.combine(start_day, time()))
+    missing = expected.difference(stored)
+
+    skip = _UNFILLABLE.get((ticker, timeframe))
+    if skip:
+        skip.difference_update({t for t in skip if t.date() < start_day})
+        missing = missing[~missing.isin(list(skip))]
+
+    kis_floor = None
+    if timeframe != '1d' and len(expected):
+        from kis_api import MINUTE_PAGE_SIZE, MINUTE_MAX_PAGES
+        kis_floor = expected[max(0, len(expected) - MINUTE_PAGE_SIZE * MINUTE_MAX_PAGES)]
+    return {"expected": len(expected), "stored": len(stored), "missing": missing,
+            "ranges": _merge_ranges(missing, timeframe), "kis_floor": kis_floor}
+
+
+def _windows(days):
+    """Sorted trading days -> [(first, last)], merging runs closer than MERGE_GAP_DAYS"""
+    windows = []
+    for d in days:
+        if windows:
+            gap, cur = 0, windows[-1][1]
+            while cur < d and gap <= MERGE_GAP_DAYS:
+                cur = mcal.next_trading_day(cur)
+                gap += 1
+            if gap <= MERGE_GAP_DAYS:
+                windows[-1][1] = d
+                continue
+        windows.append([d, d])
+    return windows
+
+
+def plan_requests(gaps, kis=True):
+    """
+    Minimal request set for {(ticker, timeframe): find_gaps()}
+
+    Intraday gaps within KIS pagination reach -> one paginated KIS walk per timeframe
+    (tickers in parallel); everything else -> yfinance start/end windows shared by all
+    tickers missing bars in them.
+    """
+    plan = []
+    for timeframe in GAP_TIMEFRAMES:
+        older = {}   # ticker -> set of missing trading days
+        recent = {}  # ticker -> missing bars within KIS reach
+        for (ticker, tf), g in gaps.items():
+            if tf != timeframe or not len(g["missing"]): continue
+            missing = g["missing"]
+            if kis and g["kis_floor"] is not None:
+                near = missing[missing >= g["kis_floor"]]
+                if len(near): recent[ticker] = near
+                missing = missing[missing < g["kis_floor"]]
+            if len(missing):
+                older[ticker] = set(missing.date)
+
+        if recent:
+            plan.append({"source": "kis", "timeframe": timeframe, "tickers": sorted(recent),
+                         "start": min(m[0] for m in recent.values()), "end": max(m[-1] for m in recent.values()),
+                         "bars": sum(len(m) for m in recent.values())})
+
+        all_days = sorted(set().union(*older.values())) if older else []
+        for first, last in _windows(all_days):
+            tickers = sorted(t for t, days in older.items() if any(first <= d <= last for d in days))
+            bars = sum(int(((gaps[(t, timeframe)]["missing"].date >= first) &
+                            (gaps[(t, timeframe)]["missing"].date <= last)).sum()) for t in tickers)
+            plan.append({"source": "yfinance", "timeframe": timeframe, "tickers": tickers,
+                         "start": first, "end": last, "bars": bars})
+    return plan
+
+
+def _yf_range(tickers, timeframe, start, end):
+    """{ticker: DataFrame} for [start, end] trading days, naive NY index"""
+    with metrics.external("yfinance", "download"):
+        data = yf.download(" ".join(tickers), start=start.isoformat(), end=(end + timedelta(days=1)).isoformat(),
+                           interval=timeframe, prepost=True, group_by='ticker', threads=True,
+                           progress=False, timeout=20)
+    out = {}
+    if data is None or data.empty: return out
+    for ticker in tickers:
+        if isinstance(data.columns, pd.MultiIndex):
+            if ticker not in data.columns.get_level_values(0): continue
+            df = data[ticker]
+        elif len(tickers) == 1:
+            df = data
+        else:
+            continue
+        df = df.dropna(subset=['Close'])
+        if df.index.tz is not None:
+            df.index = df.index.tz_convert(mcal.NY).tz_localize(None)
+        if timeframe == '1d':
+            df.index = df.index.normalize()
+        out[ticker] = df
+    return out
+
+
+def _mark_unfillable(ticker, timeframe, wanted, got, lo, hi):
+    """Source has bars on both sides but not this one (halt / no prepost trades): stop asking for it"""
+    lost = wanted.difference(got)
+    lost = lost[(lost > lo) & (lost < hi)]
+    if len(lost):
+        _UNFILLABLE.setdefault((ticker, timeframe), set()).update(lost)
+    return lost
+
+
+def _fill_kis(req, gaps):
+    """
+    Paginated KIS walk; each page is filtered to missing bars and saved as it arrives.
+    Returns (bars saved, {ticker: bars saved}).
+    """
+    from kis_api import backfill_minute_candles
+    tf = req["timeframe"]
+    wanted = {t: gaps[(t, tf)]["missing"][gaps[(t, tf)]["missing"] >= req["start"]] for t in req["tickers"]}
+    got = {t: [] for t in req["tickers"]}
+    span = {}
+
+    def keep(ticker, df):
+        lo, hi = span.get(ticker, (df.index.min(), df.index.max()))
+        span[ticker] = (min(lo, df.index.min()), max(hi, df.index.max()))
+        hit = df[df.index.isin(wanted[ticker])]
+        got[ticker].append(hit.index)
+        return hit
+
+    saved = backfill_minute_candles(req["tickers"], GAP_TIMEFRAMES[tf], req["start"], timeframe=tf, keep=keep)
+    for ticker, (lo, hi) in span.items():
+        _mark_unfillable(ticker, tf, wanted[ticker], pd.DatetimeIndex([]).append(got[ticker]), lo, hi)
+    total = sum(saved.values())
+    metrics.inc("backfill_bars_total", total, source="kis", timeframe=tf)
+    return total, saved
+
+
+def _fill(req, gaps):
+    """Run one planned yfinance request and save only the missing bars. Returns bars saved."""
+    tf = req["timeframe"]
+    frames = _yf_range(req["tickers"], tf, req["start"], req["end"])
+
+    saved = 0
+    for ticker in req["tickers"]:
+        missing = gaps[(ticker, tf)]["missing"]
+        wanted = missing[(missing.date >= req["start"]) & (missing.date <= req["end"])]
+        df = frames.get(ticker)
+        if df is None or df.empty:
+            continue  # source failure: retry next run
+        hit = df[df.index.isin(wanted)]
+        hit = hit[~hit.index.duplicated(keep='last')]
+        if not hit.empty and save_market_candles(ticker, tf, hit, source=req["source"]):
+            saved += len(hit)
+        _mark_unfillable(ticker, tf, wanted, hit.index, df.index.min(), df.index.max())
+    metrics.inc("backfill_bars_total", saved, source=req["source"], timeframe=tf)
+    return saved
+
+
+def _summary(gaps, plan):
+    out = {}
+    for (ticker, tf), g in sorted(gaps.items()):
+        m = g["missing"]
+        out.setdefault(ticker, {})[tf] = {
+            "expected": g["expected"], "stored": g["stored"], "missing": len(m), "ranges": len(g["ranges"]),
+            "unfillable": len(_UNFILLABLE.get((ticker, tf), ())),
+            "first_missing": str(m[0]) if len(m) else None, "last_missing": str(m[-1]) if len(m) else None,
+        }
+        metrics.set_gauge("candle_gap_bars", len(m), ticker=ticker, timeframe=tf)
+    reqs = [{**r, "start": str(r["start"]), "end": str(r["end"])} for r in plan]
+    return {"gaps": out, "total_missing": sum(len(g["missing"]) for g in gaps.values()), "requests": reqs}
+
+
+def scan_gaps(tickers=None, timeframes=None, now=None):
+    """Detect gaps and the request plan without fetching anything"""
+    gaps = {(t, tf): find_gaps(t, tf, now) for t in (tickers or GAP_TICKERS) for tf in (timeframes or GAP_TIMEFRAMES)}
+    return gaps, plan_requests(gaps)
+
+
+def run_backfill(tickers=None, timeframes=None, now=None):
+    """
+    Detect and fill candle gaps (only the missing bars are requested/saved)
+
+    Returns:
+        Status dict (gap counts before, bars filled, requests issued), or None if already running
+    """
+    if not _backfill_lock.acquire(blocking=False):
+        return None
+    try:
+        t0 = _time.perf_counter()
+        gaps, plan = scan_gaps(tickers, timeframes, now)
+        print(f"🔍 Candle gaps: {sum(len(g['missing']) for g in gaps.values())} bars, {len(plan)} requests planned")
+        filled = 0
+
+        # 1) KIS pagination for recent gaps (pages stream straight into the DB)
+        remaining = {k: dict(g) for k, g in gaps.items()}
+        executed = []
+        for req in [r for r in plan if r["source"] == "kis"]:
+            try:
+                n, _ = _fill_kis(req, gaps)
+                req["filled"] = n
+                filled += n
+                print(f"  📥 kis {req['timeframe']} {','.join(req['tickers'])} since {req['start']}: {n}/{req['bars']} bars")
+            except Exception as e:
+                req["error"] = str(e)
+                print(f"  ❌ KIS backfill failed ({req['timeframe']}): {e}")
+            executed.append(req)
+
+        # 2) Whatever KIS could not reach (or skipped) goes to yfinance ranges
+        touched = {(t, r["timeframe"]) for r in executed for t in r["tickers"]}
+        if executed:
+            for key in touched:
+                g = remaining[key]
+                stored = pd.DatetimeIndex([]) if not len(g["missing"]) else stored_bar_times(
+                    key[0], key[1], g["missing"][0].to_pydatetime())
+                skip = _UNFILLABLE.get(key, ())
+                left = g["missing"].difference(stored)
+                g["missing"] = left[~left.isin(list(skip))] if skip else left
+            plan = executed + plan_requests(remaining, kis=False)
+        for req in [r for r in plan if r["source"] == "yfinance"]:
+            try:
+                n = _fill(req, remaining)
+                req["filled"] = n
+                filled += n
+                print(f"  📥 yfinance {req['timeframe']} {','.join(req['tickers'])} "
+                      f"{req['start']}~{req['end']}: {n}/{req['bars']} bars")
+            except Exception as e:
+                req["error"] = str(e)
+                print(f"  ❌ Backfill request failed (yfinance {req['timeframe']}): {e}")
+
+        status = _summary(gaps, plan)
+        status.update({"total_filled": filled, "elapsed_s": round(_time.perf_counter() - t0, 2),
+                       "last_run": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+        _BACKFILL_STATUS.clear()
+        _BACKFILL_STATUS.update(status)
+        print(f"✅ Backfill done: {filled}/{status['total_missing']} bars filled")
+        return status
+    finally:
+        _backfill_lock.release()
+
+
+def get_backfill_status(scan=True):
+    """Current gap counts (fresh scan) plus the last backfill run"""
+    status = {"running": _backfill_lock.locked(), "last_run": dict(_BACKFILL_STATUS)}
+    if scan:
+        status.update(_summary(*scan_gaps()))
+    return status
+
+
 if __name__ == '__main__':
     validate_all_tickers()
@@ -3,6 +3,11 @@ from pymysql.cursors import DictCursor
 from dbutils.pooled_db import PooledDB
 import os
 from datetime import datetime
+import metrics
+import notify_index
+import write_behind
+import lot_ledger
+import bar_trigger
 
 # Connection Config
 DB_CONFIG = {
@@ -39,9 +44,11 @@ def _get_pool():
     return _connection_pool
 
 
+_last_indicators = {}   # ticker -> last logged row (중복 로그 방지)
+
 def log_market_indicators(data):
     """
-    시장 지표 및 신호 상태 DB 저장
+    시장 지표 및 신호 상태 DB 저장 (write-behind upsert, 값이 바뀐 경우에만)
     data struct: {
         'ticker': str,
         'candle_time': datetime (NY),
@@ -50,23 +57,125 @@ def log_market_indicators(data):
         ...
     }
     """
-    conn = get_connection()
     try:
-        with conn.cursor() as cursor:
-            sql = """
-            INSERT INTO market_indicators_log 
-            (ticker, candle_time, rsi_14, vol_ratio, atr, pivot_r1, gold_30m, gold_5m, dead_30m, dead_5m)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            cursor.execute(sql, (
-                data['ticker'], data['candle_time'], 
-                data.get('rsi', 0), data.get('vr', 0), data.get('atr', 0), data.get('pivot_r1', 0),
-                data.get('gold_30m', 'N'), data.get('gold_5m', 'N'),
-                data.get('dead_30m', 'N'), data.get('dead_5m', 'N')
-            ))
-            conn.commit()
+        ct = data['candle_time']
+        if not isinstance(ct, datetime):
+            try:
+                ct = datetime.strptime(str(ct)[:19], '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                return False  # 'N/A' (no candle yet): nothing to key the row on
+        row = (
+            data['ticker'], ct,
+            data.get('rsi', 0), data.get('vr', 0), data.get('atr', 0), data.get('pivot_r1', 0),
+            data.get('gold_30m', 'N'), data.get('gold_5m', 'N'),
+            data.get('dead_30m', 'N'), data.get('dead_5m', 'N')
+        )
+        if _last_indicators.get(data['ticker']) == row:
+            metrics.inc("indicator_log_skipped_total")
+            return False
+        _last_indicators[data['ticker']] = row
+        write_behind.enqueue("market_indicators_log", row)
+        return True
     except Exception as e:
         print(f"Log Indicators Error: {e}")
+        return False
+
+# Write-behind targets: table -> INSERT (executemany turns it into multi-row INSERTs)
+_WRITE_BEHIND_SQL = {
+    "market_indicators_log": """
+        INSERT INTO market_indicators_log
+        (ticker, candle_time, rsi_14, vol_ratio, atr, pivot_r1, gold_30m, gold_5m, dead_30m, dead_5m)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE rsi_14=VALUES(rsi_14), vol_ratio=VALUES(vol_ratio), atr=VALUES(atr),
+            pivot_r1=VALUES(pivot_r1), gold_30m=VALUES(gold_30m), gold_5m=VALUES(gold_5m),
+            dead_30m=VALUES(dead_30m), dead_5m=VALUES(dead_5m)
+    """,
+    "signal_history": """
+        INSERT INTO signal_history (ticker, name, signal_type, signal_reason, position_desc, price, signal_time, time_kst, time_ny, is_sent, score, interpretation)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """,
+    "history": """
+        INSERT INTO history (manage_id, ticker, event_type, short_msg, event_price, event_dt)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """,
+}
+
+@metrics.timed("db_write", op="write_batch")
+def write_batch(batches):
+    """Write-behind flush: {table: [row tuples]} inserted in one transaction"""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            for table, rows in batches.items():
+                cursor.executemany(_WRITE_BEHIND_SQL[table], rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+def get_indicator_log(since, tickers=None):
+    """market_indicators_log rows with candle_time >= since (roll-up input)"""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            sql = ("SELECT ticker, candle_time, rsi_14, vol_ratio, atr, pivot_r1, gold_30m, gold_5m, dead_30m, dead_5m "
+                   "FROM market_indicators_log WHERE candle_time >= %s")
+            params = [since]
+            if tickers:
+                sql += " AND ticker IN (" + ",".join(["%s"] * len(tickers)) + ")"
+                params.extend(tickers)
+            cursor.execute(sql + " ORDER BY ticker, candle_time", params)
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+@metrics.timed("db_write", op="upsert_indicator_rollups")
+def upsert_indicator_rollups(rows):
+    """rows = [(ticker, timeframe, bucket_time, rsi_14, rsi_min, rsi_max, vol_ratio, vol_ratio_max,
+               atr, pivot_r1, gold_30m, gold_5m, dead_30m, dead_5m, samples)]"""
+    if not rows: return 0
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.executemany("""
+                INSERT INTO market_indicators_rollup
+                (ticker, timeframe, bucket_time, rsi_14, rsi_min, rsi_max, vol_ratio, vol_ratio_max,
+                 atr, pivot_r1, gold_30m, gold_5m, dead_30m, dead_5m, samples)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE rsi_14=VALUES(rsi_14), rsi_min=VALUES(rsi_min), rsi_max=VALUES(rsi_max),
+                    vol_ratio=VALUES(vol_ratio), vol_ratio_max=VALUES(vol_ratio_max), atr=VALUES(atr),
+                    pivot_r1=VALUES(pivot_r1), gold_30m=VALUES(gold_30m), gold_5m=VALUES(gold_5m),
+                    dead_30m=VALUES(dead_30m), dead_5m=VALUES(dead_5m), samples=VALUES(samples)
+            """, rows)
+        conn.commit()
+        return len(rows)
+    finally:
+        conn.close()
+
+def get_indicator_range(ticker, timeframe, start=None, end=None, limit=500):
+    """Indicator snapshots for ticker in [start, end]; timeframe 'raw' reads market_indicators_log"""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            if timeframe == 'raw':
+                sql = ("SELECT candle_time AS bucket_time, rsi_14, vol_ratio, atr, pivot_r1, gold_30m, gold_5m, dead_30m, dead_5m "
+                       "FROM market_indicators_log WHERE ticker=%s")
+                params = [ticker]
+                col = "candle_time"
+            else:
+                sql = ("SELECT bucket_time, rsi_14, rsi_min, rsi_max, vol_ratio, vol_ratio_max, atr, pivot_r1, "
+                       "gold_30m, gold_5m, dead_30m, dead_5m, samples FROM market_indicators_rollup "
+                       "WHERE ticker=%s AND timeframe=%s")
+                params = [ticker, timeframe]
+                col = "bucket_time"
+            if start:
+                sql += f" AND {col} >= %s"
+                params.append(start)
+            if end:
+                sql += f" AND {col} <= %s"
+                params.append(end)
+            # newest `limit` rows, returned oldest first (chart order)
+            cursor.execute(sql + f" ORDER BY {col} DESC LIMIT %s", params + [int(limit)])
+            return cursor.fetchall()[::-1]
     finally:
         conn.close()
 
@@ -75,14 +184,14 @@ def get_connection():
     pool = _get_pool()
     if pool:
         try:
-            return pool.connection()
+            return metrics.CountingConnection(pool.connection())
         except Exception as e:
             print(f"Pool Connection Error: {e}")
             # Fallback to direct connection
-            return pymysql.connect(**DB_CONFIG)
+            return metrics.CountingConnection(pymysql.connect(**DB_CONFIG))
     else:
         # Direct connection fallback
-        return pymysql.connect(**DB_CONFIG)
+        return metrics.CountingConnection(pymysql.connect(**DB_CONFIG))
 
 def init_db():
     """Initialize tables if they don't exist"""
@@ -161,6 +270,23 @@ def init_db():
             """
             cursor.execute(sql_sms_logs)
 
+            # 4-1. SMS Outbox (durable send queue, drained by sms dispatcher)
+            sql_sms_outbox = """
+            CREATE TABLE IF NOT EXISTS sms_outbox (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                receiver VARCHAR(20),
+                message TEXT,
+                status VARCHAR(10) DEFAULT 'PENDING',
+                attempts INT DEFAULT 0,
+                next_attempt_at DATETIME,
+                last_error VARCHAR(255),
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                sent_at DATETIME,
+                INDEX idx_sms_outbox_due (status, next_attempt_at)
+            )
+            """
+            cursor.execute(sql_sms_outbox)
+
             # 5. Ticker Settings (Dashboard Visibility)
             sql_ticker_settings = """
             CREATE TABLE IF NOT EXISTS ticker_settings (
@@ -248,11 +374,47 @@ def init_db():
                 gold_5m VARCHAR(30) DEFAULT 'N' COMMENT '5분 골든 발생시간(KR) or N',
                 dead_30m VARCHAR(30) DEFAULT 'N' COMMENT '30분 데드 발생시간(KR) or N',
                 dead_5m VARCHAR(30) DEFAULT 'N' COMMENT '5분 데드 발생시간(KR) or N',
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '분석 실행 시간(Log Time)'
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '분석 실행 시간(Log Time)',
+                UNIQUE KEY uq_indicator_candle (ticker, candle_time)
             )
             """
             cursor.execute(sql_indicators)
 
+            # 10-1. Existing installs: drop redundant rows per candle, then key upserts on (ticker, candle_time)
+            try:
+                cursor.execute("SHOW INDEX FROM market_indicators_log WHERE Key_name = 'uq_indicator_candle'")
+                if not cursor.fetchone():
+                    cursor.execute("DELETE a FROM market_indicators_log a JOIN market_indicators_log b "
+                                   "ON a.ticker = b.ticker AND a.candle_time = b.candle_time AND a.id < b.id")
+                    cursor.execute("ALTER TABLE market_indicators_log ADD UNIQUE KEY uq_indicator_candle (ticker, candle_time)")
+                    print("✅ market_indicators_log: duplicates removed, unique (ticker, candle_time) added")
+            except Exception as e:
+                print(f"Indicator Log Migration Skipped: {e}")
+
+            # 10-2. Indicator Roll-ups (5m / 30m / 1d buckets of market_indicators_log, see indicator_store)
+            sql_indicator_rollup = """
+            CREATE TABLE IF NOT EXISTS market_indicators_rollup (
+                ticker VARCHAR(10) NOT NULL,
+                timeframe VARCHAR(5) NOT NULL, -- 5m, 30m, 1d
+                bucket_time DATETIME NOT NULL COMMENT '구간 시작 시간(NY)',
+                rsi_14 DECIMAL(10, 2) COMMENT '구간 마지막 값',
+                rsi_min DECIMAL(10, 2),
+                rsi_max DECIMAL(10, 2),
+                vol_ratio DECIMAL(10, 2),
+                vol_ratio_max DECIMAL(10, 2),
+                atr DECIMAL(10, 4),
+                pivot_r1 DECIMAL(10, 2),
+                gold_30m VARCHAR(30) DEFAULT 'N',
+                gold_5m VARCHAR(30) DEFAULT 'N',
+                dead_30m VARCHAR(30) DEFAULT 'N',
+                dead_5m VARCHAR(30) DEFAULT 'N',
+                samples INT DEFAULT 0 COMMENT '구간 내 캔들(원본 행) 수',
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                PRIMARY KEY (ticker, timeframe, bucket_time)
+            )
+            """
+            cursor.execute(sql_indicator_rollup)
+
 
 
 
@@ -459,6 +621,40 @@ def init_db():
             """
             cursor.execute(sql_sys_trade)
 
+            # 12-1. System Trade Summary (running aggregates per ticker + 'ALL', see trade_stats)
+            sql_sys_trade_summary = """
+            CREATE TABLE IF NOT EXISTS system_trade_summary (
+                ticker VARCHAR(10) PRIMARY KEY,
+                last_trade_id INT DEFAULT 0 COMMENT '반영된 마지막 system_trades.id',
+                last_type VARCHAR(10),
+                last_price DECIMAL(10, 4),
+                last_trade_time DATETIME,
+                last_buy_price DECIMAL(10, 4),
+                trades INT DEFAULT 0,
+                wins INT DEFAULT 0,
+                returns_n INT DEFAULT 0,
+                sum_return DECIMAL(12, 4) DEFAULT 0,
+                peak_return DECIMAL(12, 4) DEFAULT 0,
+                max_drawdown DECIMAL(12, 4) DEFAULT 0,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+            """
+            cursor.execute(sql_sys_trade_summary)
+
+            # 12-2. Equity Curve (mark-to-market after each price update, see equity_curve)
+            sql_equity = """
+            CREATE TABLE IF NOT EXISTS equity_curve (
+                ts DATETIME PRIMARY KEY,
+                equity_usd DECIMAL(15, 2),
+                cash_usd DECIMAL(15, 2),
+                exposure_usd DECIMAL(15, 2) COMMENT '보유 종목 평가액',
+                cost_usd DECIMAL(15, 2) COMMENT '보유 종목 매입액',
+                positions INT DEFAULT 0,
+                krw_rate DECIMAL(10, 2)
+            )
+            """
+            cursor.execute(sql_equity)
+
             # --- Seed Initial Data ---
             # Seed Managed Stocks
             initial_stocks = [
@@ -527,53 +723,37 @@ def get_user_requests():
         conn.close()
 
 
-def save_signal(signal_data):
-    """Save a detected signal to DB"""
-    conn = get_connection()
+def save_signal(signal_data, critical=False):
+    """Save a detected signal to DB (write-behind; critical=True commits before returning)"""
     try:
         # Convert pandas Timestamp to python datetime if needed
         st = signal_data['signal_time_raw']
         if hasattr(st, 'to_pydatetime'):
             st = st.to_pydatetime()
-            
-        with conn.cursor() as cursor:
-            sql = """
-            INSERT INTO signal_history (ticker, name, signal_type, signal_reason, position_desc, price, signal_time, time_kst, time_ny, is_sent, score, interpretation)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            cursor.execute(sql, (
-                signal_data['ticker'],
-                signal_data['name'],
-                signal_data['signal_type'],
-                signal_data.get('signal_reason', ''),  # 신호 발생 이유
-                signal_data['position'],
-                signal_data['current_price'],
-                st, 
-                signal_data.get('time_kst', ''),  # 한국시간
-                signal_data.get('time_ny', ''),   # 미국시간
-                signal_data.get('is_sent', False),
-                signal_data.get('score', 0),
-                signal_data.get('interpretation', '')
-            ))
-        conn.commit()
+
+        write_behind.enqueue("signal_history", (
+            signal_data['ticker'],
+            signal_data['name'],
+            signal_data['signal_type'],
+            signal_data.get('signal_reason', ''),  # 신호 발생 이유
+            signal_data['position'],
+            signal_data['current_price'],
+            st,
+            signal_data.get('time_kst', ''),  # 한국시간
+            signal_data.get('time_ny', ''),   # 미국시간
+            signal_data.get('is_sent', False),
+            signal_data.get('score', 0),
+            signal_data.get('interpretation', '')
+        ), critical=critical)
+        # Recorded on enqueue so de-dup sees the signal before the batch is flushed
+        notify_index.record_signal(signal_data['ticker'], signal_data['signal_type'], signal_data['position'], st)
+        bar_trigger.mark("saved")
     except Exception as e:
         print(f"Save Signal Error: {e}")
-        # Re-raise to ensure calling logic knows it failed, or handle gracefully?
-        # If we silence it, SMS might send but DB empty. Let's print and pass for now to allow SMS to proceed if DB is flaky, 
-        # BUT user complained about missing history. Let's log heavily.
-    finally:
-        conn.close()
 
 def check_last_signal(ticker):
-    """Get the last saved signal for a ticker to prevent duplicates"""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cursor:
-            sql = "SELECT * FROM signal_history WHERE ticker=%s ORDER BY signal_time DESC LIMIT 1"
-            cursor.execute(sql, (ticker,))
-            return cursor.fetchone()
-    finally:
-        conn.close()
+    """Get the last saved signal for a ticker to prevent duplicates (served from notify_index)"""
+    return notify_index.last_signal(ticker)
 
 def get_signals(ticker=None, start_date=None, end_date=None, limit=30):
     """Fetch signal history with filtering"""
@@ -600,12 +780,33 @@ def get_signals(ticker=None, start_date=None, end_date=None, limit=30):
     finally:
         conn.close()
 
+def get_latest_signal_id():
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT MAX(id) AS id FROM signal_history")
+            row = cursor.fetchone()
+            return (row or {}).get('id') or 0
+    finally:
+        conn.close()
+
+def get_signals_after(last_id, limit=200):
+    """signal_history rows with id > last_id, oldest first (SSE 'signal' push)"""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT * FROM signal_history WHERE id > %s ORDER BY id LIMIT %s", (int(last_id), int(limit)))
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
 def delete_signal(id):
     conn = get_connection()
     try:
         with conn.cursor() as cursor:
             cursor.execute("DELETE FROM signal_history WHERE id=%s", (id,))
         conn.commit()
+        notify_index.reset()
         return True
     finally:
         conn.close()
@@ -616,10 +817,12 @@ def delete_all_signals():
         with conn.cursor() as cursor:
             cursor.execute("DELETE FROM signal_history")
         conn.commit()
+        notify_index.reset()
         return True
     finally:
         conn.close()
 
+@metrics.timed("db_write", op="save_sms_log")
 def save_sms_log(receiver, message, status):
     """Save SMS send log"""
     conn = get_connection()
@@ -628,6 +831,7 @@ def save_sms_log(receiver, message, status):
             sql = "INSERT INTO sms_logs (receiver, message, status) VALUES (%s, %s, %s)"
             cursor.execute(sql, (receiver, message, status))
         conn.commit()
+        notify_index.record_sms(message)
     finally:
         conn.close()
 
@@ -648,6 +852,7 @@ def delete_sms_log(id):
         with conn.cursor() as cursor:
             cursor.execute("DELETE FROM sms_logs WHERE id=%s", (id,))
         conn.commit()
+        notify_index.reset()
         return True
     finally:
         conn.close()
@@ -658,39 +863,68 @@ def delete_all_sms_logs():
         with conn.cursor() as cursor:
             cursor.execute("DELETE FROM sms_logs")
         conn.commit()
+        notify_index.reset()
         return True
     finally:
         conn.close()
 
-def check_recent_sms_log(stock_name, signal_type, timeframe_minutes=30):
-    """Check if a similar SMS was sent recently"""
+@metrics.timed("db_write", op="add_sms_outbox")
+def add_sms_outbox(items):
+    """Queue messages in sms_outbox: items = [(receiver, message)] -> ids"""
     conn = get_connection()
     try:
+        ids = []
         with conn.cursor() as cursor:
-            # Check for messages containing the stock name AND signal type within timeframe
-            # Note: signal_type from logic ('매수 진입' etc) might differ slightly from message format, but usually consistent.
-            # Message format: [...][stock_name][signal_type]...
-            
-            # Using LIKE query
-            sql = """
-            SELECT id, created_at FROM sms_logs 
-            WHERE message LIKE %s AND message LIKE %s 
-            AND created_at >= NOW() - INTERVAL %s MINUTE
-            LIMIT 1
-            """
-            # Add brackets to match exact format in SMS function
-            like_stock = f"%[{stock_name}]%"
-            # Simplify signal type matching (e.g. just "매수" or "매도") to catch broader duplicates? 
-            # User said: "Same stock and status(buy/sell)". 
-            # 'signal_type' passed here is usually '매수 진입' or 'box_upper'.
-            # Let's use the exact string passed to the SMS function logic.
-            like_type = f"%[{signal_type}]%"
-            
-            cursor.execute(sql, (like_stock, like_type, int(timeframe_minutes)))
-            return cursor.fetchone()
+            for receiver, message in items:
+                cursor.execute("INSERT INTO sms_outbox (receiver, message, status, next_attempt_at) "
+                               "VALUES (%s, %s, 'PENDING', NOW())", (receiver, message))
+                ids.append(cursor.lastrowid)
+        conn.commit()
+        return ids
     finally:
         conn.close()
 
+def get_due_sms_outbox(limit=50):
+    """PENDING outbox rows whose retry time has come (oldest first)"""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id, receiver, message, attempts FROM sms_outbox "
+                           "WHERE status='PENDING' AND next_attempt_at <= NOW() ORDER BY id LIMIT %s", (int(limit),))
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+@metrics.timed("db_write", op="update_sms_outbox")
+def update_sms_outbox(updates):
+    """updates = [(id, status, attempts, next_attempt_at, last_error)]; SENT rows get sent_at"""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.executemany("UPDATE sms_outbox SET status=%s, attempts=%s, next_attempt_at=%s, last_error=%s, "
+                               "sent_at=CASE WHEN %s='SENT' THEN NOW() ELSE sent_at END WHERE id=%s",
+                               [(st, att, nxt, (err or '')[:255] or None, st, i) for i, st, att, nxt, err in updates])
+        conn.commit()
+    finally:
+        conn.close()
+
+def get_sms_outbox_summary():
+    """{status: count} plus the last failed rows"""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT status, COUNT(*) AS cnt FROM sms_outbox GROUP BY status")
+            counts = {r['status']: int(r['cnt']) for r in cursor.fetchall()}
+            cursor.execute("SELECT id, message, attempts, last_error, created_at FROM sms_outbox "
+                           "WHERE status='FAILED' ORDER BY id DESC LIMIT 10")
+            return counts, cursor.fetchall()
+    finally:
+        conn.close()
+
+def check_recent_sms_log(stock_name, signal_type, timeframe_minutes=30):
+    """Check if a similar SMS ([stock_name] and [signal_type] in the message) was sent recently"""
+    return notify_index.seen_sms(stock_name, signal_type, timeframe_minutes)
+
 
 
 # --- Stock Management ---
@@ -876,7 +1110,9 @@ def add_transaction(ticker_or_data, trade_type=None, qty=None, price=None, trade
             VALUES (%s, %s, %s, %s, COALESCE(%s, NOW()), %s)
             """
             cursor.execute(sql, (ticker, trade_type, qty, price, trade_date, memo))
+            txn_id = cursor.lastrowid
             conn.commit()
+        lot_ledger.refresh(txn_id)
     except Exception as e:
         print(f"Insert Transaction Error: {e}")
     finally:
@@ -889,6 +1125,25 @@ def add_transaction(ticker_or_data, trade_type=None, qty=None, price=None, trade
         qty_change = qty if trade_type == 'BUY' else -qty
         return update_holding(ticker, qty_change, price, memo, is_reset=False)
 
+def get_journal_transactions():
+    """All journal_transactions rows (lot ledger input)"""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id, ticker, trade_type, qty, price, trade_date FROM journal_transactions")
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+def get_journal_transaction(id):
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id, ticker, trade_type, qty, price, trade_date FROM journal_transactions WHERE id=%s", (id,))
+            return cursor.fetchone()
+    finally:
+        conn.close()
+
 def update_transaction(id, data):
     # Backward compatibility: For now, we just update journal_transactions log.
     # Recalculating holdings from history is complex.
@@ -911,6 +1166,7 @@ def update_transaction(id, data):
                 id
             ))
         conn.commit()
+        lot_ledger.refresh(id)
         return True
     except Exception as e:
         print(f"Update Transaction Error: {e}")
@@ -924,6 +1180,7 @@ def delete_transaction(id):
         with conn.cursor() as cursor:
             cursor.execute("DELETE FROM journal_transactions WHERE id=%s", (id,))
         conn.commit()
+        lot_ledger.remove(id)
         return True
     except Exception as e:
         print(f"Delete Transaction Error: {e}")
@@ -980,39 +1237,6 @@ def update_holding(ticker, qty_change_or_new_qty, price, memo=None, is_reset=Fal
         return False, str(e)
     finally:
         conn.close()
-    conn = get_connection()
-    try:
-        with conn.cursor() as cursor:
-            sql = """
-            UPDATE journal_transactions 
-            SET ticker=%s, trade_type=%s, qty=%s, price=%s, trade_date=%s, memo=%s
-            WHERE id=%s
-            """
-            cursor.execute(sql, (
-                data['ticker'],
-                data['trade_type'],
-                data['qty'],
-                data['price'],
-                data['trade_date'],
-                data.get('memo', ''),
-                id
-            ))
-        conn.commit()
-        return True
-    finally:
-        conn.close()
-
-        conn.close()
-
-def delete_transaction(id):
-    conn = get_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute("DELETE FROM journal_transactions WHERE id=%s", (id,))
-        conn.commit()
-        return True
-    finally:
-        conn.close()
 
 # --- Cheongan 2.0 Helpers ---
 
@@ -1120,6 +1344,48 @@ def delete_managed_stock(id):
     finally:
         conn.close()
 
+def get_valuation_holdings():
+    """Open positions for mark-to-market (equity_curve)"""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT ticker, quantity, avg_price, current_price, currency FROM managed_stocks WHERE quantity > 0")
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+def add_equity_point(p):
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO equity_curve (ts, equity_usd, cash_usd, exposure_usd, cost_usd, positions, krw_rate)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE equity_usd=VALUES(equity_usd), cash_usd=VALUES(cash_usd),
+                    exposure_usd=VALUES(exposure_usd), cost_usd=VALUES(cost_usd),
+                    positions=VALUES(positions), krw_rate=VALUES(krw_rate)
+            """, (p['ts'], p['equity_usd'], p['cash_usd'], p['exposure_usd'], p['cost_usd'], p['positions'], p['krw_rate']))
+        conn.commit()
+    finally:
+        conn.close()
+
+def get_equity_points(start=None, end=None):
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            sql = "SELECT ts, equity_usd, cash_usd, exposure_usd, cost_usd, positions, krw_rate FROM equity_curve WHERE 1=1"
+            params = []
+            if start:
+                sql += " AND ts >= %s"
+                params.append(start)
+            if end:
+                sql += " AND ts <= %s"
+                params.append(end)
+            cursor.execute(sql + " ORDER BY ts", params)
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
 def get_total_capital():
     conn = get_connection()
     try:
@@ -1150,19 +1416,33 @@ def set_total_capital(amount):
     finally:
         conn.close()
 
+# {date: digest} of the last market_status write (skip identical rewrites)
+_MARKET_STATUS_DIGEST = {}
+
+@metrics.timed("db_write", op="update_market_status")
 def update_market_status(regime, details):
+    """market_status upsert. Skipped when regime/details (except timestamp) are unchanged."""
+    import hashlib
+    from report_store import dumps
+    date_str = datetime.now().strftime("%Y-%m-%d")
+    stable = {k: v for k, v in details.items() if k != 'timestamp'} if isinstance(details, dict) else details
+    digest = hashlib.md5(regime.encode('utf-8') + dumps(stable)).hexdigest()
+    if _MARKET_STATUS_DIGEST.get(date_str) == digest:
+        return
+
+    payload = dumps(details)
     conn = get_connection()
     try:
-        import json
-        date_str = datetime.now().strftime("%Y-%m-%d")
         with conn.cursor() as cursor:
             sql = """
             INSERT INTO market_status (date, regime, details)
             VALUES (%s, %s, %s)
             ON DUPLICATE KEY UPDATE regime=VALUES(regime), details=VALUES(details)
             """
-            cursor.execute(sql, (date_str, regime, json.dumps(details)))
+            cursor.execute(sql, (date_str, regime, payload.decode('utf-8')))
         conn.commit()
+        _MARKET_STATUS_DIGEST.clear()
+        _MARKET_STATUS_DIGEST[date_str] = digest
     finally:
         conn.close()
 
@@ -1233,6 +1513,7 @@ def get_global_config(key_name, default=None):
     finally:
         conn.close()
 
+@metrics.timed("db_write", op="set_global_config")
 def set_global_config(key_name, value):
     """Save JSON config to global_config table"""
     conn = get_connection()
@@ -1383,6 +1664,7 @@ def get_last_candle_time(ticker, timeframe):
         print(f"Error getting last candle time: {e}")
         return None
 
+@metrics.timed("db_write", op="save_market_candles")
 def save_market_candles(ticker, timeframe, df, source='yfinance'):
     """Save DataFrame to market_candles table (Upsert)"""
     import pandas as pd
@@ -1517,31 +1799,34 @@ def init_system_trade_table():
     finally:
         conn.close()
 
+_SYSTEM_TRADE_SUMMARY_SQL = """
+    INSERT INTO system_trade_summary
+    (ticker, last_trade_id, last_type, last_price, last_trade_time, last_buy_price,
+     trades, wins, returns_n, sum_return, peak_return, max_drawdown)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE last_trade_id=VALUES(last_trade_id), last_type=VALUES(last_type),
+        last_price=VALUES(last_price), last_trade_time=VALUES(last_trade_time),
+        last_buy_price=VALUES(last_buy_price), trades=VALUES(trades), wins=VALUES(wins),
+        returns_n=VALUES(returns_n), sum_return=VALUES(sum_return), peak_return=VALUES(peak_return),
+        max_drawdown=VALUES(max_drawdown)
+"""
+
 def log_system_trade(trade_data):
     """
     Log a system trade (Buy/Sell)
     trade_data: {ticker, trade_type, price, trade_time, strategy_note}
-    Atomic transaction to ensure Buy/Sell sequence? 
-    Logic handled in app layer, this just inserts.
+    SELL profit is measured against the last BUY held in trade_stats (no lookup query);
+    the trade and the updated system_trade_summary rows commit together.
     """
+    import trade_stats
+    trade_stats.warm()
     conn = get_connection()
     try:
+        profit_pct, realized_pl = None, None
+        if trade_data['trade_type'] == 'SELL':
+            profit_pct, realized_pl = trade_stats.sell_profit(trade_data['ticker'], trade_data['price'])
+
         with conn.cursor() as cursor:
-            # If SELL, calculate profit based on last BUY
-            profit_pct = None
-            realized_pl = None
-            
-            if trade_data['trade_type'] == 'SELL':
-                # Find last OPEN BUY
-                # Simple logic: Find last transaction. If BUY, calculate.
-                cursor.execute("SELECT price FROM system_trades WHERE ticker=%s AND trade_type='BUY' ORDER BY trade_time DESC LIMIT 1", (trade_data['ticker'],))
-                last_buy = cursor.fetchone()
-                if last_buy:
-                    buy_price = float(last_buy['price'])
-                    sell_price = float(trade_data['price'])
-                    profit_pct = ((sell_price - buy_price) / buy_price) * 100
-                    realized_pl = sell_price - buy_price # Per unit
-            
             sql = """
             INSERT INTO system_trades (ticker, trade_type, price, trade_time, profit_pct, realized_pl, strategy_note)
             VALUES (%s, %s, %s, %s, %s, %s, %s)
@@ -1555,7 +1840,15 @@ def log_system_trade(trade_data):
                 realized_pl,
                 trade_data.get('strategy_note', '')
             ))
+            row = {"id": cursor.lastrowid, "ticker": trade_data['ticker'], "trade_type": trade_data['trade_type'],
+                   "price": trade_data['price'], "trade_time": trade_data['trade_time'],
+                   "profit_pct": round(profit_pct, 2) if profit_pct is not None else None,
+                   "realized_pl": round(realized_pl, 2) if realized_pl is not None else None,
+                   "strategy_note": trade_data.get('strategy_note', '')}
+            states = trade_stats.preview(row)
+            cursor.executemany(_SYSTEM_TRADE_SUMMARY_SQL, [s.to_row() for s in states])
         conn.commit()
+        trade_stats.commit(states)
         return True
     except Exception as e:
         print(f"Log System Trade Error: {e}")
@@ -1574,160 +1867,123 @@ def get_system_trade_history(limit=50):
         conn.close()
 
 def get_last_system_trade(ticker):
+    """Last system trade for ticker (memory, see trade_stats)"""
+    import trade_stats
+    return trade_stats.last_trade(ticker)
+
+def get_system_performance_summary():
+    """Win Rate / Avg / Total Return (+ max drawdown) over closed system trades, O(1) from trade_stats"""
+    import trade_stats
+    return trade_stats.summary()
+
+def get_system_trade_summaries():
     conn = get_connection()
     try:
         with conn.cursor() as cursor:
-            sql = "SELECT * FROM system_trades WHERE ticker=%s ORDER BY trade_time DESC LIMIT 1"
-            cursor.execute(sql, (ticker,))
-            return cursor.fetchone()
+            cursor.execute("SELECT * FROM system_trade_summary")
+            return cursor.fetchall()
     finally:
         conn.close()
 
-def get_system_performance_summary():
-    """Calculate Win Rate and Total Return from system_trades"""
+def get_system_trades_after(trade_id):
+    """system_trades rows with id > trade_id in insert order (summary catch-up)"""
     conn = get_connection()
     try:
         with conn.cursor() as cursor:
-            # Win Rate
-            sql_win = """
-            SELECT 
-                COUNT(*) as total_trades,
-                SUM(CASE WHEN profit_pct > 0 THEN 1 ELSE 0 END) as wins
-            FROM system_trades 
-            WHERE trade_type = 'SELL'
-            """
-            cursor.execute(sql_win)
-            win_stats = cursor.fetchone()
-            
-            # Avg Return & Total
-            sql_ret = "SELECT AVG(profit_pct) as avg_return, SUM(profit_pct) as total_return FROM system_trades WHERE trade_type = 'SELL'"
-            cursor.execute(sql_ret)
-            ret_stats = cursor.fetchone()
-            
-            return {
-                "total_trades": win_stats['total_trades'],
-                "wins": win_stats['wins'],
-                "win_rate": (win_stats['wins'] / win_stats['total_trades'] * 100) if win_stats['total_trades'] > 0 else 0,
-                "avg_return": ret_stats['avg_return'] or 0,
-                "total_return": ret_stats['total_return'] or 0
-            }
+            cursor.execute("SELECT id, ticker, trade_type, price, trade_time, profit_pct FROM system_trades "
+                           "WHERE id > %s ORDER BY id", (int(trade_id),))
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+@metrics.timed("db_write", op="upsert_system_trade_summary")
+def upsert_system_trade_summary(rows):
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.executemany(_SYSTEM_TRADE_SUMMARY_SQL, rows)
+        conn.commit()
     finally:
         conn.close()
 
 
+@metrics.timed("db_write", op="update_stock_prices")
 def update_stock_prices():
     """
     종목관리에 등록된 모든 종목의 현재가를 업데이트
-    - KIS API 사용하여 실시간 가격 조회
+    - quote_service로 KIS / yfinance 동시 조회 후 합의 가격 사용 (느린 소스는 deadline에서 제외)
+    - 시세 조회는 DB 연결 밖에서 수행, 결과는 UPDATE ... CASE 한 번으로 일괄 반영
     - 수동 입력값(is_manual_price=TRUE)은 업데이트 제외
-    - 휴장일 감지 및 is_market_open 플래그 설정
     """
-    from datetime import datetime
-    from kis_api import get_current_price, get_exchange_code
+    import time
+    from kis_api import get_exchange_code
+    from quote_service import get_quotes
     
+    t0 = time.perf_counter()
     try:
+        # 1. 대상 종목 조회 (짧은 연결)
         with get_connection() as conn:
             with conn.cursor() as cursor:
-                # 자동 업데이트 대상 종목 조회 (수동 입력 제외)
-                sql = """
+                cursor.execute("""
                     SELECT ticker, name, exchange, is_manual_price
                     FROM managed_stocks 
                     WHERE is_active = TRUE
-                """
-                cursor.execute(sql)
+                """)
                 rows = cursor.fetchall()
                 
-                if not rows:
-                    print("⚠️ 등록된 종목이 없습니다")
-                    return False
-                
-                print(f"📊 {len(rows)}개 종목 현재가 업데이트 시작 (KIS -> YF Fallback)...")
-                
-                updated_count = 0
-                skipped_count = 0
-                failed_count = 0
-                
-                import yfinance as yf # Lazy import
-                
-                for row in rows:
-                    ticker = row['ticker']
-                    name = row['name']
-                    exchange = row.get('exchange')
-                    is_manual = row.get('is_manual_price', False)
-                    
-                    # 수동 입력값은 보호
-                    if is_manual:
-                        print(f"  ⏭️ {ticker} - 수동 입력값 유지")
-                        skipped_count += 1
-                        continue
-                    
-                    try:
-                        # 거래소 코드 자동 감지
-                        if not exchange:
-                            exchange = get_exchange_code(ticker)
-                        
-                        current_price = 0
-                        is_market_open = False
-                        source = "None"
-
-                        # 1. KIS API로 현재가 조회
-                        # print(f"  🔍 {ticker} ({exchange}) 조회 중... (KIS)")
-                        price_data = get_current_price(ticker, exchange)
-                        
-                        if price_data and price_data.get('price', 0) > 0:
-                            current_price = price_data['price']
-                            is_market_open = price_data.get('is_open', True)
-                            source = "KIS"
-                        else:
-                            # 2. Skip fallback for SOXS/SOXL? No, user wants ALL.
-                            # Fallback to YFinance (Extended Hours)
-                            # print(f"  ⚠️ KIS Failed for {ticker}. Trying YF...")
-                            try:
-                                t = yf.Ticker(ticker)
-                                # Get fast info first
-                                fast_info = t.fast_info
-                                last_price = fast_info.last_price
-                                
-                                # Check Pre/Post market if available
-                                # yfinance often needs history(period="1d", interval="1m", prepost=True) to see latest
-                                df = t.history(period="1d", interval="1m", prepost=True)
-                                if not df.empty:
-                                    last_price = float(df['Close'].iloc[-1])
-                                    source = "YF(Ext)"
-                                else:
-                                    source = "YF(Fast)" # Fallback to last close
-                                
-                                if last_price > 0:
-                                    current_price = last_price
-                                    is_market_open = True # Assume open if we got data? Or derived path.
-                            except Exception as ey:
-                                print(f"  ❌ YF Fallback Failed: {ey}")
-                        
-                        if current_price > 0:
-                            # 현재가 업데이트
-                            update_sql = """
-                                UPDATE managed_stocks 
-                                SET current_price = %s, 
-                                    price_updated_at = NOW(),
-                                    is_market_open = %s
-                                WHERE ticker = %s
-                            """
-                            cursor.execute(update_sql, (current_price, is_market_open, ticker))
-                            conn.commit() # Commit per row to ensure partial success
-                            updated_count += 1
-                            print(f"  ✅ {ticker}: ${current_price:,.2f} ({source})")
-                        else:
-                            print(f"  ❌ {ticker}: 가격 조회 실패")
-                            failed_count += 1
-
-                    except Exception as e:
-                        print(f"  ❌ {ticker} 업데이트 오류: {e}")
-                        failed_count += 1
-                        continue
-                
+        if not rows:
+            print("⚠️ 등록된 종목이 없습니다")
+            return False
+        
+        # 수동 입력값은 보호
+        auto = [r for r in rows if not r.get('is_manual_price', False)]
+        skipped_count = len(rows) - len(auto)
+        print(f"📊 {len(rows)}개 종목 현재가 업데이트 시작 (KIS + YF consensus, 수동 {skipped_count}개 제외)...")
+        
+        # 2. 시세 조회: DB 연결 없이 소스별 병렬 (deadline 적용)
+        t_fetch = time.perf_counter()
+        quotes = get_quotes([r['ticker'] for r in auto],
+                            exchanges={r['ticker']: r.get('exchange') or get_exchange_code(r['ticker']) for r in auto})
+        fetch_ms = (time.perf_counter() - t_fetch) * 1000
+        
+        updates = []
+        for row in auto:
+            ticker = row['ticker']
+            quote = quotes.get(ticker)
+            if quote and quote.get('price', 0) > 0:
+                updates.append((ticker, float(quote['price'])))
+                print(f"  ✅ {ticker}: ${quote['price']:,.2f} ({quote['source']}/{quote['consensus']})")
+            else:
+                print(f"  ❌ {ticker}: 가격 조회 실패")
+        failed_count = len(auto) - len(updates)
+        
+        # 3. 일괄 UPDATE (한 문장, 한 번 커밋)
+        if updates:
+            cases = " ".join(["WHEN %s THEN %s"] * len(updates))
+            sql = f"""
+                UPDATE managed_stocks 
+                SET current_price = CASE ticker {cases} ELSE current_price END,
+                    price_updated_at = NOW(),
+                    is_market_open = TRUE
+                WHERE ticker IN ({", ".join(["%s"] * len(updates))})
+            """
+            params = [v for pair in updates for v in pair] + [t for t, _ in updates]
+            with get_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(sql, params)
                 conn.commit()
-                print(f"\n✅ 업데이트 완료: {updated_count}개 성공, {skipped_count}개 스킵(수동), {failed_count}개 실패")
-                return True
+        
+        # 4. 보유 종목 평가 (equity curve 기록)
+        try:
+            from equity_curve import revalue
+            revalue()
+        except Exception as e:
+            print(f"Equity Revalue Error: {e}")
+
+        total_ms = (time.perf_counter() - t0) * 1000
+        print(f"\n✅ 업데이트 완료: {len(updates)}개 성공, {skipped_count}개 스킵(수동), {failed_count}개 실패 "
+              f"({total_ms:.0f}ms, 시세 조회 {fetch_ms:.0f}ms)")
+        return True
                 
     except Exception as e:
         print(f"❌ 현재가 업데이트 오류: {e}")
@@ -1848,34 +2104,25 @@ def get_trade_history(limit=50):
 
 # --- Cheongan V2 Helper Functions ---
 
-def log_history(manage_id, ticker, event_type, msg=None, price=None):
-    """이벤트/신호 이력을 history 테이블에 저장 (30분 내 중복 방지)"""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cursor:
-            # 30분 이내 동일한 이벤트(ticker, event_type, msg)가 있는지 확인
-            check_sql = """
-                SELECT event_dt FROM history 
-                WHERE ticker=%s AND event_type=%s AND short_msg=%s 
-                AND event_dt > NOW() - INTERVAL '30 minutes'
-                LIMIT 1
-            """
-            cursor.execute(check_sql, (ticker, event_type, msg))
-            if cursor.fetchone():
-                return True # 중복 기록 방지 (성공으로 처리)
-
-            sql = """
-                INSERT INTO history (manage_id, ticker, event_type, short_msg, event_price, event_dt) 
-                VALUES (%s, %s, %s, %s, %s, NOW())
-            """
-            cursor.execute(sql, (manage_id, ticker, event_type, msg, price))
-        conn.commit()
-        return True
+_recent_history = {}   # (ticker, event_type, msg) -> last logged epoch (30분 중복 방지)
+
+def log_history(manage_id, ticker, event_type, msg=None, price=None, critical=False):
+    """이벤트/신호 이력을 history 테이블에 저장 (30분 내 중복 방지, write-behind)"""
+    now = datetime.now()
+    key = (ticker, event_type, msg)
+    ts = now.timestamp()
+    if ts - _recent_history.get(key, 0) < 30 * 60:
+        return True  # 중복 기록 방지 (성공으로 처리)
+    try:
+        for k in [k for k, v in _recent_history.items() if ts - v >= 30 * 60]:
+            del _recent_history[k]
+        _recent_history[key] = ts
+        ok = write_behind.enqueue("history", (manage_id, ticker, event_type, msg, price, now), critical=critical)
+        bar_trigger.mark("saved")
+        return ok
     except Exception as e:
         print(f"Log History Error: {e}")
         return False
-    finally:
-        conn.close()
 
 def get_v2_buy_status(ticker):
     """현재 진행 중인 매수 신호 상태 조회 (최신 1건)"""
@@ -1892,6 +2139,7 @@ def get_v2_buy_status(ticker):
     finally:
         conn.close()
 
+@metrics.timed("db_write", op="save_v2_buy_signal")
 def save_v2_buy_signal(manage_id, ticker, signal_type, price):
     """매수 신호 단계별 업데이트 (1차, 2차, 3차)"""
     # signal_type: 'sig1', 'sig2', 'sig3', 'final'
@@ -1948,6 +2196,7 @@ def get_v2_sell_status(ticker):
     finally:
         conn.close()
 
+@metrics.timed("db_write", op="create_v2_sell_record")
 def create_v2_sell_record(manage_id, ticker, entry_price):
     """최종 진입 확정 시 sell_stock 레코드 생성"""
     conn = get_connection()
@@ -1966,6 +2215,7 @@ def create_v2_sell_record(manage_id, ticker, entry_price):
     finally:
         conn.close()
 
+@metrics.timed("db_write", op="save_v2_buy_signal")
 def save_v2_buy_signal(manage_id, signal_type, price):
     """매수 신호 단계별 업데이트"""
     conn = get_connection()
@@ -1992,6 +2242,7 @@ def save_v2_buy_signal(manage_id, signal_type, price):
     finally:
         conn.close()
 
+@metrics.timed("db_write", op="save_v2_sell_signal")
 def save_v2_sell_signal(manage_id, signal_type, price):
     """청산 신호 단계별 업데이트"""
     conn = get_connection()
@@ -2116,6 +2367,7 @@ def confirm_v2_sell(ticker, price, qty, is_end=False):
     finally:
         conn.close()
 
+@metrics.timed("db_write", op="manual_update_signal")
 def manual_update_signal(ticker, signal_key, price, status='Y'):
     """
     수동으로 신호 상태 변경 (1차, 2차, 3차)
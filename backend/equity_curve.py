@@ -0,0 +1,122 @@
+"""
+Equity Curve
+Mark-to-market portfolio value after every price update. Holdings
+(managed_stocks qty / avg / current price) are revalued as numpy arrays and one
+compact point is appended to equity_curve:
+
+  cost      = Σ qty × avg_price                 (capital tied up in positions)
+  exposure  = Σ qty × current_price             (market value of positions)
+  cash      = total_capital − cost
+  equity    = cash + exposure                   (= capital + unrealized P&L)
+
+Amounts are stored in USD with the KRW=X rate of that moment (market_indices),
+so both currencies can be served. KRW-priced holdings are converted at that rate.
+Points identical to the previous one are skipped for up to IDLE_KEEP_SEC (market
+closed), keeping the series compact.
+
+Usage:
+  revalue()                                         # after update_stock_prices
+  query(start="2026-01-01", points=300)             # downsampled for charts
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+DEFAULT_KRW = 1460.0     # same fallback as generate_trade_guidelines
+IDLE_KEEP_SEC = 3600     # unchanged points are still written once an hour
+MAX_POINTS = 2000
+
+_state = {"last": None, "last_at": 0.0}
+
+
+def value_holdings(qty, price, avg, is_krw, krw_rate):
+    """Vectorized revaluation -> (exposure_usd, cost_usd) for arrays of positions"""
+    fx = np.where(is_krw, 1.0 / krw_rate, 1.0)
+    return float(np.dot(qty, price * fx)), float(np.dot(qty, avg * fx))
+
+
+def _krw_rate(indices):
+    for r in indices or []:
+        if r.get('ticker') == 'KRW=X' and r.get('current_price'):
+            return float(r['current_price'])
+    return DEFAULT_KRW
+
+
+@metrics.timed("equity_revalue")
+def revalue(now=None):
+    """Revalue holdings at current prices and append a point -> point dict (None when skipped)"""
+    from db import get_valuation_holdings, get_market_indices, get_total_capital, add_equity_point
+    rows = get_valuation_holdings()
+    krw_rate = _krw_rate(get_market_indices())
+    capital = float(get_total_capital())
+
+    if rows:
+        qty = np.array([float(r['quantity'] or 0) for r in rows])
+        avg = np.array([float(r['avg_price'] or 0) for r in rows])
+        price = np.array([float(r['current_price'] or 0) for r in rows])
+        price = np.where(price > 0, price, avg)          # no quote yet -> carry at cost
+        is_krw = np.array([(r.get('currency') or 'USD').upper() == 'KRW' for r in rows])
+        exposure, cost = value_holdings(qty, price, avg, is_krw, krw_rate)
+    else:
+        exposure = cost = 0.0
+
+    cash = capital - cost
+    point = {"ts": (now or datetime.now()).replace(microsecond=0),
+             "equity_usd": round(cash + exposure, 2), "cash_usd": round(cash, 2),
+             "exposure_usd": round(exposure, 2), "cost_usd": round(cost, 2),
+             "positions": len(rows), "krw_rate": round(krw_rate, 2)}
+
+    key = tuple(v for k, v in point.items() if k != "ts")
+    if key == _state["last"] and time.time() - _state["last_at"] < IDLE_KEEP_SEC:
+        return None
+    add_equity_point(point)
+    _state.update(last=key, last_at=time.time())
+    metrics.set_gauge("equity_usd", point["equity_usd"])
+    return point
+
+
+def _with_krw(df):
+    for col in ("equity", "cash", "exposure"):
+        df[f"{col}_krw"] = (df[f"{col}_usd"] * df["krw_rate"]).round(0)
+    return df
+
+
+def query(start=None, end=None, points=500):
+    """Equity points in [start, end] (local time), downsampled to at most `points` buckets.
+    Each bucket reports the last values plus the equity low/high inside it."""
+    from db import get_equity_points
+    if end and len(end) == 10:
+        end = f"{end} 23:59:59"
+    points = max(10, min(int(points), MAX_POINTS))
+    rows = get_equity_points(start, end)
+    if not rows:
+        return {"points": [], "raw_count": 0, "bucket_sec": 0}
+
+    df = pd.DataFrame(rows)
+    df["ts"] = pd.to_datetime(df["ts"])
+    for col in ("equity_usd", "cash_usd", "exposure_usd", "cost_usd", "krw_rate"):
+        df[col] = df[col].astype(float)
+    df = df.set_index("ts").sort_index()
+
+    span = (df.index[-1] - df.index[0]).total_seconds()
+    bucket_sec = 0
+    if len(df) > points and span > 0:
+        bucket_sec = int(np.ceil(span / points))
+        grouped = df.resample(timedelta(seconds=bucket_sec))
+        low, high = grouped["equity_usd"].min(), grouped["equity_usd"].max()
+        df = grouped.last().dropna(subset=["equity_usd"])
+        df["equity_low_usd"], df["equity_high_usd"] = low.loc[df.index], high.loc[df.index]
+    else:
+        df["equity_low_usd"] = df["equity_high_usd"] = df["equity_usd"]
+
+    df["positions"] = df["positions"].astype(int)
+    df = _with_krw(df)
+    df["exposure_pct"] = np.where(df["equity_usd"] > 0, df["exposure_usd"] / df["equity_usd"] * 100, 0).round(2)
+    df = df.reset_index()
+    df["ts"] = df["ts"].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return {"points": df.to_dict("records"), "raw_count": len(rows), "bucket_sec": bucket_sec}
@@ -0,0 +1,123 @@
+"""
+Indicator Store
+market_indicators_log holds one row per (ticker, candle_time), upserted by the
+write-behind buffer only when the values change. This module rolls those rows
+up into market_indicators_rollup at 5m / 30m / 1d resolution (last value per
+bucket plus RSI range, max volume ratio and sample count) and serves range
+queries over either level for charts and backtests.
+
+Roll-ups are recomputed from the raw rows of the last ROLLUP_DAYS days, so a
+run is idempotent and a restart never leaves partial buckets behind.
+
+Usage:
+  rollup()                                          # scheduler, every 5 min
+  rollup(days=90)                                   # one-off backfill
+  query("SOXL", "30m", start="2026-01-02", end="2026-01-09")
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import market_calendar as mcal
+import metrics
+
+ROLLUPS = {"5m": 5, "30m": 30, "1d": 1440}   # timeframe -> bucket minutes
+TIMEFRAMES = ("raw",) + tuple(ROLLUPS)
+ROLLUP_DAYS = 2
+QUERY_TTL = 60           # seconds a range result is reused (cleared by rollup)
+MAX_LIMIT = 5000
+
+_lock = threading.Lock()
+_cache = {}              # (ticker, tf, start, end, limit) -> (ts, rows)
+_state = {"last_run": None, "last_rows": 0}
+
+
+def bucket_start(t, timeframe):
+    """Start of the bucket containing t (naive NY datetime)"""
+    if timeframe == "1d":
+        return datetime.combine(t.date(), datetime.min.time())
+    size = ROLLUPS[timeframe]
+    return t.replace(minute=t.minute - t.minute % size, second=0, microsecond=0)
+
+
+def _num(v):
+    return float(v) if v is not None else None
+
+
+def _aggregate(rows):
+    """Raw rows (sorted by ticker, candle_time) -> roll-up row tuples for every timeframe"""
+    buckets = {}
+    for r in rows:
+        for tf in ROLLUPS:
+            key = (r['ticker'], tf, bucket_start(r['candle_time'], tf))
+            b = buckets.get(key)
+            rsi, vr = _num(r['rsi_14']), _num(r['vol_ratio'])
+            if b is None:
+                buckets[key] = b = {"rsi_min": rsi, "rsi_max": rsi, "vr_max": vr, "samples": 0}
+            else:
+                if rsi is not None:
+                    b["rsi_min"] = rsi if b["rsi_min"] is None else min(b["rsi_min"], rsi)
+                    b["rsi_max"] = rsi if b["rsi_max"] is None else max(b["rsi_max"], rsi)
+                if vr is not None:
+                    b["vr_max"] = vr if b["vr_max"] is None else max(b["vr_max"], vr)
+            b["samples"] += 1
+            b["last"] = r
+    out = []
+    for (ticker, tf, start), b in buckets.items():
+        r = b["last"]
+        out.append((ticker, tf, start, _num(r['rsi_14']), b["rsi_min"], b["rsi_max"],
+                    _num(r['vol_ratio']), b["vr_max"], _num(r['atr']), _num(r['pivot_r1']),
+                    r['gold_30m'], r['gold_5m'], r['dead_30m'], r['dead_5m'], b["samples"]))
+    return out
+
+
+@metrics.timed("indicator_rollup")
+def rollup(days=ROLLUP_DAYS, tickers=None):
+    """Recompute roll-ups for the last `days` NY calendar days -> rows upserted"""
+    from db import get_indicator_log, upsert_indicator_rollups
+    since = datetime.combine(mcal.now_ny().date() - timedelta(days=days), datetime.min.time())
+    rows = get_indicator_log(since, tickers)
+    for r in rows:
+        if not isinstance(r['candle_time'], datetime):
+            r['candle_time'] = datetime.strptime(str(r['candle_time'])[:19], '%Y-%m-%d %H:%M:%S')
+    written = upsert_indicator_rollups(_aggregate(rows))
+    with _lock:
+        _cache.clear()
+    _state.update(last_run=datetime.now().strftime('%Y-%m-%d %H:%M:%S'), last_rows=written)
+    return written
+
+
+def _jsonable(row):
+    out = {}
+    for k, v in row.items():
+        if isinstance(v, Decimal): v = float(v)
+        elif isinstance(v, datetime): v = v.strftime('%Y-%m-%d %H:%M:%S')
+        out[k] = v
+    return out
+
+
+def query(ticker, timeframe="30m", start=None, end=None, limit=500):
+    """Indicator snapshots oldest-first; start/end are NY 'YYYY-MM-DD[ HH:MM:SS]' (end date inclusive)"""
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f"timeframe must be one of {TIMEFRAMES}")
+    if end and len(end) == 10:
+        end = f"{end} 23:59:59"
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    key = (ticker, timeframe, start, end, limit)
+    now = time.time()
+    with _lock:
+        hit = _cache.get(key)
+    if hit and now - hit[0] < QUERY_TTL:
+        metrics.inc("indicator_query_cache_hits_total")
+        return hit[1]
+    from db import get_indicator_range
+    rows = [_jsonable(r) for r in get_indicator_range(ticker, timeframe, start, end, limit)]
+    with _lock:
+        _cache[key] = (now, rows)
+    return rows
+
+
+def status():
+    return {"timeframes": list(TIMEFRAMES), "rollup_days": ROLLUP_DAYS, "cached_queries": len(_cache), **_state}
@@ -0,0 +1,238 @@
+"""
+Scheduler Job Profiler
+Opt-in sampling profiler for APScheduler jobs. Arm it (POST /api/system/profile)
+and the next N runs are sampled from a side thread via sys._current_frames();
+collapsed stacks (.folded, flamegraph.pl / speedscope compatible) and a
+flamegraph SVG are written to PROFILE_DIR.
+
+Independent of arming, a job that runs past its interval is sampled from that
+point on and logged as an overrun with its hottest frames (APScheduler would
+otherwise silently skip the overlapping run).
+"""
+
+import html
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import metrics
+from applog import get_logger
+
+log = get_logger("scheduler")
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+SAMPLE_INTERVAL = 0.005       # 200 Hz while armed
+OVERRUN_SAMPLE_INTERVAL = 0.02
+MAX_PROFILES = 50             # oldest files pruned beyond this
+TOP_FRAMES = 5
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_lock = threading.Lock()
+_armed = {}                   # job name (or "*") -> remaining runs
+_last_runs = {}               # job name -> {elapsed_s, overrun, profile}
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples one thread's stack at a fixed interval into collapsed-stack counts"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.app_frames = Counter()   # deepest frame inside backend/ per sample
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="job-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None: break
+            labels, app = [], None
+            while frame is not None:
+                code = frame.f_code
+                labels.append(_frame_label(code))
+                if app is None and code.co_filename.startswith(_APP_DIR) and code.co_filename != __file__:
+                    app = f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+                frame = frame.f_back
+            labels.reverse()
+            self.stacks[";".join(labels)] += 1
+            if app: self.app_frames[app] += 1
+            self.samples += 1
+
+    def top(self, n=TOP_FRAMES):
+        """[(frame, pct)] of the hottest backend frames"""
+        total = self.samples or 1
+        return [(f, round(c * 100.0 / total, 1)) for f, c in self.app_frames.most_common(n)]
+
+
+# --- Arming ---
+def arm(runs=1, job=None):
+    """Profile the next `runs` runs of `job` (any job when None)"""
+    with _lock:
+        _armed[job or "*"] = max(0, int(runs))
+    log.info("profiler.armed", job=job or "*", runs=runs)
+    return status()
+
+
+def _take(job):
+    with _lock:
+        for key in (job, "*"):
+            if _armed.get(key, 0) > 0:
+                _armed[key] -= 1
+                if not _armed[key]: del _armed[key]
+                return True
+    return False
+
+
+def status():
+    files = []
+    if os.path.isdir(PROFILE_DIR):
+        files = sorted(os.listdir(PROFILE_DIR), reverse=True)[:20]
+    with _lock:
+        return {"armed": dict(_armed), "last_runs": dict(_last_runs), "dir": PROFILE_DIR, "files": files}
+
+
+# --- Output ---
+def write_profile(job, sampler, elapsed):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = os.path.join(PROFILE_DIR, f"{job}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    with open(stem + ".folded", "w") as f:
+        for stack, count in sampler.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    with open(stem + ".svg", "w") as f:
+        f.write(render_flamegraph(sampler.stacks, f"{job} — {elapsed:.2f}s, {sampler.samples} samples"))
+    _prune()
+    return stem + ".svg"
+
+
+def _prune():
+    files = sorted(os.path.join(PROFILE_DIR, n) for n in os.listdir(PROFILE_DIR))
+    stems = sorted({os.path.splitext(p)[0] for p in files})
+    for stem in stems[:-MAX_PROFILES]:
+        for ext in (".folded", ".svg"):
+            try: os.remove(stem + ext)
+            except OSError: pass
+
+
+def render_flamegraph(stacks, title, width=1200, row=16):
+    """Minimal flamegraph SVG from collapsed stacks (root at the bottom)"""
+    root = {"n": 0, "c": {}}
+    for stack, count in stacks.items():
+        node = root
+        node["n"] += count
+        for fr in stack.split(";"):
+            node = node["c"].setdefault(fr, {"n": 0, "c": {}})
+            node["n"] += count
+
+    def depth(node):
+        return 1 + max((depth(c) for c in node["c"].values()), default=0)
+
+    levels = depth(root)
+    height = (levels + 2) * row
+    total = root["n"] or 1
+    rects = []
+
+    def walk(node, name, x, level):
+        w = node["n"] * width / total
+        if w < 0.3: return
+        y = height - (level + 1) * row
+        hue = 20 + (hash(name) % 40)
+        label = html.escape(name)
+        pct = node["n"] * 100.0 / total
+        text = label if w > len(name) * 6.5 else (label[:max(0, int(w / 6.5) - 2)] + ".." if w > 20 else "")
+        rects.append(f'<g><title>{label} ({node["n"]} samples, {pct:.1f}%)</title>'
+                     f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row - 1}" fill="hsl({hue},90%,60%)"/>'
+                     f'<text x="{x + 3:.1f}" y="{y + row - 4}">{text}</text></g>')
+        cx = x
+        for cname, child in sorted(node["c"].items()):
+            walk(child, cname, cx, level + 1)
+            cx += child["n"] * width / total
+
+    x = 0.0
+    for cname, child in sorted(root["c"].items()):
+        walk(child, cname, x, 0)
+        x += child["n"] * width / total
+
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'font-family="monospace" font-size="11">'
+            f'<text x="4" y="14" font-size="13">{html.escape(title)}</text>'
+            + "".join(rects) + "</svg>")
+
+
+# --- Job wrapper ---
+def profiled_job(name, interval_sec):
+    """Decorator for scheduler jobs: armed sampling + overrun detection"""
+    def wrap(fn):
+        def run(*args, **kwargs):
+            tid = threading.get_ident()
+            sampler = StackSampler(tid).start() if _take(name) else None
+            overrun = {}
+            guard = threading.Lock()
+
+            def on_overrun():
+                with guard:
+                    if not overrun.get("done"):
+                        overrun["sampler"] = sampler or StackSampler(tid, OVERRUN_SAMPLE_INTERVAL).start()
+
+            watchdog = threading.Timer(interval_sec, on_overrun)
+            watchdog.daemon = True
+            watchdog.start()
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - t0
+                watchdog.cancel()
+                with guard:
+                    overrun["done"] = True
+                late = overrun.get("sampler")
+                if late is not None and late is not sampler: late.stop()
+                if sampler is not None: sampler.stop()
+
+                profile = None
+                if sampler is not None:
+                    try:
+                        profile = write_profile(name, sampler, elapsed)
+                        log.info("profiler.saved", job=name, elapsed_s=round(elapsed, 2),
+                                 samples=sampler.samples, file=profile)
+                    except Exception as e:
+                        log.error("profiler.write_failed", job=name, error=e)
+
+                if elapsed > interval_sec:
+                    metrics.inc("job_overruns_total", job=name)
+                    top = (late or sampler).top() if (late or sampler) else []
+                    log.warning("scheduler.overrun", job=name, elapsed_s=round(elapsed, 2),
+                                interval_s=interval_sec,
+                                top=" | ".join(f"{f} {p}%" for f, p in top) or "n/a")
+                with _lock:
+                    _last_runs[name] = {"elapsed_s": round(elapsed, 3), "overrun": elapsed > interval_sec,
+                                        "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "profile": profile}
+        run.__name__ = fn.__name__
+        run.__doc__ = fn.__doc__
+        run.__wrapped__ = fn
+        return run
+    return wrap
+
+
+def on_scheduler_event(event):
+    """APScheduler listener: runs skipped because the previous one is still going"""
+    job = getattr(event, "job_id", "?")
+    metrics.inc("job_skipped_total", job=job)
+    log.warning("scheduler.skipped", every=60, key=job, job=job, code=getattr(event, "code", None))
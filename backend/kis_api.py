@@ -2,14 +2,26 @@ import requests
 import json
 import time
 import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import metrics
+from applog import get_logger
+
+log = get_logger("kis")
+
+MINUTE_PAGE_SIZE = 120     # NREC max per inquire-time-itemchartprice call
+MINUTE_MAX_PAGES = 10      # continuation depth cap per symbol
+MINUTE_WORKERS = 3         # symbols walked in parallel (pages of one symbol are chained by KEYB)
 
 class KisApi:
     def __init__(self):
         self.APP_KEY = "PS9q8I7TgXLRu2XNJj2GZnaqGU2Uy1CtDZpI"
         self.APP_SECRET = "KSgC+E/xD+fvGhquv0DLXXKXf9jD4c4jOLZLWuLCp004H+vx9RSQbcPR3CGO0Ox3SHhCykiaDgmjYM0grzH2/j9rnVUGa9GqylNLEFxBq9dYtGhCe01pZ4hGqn4j/U5raqWkQBYWwtzT3Hy/VOZ8eKWooJgbyH5gGygZuUifV7uVnYfMPec="
-        self.URL_BASE = "https://openapi.koreainvestment.com:9443"
-        self.token_file = "kis_token.json"
+        # Env overrides let the benchmark harness point at a local fake KIS server
+        self.URL_BASE = os.getenv("KIS_URL_BASE", "https://openapi.koreainvestment.com:9443")
+        self.token_file = os.getenv("KIS_TOKEN_FILE", "kis_token.json")
         self.access_token = self._load_token()
 
     def _load_token(self):
@@ -33,7 +45,8 @@ class KisApi:
             "appsecret": self.APP_SECRET
         }
         try:
-            res = requests.post(f"{self.URL_BASE}/oauth2/tokenP", headers=headers, data=json.dumps(body), timeout=5)
+            with metrics.external("kis", "token"):
+                res = requests.post(f"{self.URL_BASE}/oauth2/tokenP", headers=headers, data=json.dumps(body), timeout=5)
             if res.status_code == 200:
                 data = res.json()
                 token = data['access_token']
@@ -72,19 +85,19 @@ class KisApi:
              exchanges.extend(other_exchanges)
         
         for excd in exchanges:
-            print(f"  KIS API: Checking {excd} for {symbol}...")
+            log.debug("kis.price.try", symbol=symbol, exchange=excd)
             res = self._fetch_price_request(excd, symbol)
             
             if res and res.get('rt_cd') == '0':
                 out = res['output']
                 # If 'last' price is empty, it means this exchange has no data for this ticker. Try next.
                 if not out.get('last'):
-                    print(f"  KIS API: No price data in {excd} for {symbol}.")
+                    log.debug("kis.price.empty", symbol=symbol, exchange=excd)
                     continue
                     
                 try:
                     price = float(out['last']) if out.get('last') else 0.0
-                    print(f"  KIS API: Found {symbol} in {excd} @ ${price}")
+                    log.debug("kis.price.found", symbol=symbol, exchange=excd, price=price)
                     return {
                         'price': price,
                         'diff': float(out['diff']) if out.get('diff') else 0.0,
@@ -94,7 +107,7 @@ class KisApi:
                 except (ValueError, TypeError):
                     continue
             else:
-                 print(f"  KIS API: Error or No Data in {excd} for {symbol} (Code: {res.get('rt_cd')})")
+                 log.debug("kis.price.error", symbol=symbol, exchange=excd, rt_cd=res.get('rt_cd') if res else None)
             
         return None
 
@@ -112,7 +125,8 @@ class KisApi:
             "SYMB": symbol
         }
         try:
-            res = requests.get(f"{self.URL_BASE}/uapi/overseas-price/v1/quotations/price", headers=headers, params=params, timeout=1.5)
+            with metrics.external("kis", "price"):
+                res = requests.get(f"{self.URL_BASE}/uapi/overseas-price/v1/quotations/price", headers=headers, params=params, timeout=1.5)
             if res.status_code == 200:
                 return res.json()
         except Exception as e:
@@ -147,7 +161,8 @@ class KisApi:
             "MODP": "1" # 1: Adjusted Price
         }
         try:
-            res = requests.get(f"{self.URL_BASE}/uapi/overseas-price/v1/quotations/dailyprice", headers=headers, params=params, timeout=1.5)
+            with metrics.external("kis", "dailyprice"):
+                res = requests.get(f"{self.URL_BASE}/uapi/overseas-price/v1/quotations/dailyprice", headers=headers, params=params, timeout=1.5)
             if res.status_code == 200:
                 data = res.json()
                 if data['rt_cd'] == '0':
@@ -167,40 +182,139 @@ class KisApi:
         return self._fetch_minute_candles_request(exchange, symbol, str(interval_min), next_key)
 
     def _fetch_minute_candles_request(self, exchange, symbol, interval, next_key=""):
+        page = self._fetch_minute_page(exchange, symbol, interval, next_key)
+        return page[0] if page else None
+
+    def _fetch_minute_page(self, exchange, symbol, interval, next_key="", keyb=""):
+        """
+        One minute-chart page (newest first).
+        Continuation: NEXT="1" + KEYB=<oldest bar key of the previous page>.
+        Returns (rows, has_more) or None on failure.
+        """
         headers = {
             "content-type": "application/json; charset=utf-8",
             "authorization": f"Bearer {self.access_token}",
             "appkey": self.APP_KEY,
             "appsecret": self.APP_SECRET,
-            "tr_id": "HHDFS76950200"
+            "tr_id": "HHDFS76950200",
+            "tr_cont": "N" if next_key else ""
         }
-        
-        # Current Time for End? KIS usually returns recent from now.
-        import datetime
-        now_str = datetime.datetime.now().strftime("%H%M%S") # Not used in param but good to know
-        
         params = {
             "AUTH": "",
             "EXCD": exchange,
             "SYMB": symbol,
             "NMIN": interval, 
-            "PINC": "1", # 1: Includes gap correction? or 0. Usually 1.
-            "NEXT": next_key, # Next Key
-            "NREC": "120", # Number of records (120 max)
-            "KEYB": "" # Key value?
+            "PINC": "1", # 1: 전일 포함
+            "NEXT": next_key,
+            "NREC": str(MINUTE_PAGE_SIZE),
+            "FILL": "",
+            "KEYB": keyb
         }
         
         try:
-            res = requests.get(f"{self.URL_BASE}/uapi/overseas-price/v1/quotations/inquire-time-itemchartprice", headers=headers, params=params, timeout=2.0)
+            with metrics.external("kis", "minute_chart"):
+                res = requests.get(f"{self.URL_BASE}/uapi/overseas-price/v1/quotations/inquire-time-itemchartprice", headers=headers, params=params, timeout=2.0)
             if res.status_code == 200:
                 data = res.json()
                 if data['rt_cd'] == '0':
-                    return data['output2'] # output2 is the list
+                    out1 = data.get('output1') or {}
+                    more = out1.get('more') == 'Y' or res.headers.get('tr_cont') in ('F', 'M')
+                    return data['output2'] or [], more
         except Exception as e:
-            # print(f"KIS Minute Chart Error: {e}")
-            pass
+            log.debug("kis.minute.error", symbol=symbol, error=e)
         return None
 
+    def iter_minute_candles(self, symbol, interval_min=30, exchange=None, since=None, max_pages=MINUTE_MAX_PAGES):
+        """
+        Walk minute-chart pages newest -> oldest, yielding one normalized OHLCV
+        DataFrame (naive NY index) per page. Stops at `since` (naive NY), the
+        last page, or max_pages.
+        """
+        exchange = exchange or get_exchange_code(symbol)
+        next_key, keyb = "", ""
+        for _ in range(max_pages):
+            page = self._fetch_minute_page(exchange, symbol, str(interval_min), next_key, keyb)
+            if not page or not page[0]: return
+            rows, more = page
+            df = minute_rows_to_frame(rows)
+            if not df.empty:
+                yield df
+            oldest = min(rows, key=_minute_row_key)
+            if not more or df.empty or (since is not None and df.index.min() <= since): return
+            if _minute_row_key(oldest) == keyb: return  # server ignored KEYB: avoid looping on one page
+            next_key, keyb = "1", _minute_row_key(oldest)
+
+    def stream_minute_candles(self, symbols, interval_min=30, since=None, max_pages=MINUTE_MAX_PAGES,
+                              workers=MINUTE_WORKERS):
+        """
+        (symbol, DataFrame) chunks from per-symbol page walks running in parallel.
+        A bounded queue hands chunks to the consumer, so memory stays at a few
+        pages no matter how deep the walk goes.
+        """
+        chunks = queue.Queue(maxsize=max(2, workers * 2))
+        stop = threading.Event()
+        end = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def walk(sym):
+            try:
+                for df in self.iter_minute_candles(sym, interval_min, since=since, max_pages=max_pages):
+                    if not put((sym, df)): return
+            except Exception as e:
+                log.warning("kis.minute.walk_failed", symbol=sym, error=e)
+            finally:
+                put((sym, end))
+
+        pool = ThreadPoolExecutor(max_workers=max(1, min(workers, len(symbols))), thread_name_prefix="kis-minute")
+        try:
+            for sym in symbols:
+                pool.submit(walk, sym)
+            pending = len(symbols)
+            while pending:
+                sym, df = chunks.get()
+                if df is end:
+                    pending -= 1
+                    continue
+                yield sym, df
+        finally:
+            stop.set()
+            pool.shutdown(wait=False)
+
+
+def _minute_row_key(row):
+    """YYYYMMDDHHMMSS of a minute row (exchange local when present, as KEYB expects)"""
+    if row.get('xymd'):
+        return f"{row['xymd']}{row.get('xhms', '')}"
+    return f"{row.get('kymd', '')}{row.get('khms', '')}"
+
+
+def minute_rows_to_frame(rows):
+    """KIS minute rows -> OHLCV DataFrame with naive NY index (ascending)"""
+    import pandas as pd
+    from market_calendar import KST, NY
+    raw = pd.DataFrame(rows)
+    if raw.empty:
+        return pd.DataFrame(columns=["Open", "High", "Low", "Close", "Volume"])
+    if 'xymd' in raw and 'xhms' in raw:  # exchange local time
+        idx = pd.to_datetime(raw['xymd'] + raw['xhms'], format="%Y%m%d%H%M%S")
+    else:                                # KST
+        idx = (pd.to_datetime(raw['kymd'] + raw['khms'], format="%Y%m%d%H%M%S")
+               .dt.tz_localize(KST).dt.tz_convert(NY).dt.tz_localize(None))
+    num = lambda c: pd.to_numeric(raw[c], errors='coerce') if c in raw else 0.0
+    df = pd.DataFrame({"Open": num('open'), "High": num('high'), "Low": num('low'), "Close": num('last'),
+                       "Volume": num('evol') if 'evol' in raw else num('vol')})
+    df.index = pd.DatetimeIndex(idx, name="Datetime")
+    df = df.dropna(subset=['Close'])
+    return df[~df.index.duplicated(keep='first')].sort_index()
+
 def get_exchange_code(ticker):
     """
     종목 코드로 거래소 추정
@@ -260,5 +374,29 @@ def get_minute_candles(ticker, interval, exchange=None):
         exchange = get_exchange_code(ticker)
     return kis_client.get_minute_candles(ticker, interval, exchange)
 
+def backfill_minute_candles(tickers, interval, since, timeframe=None, keep=None):
+    """
+    KIS 분봉 페이지를 next_key로 연속 조회하며 페이지 단위로 바로 market_candles에 저장 (generator pipeline)
+
+    Args:
+        tickers: 종목 코드 리스트 (종목별 병렬 조회)
+        interval: 분 단위 (5, 30)
+        since: 이 시각(naive NY)까지 거슬러 조회
+        keep: optional filter(ticker, df) -> df applied before saving (e.g. only missing bars)
+
+    Returns:
+        {ticker: saved bar count}
+    """
+    from db import save_market_candles
+    timeframe = timeframe or f"{interval}m"
+    saved = {t: 0 for t in tickers}
+    for ticker, df in kis_client.stream_minute_candles(tickers, interval, since=since):
+        df = df[df.index >= since]
+        if keep is not None:
+            df = keep(ticker, df)
+        if df is not None and not df.empty and save_market_candles(ticker, timeframe, df, source='kis'):
+            saved[ticker] += len(df)
+    return saved
+
 # Final Singleton
 kis_client = KisApi()
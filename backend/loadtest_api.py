@@ -0,0 +1,89 @@
+"""
+API Load Test
+N concurrent clients hammer the hot endpoints and report latency percentiles.
+
+Usage: python loadtest_api.py [--url http://127.0.0.1:8080] [--clients 200] [--requests 20]
+                              [--endpoints /api/report,/api/signals?limit=5,...]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+DEFAULT_ENDPOINTS = [
+    "/api/report",
+    "/api/signals?limit=5",
+    "/api/v2/status/SOXL",
+    "/api/managed-stocks",
+]
+
+
+def percentile(values, p):
+    if not values: return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(p / 100.0 * (len(values) - 1)))))
+    return values[k]
+
+
+async def client_loop(client, endpoints, n_requests, results, errors):
+    for i in range(n_requests):
+        ep = endpoints[i % len(endpoints)]
+        t0 = time.perf_counter()
+        try:
+            r = await client.get(ep)
+            if r.status_code >= 400:
+                errors[ep] = errors.get(ep, 0) + 1
+        except Exception:
+            errors[ep] = errors.get(ep, 0) + 1
+            continue
+        results.setdefault(ep, []).append((time.perf_counter() - t0) * 1000)
+
+
+async def run(url, clients, n_requests, endpoints):
+    results, errors = {}, {}
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, timeout=30, limits=limits) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*[client_loop(client, endpoints, n_requests, results, errors) for _ in range(clients)])
+        elapsed = time.perf_counter() - t0
+
+    total = sum(len(v) for v in results.values())
+    summary = {"clients": clients, "requests": total, "elapsed_s": round(elapsed, 2),
+               "rps": round(total / elapsed, 1) if elapsed else 0, "endpoints": {}}
+    for ep, lat in results.items():
+        summary["endpoints"][ep] = {
+            "n": len(lat),
+            "p50_ms": round(percentile(lat, 50), 1),
+            "p95_ms": round(percentile(lat, 95), 1),
+            "p99_ms": round(percentile(lat, 99), 1),
+            "mean_ms": round(statistics.mean(lat), 1),
+            "errors": errors.get(ep, 0),
+        }
+    return summary
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://127.0.0.1:8080")
+    ap.add_argument("--clients", type=int, default=200)
+    ap.add_argument("--requests", type=int, default=20, help="requests per client")
+    ap.add_argument("--endpoints", default=",".join(DEFAULT_ENDPOINTS))
+    ap.add_argument("--json", action="store_true", help="print JSON summary only")
+    args = ap.parse_args()
+
+    summary = asyncio.run(run(args.url, args.clients, args.requests, args.endpoints.split(",")))
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"=== {summary['clients']} clients, {summary['requests']} requests in {summary['elapsed_s']}s ({summary['rps']} req/s) ===")
+    print(f"{'endpoint':<28}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>6}")
+    for ep, s in summary["endpoints"].items():
+        print(f"{ep:<28}{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}{s['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
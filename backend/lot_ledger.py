@@ -0,0 +1,218 @@
+"""
+FIFO Lot Ledger
+Materialized FIFO view of journal_transactions for /api/transactions/stats.
+Per ticker the ledger keeps transactions in (trade_date, id) order plus prefix
+sums over the buy stream (qty and cost). FIFO consumption is fully described by
+the number of units sold so far, so the cost of any sell is the difference of
+two prefix-cost lookups (bisect, O(log n)) instead of popping lots one by one.
+
+An appended transaction is applied in O(log n); an edit, delete or back-dated
+insert truncates the per-ticker state at that transaction and replays only the
+transactions from there on. Loaded from the DB on first use; add/update/delete
+in db.py keep it current.
+
+Usage:
+  realized_trades()     # same rows as the old FIFO replay, oldest first
+  open_lots("SOXL")     # remaining lots with their cost
+"""
+
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from decimal import Decimal
+
+import metrics
+
+_ZERO = Decimal(0)
+
+
+class TickerLedger:
+    """Transactions of one ticker and the FIFO state after each of them"""
+    __slots__ = ("keys", "txns", "consumed", "buy_qty", "buy_cost", "buy_price", "buy_pos", "realized")
+
+    def __init__(self):
+        self.keys = []        # (trade_date, id), sorted
+        self.txns = []        # (trade_type, qty, price) parallel to keys
+        self.consumed = []    # units taken from the buy stream after each txn
+        self.buy_qty = []     # prefix sums over BUY txns
+        self.buy_cost = []
+        self.buy_price = []
+        self.buy_pos = []     # txn index of each BUY
+        self.realized = {}    # sell id -> result row
+
+    def _cost_at(self, units):
+        """Cost of the first `units` units of the buy stream"""
+        if units <= 0: return _ZERO
+        j = bisect_left(self.buy_qty, units)
+        prev_q = self.buy_qty[j - 1] if j else 0
+        prev_c = self.buy_cost[j - 1] if j else _ZERO
+        return prev_c + (units - prev_q) * self.buy_price[j]
+
+    def replay_from(self, k):
+        """Drop derived state from txn k on and re-apply txns k.. (state before k is kept)"""
+        j = bisect_left(self.buy_pos, k)
+        del self.buy_qty[j:], self.buy_cost[j:], self.buy_price[j:], self.buy_pos[j:]
+        del self.consumed[k:]
+        for _, tid in self.keys[k:]:
+            self.realized.pop(tid, None)
+        used = self.consumed[k - 1] if k else 0
+        for i in range(k, len(self.keys)):
+            trade_type, qty, price = self.txns[i]
+            if trade_type == 'BUY' and qty > 0:
+                self.buy_qty.append((self.buy_qty[-1] if self.buy_qty else 0) + qty)
+                self.buy_cost.append((self.buy_cost[-1] if self.buy_cost else _ZERO) + qty * price)
+                self.buy_price.append(price)
+                self.buy_pos.append(i)
+            elif trade_type == 'SELL':
+                available = (self.buy_qty[-1] if self.buy_qty else 0) - used
+                filled = min(qty, available)
+                if filled > 0:
+                    cost = self._cost_at(used + filled) - self._cost_at(used)
+                    avg_buy = cost / filled
+                    trade_date, tid = self.keys[i]
+                    self.realized[tid] = {
+                        "date": trade_date,
+                        "qty": filled,
+                        "profit": round(float((price - avg_buy) * filled), 2),
+                        "pct": round(float((price - avg_buy) / avg_buy * 100), 2) if avg_buy else 0.0,
+                    }
+                    used += filled
+            self.consumed.append(used)
+
+    def insert(self, key, txn):
+        k = bisect_left(self.keys, key)
+        self.keys.insert(k, key)
+        self.txns.insert(k, txn)
+        self.replay_from(k)
+
+    def remove(self, key):
+        k = bisect_left(self.keys, key)
+        if k < len(self.keys) and self.keys[k] == key:
+            del self.keys[k], self.txns[k]
+            self.realized.pop(key[1], None)     # no longer in keys[k:] for replay_from
+            self.replay_from(k)
+
+    def open_lots(self):
+        used = self.consumed[-1] if self.consumed else 0
+        j = bisect_right(self.buy_qty, used)     # first lot not fully consumed
+        lots = []
+        for n in range(j, len(self.buy_qty)):
+            start = max(used, self.buy_qty[n - 1] if n else 0)
+            lots.append({"date": self.keys[self.buy_pos[n]][0], "qty": self.buy_qty[n] - start,
+                         "price": float(self.buy_price[n])})
+        return lots
+
+
+_lock = threading.Lock()
+_ledgers = {}            # ticker -> TickerLedger
+_index = {}              # txn id -> (ticker, key)
+_state = {"loaded": False, "stats": None}
+
+
+def _to_dt(v):
+    if isinstance(v, datetime) or v is None: return v or datetime.now()
+    return datetime.fromisoformat(str(v).replace('T', ' ')[:19])
+
+
+def _add(row):
+    key = (_to_dt(row['trade_date']), row['id'])
+    txn = (row['trade_type'], int(row['qty'] or 0), Decimal(str(row['price'] or 0)))
+    _ledgers.setdefault(row['ticker'], TickerLedger()).insert(key, txn)
+    _index[row['id']] = (row['ticker'], key)
+
+
+def _drop(txn_id):
+    hit = _index.pop(txn_id, None)
+    if hit:
+        ticker, key = hit
+        _ledgers[ticker].remove(key)
+
+
+def _load():
+    from db import get_journal_transactions
+    with metrics.stage("ledger_load"):
+        rows = sorted(get_journal_transactions(), key=lambda r: (_to_dt(r['trade_date']), r['id']))
+        by_ticker = {}
+        for r in rows:
+            by_ticker.setdefault(r['ticker'], []).append(r)
+        for ticker, txns in by_ticker.items():
+            ledger = _ledgers[ticker] = TickerLedger()
+            for r in txns:
+                key = (_to_dt(r['trade_date']), r['id'])
+                ledger.keys.append(key)
+                ledger.txns.append((r['trade_type'], int(r['qty'] or 0), Decimal(str(r['price'] or 0))))
+                _index[r['id']] = (ticker, key)
+            ledger.replay_from(0)
+    _state["loaded"] = True
+    print(f"📒 Lot ledger loaded: {len(rows)} transactions, {len(_ledgers)} tickers")
+
+
+def _ensure_loaded():
+    if _state["loaded"]: return
+    with _lock:
+        if not _state["loaded"]:
+            _load()
+
+
+# --- Writes (called by db after commit) ---
+def refresh(txn_id):
+    """Transaction added or edited: re-read it and replay its ticker(s) from that point"""
+    if not _state["loaded"]: return      # the first read loads everything
+    from db import get_journal_transaction
+    row = get_journal_transaction(txn_id)
+    with _lock:
+        _drop(txn_id)
+        if row: _add(row)
+        _state["stats"] = None
+
+
+def remove(txn_id):
+    if not _state["loaded"]: return
+    with _lock:
+        _drop(txn_id)
+        _state["stats"] = None
+
+
+def reset():
+    with _lock:
+        _ledgers.clear()
+        _index.clear()
+        _state.update(loaded=False, stats=None)
+
+
+# --- Reads ---
+def realized_trades():
+    """[{ticker, date, qty, profit, pct}] per filled SELL, ordered by trade date"""
+    _ensure_loaded()
+    with _lock:
+        if _state["stats"] is None:
+            rows = []
+            for ticker, ledger in _ledgers.items():
+                for (trade_date, tid) in ledger.keys:
+                    r = ledger.realized.get(tid)
+                    if r: rows.append(((trade_date, tid), {"ticker": ticker, **r}))
+            rows.sort(key=lambda x: x[0])
+            _state["stats"] = [r for _, r in rows]
+        return _state["stats"]
+
+
+def open_lots(ticker):
+    _ensure_loaded()
+    with _lock:
+        ledger = _ledgers.get(ticker)
+        return ledger.open_lots() if ledger else []
+
+
+def summary():
+    """Per ticker: open qty / cost basis and realized profit"""
+    _ensure_loaded()
+    with _lock:
+        out = {}
+        for ticker, ledger in sorted(_ledgers.items()):
+            lots = ledger.open_lots()
+            qty = sum(l["qty"] for l in lots)
+            cost = sum(l["qty"] * l["price"] for l in lots)
+            out[ticker] = {"open_qty": qty, "avg_cost": round(cost / qty, 4) if qty else 0,
+                           "open_lots": len(lots), "realized_profit": round(sum(r["profit"] for r in ledger.realized.values()), 2),
+                           "transactions": len(ledger.keys)}
+        return out
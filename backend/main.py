@@ -1,6 +1,14 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response, HTTPException
+from fastapi.responses import StreamingResponse, JSONResponse
+import asyncio
+from async_io import run_db, run_ext
+import metrics
+from job_profiler import profiled_job, on_scheduler_event
+from session_cadence import cadenced
+from bar_trigger import bar_context, cron_kwargs
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from typing import Optional
 from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime
 import pandas as pd
@@ -39,11 +47,27 @@ def on_startup():
     SMS_ENABLED = get_global_config("sms_enabled", True)
     print(f"Startup: SMS Enabled = {SMS_ENABLED}")
 
+    # SMS outbox dispatcher (resumes messages left pending by the previous process)
+    from sms import start_dispatcher
+    start_dispatcher()
+
+    # Recent signal / SMS index for de-dup and throttling (lookups stay in memory afterwards)
+    try:
+        import notify_index
+        notify_index.warm()
+    except Exception as e:
+        print(f"Notify index warm-up failed (retried on first lookup): {e}")
+
     # Start Scheduler
+    from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
     scheduler = BackgroundScheduler()
-    scheduler.add_job(monitor_signals, 'interval', minutes=1)
+    scheduler.add_listener(on_scheduler_event, EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED)
+    # Signal jobs fire just after each bar close (NY time + settlement delay, see bar_trigger)
+    scheduler.add_job(monitor_cycle, 'cron', id='monitor', **cron_kwargs(1))
     
-    # [New] Auto Price Update (Every 5 mins)
+    # [New] Auto Price Update (Every 5 mins, session cadence)
+    @cadenced("price_update", base_sec=300)
+    @profiled_job("price_update", interval_sec=300)
     def update_prices_job():
         try:
             # Only run during market hours + buffer (roughly) or freely if quota allows.
@@ -52,30 +76,117 @@ def on_startup():
         except Exception as e:
             print(f"Auto Price Update Failed: {e}")
 
-    scheduler.add_job(update_prices_job, 'interval', minutes=5)
+    scheduler.add_job(update_prices_job, 'interval', minutes=5, id='price_update')
     
-    # [New] Cheongan V2 Signal Analysis (Every 5 mins)
-    scheduler.add_job(run_v2_signal_analysis, 'interval', minutes=5)
+    # [New] Cheongan V2 Signal Analysis (Every 5m bar close)
+    scheduler.add_job(v2_cycle, 'cron', id='v2_signal', **cron_kwargs(5))
+
+    # Candle gap backfill (hourly, targeted requests only)
+    scheduler.add_job(data_backfill_job, 'interval', minutes=60, id='backfill')
+    
+    # Prev close reference: resolve today's close once the regular session is over
+    scheduler.add_job(prev_close_job, 'cron', day_of_week='mon-fri', hour='13,16,20', minute=20,
+                      timezone='America/New_York', id='prev_close')
+
+    # Indicator roll-ups (5m/30m/1d buckets of market_indicators_log)
+    scheduler.add_job(indicator_rollup_job, 'interval', minutes=5, id='indicator_rollup')
     
     # [New] SOXS Data Maintenance Scheduler (User Request: 3 Days Rolling)
     from scheduler_soxs import start_maintenance_scheduler as start_soxs_sched
     start_soxs_sched()
 
     scheduler.start()
-    print("✅ Scheduler Started: Monitor(1m), PriceUpdate(5m), SOXS_Maintenance(5m)")
+    print("✅ Scheduler Started: Monitor(1m bar close), V2(5m bar close), PriceUpdate(5m), SOXS_Maintenance(5m), Backfill(1h), PrevClose(post-close), IndicatorRollup(5m)")
+    print("   Cadence: monitor / price / v2 / SOXS run less often outside regular hours (GET /api/system/cadence)")
+
 
+@app.on_event("startup")
+async def bind_report_stream():
+    # Scheduler threads hand SSE frames to this loop
+    import asyncio
+    from report_stream import hub
+    hub.bind_loop(asyncio.get_running_loop())
+
+@app.on_event("shutdown")
+def flush_write_behind():
+    """Commit buffered signal / history / indicator rows before the process exits"""
+    import write_behind
+    if not write_behind.flush():
+        print("⚠️ Write-behind flush failed at shutdown")
 
 # ... (API endpoints)
 
+class ProfileRequest(BaseModel):
+    runs: int = 1
+    job: Optional[str] = None   # monitor / v2_signal / price_update / soxs_maintenance, None = any
+
+class CadenceUpdate(BaseModel):
+    policies: dict              # {job: {regular|pre|post|closed: seconds or null}}
+
+@app.get("/api/system/cadence")
+def api_cadence_status():
+    """Session cadence policies, last runs and skipped ticks / calls saved per day"""
+    from session_cadence import status
+    return status()
+
+@app.post("/api/system/cadence")
+def api_cadence_update(req: CadenceUpdate):
+    from session_cadence import set_policies
+    try:
+        return {"status": "success", "policies": set_policies(req.policies)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/system/bar-latency")
+def api_bar_latency():
+    """Bar close -> signal saved / SMS queued latency (recent quantiles; histogram in /api/metrics)"""
+    from bar_trigger import status
+    return status()
+
+@app.get("/api/system/profile")
+def api_profile_status():
+    """Armed profiler runs, last run durations and saved flamegraphs"""
+    from job_profiler import status
+    return status()
+
+@app.post("/api/system/profile")
+def api_profile_arm(req: ProfileRequest):
+    """Sample the next N scheduler runs (collapsed stacks + SVG under profiles/)"""
+    from job_profiler import arm
+    return arm(req.runs, req.job)
+
+@app.get("/api/system/quote-sources")
+def api_quote_sources():
+    """Quote source health: EWMA latency, error rate, demotion state"""
+    from quote_service import source_status
+    return source_status()
+
+@app.get("/api/system/prev-close")
+def api_prev_close():
+    """Daily reference closes (previous regular-session close) per ticker and their source"""
+    from ref_price import status
+    return status()
+
+@app.get("/api/system/backfill")
+def api_backfill_status():
+    """Missing candle bars per ticker/timeframe vs the session calendar, plus the last backfill run"""
+    from data_validator import get_backfill_status
+    try:
+        return get_backfill_status()
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
 @app.post("/api/system/backfill")
 def api_trigger_backfill():
-    """Manually trigger deep data fetch (30 days)"""
+    """Fill candle gaps now (only the missing bars are fetched)"""
+    from data_validator import run_backfill
     try:
-        # Run in background to avoid timeout
-        import threading
-        t = threading.Thread(target=data_backfill_job)
-        t.start()
-        return {"status": "success", "message": "데이터 동기화(최근 30일) 작업이 백그라운드에서 시작되었습니다."}
+        result = run_backfill()
+        if result is None:
+            return {"status": "busy", "message": "이미 데이터 보충 작업이 진행 중입니다."}
+        return {"status": "success",
+                "message": f"누락 캔들 {result['total_missing']}개 중 {result['total_filled']}개 보충 ({len(result['requests'])}회 요청)",
+                **result}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
@@ -107,6 +218,8 @@ def set_sms_setting(setting: SMSSettingModel):
     global SMS_ENABLED
     SMS_ENABLED = setting.enabled
     set_global_config("sms_enabled", SMS_ENABLED)
+    from sms import set_sms_enabled
+    set_sms_enabled(SMS_ENABLED)
     print(f"SMS System Enabled (Saved to DB): {SMS_ENABLED}")
     return {"status": "success", "enabled": SMS_ENABLED}
     return {"status": "success", "enabled": SMS_ENABLED}
@@ -136,40 +249,37 @@ def update_prices_job():
     try:
         print(f"[{datetime.now()}] 종목 현재가 업데이트 시작...")
         update_stock_prices()
-        
-        # [MODIFIED] Periodic Deep Fetch (Backfill)
-        # Every hour, ensure we have full month history in DB to prevent gaps
-        if datetime.now().minute == 0:
-             print("🕒 Hourly Deep Fetch Triggered (Backfill Data)")
-             from analysis import fetch_data
-             fetch_data(force=True) # force=True inside fetch_data treats as realtime, but we need deeper?
-             # Actually, let's create a separate scheduled job for deep fetch or modify fetch_data logic.
-             # Ideally fetch_data(force=True) updates "5d". 
-             # Let's trust "Incremental Data Fetch" in fetch_data covers gaps if we call it frequently.
-             # But user wants "DB에 모든 데이터". Let's run a dedicated backfill occasionally.
-             pass
-
     except Exception as e:
         print(f"현재가 업데이트 작업 오류: {e}")
 
+@profiled_job("backfill", interval_sec=3600)
 def data_backfill_job():
-    """주기적으로 과거 데이터(1개월)를 다시 가져와 DB 구멍을 메꾸는 작업"""
+    """매시간 market_candles 누락 구간을 세션 캘린더 기준으로 찾아 해당 구간만 보충"""
     try:
-        print(f"[{datetime.now()}] 🔄 Data Backfill Job Started (1mo deep fetch)...")
-        from analysis import fetch_data
-        # Force fetch, but fetch_data determines period. 
-        # We need to ideally pass a param? For now, fetch_data logic uses "1mo" if empty.
-        # But if not empty, it uses "5d". We want "1mo" periodically.
-        # Let's modify fetch_data to accept 'period' arg or just trigger simple fetch.
-        
-        # Temporary: Just call fetch_data(force=True) relies on '5d'.
-        # To truly backfill, we should call yfinance directly here or enhance fetch_data.
-        # Let's enhance fetch_data to take a period argument in next step.
-        fetch_data(force=True, override_period="1mo") 
-        print("✅ Backfill Job Completed.")
+        from data_validator import run_backfill
+        print(f"[{datetime.now()}] 🔄 Candle Gap Backfill Started...")
+        run_backfill()
     except Exception as e:
          print(f"Backfill Job Error: {e}")
 
+def indicator_rollup_job():
+    """5분마다 최근 지표 로그를 5m/30m/1d 구간으로 집계"""
+    try:
+        from indicator_store import rollup
+        rollup()
+    except Exception as e:
+        print(f"Indicator Rollup Job Error: {e}")
+
+def prev_close_job():
+    """장 마감 후 당일 정규장 종가를 다음 세션의 기준 전일종가로 확정"""
+    try:
+        from ref_price import warm_next_session
+        resolved = warm_next_session()
+        if resolved:
+            print(f"[{datetime.now()}] 📌 Prev close warmed for next session: {len(resolved)} tickers")
+    except Exception as e:
+        print(f"Prev Close Job Error: {e}")
+
 def process_system_trading(ticker, result):
     """
     Check analysis result and log virtual system trades.
@@ -237,13 +347,23 @@ def monitor_signals():
         full_report = run_analysis(force_update=True)
         stocks_data = full_report.get('stocks', [])
         
+        # Serialize once per cycle; /api/report serves these bytes
+        try:
+            from report_store import publish_report
+            from db import get_ticker_settings
+            publish_report(full_report, get_ticker_settings())
+        except Exception as e:
+            print(f"Report Publish Error: {e}")
+        
+        # [NEW] System Auto-Trading Log (Virtual Portfolio) - Master Control Tower results
         for stock_res in stocks_data:
+            process_system_trading(stock_res['ticker'], stock_res)
+        
+        # Per-stock signals (managed_stocks, parallel analysis stage)
+        for stock_res in full_report.get('stock_analysis', []):
             ticker = stock_res['ticker']
             res = stock_res # Use the result from run_analysis
             
-            # [NEW] System Auto-Trading Log (Virtual Portfolio)
-            process_system_trading(ticker, res)
-            
             # Skip if analysis failed
             if 'error' in res or 'position' not in res:
                 print(f"Skipping {ticker} due to analysis error: {res.get('error', 'No position data')}")
@@ -292,18 +412,10 @@ def monitor_signals():
                 # 7-day de-duplication for standard signal saving
                 if is_new: # Only check if not already marked as duplicate by 30-min window
                     try:
-                        from db import get_connection
-                        with get_connection() as conn:
-                            with conn.cursor() as cursor:
-                                cursor.execute("""
-                                    SELECT id FROM signal_history 
-                                    WHERE ticker=%s AND position_desc=%s 
-                                    AND created_at >= NOW() - INTERVAL 7 DAY
-                                    LIMIT 1
-                                """, (ticker, res['position']))
-                                if cursor.fetchone():
-                                    print(f"Skipping 7-day duplicate signal for {ticker} ({res['position']})")
-                                    is_new = False
+                        import notify_index
+                        if notify_index.seen_signal(ticker, position=res['position'], minutes=7 * 24 * 60):
+                            print(f"Skipping 7-day duplicate signal for {ticker} ({res['position']})")
+                            is_new = False
                     except Exception as e:
                         print(f"Signal de-duplication error {ticker}: {e}")
                 
@@ -341,7 +453,8 @@ def monitor_signals():
                             if success:
                                 is_sent = True
                                 msg = f"[{ticker}] [{short_pos}] [${res['current_price']}] [{sms_reason}]"
-                                save_sms_log(receiver="01044900528", message=msg, status="Success")
+                                # Queued in the outbox; the delivery outcome is tracked in sms_outbox (/api/sms/outbox)
+                                save_sms_log(receiver="01044900528", message=msg, status="Queued")
 
                     save_signal({
                         'ticker': ticker,
@@ -370,14 +483,14 @@ def monitor_signals():
                     recent = check_recent_sms_log(k_ticker, m_pos, 30)
                     
                     if not recent and SMS_ENABLED:
-                        send_sms(
+                        queued = send_sms(
                             stock_name=k_ticker,
                             signal_type="마스터 진입",
                             price=full_report['holdings'].get(k_ticker, {}).get('current_price', 0),
                             signal_time=m_res.get('signal_time', '지금'),
                             reason="3종 필터 완성"
                         )
-                        save_sms_log(receiver="01044900528", message=f"[{k_ticker}] [{m_pos}] 완성", status="Success")
+                        save_sms_log(receiver="01044900528", message=f"[{k_ticker}] [{m_pos}] 완성", status="Queued" if queued else "Skipped")
 
                 # B. 5m Dead Cross Warning (Warning 5m)
                 if m_res.get('warning_5m'):
@@ -386,14 +499,14 @@ def monitor_signals():
                     recent_w = check_recent_sms_log(k_ticker, w_pos, 30)
                     
                     if not recent_w and SMS_ENABLED:
-                        send_sms(
+                        queued = send_sms(
                             stock_name=k_ticker,
                             signal_type="주의 경보",
                             price=full_report['holdings'].get(k_ticker, {}).get('current_price', 0),
                             signal_time="현재",
                             reason="5분봉 데드크로스 발생"
                         )
-                        save_sms_log(receiver="01044900528", message=f"[{k_ticker}] [{w_pos}] 주의!!", status="Success")
+                        save_sms_log(receiver="01044900528", message=f"[{k_ticker}] [{w_pos}] 주의!!", status="Queued" if queued else "Skipped")
 
                 # C. Trend Break (Sell Signal)
                 if m_res.get('is_sell_signal'):
@@ -402,53 +515,118 @@ def monitor_signals():
                     recent_s = check_recent_sms_log(k_ticker, s_pos, 30)
                     
                     if not recent_s and SMS_ENABLED:
-                        send_sms(
+                        queued = send_sms(
                             stock_name=k_ticker,
                             signal_type="매도(EXIT)",
                             price=full_report['holdings'].get(k_ticker, {}).get('current_price', 0),
                             signal_time="현재",
                             reason="30분봉 추세 이탈"
                         )
-                        save_sms_log(receiver="01044900528", message=f"[{k_ticker}] [{s_pos}] 발생", status="Success")
+                        save_sms_log(receiver="01044900528", message=f"[{k_ticker}] [{s_pos}] 발생", status="Queued" if queued else "Skipped")
 
     except Exception as e:
         print(f"Monitor Error: {e}")
         import traceback
         traceback.print_exc()
 
-@app.get("/api/report")
-def get_report():
+    publish_new_signals()
+
+@cadenced("monitor", base_sec=60)
+@profiled_job("monitor", interval_sec=60)
+def monitor_cycle():
+    """Scheduler entry: monitor_signals with per-cycle timing and call/query counts"""
+    with metrics.cycle("monitor"), bar_context("monitor", 1):
+        monitor_signals()
+
+@cadenced("v2_signal", base_sec=300)
+@profiled_job("v2_signal", interval_sec=300)
+def v2_cycle():
+    with metrics.cycle("v2"), bar_context("v2", 5):
+        run_v2_signal_analysis()
+
+# Newest signal_history id already pushed to SSE clients
+_LAST_PUSHED_SIGNAL_ID = None
+SIGNAL_PUSH_BATCH = 200      # rows per query; a bigger backlog goes out in several events
+
+def publish_new_signals():
+    """Push signal_history rows saved since the last cycle (any writer) as SSE 'signal' events"""
+    global _LAST_PUSHED_SIGNAL_ID
     try:
-        from db import get_current_holdings, get_ticker_settings
-        holdings = get_current_holdings()
-        settings = get_ticker_settings()
+        from report_stream import hub
+        from db import get_signals_after, get_latest_signal_id
+        if _LAST_PUSHED_SIGNAL_ID is None:
+            # First cycle: start from the newest row, history is not replayed
+            _LAST_PUSHED_SIGNAL_ID = get_latest_signal_id()
+            return
+        while True:
+            rows = get_signals_after(_LAST_PUSHED_SIGNAL_ID, SIGNAL_PUSH_BATCH)
+            if not rows: break
+            hub.publish_event("signal", rows)
+            _LAST_PUSHED_SIGNAL_ID = rows[-1]['id']
+            if len(rows) < SIGNAL_PUSH_BATCH: break
+    except Exception as e:
+        print(f"Signal Push Error: {e}")
 
-        # Run standard analysis
-        data = run_analysis(holdings)
-        
-        # Add visibility flag to each stock
-        for stock in data.get('stocks', []):
-            ticker = stock['ticker']
-            stock['is_visible'] = settings.get(ticker, True) # Default to True
-        
-        # Old Mock Insight Removed. Prefer analysis.py's Trade Guidelines.
-        # Ensure data['insight'] exists; it should from run_analysis.
-        if 'insight' not in data:
-            data['insight'] = "데이터 분석 중..."
+def _build_first_report():
+    from report_store import publish_report
+    from db import get_current_holdings, get_ticker_settings
+    return publish_report(run_analysis(get_current_holdings()), get_ticker_settings())
 
-        
-        return data
+@app.get("/api/report")
+async def get_report(request: Request):
+    try:
+        from report_store import get_report as get_cycle_report
+        report = get_cycle_report()
+        if report is None:
+            # Before the first scheduler cycle: run once (off the event loop) and cache
+            report = await run_db(_build_first_report)
+
+        if request.headers.get("if-none-match") == report.etag:
+            return Response(status_code=304, headers={"ETag": report.etag})
+        return Response(content=report.body, media_type="application/json", headers={"ETag": report.etag})
     except Exception as e:
         print(f"Error: {e}")
         return {"error": str(e)}
 
+@app.get("/api/stream")
+async def report_stream(request: Request):
+    """SSE: 'snapshot' on connect, then per-cycle 'delta' and 'signal' events"""
+    from report_stream import hub
+    from report_store import get_report as get_cycle_report
+    if not hub.has_snapshot() and (report := get_cycle_report()) is not None:
+        hub.publish_report(report.body)
+    q = hub.subscribe()
+    return StreamingResponse(hub.stream(request, q), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/api/health")
 def health_check():
     return {"status": "ok"}
 
+@app.get("/api/metrics")
+def api_metrics():
+    """Prometheus scrape target (stage timings, external calls, DB queries)"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/api/signals")
-def api_get_signals(ticker: str = None, start_date: str = None, end_date: str = None, limit: int = 30):
-    return get_signals(ticker, start_date, end_date, limit)
+async def api_get_signals(ticker: str = None, start_date: str = None, end_date: str = None, limit: int = 30):
+    return await run_db(get_signals, ticker, start_date, end_date, limit)
+
+@app.get("/api/indicators/{ticker}")
+async def api_indicator_range(ticker: str, timeframe: str = "30m", start: str = None, end: str = None, limit: int = 500):
+    """Indicator snapshots for charts / backtests: timeframe raw | 5m | 30m | 1d, start/end in NY time"""
+    from indicator_store import query
+    try:
+        return await run_db(query, ticker.upper(), timeframe, start, end, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/indicators/rollup")
+async def api_indicator_rollup(days: int = 2):
+    """Recompute indicator roll-ups for the last N days (backfill after migration)"""
+    from indicator_store import rollup, status
+    rows = await run_db(rollup, days)
+    return {"rows": rows, **status()}
 
 @app.delete("/api/signals/all")
 def api_delete_all_signals():
@@ -465,10 +643,10 @@ def api_delete_signal(id: int):
     return {"status": "error"}
 
 @app.get("/api/managed-stocks")
-def get_managed_stocks_api():
+async def get_managed_stocks_api():
     try:
         from db import get_managed_stocks
-        stocks = get_managed_stocks()
+        stocks = await run_db(get_managed_stocks)
         return stocks
     except Exception as e:
         print(f"Error fetching managed stocks: {e}")
@@ -512,18 +690,20 @@ def api_get_dashboard_settings():
 @app.post("/api/dashboard-settings")
 def api_update_dashboard_setting(setting: TickerSettingUpdate):
     if update_ticker_setting(setting.ticker, setting.is_visible):
+        from report_store import refresh_visibility
+        refresh_visibility(get_ticker_settings())
         return {"status": "success"}
     return {"status": "error"}
 
 @app.get("/api/exchange-rate")
-def api_get_exchange_rate():
+async def api_get_exchange_rate():
     from analysis import MARKET_INDICATORS
-    import yfinance as yf
+    from quote_service import get_market_snapshot
     try:
-        t = yf.Ticker(MARKET_INDICATORS["KRW"])
-        hist = t.history(period="1d")
-        if not hist.empty:
-            return {"rate": float(hist['Close'].iloc[-1])}
+        sym = MARKET_INDICATORS["KRW"]
+        snap = await run_ext(get_market_snapshot, [sym])
+        if sym in snap:
+            return {"rate": snap[sym]['price']}
         return {"rate": 1350.0}
     except:
         return {"rate": 1350.0}
@@ -538,23 +718,36 @@ class SMSPostModel(BaseModel):
 def api_test_sms(data: SMSPostModel):
     # Check enabled? User might want to force test even if disabled. 
     # Let's allow test.
-    from sms import send_sms
+    # Sent directly (not via the outbox) so the caller sees the gateway result
+    from sms import send_sms_now, format_sms
     from datetime import datetime
     
     signal_time = datetime.now().strftime("%m/%d %H:%M")
-    success = send_sms(
-        stock_name=data.stock_name,
-        signal_type=data.signal_type,
-        price=data.price,
-        signal_time=signal_time,
-        reason=data.reason
-    )
+    success, _ = send_sms_now(format_sms(data.stock_name, data.signal_type, data.price, data.reason))
     
     msg = f"[{signal_time}] [{data.stock_name}] [{data.signal_type}] [${data.price}] [{data.reason}]"
     save_sms_log(receiver="01044900528", message=msg, status="Success" if success else "Failed")
     
     return {"status": "success" if success else "error"}
 
+@app.get("/api/sms/outbox")
+def api_sms_outbox():
+    """Outbox state: queued / in-flight, counts per status, recent permanent failures"""
+    from sms import outbox_status
+    return outbox_status()
+
+@app.get("/api/system/write-behind")
+def api_write_behind():
+    """Write-behind buffer: rows pending per table, age of the oldest row, last flush"""
+    import write_behind
+    return write_behind.status()
+
+@app.get("/api/system/notify-index")
+def api_notify_index():
+    """In-memory recent signal / SMS index used for de-dup and throttling"""
+    import notify_index
+    return notify_index.status()
+
 @app.get("/api/sms/history")
 def api_get_sms_history(limit: int = 30):
     return get_sms_logs(limit=limit)
@@ -659,65 +852,38 @@ def api_delete_transaction(id: int):
 
 @app.get("/api/transactions/stats")
 def api_get_txn_stats():
-    txns = get_transactions()
-    if not txns: return []
-
-    # Calculate Realized Profit based on FIFO
-    inventory = {} 
-    results = [] 
-    
-    # Sort by date asc
-    txns_sorted = sorted(txns, key=lambda x: x['trade_date'])
-    
-    for t in txns_sorted:
-        ticker = t['ticker']
-        if ticker not in inventory: inventory[ticker] = []
-        
-        if t['trade_type'] == 'BUY':
-            inventory[ticker].append({'price': t['price'], 'qty': t['qty'], 'date': t['trade_date']})
-        elif t['trade_type'] == 'SELL':
-            sell_qty = t['qty']
-            sell_price = t['price']
-            
-            cost_basis = 0
-            qty_filled = 0
-            
-            while sell_qty > 0 and inventory[ticker]:
-                batch = inventory[ticker][0] # First item
-                
-                if batch['qty'] <= sell_qty:
-                    cost_basis += batch['price'] * batch['qty']
-                    qty_filled += batch['qty']
-                    sell_qty -= batch['qty']
-                    inventory[ticker].pop(0)
-                else:
-                    cost_basis += batch['price'] * sell_qty
-                    qty_filled += sell_qty
-                    batch['qty'] -= sell_qty
-                    sell_qty = 0
-            
-            # If we sold something
-            if qty_filled > 0:
-                avg_buy_price = cost_basis / qty_filled
-                profit = (sell_price - avg_buy_price) * qty_filled
-                pct = ((sell_price - avg_buy_price) / avg_buy_price) * 100
-                
-                results.append({
-                    "ticker": ticker,
-                    "date": t['trade_date'],
-                    "qty": qty_filled,
-                    "profit": round(profit, 2),
-                    "pct": round(pct, 2)
-                })
-                
-    return results
+    """Realized profit per SELL (FIFO), served from the materialized lot ledger"""
+    from lot_ledger import realized_trades
+    return realized_trades()
+
+@app.get("/api/system-trades/summary")
+def api_system_trade_summary(ticker: str = None):
+    """Simulated system trade performance (win rate, returns, max drawdown), overall or per ticker"""
+    import trade_stats
+    if ticker:
+        return trade_stats.summary(ticker.upper())
+    return {"total": trade_stats.summary(), "by_ticker": trade_stats.all_summaries()}
+
+@app.get("/api/equity/curve")
+async def api_equity_curve(start: str = None, end: str = None, points: int = 500):
+    """Mark-to-market equity / cash / exposure series (USD + KRW), downsampled to `points` buckets"""
+    from equity_curve import query
+    return await run_db(query, start, end, points)
+
+@app.get("/api/transactions/ledger")
+def api_get_txn_ledger(ticker: str = None):
+    """Open FIFO lots (one ticker) or per-ticker open qty / cost basis / realized profit"""
+    from lot_ledger import open_lots, summary
+    if ticker:
+        return open_lots(ticker.upper())
+    return summary()
 
 @app.get("/api/requests")
 async def get_requests():
     """Get all tracked user requests"""
     try:
         from db import get_user_requests
-        reqs = get_user_requests()
+        reqs = await run_db(get_user_requests)
         return reqs
     except Exception as e:
         print(f"Get Requests Error: {e}")
@@ -733,7 +899,7 @@ async def create_request(item: RequestItem):
     """Log a new user request"""
     try:
         from db import add_user_request
-        add_user_request(item.request_text, item.ai_interpretation, item.implementation_details)
+        await run_db(add_user_request, item.request_text, item.ai_interpretation, item.implementation_details)
         return {"status": "success"}
     except Exception as e:
         print(f"Add Request Error: {e}")
@@ -813,39 +979,25 @@ def me_api(token: str):
         return {"status": "error", "message": "Invalid token"}
 
 @app.get("/api/v2/status/{ticker}")
-def get_v2_status(ticker: str):
+async def get_v2_status(ticker: str):
     """Get V2 Signal Status (Buy/Sell) + Market Info"""
     try:
         from db import get_v2_buy_status, get_v2_sell_status, get_market_indices
+        from v2_state import serialize
         ticker = ticker.upper()
         
-        buy_record = get_v2_buy_status(ticker)
-        sell_record = get_v2_sell_status(ticker)
-        
+        # Independent queries -> run concurrently (separate pooled connections)
         # Get current_price from market_indices (Single Source of Truth)
-        market_data = get_market_indices()
+        buy_record, sell_record, market_data = await asyncio.gather(
+            run_db(get_v2_buy_status, ticker),
+            run_db(get_v2_sell_status, ticker),
+            run_db(get_market_indices)
+        )
         market_info = next((m for m in market_data if m['ticker'] == ticker), None)
         
         current_price = float(market_info['current_price']) if market_info else 0.0
         change_pct = float(market_info.get('change_pct', 0.0)) if market_info else 0.0
         
-        # Convert decimals to float for JSON serialization
-        def serialize(obj):
-            if not obj: return None
-            # Ensure obj is a dict, not a list
-            if isinstance(obj, list):
-                return None
-            # If it's already a dict, use it; otherwise convert
-            new_obj = obj if isinstance(obj, dict) else dict(obj)
-            for k, v in new_obj.items():
-                from decimal import Decimal
-                from datetime import datetime
-                if isinstance(v, Decimal):
-                    new_obj[k] = float(v)
-                elif isinstance(v, datetime):
-                    new_obj[k] = v.isoformat()
-            return new_obj
-
         return {
             "status": "success",
             "buy": serialize(buy_record),
@@ -0,0 +1,288 @@
+"""
+US Market Session Calendar
+NYSE holiday / early-close table, pre / regular / post session boundaries and
+DST transitions, plus shared timezone objects and vectorized KST/NY formatting.
+
+Day info is computed once per date and memoized, so session lookups are O(1)
+dict hits after the first call. Naive timestamps are treated as New York time
+(DB candles and yfinance data are stored as naive NY time).
+"""
+
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pytz
+
+KST = pytz.timezone('Asia/Seoul')
+NY = pytz.timezone('America/New_York')
+UTC = timezone.utc
+
+# Session boundaries (NY local minutes since midnight)
+PRE_OPEN = 4 * 60
+REGULAR_OPEN = 9 * 60 + 30
+REGULAR_CLOSE = 16 * 60
+EARLY_CLOSE = 13 * 60
+POST_CLOSE = 20 * 60
+EARLY_POST_CLOSE = 17 * 60    # after-hours end 4h after a 13:00 early close
+
+CLOSED, PRE, REGULAR, POST = "closed", "pre", "regular", "post"
+
+
+# --- Holiday table ---
+def _nth_weekday(year, month, weekday, n):
+    """n-th weekday (Mon=0) of month; n=-1 for the last"""
+    if n > 0:
+        d = date(year, month, 1)
+        d += timedelta(days=(weekday - d.weekday()) % 7)
+        return d + timedelta(weeks=n - 1)
+    d = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return d - timedelta(days=(d.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    """Gregorian Easter Sunday (Anonymous algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _observed(d):
+    """Saturday -> Friday, Sunday -> Monday"""
+    if d.weekday() == 5: return d - timedelta(days=1)
+    if d.weekday() == 6: return d + timedelta(days=1)
+    return d
+
+
+@lru_cache(maxsize=64)
+def nyse_holidays(year):
+    """{date: name} of full-day NYSE closures"""
+    h = {}
+    ny = date(year, 1, 1)
+    if ny.weekday() != 5:  # NYSE does not observe New Year's Day on the prior Friday
+        h[_observed(ny)] = "New Year's Day"
+    h[_nth_weekday(year, 1, 0, 3)] = "Martin Luther King Jr. Day"
+    h[_nth_weekday(year, 2, 0, 3)] = "Washington's Birthday"
+    h[_easter(year) - timedelta(days=2)] = "Good Friday"
+    h[_nth_weekday(year, 5, 0, -1)] = "Memorial Day"
+    if year >= 2022:
+        h[_observed(date(year, 6, 19))] = "Juneteenth"
+    h[_observed(date(year, 7, 4))] = "Independence Day"
+    h[_nth_weekday(year, 9, 0, 1)] = "Labor Day"
+    h[_nth_weekday(year, 11, 3, 4)] = "Thanksgiving Day"
+    h[_observed(date(year, 12, 25))] = "Christmas Day"
+    return h
+
+
+@lru_cache(maxsize=64)
+def nyse_early_closes(year):
+    """{date: name} of 13:00 ET early closes"""
+    e = {}
+    jul3 = date(year, 7, 3)
+    if jul3.weekday() < 5 and jul3 not in nyse_holidays(year):
+        e[jul3] = "Independence Day Eve"
+    e[_nth_weekday(year, 11, 3, 4) + timedelta(days=1)] = "Black Friday"
+    dec24 = date(year, 12, 24)
+    if dec24.weekday() < 5 and dec24 not in nyse_holidays(year):
+        e[dec24] = "Christmas Eve"
+    return e
+
+
+@lru_cache(maxsize=4096)
+def day_info(d):
+    """(is_trading_day, regular_close_minute, holiday_name) for a NY calendar date"""
+    if d.weekday() >= 5:
+        return False, 0, "Weekend"
+    name = nyse_holidays(d.year).get(d)
+    if name:
+        return False, 0, name
+    return True, (EARLY_CLOSE if d in nyse_early_closes(d.year) else REGULAR_CLOSE), None
+
+
+def is_trading_day(d):
+    return day_info(d)[0]
+
+
+def post_close_minute(close_min):
+    return EARLY_POST_CLOSE if close_min == EARLY_CLOSE else POST_CLOSE
+
+
+def previous_trading_day(d):
+    d -= timedelta(days=1)
+    while not is_trading_day(d):
+        d -= timedelta(days=1)
+    return d
+
+
+def next_trading_day(d):
+    d += timedelta(days=1)
+    while not is_trading_day(d):
+        d += timedelta(days=1)
+    return d
+
+
+# --- DST ---
+@lru_cache(maxsize=64)
+def dst_transitions(year):
+    """(start, end) dates of US DST: 2nd Sunday of March, 1st Sunday of November"""
+    return _nth_weekday(year, 3, 6, 2), _nth_weekday(year, 11, 6, 1)
+
+
+def is_dst(d):
+    start, end = dst_transitions(d.year)
+    return start <= d < end
+
+
+def kst_ny_offset_hours(d):
+    """KST is 13h ahead of New York during DST, 14h otherwise"""
+    return 13 if is_dst(d) else 14
+
+
+# --- Conversions ---
+def to_ny(ts):
+    """datetime / Timestamp -> aware NY datetime (naive = NY local)"""
+    if ts.tzinfo is None:
+        return NY.localize(ts.to_pydatetime() if hasattr(ts, 'to_pydatetime') else ts)
+    return ts.astimezone(NY)
+
+
+def now_ny():
+    return datetime.now(UTC).astimezone(NY)
+
+
+def now_kst():
+    return datetime.now(UTC).astimezone(KST)
+
+
+def session_at(ts=None):
+    """Session name (closed/pre/regular/post) for a timestamp (default: now)"""
+    t = to_ny(ts) if ts is not None else now_ny()
+    trading, close_min, _ = day_info(t.date())
+    if not trading: return CLOSED
+    m = t.hour * 60 + t.minute
+    if m < PRE_OPEN: return CLOSED
+    if m < REGULAR_OPEN: return PRE
+    if m < close_min: return REGULAR
+    if m < post_close_minute(close_min): return POST
+    return CLOSED
+
+
+def is_regular_session(ts=None):
+    return session_at(ts) == REGULAR
+
+
+def session_bounds(d):
+    """Aware NY datetimes {pre_open, open, close, post_close} for a trading day, None otherwise"""
+    trading, close_min, _ = day_info(d)
+    if not trading: return None
+    at = lambda m: NY.localize(datetime.combine(d, dtime(m // 60, m % 60)))
+    return {"pre_open": at(PRE_OPEN), "open": at(REGULAR_OPEN),
+            "close": at(close_min), "post_close": at(post_close_minute(close_min))}
+
+
+def trading_days(start, end):
+    """Trading dates in [start, end]"""
+    out, d = [], start
+    while d <= end:
+        if is_trading_day(d): out.append(d)
+        d += timedelta(days=1)
+    return out
+
+
+@lru_cache(maxsize=2048)
+def bar_starts(d, interval_min, extended=True):
+    """Naive NY start times of every intraday bar the session of `d` should produce"""
+    trading, close_min, _ = day_info(d)
+    if not trading: return pd.DatetimeIndex([])
+    first = PRE_OPEN if extended else REGULAR_OPEN
+    last = post_close_minute(close_min) if extended else close_min
+    base = pd.Timestamp(d)
+    return pd.date_range(base + pd.Timedelta(minutes=first), base + pd.Timedelta(minutes=last - interval_min),
+                         freq=f"{interval_min}min")
+
+
+def last_expected_bar_time(now=None):
+    """Latest moment a bar could exist: now inside an (extended) session, else the last session end"""
+    t = to_ny(now) if now is not None else now_ny()
+    d = t.date()
+    if is_trading_day(d):
+        b = session_bounds(d)
+        if t >= b["pre_open"]:
+            return min(t, b["post_close"])
+    return session_bounds(previous_trading_day(d))["post_close"]
+
+
+def session_time(start, end, limit=None):
+    """
+    Extended-session (pre_open..post_close) time between two timestamps.
+    Overnight gaps, weekends and holidays count as zero. Stops early once `limit` is exceeded.
+    """
+    a, b = to_ny(start), to_ny(end)
+    total, d = timedelta(0), a.date()
+    while d <= b.date():
+        s = session_bounds(d)
+        if s:
+            lo, hi = max(a, s["pre_open"]), min(b, s["post_close"])
+            if hi > lo: total += hi - lo
+            if limit is not None and total > limit: break
+        d += timedelta(days=1)
+    return total
+
+
+def is_stale(latest_ts, now=None, grace=timedelta(hours=6)):
+    """
+    True if more than `grace` of extended-session time has passed since the latest bar.
+    Overnight gaps, weekends and holidays are not counted, so Monday 04:10 data from
+    Friday 19:30 (or 04:05 data from the evening before) is not stale.
+    """
+    if latest_ts is None: return True
+    t = to_ny(now) if now is not None else now_ny()
+    return session_time(latest_ts, t, limit=grace) > grace
+
+
+# --- Vectorized formatting ---
+def localize_index(idx):
+    """DatetimeIndex -> NY-aware DatetimeIndex (naive treated as NY)"""
+    idx = pd.DatetimeIndex(idx)
+    if idx.tz is None:
+        return idx.tz_localize(NY, ambiguous='NaT', nonexistent='shift_forward')
+    return idx.tz_convert(NY)
+
+
+def format_index(idx, tz=KST, fmt='%m-%d %H:%M'):
+    """Whole-index timezone conversion + strftime (one call instead of per-row astimezone)"""
+    return np.asarray(localize_index(idx).tz_convert(tz).strftime(fmt))
+
+
+def fmt_kr_ny(ts, fmt='%m-%d %H:%M'):
+    """{'kr': ..., 'ny': ...} labels for one timestamp"""
+    t = to_ny(ts)
+    return {"kr": t.astimezone(KST).strftime(fmt), "ny": t.strftime(fmt)}
+
+
+def sessions_for_index(idx):
+    """Vectorized session labels for a DatetimeIndex (per-day info memoized)"""
+    ny_idx = localize_index(idx)
+    mins = np.asarray(ny_idx.hour * 60 + ny_idx.minute)
+    days = np.asarray(ny_idx.date)
+    out = np.full(len(ny_idx), CLOSED, dtype=object)
+    for d in np.unique(days[~pd.isna(days)]) if len(days) else []:
+        trading, close_min, _ = day_info(d)
+        if not trading: continue
+        mask = days == d
+        m = mins[mask]
+        lab = np.where(m < PRE_OPEN, CLOSED,
+              np.where(m < REGULAR_OPEN, PRE,
+              np.where(m < close_min, REGULAR,
+              np.where(m < post_close_minute(close_min), POST, CLOSED))))
+        out[mask] = lab
+    return out
@@ -0,0 +1,311 @@
+"""
+Hot-Path Metrics
+In-process counters and latency histograms for the scheduler cycle
+(candle load, KIS patch, indicators, triple filter, V2 state machine, SMS,
+DB writes), rendered in Prometheus text format at /api/metrics.
+
+Usage:
+  with metrics.stage("triple_filter"): ...
+  metrics.inc("external_calls_total", source="kis", endpoint="price")
+  with metrics.cycle("monitor"): ...   # per-cycle call/query counts
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+PREFIX = "money"
+
+# Seconds; hot-path stages range from sub-ms (cached lookups) to tens of seconds (yfinance)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+WINDOW = 512           # rolling samples per series for recent quantiles
+QUANTILES = (0.5, 0.95, 0.99)
+
+_lock = threading.Lock()
+_counters = {}         # (name, labels) -> float
+_histograms = {}       # (name, labels) -> _Histogram
+_gauges = {}           # (name, labels) -> float
+_NAME_BUCKETS = {}      # histogram name -> bucket bounds when BUCKETS don't fit (register_buckets)
+_HELP = {
+    "stage_seconds": "Wall time per hot-path stage",
+    "stage_recent_seconds": "Rolling quantiles of the last samples per stage",
+    "external_calls_total": "Outbound calls (KIS, yfinance, SMS gateway)",
+    "external_call_seconds": "Outbound call latency",
+    "db_queries_total": "SQL statements executed",
+    "stage_errors_total": "Stages that raised",
+    "cycle_seconds": "Scheduler cycle wall time",
+    "cycle_external_calls": "Outbound calls made during the last cycle",
+    "cycle_db_queries": "SQL statements executed during the last cycle",
+    "job_overruns_total": "Scheduler runs that took longer than their interval",
+    "job_skipped_total": "Scheduler runs skipped or missed because the previous run was still going",
+    "candle_gap_bars": "Missing market_candles bars vs the session calendar (last scan)",
+    "backfill_bars_total": "Missing bars filled by targeted backfill",
+    "quote_source_seconds": "Quote source round latency (deadline when it timed out)",
+    "quote_source_errors_total": "Quote source rounds that failed, timed out or returned nothing",
+    "quote_source_healthy": "1 if the quote source is in rotation, 0 while demoted",
+    "sms_enqueued_total": "SMS messages queued by the signal engines",
+    "sms_sent_total": "Outbox rows delivered to the SMS gateway",
+    "sms_send_failures_total": "Outbox rows whose send attempt failed (retried with backoff)",
+    "sms_outbox_pending": "Outbox rows due for sending at the last dispatcher pass",
+    "notify_index_lookups_total": "Signal de-dup / SMS throttle checks answered from the in-memory index",
+    "writebehind_rows_total": "Rows buffered for write-behind INSERT",
+    "writebehind_flushes_total": "Write-behind batches committed",
+    "writebehind_flush_failures_total": "Write-behind batches that failed (rows kept for retry)",
+    "writebehind_dropped_total": "Buffered rows dropped because the buffer was full",
+    "writebehind_delay_seconds": "Time the oldest row of a batch waited before its COMMIT",
+    "writebehind_pending": "Rows left in the write-behind buffer after the last flush",
+    "indicator_log_skipped_total": "Indicator log rows skipped because nothing changed since the last write",
+    "indicator_query_cache_hits_total": "Indicator range queries answered from the short-lived cache",
+    "equity_usd": "Mark-to-market portfolio equity at the last price update (USD)",
+    "cadence_runs_total": "Scheduler ticks let through by the session cadence policy",
+    "cadence_skipped_total": "Scheduler ticks skipped by the session cadence policy",
+    "cadence_calls_saved_total": "Estimated outbound calls avoided by skipped ticks",
+    "bar_signal_latency_seconds": "Bar close to signal saved / SMS queued",
+}
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "total", "n", "recent")
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.n = 0
+        self.recent = deque(maxlen=WINDOW)
+
+    def observe(self, v):
+        for i, b in enumerate(self.buckets):
+            if v <= b:
+                self.counts[i] += 1
+                break
+        self.total += v
+        self.n += 1
+        self.recent.append(v)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def inc(name, value=1, **labels):
+    k = _key(name, labels)
+    with _lock:
+        _counters[k] = _counters.get(k, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def register_buckets(name, buckets):
+    """Custom bucket bounds for a histogram (before its first observe)"""
+    _NAME_BUCKETS[name] = tuple(buckets)
+
+
+def observe(name, seconds, **labels):
+    k = _key(name, labels)
+    with _lock:
+        h = _histograms.get(k)
+        if h is None:
+            h = _histograms[k] = _Histogram(_NAME_BUCKETS.get(name, BUCKETS))
+        h.observe(seconds)
+
+
+@contextmanager
+def stage(name, **labels):
+    """Time a block as stage_seconds{stage=name}; exceptions are counted and re-raised"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        inc("stage_errors_total", stage=name, **labels)
+        raise
+    finally:
+        observe("stage_seconds", time.perf_counter() - t0, stage=name, **labels)
+
+
+def timed(name, **labels):
+    """Decorator form of stage()"""
+    def wrap(fn):
+        def inner(*args, **kwargs):
+            with stage(name, **labels):
+                return fn(*args, **kwargs)
+        inner.__name__ = fn.__name__
+        inner.__doc__ = fn.__doc__
+        inner.__wrapped__ = fn
+        return inner
+    return wrap
+
+
+@contextmanager
+def external(source, endpoint):
+    """Count + time one outbound call"""
+    inc("external_calls_total", source=source, endpoint=endpoint)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("external_call_seconds", time.perf_counter() - t0, source=source, endpoint=endpoint)
+
+
+def external_calls():
+    """Outbound calls made so far (all sources)"""
+    with _lock:
+        return sum(v for (n, _), v in _counters.items() if n == "external_calls_total")
+
+
+def _sum_by(name, label):
+    out = {}
+    with _lock:
+        for (n, labels), v in _counters.items():
+            if n != name: continue
+            lv = dict(labels).get(label, "")
+            out[lv] = out.get(lv, 0) + v
+    return out
+
+
+@contextmanager
+def cycle(name):
+    """Scheduler cycle: wall time plus external calls / DB queries made during it"""
+    ext0 = _sum_by("external_calls_total", "source")
+    db0 = sum(_sum_by("db_queries_total", "kind").values())
+    with stage(name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            observe("cycle_seconds", time.perf_counter() - t0, cycle=name)
+            ext1 = _sum_by("external_calls_total", "source")
+            for src in set(ext0) | set(ext1):
+                set_gauge("cycle_external_calls", ext1.get(src, 0) - ext0.get(src, 0), cycle=name, source=src)
+            set_gauge("cycle_db_queries", sum(_sum_by("db_queries_total", "kind").values()) - db0, cycle=name)
+
+
+# --- DB query counting (wraps pooled pymysql connections) ---
+class _CountingCursor:
+    __slots__ = ("_cur",)
+
+    def __init__(self, cur):
+        self._cur = cur
+
+    def execute(self, sql, args=None):
+        inc("db_queries_total", kind=_kind(sql))
+        return self._cur.execute(sql, args)
+
+    def executemany(self, sql, args):
+        inc("db_queries_total", kind=_kind(sql))
+        return self._cur.executemany(sql, args)
+
+    def __getattr__(self, item):
+        return getattr(self._cur, item)
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return self._cur.__exit__(*exc)
+
+
+class CountingConnection:
+    """Connection proxy whose cursors count executed statements"""
+    __slots__ = ("_conn",)
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return _CountingCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, item):
+        return getattr(self._conn, item)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+
+def _kind(sql):
+    head = sql.lstrip()[:6].upper()
+    return head if head in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+
+# --- Prometheus text exposition ---
+def _fmt_labels(labels, extra=None):
+    items = list(labels) + (list(extra.items()) if extra else [])
+    if not items: return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+def _header(lines, name, kind):
+    full = f"{PREFIX}_{name}"
+    lines.append(f"# HELP {full} {_HELP.get(name, name)}")
+    lines.append(f"# TYPE {full} {kind}")
+    return full
+
+
+def render():
+    """Prometheus text format (version 0.0.4)"""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        hists = {k: (h.buckets, list(h.counts), h.total, h.n, sorted(h.recent)) for k, h in _histograms.items()}
+
+    lines = []
+    for name in sorted({n for n, _ in counters}):
+        full = _header(lines, name, "counter")
+        for (n, labels), v in sorted(counters.items()):
+            if n == name: lines.append(f"{full}{_fmt_labels(labels)} {v:g}")
+
+    for name in sorted({n for n, _ in gauges}):
+        full = _header(lines, name, "gauge")
+        for (n, labels), v in sorted(gauges.items()):
+            if n == name: lines.append(f"{full}{_fmt_labels(labels)} {v:g}")
+
+    for name in sorted({n for n, _ in hists}):
+        full = _header(lines, name, "histogram")
+        series = sorted((k, v) for k, v in hists.items() if k[0] == name)
+        for (_, labels), (buckets, counts, total, n, _recent) in series:
+            acc = 0
+            for b, c in zip(buckets, counts):
+                acc += c
+                lines.append(f"{full}_bucket{_fmt_labels(labels, {'le': f'{b:g}'})} {acc}")
+            lines.append(f"{full}_bucket{_fmt_labels(labels, {'le': '+Inf'})} {n}")
+            lines.append(f"{full}_sum{_fmt_labels(labels)} {total:.6f}")
+            lines.append(f"{full}_count{_fmt_labels(labels)} {n}")
+
+        # Rolling window quantiles (recent behaviour, unlike the cumulative buckets)
+        rname = name.replace("_seconds", "_recent_seconds")
+        rfull = _header(lines, rname, "summary")
+        for (_, labels), (_b, _c, _t, _n, recent) in series:
+            if not recent: continue
+            for q in QUANTILES:
+                v = recent[min(len(recent) - 1, int(q * len(recent)))]
+                lines.append(f"{rfull}{_fmt_labels(labels, {'quantile': f'{q:g}'})} {v:.6f}")
+            lines.append(f"{rfull}_sum{_fmt_labels(labels)} {sum(recent):.6f}")
+            lines.append(f"{rfull}_count{_fmt_labels(labels)} {len(recent)}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    """Plain dict view (debug endpoints / bench)"""
+    with _lock:
+        return {
+            "counters": {f"{n}{_fmt_labels(l)}": v for (n, l), v in _counters.items()},
+            "gauges": {f"{n}{_fmt_labels(l)}": v for (n, l), v in _gauges.items()},
+            "stages_ms": {f"{n}{_fmt_labels(l)}": round(h.total / h.n * 1000, 2)
+                          for (n, l), h in _histograms.items() if h.n},
+        }
+
+
+def reset():
+    with _lock:
+        _counters.clear(); _gauges.clear(); _histograms.clear()
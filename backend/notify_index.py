@@ -0,0 +1,194 @@
+"""
+Recent Notification Index
+In-memory view of recent signal_history / sms_logs rows so the de-dup and SMS
+throttle checks in monitor_signals and check_triple_filter are dict lookups
+instead of SQL (LIKE scans, 7-day windows) on every cycle.
+
+Keys are (kind, ...) tuples mapped to the last time they were seen; expiry runs
+through minute buckets so pruning only touches keys that actually aged out.
+Warmed from the DB on first use and updated by db.save_signal / save_sms_log,
+so the DB is only touched on writes. Deletes through the API reset the index.
+
+Usage:
+  seen_signal("SOXL", signal_type="BUY (MASTER)", minutes=30)
+  seen_sms("SOXL", "마스터 SOXL 진입", minutes=30)     # same match as the old LIKE query
+"""
+
+import re
+import threading
+import time
+from datetime import datetime
+
+import metrics
+from applog import get_logger
+
+log = get_logger("notify_index")
+
+BUCKET_SEC = 60
+SIGNAL_RETENTION_MIN = 7 * 24 * 60   # longest de-dup window (7-day position check)
+SMS_RETENTION_MIN = 24 * 60
+_TOKEN = re.compile(r"\[([^\]]*)\]")
+
+
+class RecentIndex:
+    """key -> last seen epoch seconds, expired through minute buckets"""
+    __slots__ = ("retention", "_last", "_buckets")
+
+    def __init__(self, retention_min):
+        self.retention = retention_min * 60
+        self._last = {}
+        self._buckets = {}       # bucket -> [keys]; dicts keep insertion order, buckets arrive ~monotonic
+
+    def add(self, key, ts):
+        if ts > self._last.get(key, 0):
+            self._last[key] = ts
+        self._buckets.setdefault(int(ts // BUCKET_SEC), []).append(key)
+
+    def seen_within(self, key, minutes, now):
+        ts = self._last.get(key)
+        return ts is not None and now - ts <= minutes * 60
+
+    def prune(self, now):
+        cutoff = now - self.retention
+        limit = int(cutoff // BUCKET_SEC)
+        for b in [b for b in self._buckets if b < limit]:
+            for key in self._buckets.pop(b):
+                if self._last.get(key, now) < cutoff:
+                    del self._last[key]
+
+    def __len__(self):
+        return len(self._last)
+
+
+_lock = threading.Lock()
+_signals = RecentIndex(SIGNAL_RETENTION_MIN)
+_sms = RecentIndex(SMS_RETENTION_MIN)
+_last_signal = {}                    # ticker -> {'signal_time', 'position_desc', 'position', 'signal_type'}
+_state = {"warm": False, "pruned_at": 0.0}
+
+
+def _epoch(v):
+    if isinstance(v, datetime): return v.timestamp()
+    if v is None: return time.time()
+    return datetime.strptime(str(v)[:19], '%Y-%m-%d %H:%M:%S').timestamp()
+
+
+def _sms_keys(message):
+    """(a, b) pairs of bracketed tokens: '[SOXL] [매수] ...' matches LIKE '%[SOXL]%' AND '%[매수]%'"""
+    tokens = list(dict.fromkeys(_TOKEN.findall(message or "")))
+    return [(a, b) for a in tokens for b in tokens]
+
+
+def _add_signal(ticker, signal_type, position, signal_time, created_ts=None):
+    if created_ts is not None:
+        _signals.add(("type", ticker, signal_type), created_ts)
+        _signals.add(("pos", ticker, position), created_ts)
+    last = _last_signal.get(ticker)
+    if signal_time is not None and (last is None or str(signal_time) >= str(last['signal_time'])):
+        _last_signal[ticker] = {"ticker": ticker, "signal_time": signal_time, "signal_type": signal_type,
+                                "position_desc": position, "position": position}
+
+
+# --- Warm / reset ---
+def _warm():
+    from db import get_connection
+    t0 = time.perf_counter()
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT ticker, signal_type, position_desc, signal_time, created_at FROM signal_history "
+                           "WHERE created_at >= NOW() - INTERVAL 7 DAY ORDER BY id")
+            recent = cursor.fetchall()
+            cursor.execute("SELECT s.ticker, s.signal_type, s.position_desc, s.signal_time FROM signal_history s "
+                           "JOIN (SELECT ticker, MAX(signal_time) AS mt FROM signal_history GROUP BY ticker) m "
+                           "ON s.ticker = m.ticker AND s.signal_time = m.mt")
+            latest = cursor.fetchall()
+            cursor.execute("SELECT message, created_at FROM sms_logs WHERE created_at >= NOW() - INTERVAL 1 DAY")
+            sms_rows = cursor.fetchall()
+    for r in latest:
+        _add_signal(r['ticker'], r['signal_type'], r['position_desc'], r['signal_time'])
+    for r in recent:
+        _add_signal(r['ticker'], r['signal_type'], r['position_desc'], r['signal_time'], _epoch(r['created_at']))
+    for r in sms_rows:
+        ts = _epoch(r['created_at'])
+        for key in _sms_keys(r['message']):
+            _sms.add(key, ts)
+    _state["warm"] = True
+    log.info("notify_index.warmed", signals=len(recent), sms=len(sms_rows),
+             ms=round((time.perf_counter() - t0) * 1000, 1))
+
+
+def _ensure_warm():
+    if _state["warm"]: return
+    with _lock:
+        if not _state["warm"]:
+            _warm()
+
+
+def warm():
+    """Startup hook: load the index now instead of on the first monitor cycle"""
+    _ensure_warm()
+    return status()
+
+
+def reset():
+    """Drop everything (rows were deleted); the next lookup re-warms from the DB"""
+    with _lock:
+        _signals.__init__(SIGNAL_RETENTION_MIN)
+        _sms.__init__(SMS_RETENTION_MIN)
+        _last_signal.clear()
+        _state["warm"] = False
+
+
+def _maybe_prune(now):
+    if now - _state["pruned_at"] >= BUCKET_SEC:
+        _signals.prune(now)
+        _sms.prune(now)
+        _state["pruned_at"] = now
+
+
+# --- Writes (called by db after a successful insert) ---
+def record_signal(ticker, signal_type, position, signal_time=None):
+    if not _state["warm"]: return        # the warm query will include this row
+    now = time.time()
+    with _lock:
+        _add_signal(ticker, signal_type, position, signal_time, now)
+        _maybe_prune(now)
+
+
+def record_sms(message):
+    if not _state["warm"]: return
+    now = time.time()
+    with _lock:
+        for key in _sms_keys(message):
+            _sms.add(key, now)
+        _maybe_prune(now)
+
+
+# --- Lookups ---
+def seen_signal(ticker, signal_type=None, position=None, minutes=30):
+    """A signal_history row for ticker with this type (or position text) was saved within `minutes`"""
+    _ensure_warm()
+    key = ("type", ticker, signal_type) if signal_type is not None else ("pos", ticker, position)
+    hit = _signals.seen_within(key, minutes, time.time())
+    metrics.inc("notify_index_lookups_total", kind="signal", hit=str(hit).lower())
+    return hit
+
+
+def seen_sms(stock_name, signal_type, minutes=30):
+    """An sms_logs message containing [stock_name] and [signal_type] was logged within `minutes`"""
+    _ensure_warm()
+    hit = _sms.seen_within((str(stock_name), str(signal_type)), minutes, time.time())
+    metrics.inc("notify_index_lookups_total", kind="sms", hit=str(hit).lower())
+    return hit
+
+
+def last_signal(ticker):
+    """Latest signal_history entry (by signal_time) for ticker, or None"""
+    _ensure_warm()
+    last = _last_signal.get(ticker)
+    return dict(last) if last else None
+
+
+def status():
+    return {"warm": _state["warm"], "signal_keys": len(_signals), "sms_keys": len(_sms),
+            "tickers": len(_last_signal)}
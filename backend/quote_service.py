@@ -0,0 +1,349 @@
+"""
+Quote Consensus Service
+One entry point for live prices. Every configured source (KIS, yfinance) is
+queried concurrently under a deadline; the answer is picked by agreement
+between sources first, then freshness, then source health.
+
+Per-source latency / error rate are tracked as EWMAs. A source that keeps
+failing or runs past the deadline is demoted (skipped) for a cooldown that
+doubles on repeated failures, then probed again, so one slow source cannot
+stall a cycle. Late answers still land in the per-source cache and are used
+by the next call.
+
+Usage:
+  q = get_quote("SOXL")             # {'price','diff','rate','prev_close','source',...}
+  quotes = get_quotes(["SOXL", "TSLA"], exchanges={"TSLA": "NAS"})
+Env: QUOTE_SOURCES (default "kis,yfinance"), QUOTE_DEADLINE_SEC (default 2.5)
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import metrics
+from applog import get_logger
+
+log = get_logger("quotes")
+
+QUOTE_SOURCES = [s.strip() for s in os.getenv("QUOTE_SOURCES", "kis,yfinance").split(",") if s.strip()]
+QUOTE_DEADLINE_SEC = float(os.getenv("QUOTE_DEADLINE_SEC", "2.5"))
+QUOTE_MAX_WORKERS = 8
+AGREE_PCT = 1.5          # prices within this % of each other are consistent
+MAX_QUOTE_AGE = 120      # seconds a cached source answer may stand in for a missed one
+EWMA_ALPHA = 0.2
+FAIL_LIMIT = 3           # consecutive failed calls before demotion
+ERROR_RATE_LIMIT = 0.5
+BASE_COOLDOWN = 30
+MAX_COOLDOWN = 600
+
+_pool = ThreadPoolExecutor(max_workers=QUOTE_MAX_WORKERS, thread_name_prefix="quote")
+_lock = threading.Lock()
+_cache = {}              # (source, ticker) -> quote dict (with 'as_of', 'fetched_at')
+
+
+class SourceHealth:
+    """EWMA latency / error rate plus demotion state for one source"""
+    __slots__ = ("name", "latency", "error_rate", "fails", "calls", "errors",
+                 "cooldown", "demoted_until", "last_error")
+
+    def __init__(self, name):
+        self.name = name
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.fails = 0
+        self.calls = 0
+        self.errors = 0
+        self.cooldown = BASE_COOLDOWN
+        self.demoted_until = 0.0
+        self.last_error = None
+
+    def record(self, ok, seconds, error=None):
+        with _lock:
+            self.calls += 1
+            self.latency = seconds if self.calls == 1 else (1 - EWMA_ALPHA) * self.latency + EWMA_ALPHA * seconds
+            self.error_rate = (1 - EWMA_ALPHA) * self.error_rate + EWMA_ALPHA * (0.0 if ok else 1.0)
+            if ok:
+                self.fails = 0
+                if self.demoted_until:
+                    log.info("quote.source_restored", source=self.name)
+                self.demoted_until = 0.0
+                self.cooldown = BASE_COOLDOWN
+            else:
+                self.errors += 1
+                self.fails += 1
+                self.last_error = str(error) if error else "empty"
+            unhealthy = self.fails >= FAIL_LIMIT or (self.calls >= 5 and self.error_rate > ERROR_RATE_LIMIT) \
+                or self.latency > QUOTE_DEADLINE_SEC
+            if unhealthy and not ok:
+                self.demoted_until = time.time() + self.cooldown
+                log.warning("quote.source_demoted", source=self.name, cooldown_s=self.cooldown,
+                            error_rate=self.error_rate, latency_s=self.latency, error=self.last_error)
+                self.cooldown = min(MAX_COOLDOWN, self.cooldown * 2)
+        metrics.observe("quote_source_seconds", seconds, source=self.name)
+        if not ok: metrics.inc("quote_source_errors_total", source=self.name)
+        metrics.set_gauge("quote_source_healthy", 0 if self.demoted else 1, source=self.name)
+
+    @property
+    def demoted(self):
+        return time.time() < self.demoted_until
+
+    def score(self):
+        """0..1; higher is better (reliability discounted by latency)"""
+        return (1.0 - self.error_rate) / (1.0 + self.latency / QUOTE_DEADLINE_SEC)
+
+    def as_dict(self):
+        return {"latency_ms": round(self.latency * 1000, 1), "error_rate": round(self.error_rate, 3),
+                "calls": self.calls, "errors": self.errors, "demoted": self.demoted,
+                "demoted_for_s": max(0, round(self.demoted_until - time.time())),
+                "score": round(self.score(), 3), "last_error": self.last_error}
+
+
+# --- Sources: fetch(tickers, exchanges) -> {ticker: quote} ---
+def _fetch_kis(ticker, exchange):
+    from kis_api import kis_client, get_exchange_code
+    q = kis_client.get_price(ticker, exchange=exchange or get_exchange_code(ticker))
+    if not q or not q.get('price'): return {}
+    now = time.time()
+    return {ticker: {"price": q['price'], "diff": q.get('diff', 0.0), "rate": q.get('rate', 0.0),
+                     "prev_close": q['price'] - q.get('diff', 0.0), "exchange": q.get('exchange'),
+                     "as_of": now}}
+
+
+def _fetch_yfinance(tickers):
+    """One batched 1m (extended hours) download for last price; prev close from the cycle snapshot"""
+    import pandas as pd
+    import yfinance as yf
+    with metrics.external("yfinance", "download"):
+        intraday = yf.download(" ".join(tickers), period="1d", interval="1m", prepost=True, group_by='ticker',
+                               threads=True, progress=False, timeout=10)
+    if intraday is None or intraday.empty: return {}
+    close = _field(intraday, 'Close', tickers)
+    snap = get_market_snapshot(tickers)
+
+    out = {}
+    now = time.time()
+    for t in close.columns:
+        col = close[t].dropna()
+        if col.empty: continue
+        price = float(col.iloc[-1])
+        as_of = min(col.index[-1].timestamp() + 60, now)
+        prev_close = (snap.get(t) or {}).get('prev_close')
+        diff = price - prev_close if prev_close else 0.0
+        out[t] = {"price": price, "diff": diff, "rate": diff / prev_close * 100 if prev_close else 0.0,
+                  "prev_close": prev_close, "exchange": None, "as_of": as_of}
+    return out
+
+
+# --- Market snapshot (daily bars, one download per scheduler cycle) ---
+SNAPSHOT_TTL = 55        # seconds; monitor cycle is 60s, so each cycle downloads once
+SNAPSHOT_UNIVERSE_SEC = 900   # symbols requested within this window ride along in each download
+_snapshot = {"at": 0.0, "data": {}}
+_snapshot_lock = threading.Lock()
+
+
+def _field(data, field, symbols):
+    """(date x symbol) frame of one OHLCV field from a yf.download result (either column layout)"""
+    import pandas as pd
+    if isinstance(data.columns, pd.MultiIndex):
+        lvl = 1 if field in data.columns.get_level_values(1) else 0
+        return data.xs(field, axis=1, level=lvl).apply(pd.to_numeric, errors='coerce')
+    return pd.DataFrame({symbols[0]: pd.to_numeric(data[field], errors='coerce')})
+
+
+def _parse_snapshot(close):
+    """Vectorized last / previous valid close per column -> {symbol: {...}}"""
+    from market_calendar import now_ny
+    valid = close.notna()
+    from_end = valid[::-1].cumsum()[::-1]          # valid rows at or after each row
+    last = close.where(valid & (from_end == 1)).max()
+    prev = close.where(valid & (from_end == 2)).max()
+    last_day = valid[::-1].idxmax()
+    change = (last / prev - 1) * 100
+
+    today = now_ny().date()
+    out = {}
+    for sym in close.columns[last.notna().to_numpy()]:
+        d = last_day[sym]
+        d = d.date() if hasattr(d, 'date') else d
+        p = None if prev.isna()[sym] else float(prev[sym])
+        out[sym] = {
+            "price": float(last[sym]),
+            "change": 0.0 if p is None else float(change[sym]),
+            "last_date": str(d),
+            # close before today's session: today's partial bar present -> previous row, else the last bar
+            "prev_close": p if d >= today else float(last[sym]),
+        }
+    return out
+
+
+def get_market_snapshot(symbols, ttl=SNAPSHOT_TTL):
+    """
+    Last price / change % / prev close for many symbols from one threaded multi-ticker
+    daily yf.download. Cached for the scheduler cycle and shared by every caller
+    (monitor_signals, price job, quote service); concurrent callers wait for one download.
+
+    Returns:
+        {symbol: {'price', 'change', 'prev_close', 'last_date'}}; missing symbols are omitted
+    """
+    symbols = [s for s in dict.fromkeys(symbols or []) if s]
+    if not symbols: return {}
+    with _snapshot_lock:
+        now = time.time()
+        seen = _snapshot.setdefault("seen", {})
+        for sym in symbols: seen[sym] = now
+        data = _snapshot["data"]
+        fresh = now - _snapshot["at"] <= ttl
+        if not (fresh and all(s in data or s in _snapshot.get("missing", ()) for s in symbols)):
+            # Everything asked for recently, so the other callers of this cycle are cache hits
+            universe = [sym for sym, at in seen.items() if now - at <= SNAPSHOT_UNIVERSE_SEC]
+            import yfinance as yf
+            try:
+                with metrics.external("yfinance", "download"):
+                    raw = yf.download(" ".join(universe), period="5d", interval="1d", group_by='ticker',
+                                      threads=True, progress=False, timeout=10)
+                parsed = _parse_snapshot(_field(raw, 'Close', universe)) if raw is not None and not raw.empty else {}
+            except Exception as e:
+                log.warning("snapshot.failed", every=60, symbols=len(universe), error=e)
+                parsed = {}
+            missing = (_snapshot.get("missing", set()) if fresh else set()) | (set(universe) - set(parsed))
+            if parsed or not fresh:
+                data = {**(data if fresh else {}), **parsed}
+                _snapshot.update(at=time.time(), data=data)
+            _snapshot["missing"] = missing - set(parsed)  # negative cache: no refetch storm within the TTL
+        return {s: data[s] for s in symbols if s in data}
+
+
+SOURCES = {
+    # name: (fetch, batched)
+    "kis": (_fetch_kis, False),
+    "yfinance": (_fetch_yfinance, True),
+}
+SOURCE_TTL = {"kis": 5, "yfinance": 30}   # seconds a fresh answer is reused without refetching
+_health = {name: SourceHealth(name) for name in SOURCES}
+
+
+def _active_sources(sources=None):
+    names = [s for s in (sources or QUOTE_SOURCES) if s in SOURCES]
+    live = [s for s in names if not _health[s].demoted]
+    if live: return live
+    # Everything demoted: probe the one whose cooldown ends first rather than return nothing
+    return sorted(names, key=lambda s: _health[s].demoted_until)[:1]
+
+
+def _store(source, quotes):
+    now = time.time()
+    with _lock:
+        for t, q in quotes.items():
+            q["fetched_at"] = now
+            _cache[(source, t)] = q
+
+
+def _timed(source, fetch, *args):
+    """Run one source call -> (quotes, seconds, error); results are cached even if the caller gave up"""
+    t0 = time.perf_counter()
+    try:
+        res = fetch(*args) or {}
+        _store(source, res)
+        return res, time.perf_counter() - t0, None
+    except Exception as e:
+        return {}, time.perf_counter() - t0, e
+
+
+def _cached(source, ticker, max_age):
+    q = _cache.get((source, ticker))
+    if q and time.time() - q["fetched_at"] <= max_age:
+        return q
+    return None
+
+
+def _choose(ticker, cands):
+    """
+    cands: [(source, quote)] -> (source, quote, consensus)
+    Largest group of mutually consistent prices wins; inside it the freshest
+    quote (ties: healthier source). With no agreement, health decides.
+    """
+    if len(cands) == 1:
+        return cands[0] + ("single",)
+    support = []
+    for s, q in cands:
+        n = sum(1 for s2, q2 in cands if s2 != s and abs(q2["price"] - q["price"]) <= q["price"] * AGREE_PCT / 100)
+        support.append(n)
+    best_support = max(support)
+    if best_support:
+        pool = [c for c, n in zip(cands, support) if n == best_support]
+        s, q = max(pool, key=lambda c: (round(c[1]["as_of"]), _health[c[0]].score()))
+        return s, q, "agree"
+    s, q = max(cands, key=lambda c: (_health[c[0]].score(), c[1]["as_of"]))
+    log.warning("quote.divergent", every=300, key=ticker, ticker=ticker, chosen=s,
+                prices=",".join(f"{src}:{qq['price']}" for src, qq in cands))
+    return s, q, "divergent"
+
+
+def get_quotes(tickers, exchanges=None, sources=None, deadline=QUOTE_DEADLINE_SEC):
+    """
+    Consensus quotes for many tickers in one round (all sources in parallel).
+
+    Args:
+        tickers: ticker list
+        exchanges: optional {ticker: 'NAS'|'NYS'|'AMS'} for KIS
+        sources: subset of SOURCES (default QUOTE_SOURCES)
+        deadline: seconds to wait; slower sources are used from cache next time
+
+    Returns:
+        {ticker: {'price','diff','rate','prev_close','exchange','source','consensus','as_of','sources'}};
+        tickers no source could price are omitted.
+    """
+    tickers = [t for t in dict.fromkeys(tickers or []) if t]
+    if not tickers: return {}
+    exchanges = exchanges or {}
+    active = _active_sources(sources)
+
+    futures = {}    # future -> source
+    for src in active:
+        need = [t for t in tickers if not _cached(src, t, SOURCE_TTL.get(src, 5))]
+        if not need: continue
+        fetch, batched = SOURCES[src]
+        calls = [(need,)] if batched else [(t, exchanges.get(t)) for t in need]
+        for args in calls:
+            f = _pool.submit(_timed, src, fetch, *args)
+            futures[f] = src
+
+    done, late = wait(list(futures), timeout=deadline) if futures else (set(), set())
+
+    # Health: one outcome per source per round (any answer = ok; a miss past the deadline = timeout)
+    rounds = {}
+    for f, src in futures.items():
+        ok, secs, err = rounds.get(src, (False, 0.0, None))
+        if f in done:
+            res, took, e = f.result()
+            ok, secs, err = ok or bool(res), max(secs, took), err or e
+        else:
+            secs, err = deadline, err or TimeoutError(f"no answer within {deadline}s")
+        rounds[src] = (ok, secs, err)
+    for src, (ok, secs, err) in rounds.items():
+        _health[src].record(ok, secs, None if ok else err)
+
+    out = {}
+    names = [s for s in (sources or QUOTE_SOURCES) if s in SOURCES]
+    for t in tickers:
+        cands = []
+        for src in names:  # demoted sources still count with answers that arrived late
+            q = _cached(src, t, MAX_QUOTE_AGE)
+            if q: cands.append((src, q))
+        if not cands: continue
+        src, q, consensus = _choose(t, cands)
+        out[t] = {**q, "source": src, "consensus": consensus, "ticker": t,
+                  "sources": {s: qq["price"] for s, qq in cands}}
+    return out
+
+
+def get_quote(ticker, exchange=None, **kwargs):
+    """Single-ticker get_quotes; None if no source answered"""
+    return get_quotes([ticker], exchanges={ticker: exchange} if exchange else None, **kwargs).get(ticker)
+
+
+def source_status():
+    """Per-source health (latency, error rate, demotion) for /api/system/quote-sources"""
+    return {"sources": {name: h.as_dict() for name, h in _health.items()},
+            "configured": QUOTE_SOURCES, "deadline_s": QUOTE_DEADLINE_SEC}
@@ -0,0 +1,194 @@
+"""
+Reference Price Service
+Previous regular-session close per ticker, resolved once per session and served
+from memory. Every engine (analyze_ticker, triple filter, V2) measures daily
+change and the +2% target against this one number.
+
+Resolution order for the close of session date R:
+  1. KIS daily row dated R (same reference KIS 'diff' is computed against)
+  2. market_candles 1d row at R
+  3. market_candles 30m bar ending at R's regular close (early closes included)
+  4. daily snapshot whose last bar is R
+
+Resolved closes are persisted in global_config ("prev_close_ref") so a restart
+does not re-resolve. Failed lookups are retried after RETRY_SEC, not per call.
+
+Usage:
+  ref = get_prev_close("SOXL")      # {'price', 'date', 'source'} or None
+  target = ref['price'] * 1.02
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import market_calendar as mcal
+import metrics
+from applog import get_logger
+
+log = get_logger("ref_price")
+
+CONFIG_KEY = "prev_close_ref"
+KEEP_DATES = 3           # persisted session dates
+RETRY_SEC = 300          # unresolved ticker/date is retried after this
+
+_lock = threading.Lock()
+_closes = {}             # (ticker, 'YYYY-MM-DD') -> {'price', 'date', 'source'}
+_misses = {}             # (ticker, 'YYYY-MM-DD') -> last failed attempt (time.time())
+_state = {"loaded": False, "tickers": set()}
+
+
+# --- Session dates ---
+def session_date(now=None):
+    """NY date of the session live prices belong to (today on trading days, else the next session)"""
+    t = mcal.to_ny(now) if now is not None else mcal.now_ny()
+    d = t.date()
+    return d if mcal.is_trading_day(d) else mcal.next_trading_day(d)
+
+
+def prev_close_date(now=None):
+    """Session date whose regular close is 'previous close' right now"""
+    return mcal.previous_trading_day(session_date(now))
+
+
+# --- Sources ---
+def _from_kis(ticker, d):
+    from kis_api import kis_client
+    rows = kis_client.get_daily_price(ticker) or []
+    key = d.strftime("%Y%m%d")
+    for r in rows:
+        if r.get('xymd') == key and float(r.get('clos') or 0) > 0:
+            return float(r['clos'])
+    return None
+
+
+def _from_db(ticker, d):
+    from db import get_connection
+    _, close_min, _ = mcal.day_info(d)
+    last_bar = datetime.combine(d, datetime.min.time()) + timedelta(minutes=close_min - 30)
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT timeframe, close_price FROM market_candles "
+                           "WHERE ticker=%s AND ((timeframe='1d' AND candle_time=%s) "
+                           "OR (timeframe='30m' AND candle_time=%s))",
+                           (ticker, datetime.combine(d, datetime.min.time()), last_bar))
+            rows = {r['timeframe']: r['close_price'] for r in cursor.fetchall()}
+    for tf, source in (('1d', "db_1d"), ('30m', "db_30m")):
+        if rows.get(tf) and float(rows[tf]) > 0:
+            return float(rows[tf]), source
+    return None, None
+
+
+def _from_snapshot(ticker, d):
+    from quote_service import get_market_snapshot
+    snap = get_market_snapshot([ticker]).get(ticker)
+    if snap and snap['last_date'] == str(d):
+        return snap['price']
+    return None
+
+
+def _resolve(ticker, d):
+    """(price, source) for the regular close of `d`, or (None, None)"""
+    try:
+        with metrics.stage("prev_close_resolve", source="kis"):
+            price = _from_kis(ticker, d)
+        if price: return price, "kis_daily"
+    except Exception as e:
+        log.warning("prev_close.kis_failed", every=300, ticker=ticker, error=e)
+    try:
+        price, source = _from_db(ticker, d)
+        if price: return price, source
+    except Exception as e:
+        log.warning("prev_close.db_failed", every=300, ticker=ticker, error=e)
+    try:
+        price = _from_snapshot(ticker, d)
+        if price: return price, "snapshot"
+    except Exception as e:
+        log.warning("prev_close.snapshot_failed", every=300, ticker=ticker, error=e)
+    return None, None
+
+
+# --- Persistence ---
+def _load():
+    """Persisted closes -> memory (once per process)"""
+    from db import get_global_config
+    stored = get_global_config(CONFIG_KEY, {}) or {}
+    for d, closes in stored.items():
+        for ticker, ref in (closes or {}).items():
+            _closes.setdefault((ticker, d), ref)
+            _state["tickers"].add(ticker)
+    _state["loaded"] = True
+
+
+def _persist():
+    from db import set_global_config
+    with _lock:
+        dates = sorted({d for _, d in _closes}, reverse=True)[:KEEP_DATES]
+        for key in [k for k in _closes if k[1] not in dates]:
+            del _closes[key]
+        out = {d: {} for d in dates}
+        for (ticker, d), ref in _closes.items():
+            out[d][ticker] = ref
+    set_global_config(CONFIG_KEY, out)
+
+
+# --- Public API ---
+def resolve(tickers, d=None):
+    """Resolve (and persist) the close of session `d` (default: current previous close) for tickers"""
+    d = d or prev_close_date()
+    ds = str(d)
+    if not _state["loaded"]:
+        with _lock:
+            if not _state["loaded"]: _load()
+    now = time.time()
+    todo = []
+    with _lock:
+        _state["tickers"].update(tickers)
+        for t in dict.fromkeys(tickers):
+            if (t, ds) in _closes: continue
+            if now - _misses.get((t, ds), 0) < RETRY_SEC: continue
+            _misses[(t, ds)] = now      # claim: concurrent callers skip instead of duplicating the lookup
+            todo.append(t)
+
+    found = {}
+    for t in todo:
+        price, source = _resolve(t, d)
+        if price:
+            found[t] = {"price": round(price, 4), "date": ds, "source": source}
+        else:
+            log.warning("prev_close.unresolved", every=300, ticker=t, date=ds)
+
+    if found:
+        with _lock:
+            for t, ref in found.items():
+                _closes[(t, ds)] = ref
+                _misses.pop((t, ds), None)
+        _persist()
+        print(f"📌 Prev close resolved ({ds}): " + ", ".join(f"{t}={r['price']}({r['source']})" for t, r in found.items()))
+    return {t: _closes[(t, ds)] for t in tickers if (t, ds) in _closes}
+
+
+def get_prev_close(ticker, now=None):
+    """{'price', 'date', 'source'} of the previous regular close, or None (memory hit after the first call per day)"""
+    ref = _closes.get((ticker, str(prev_close_date(now))))
+    if ref is not None: return ref
+    return resolve([ticker], prev_close_date(now)).get(ticker)
+
+
+def warm_next_session(now=None):
+    """After today's regular close, resolve today's close for every ticker served so far"""
+    t = mcal.to_ny(now) if now is not None else mcal.now_ny()
+    b = mcal.session_bounds(t.date())
+    if b is None or t < b["close"]: return {}
+    with _lock:
+        tickers = sorted(_state["tickers"])
+    return resolve(tickers, t.date()) if tickers else {}
+
+
+def status():
+    with _lock:
+        by_date = {}
+        for (ticker, d), ref in sorted(_closes.items()):
+            by_date.setdefault(d, {})[ticker] = ref
+        return {"prev_close_date": str(prev_close_date()), "closes": by_date,
+                "pending": sorted(f"{t}@{d}" for t, d in _misses)}
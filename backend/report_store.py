@@ -0,0 +1,163 @@
+"""
+Per-Cycle Report Store
+Holds the latest run_analysis report as a slotted record and its JSON bytes,
+serialized once per scheduler cycle and served as-is to every /api/report client.
+"""
+
+import hashlib
+import decimal
+from datetime import datetime, date
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # Fallback: stdlib json (slower, same output semantics)
+    orjson = None
+    import json
+
+
+def _default(obj):
+    """Types orjson (or json) does not encode natively"""
+    if obj is pd.NaT:
+        return None
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (pd.Timestamp, datetime, date)):
+        return obj.strftime('%Y-%m-%d %H:%M:%S') if isinstance(obj, datetime) else obj.isoformat()
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        f = float(obj)
+        return f if np.isfinite(f) else None
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (set, tuple)):
+        return list(obj)
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+if orjson is not None:
+    _OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj):
+        """obj -> JSON bytes. NaN/Inf become null."""
+        return orjson.dumps(obj, default=_default, option=_OPTS)
+else:
+    class _Encoder(json.JSONEncoder):
+        def default(self, obj):
+            return _default(obj)
+
+        def iterencode(self, obj, _one_shot=False):
+            return super().iterencode(_nan_to_none(obj), _one_shot)
+
+    def _nan_to_none(obj):
+        if isinstance(obj, float):
+            return obj if np.isfinite(obj) else None
+        if isinstance(obj, dict):
+            return {k: _nan_to_none(v) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return [_nan_to_none(v) for v in obj]
+        return obj
+
+    def dumps(obj):
+        """obj -> JSON bytes. NaN/Inf become null."""
+        return json.dumps(obj, cls=_Encoder, ensure_ascii=False, allow_nan=False).encode('utf-8')
+
+
+class CycleReport:
+    """One run_analysis cycle (fields mirror the /api/report payload)"""
+    __slots__ = ("timestamp", "stocks", "stock_analysis", "market", "insight",
+                 "strategy_list", "total_assets", "market_regime",
+                 "created_at", "_body", "_etag")
+
+    def __init__(self, timestamp, stocks, stock_analysis, market, insight,
+                 strategy_list, total_assets, market_regime):
+        self.timestamp = timestamp
+        self.stocks = stocks
+        self.stock_analysis = stock_analysis
+        self.market = market
+        self.insight = insight
+        self.strategy_list = strategy_list
+        self.total_assets = total_assets
+        self.market_regime = market_regime
+        self.created_at = datetime.now()
+        self._body = None
+        self._etag = None
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(
+            d.get("timestamp"), d.get("stocks", []), d.get("stock_analysis", []),
+            d.get("market", {}), d.get("insight", ""), d.get("strategy_list", []),
+            d.get("total_assets", {}), d.get("market_regime", {})
+        )
+
+    def to_dict(self):
+        return {
+            "timestamp": self.timestamp,
+            "stocks": self.stocks,
+            "stock_analysis": self.stock_analysis,
+            "market": self.market,
+            "insight": self.insight or "데이터 분석 중...",
+            "strategy_list": self.strategy_list,
+            "total_assets": self.total_assets,
+            "market_regime": self.market_regime,
+        }
+
+    def apply_visibility(self, settings):
+        """Dashboard visibility flag per master stock (ticker_settings)"""
+        for stock in self.stocks or []:
+            stock['is_visible'] = settings.get(stock.get('ticker'), True)
+        self._body = None
+
+    @property
+    def body(self):
+        """Serialized JSON bytes (encoded once, then reused)"""
+        if self._body is None:
+            self._body = dumps(self.to_dict())
+            self._etag = f'"{hashlib.md5(self._body).hexdigest()}"'
+        return self._body
+
+    @property
+    def etag(self):
+        self.body
+        return self._etag
+
+
+_CURRENT = None
+
+
+def publish_report(report, settings=None):
+    """Store a run_analysis() dict as the current cycle report and serialize it"""
+    global _CURRENT
+    rec = report if isinstance(report, CycleReport) else CycleReport.from_dict(report)
+    if settings is not None:
+        rec.apply_visibility(settings)
+    rec.body  # encode before readers can see it
+    _CURRENT = rec  # single rebinding -> readers never see a half-built report
+
+    # Push the delta to SSE clients (/api/stream)
+    try:
+        from report_stream import hub
+        hub.publish_report(rec.body)
+    except Exception as e:
+        print(f"Report Push Error: {e}")
+    return rec
+
+
+def get_report():
+    """Current CycleReport or None (before the first cycle)"""
+    return _CURRENT
+
+
+def refresh_visibility(settings):
+    """Re-encode the current report after ticker_settings changed"""
+    rec = _CURRENT
+    if rec is None: return
+    publish_report(CycleReport.from_dict(rec.to_dict()), settings)
@@ -0,0 +1,156 @@
+"""
+Report Push Channel (Server-Sent Events)
+The scheduler publishes each cycle's report once; connected dashboards receive
+only the changed fields (delta) instead of polling /api/report.
+
+Delta format (applied by frontend/src/reportStream.js):
+  - dict   -> {key: delta, ...} for changed keys, removed keys in "$del"
+  - list   -> {"$idx": {index: delta}} when the length is unchanged, else the full list
+  - scalar -> the new value
+  - a dict sent whole (new key, type change) -> {"$set": value}, replaced as-is
+"""
+
+import asyncio
+import time
+
+from report_store import dumps
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    import json
+    _loads = json.loads
+
+HEARTBEAT_SEC = 15        # keep idle connections (proxies) alive
+CLIENT_QUEUE_SIZE = 32    # slow client -> queue overflows -> resync with snapshot
+
+_SAME = object()
+_RESYNC = b"__resync__"
+
+
+def _whole(v):
+    """Replacement value: dicts are marked so the client doesn't merge them"""
+    return {"$set": v} if isinstance(v, dict) else v
+
+
+def diff(old, new):
+    """Structural delta old -> new (_SAME when equal)"""
+    if type(old) is not type(new):
+        return _whole(new)  # e.g. 1 -> True compares equal in Python but not in JSON
+    if isinstance(new, dict):
+        out = {}
+        for k, v in new.items():
+            d = diff(old[k], v) if k in old else _whole(v)
+            if d is not _SAME:
+                out[k] = d
+        removed = [k for k in old if k not in new]
+        if removed:
+            out["$del"] = removed
+        return out if out else _SAME
+    if isinstance(new, list):
+        if len(old) != len(new):
+            return new
+        idx = {}
+        for i, (a, b) in enumerate(zip(old, new)):
+            d = diff(a, b)
+            if d is not _SAME:
+                idx[str(i)] = d
+        return {"$idx": idx} if idx else _SAME
+    return _SAME if old == new else new
+
+
+def _frame(event, data_bytes, event_id=None):
+    head = f"event: {event}\n" + (f"id: {event_id}\n" if event_id is not None else "")
+    return head.encode() + b"data: " + data_bytes + b"\n\n"
+
+
+class ReportHub:
+    """Fan-out of pre-encoded SSE frames to asyncio client queues"""
+
+    def __init__(self):
+        self.loop = None
+        self.clients = set()
+        self.seq = 0
+        self._last = None          # last published report (plain JSON values)
+        self._snapshot = None      # encoded 'snapshot' frame for new/resyncing clients
+
+    def bind_loop(self, loop):
+        self.loop = loop
+
+    # --- Scheduler side (any thread) ---
+    def publish_report(self, body):
+        """body: encoded report bytes (CycleReport.body). Computes and broadcasts the delta."""
+        current = _loads(body)
+        prev = self._last
+        self._last = current
+        self.seq += 1
+        self._snapshot = _frame("snapshot", body, self.seq)
+        if prev is None:
+            self._broadcast(self._snapshot)
+            return
+        delta = diff(prev, current)
+        if delta is _SAME:
+            return
+        self._broadcast(_frame("delta", dumps(delta), self.seq))
+
+    def has_snapshot(self):
+        """True once a report has been published (new clients get a snapshot frame)"""
+        return self._snapshot is not None
+
+    def publish_event(self, event, payload):
+        """Ad-hoc event (e.g. 'signal' after save_signal)"""
+        self._broadcast(_frame(event, dumps(payload)))
+
+    def _broadcast(self, frame):
+        if self.loop is None or not self.clients: return
+        try:
+            self.loop.call_soon_threadsafe(self._deliver, frame)
+        except RuntimeError:
+            pass  # loop closed (shutdown)
+
+    # --- Event loop side ---
+    def _deliver(self, frame):
+        for q in list(self.clients):
+            try:
+                q.put_nowait(frame)
+            except asyncio.QueueFull:
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait(_RESYNC)
+
+    def subscribe(self):
+        q = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.clients.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        self.clients.discard(q)
+
+    async def stream(self, request, q):
+        """SSE generator for one client"""
+        try:
+            yield b"retry: 5000\n\n"
+            if self._snapshot is not None:
+                yield self._snapshot
+            last_beat = time.monotonic()
+            while True:
+                try:
+                    frame = await asyncio.wait_for(q.get(), timeout=HEARTBEAT_SEC)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected(): break
+                    yield b": ping\n\n"
+                    last_beat = time.monotonic()
+                    continue
+                if frame is _RESYNC:
+                    frame = self._snapshot
+                    if frame is None: continue
+                yield frame
+                if time.monotonic() - last_beat > HEARTBEAT_SEC:
+                    if await request.is_disconnected(): break
+                    last_beat = time.monotonic()
+        finally:
+            self.unsubscribe(q)
+
+
+hub = ReportHub()
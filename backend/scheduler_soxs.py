@@ -2,7 +2,11 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from populate_candles import populate_ticker_candle_data
 import time
+from job_profiler import profiled_job
+from session_cadence import cadenced
 
+@cadenced("soxs_maintenance", base_sec=300)
+@profiled_job("soxs_maintenance", interval_sec=300)
 def run_maintenance_job():
     """
     Job to maintain exactly 3 days of SOXS/SOXL data.
@@ -31,6 +35,7 @@ def start_maintenance_scheduler():
     # So running it often is fine, it just refreshes the whole table.
     # Let's run it every 5 minutes to keep "Today's" data fresh and accurate.
     
+    # Outside regular hours the session cadence gate skips most ticks (see session_cadence)
     scheduler.add_job(run_maintenance_job, 'interval', minutes=5, id='soxs_maintenance')
     scheduler.start()
     print("🕒 SOXS Maintenance Scheduler Started (Every 5 mins)")
@@ -0,0 +1,184 @@
+"""
+Session Cadence
+Market-hours-aware gate for the polling jobs (monitor, price_update, v2_signal,
+soxs_maintenance). APScheduler keeps firing every job at its base interval; the
+gate lets a tick through only when the policy interval for the current session
+(regular / pre / post / closed, see market_calendar) has elapsed since the
+job's last run. An interval of None means the job does not run in that session.
+
+The first tick after the session turns pre or regular runs immediately (one
+catch-up run at session open), whatever the interval. Skipped ticks are counted
+per NY day together with the external calls they would have made, estimated
+from the job's average calls per run (metrics external_calls_total).
+
+Policies default to DEFAULT_POLICIES and can be overridden per job / session
+in global_config 'cadence_policies' (POST /api/system/cadence).
+
+Usage:
+  @cadenced("monitor", base_sec=60)
+  def monitor_cycle(): ...
+  status()          # policies, per-job state, runs / skips / calls saved per day
+"""
+
+import threading
+import time
+from functools import wraps
+
+import market_calendar as mcal
+import metrics
+from applog import get_logger
+
+log = get_logger("cadence")
+
+SESSIONS = (mcal.REGULAR, mcal.PRE, mcal.POST, mcal.CLOSED)
+DEFAULT_POLICIES = {     # seconds between runs per session
+    "monitor":          {"regular": 60,  "pre": 300, "post": 300, "closed": 3600},
+    "price_update":     {"regular": 300, "pre": 600, "post": 600, "closed": 3600},
+    "v2_signal":        {"regular": 300, "pre": 900, "post": 900, "closed": 3600},
+    "soxs_maintenance": {"regular": 300, "pre": 900, "post": 900, "closed": 6 * 3600},
+}
+CONFIG_KEY = "cadence_policies"
+KEEP_DAYS = 7            # per-day counters kept for status()
+CALLS_EWMA = 0.2         # weight of the latest run in the calls-per-run average
+
+_lock = threading.Lock()
+_jobs = {}               # job -> {"last_run", "last_session", "calls_per_run", "base_sec"}
+_days = {}               # NY date str -> job -> {"runs", "skipped", "calls_saved"}
+_state = {"overrides": None}
+
+
+def _overrides():
+    if _state["overrides"] is None:
+        try:
+            from db import get_global_config
+            _state["overrides"] = get_global_config(CONFIG_KEY, {}) or {}
+        except Exception as e:
+            print(f"Cadence policy load failed (defaults used): {e}")
+            return {}
+    return _state["overrides"]
+
+
+def policy(job):
+    """Effective {session: interval_sec | None} for a job"""
+    p = dict(DEFAULT_POLICIES.get(job, {}))
+    p.update(_overrides().get(job, {}))
+    return p
+
+
+def set_policies(updates):
+    """Merge {job: {session: sec | None}} into the stored overrides -> effective policies"""
+    if not isinstance(updates, dict):
+        raise ValueError("policies must be {job: {session: seconds or null}}")
+    for job, sessions in updates.items():
+        if not isinstance(sessions, dict):
+            raise ValueError(f"{job}: expected {{session: seconds or null}}, got {type(sessions).__name__}")
+        for session, sec in sessions.items():
+            if session not in SESSIONS:
+                raise ValueError(f"session must be one of {SESSIONS}")
+            if sec is not None and (isinstance(sec, bool) or not isinstance(sec, (int, float)) or sec <= 0):
+                raise ValueError(f"{job}.{session}: interval must be a positive number of seconds or null")
+    merged = {j: dict(s) for j, s in _overrides().items()}
+    for job, sessions in updates.items():
+        merged.setdefault(job, {}).update(sessions)
+    from db import set_global_config
+    if not set_global_config(CONFIG_KEY, merged):
+        raise RuntimeError("cadence policies could not be saved")
+    _state["overrides"] = merged
+    return {job: policy(job) for job in sorted(set(DEFAULT_POLICIES) | set(merged))}
+
+
+def _day(now_ny):
+    key = now_ny.strftime('%Y-%m-%d')
+    if key not in _days:
+        _days[key] = {}
+        for old in sorted(_days)[:-KEEP_DAYS]:
+            del _days[old]
+    return _days[key]
+
+
+def decide(job, session, now, base_sec):
+    """'first' / 'catch_up' / 'due' when the tick should run, None to skip"""
+    st = _jobs.get(job)
+    if st is None or st["last_run"] is None:
+        return "first"
+    if session != st["last_session"] and session in (mcal.PRE, mcal.REGULAR):
+        return "catch_up"
+    interval = policy(job).get(session, base_sec)
+    if interval is None:
+        return None
+    # ticks arrive every base_sec with some jitter: accept half a tick early
+    return "due" if now - st["last_run"] >= interval - base_sec / 2 else None
+
+
+def cadenced(job, base_sec):
+    """Decorator: run the scheduler job only when its session policy says so"""
+    def wrap(fn):
+        @wraps(fn)
+        def run(*args, **kwargs):
+            now = time.time()
+            now_ny = mcal.now_ny()
+            session = mcal.session_at(now_ny)
+            with _lock:
+                reason = decide(job, session, now, base_sec)
+                st = _jobs.setdefault(job, {"last_run": None, "last_session": None,
+                                            "calls_per_run": None, "base_sec": base_sec})
+                day = _day(now_ny).setdefault(job, {"runs": 0, "skipped": 0, "calls_saved": 0.0})
+                if reason is None:
+                    day["skipped"] += 1
+                    day["calls_saved"] += st["calls_per_run"] or 0
+                else:
+                    day["runs"] += 1
+                    st.update(last_run=now, last_session=session)
+            if reason is None:
+                metrics.inc("cadence_skipped_total", job=job, session=session)
+                metrics.inc("cadence_calls_saved_total", value=st["calls_per_run"] or 0, job=job)
+                return None
+            metrics.inc("cadence_runs_total", job=job, session=session, reason=reason)
+            if reason == "catch_up":
+                log.info("cadence.catch_up", job=job, session=session)
+            calls0 = metrics.external_calls()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                # other jobs' calls can overlap; the average is an estimate
+                calls = metrics.external_calls() - calls0
+                with _lock:
+                    prev = st["calls_per_run"]
+                    st["calls_per_run"] = calls if prev is None else prev + CALLS_EWMA * (calls - prev)
+        return run
+    return wrap
+
+
+def reset():
+    with _lock:
+        _jobs.clear()
+        _days.clear()
+        _state["overrides"] = None
+
+
+def status():
+    now_ny = mcal.now_ny()
+    session = mcal.session_at(now_ny)
+    with _lock:
+        jobs = {}
+        for job in sorted(set(DEFAULT_POLICIES) | set(_jobs)):
+            st = _jobs.get(job, {})
+            p = policy(job)
+            last = st.get("last_run")
+            jobs[job] = {"policy": p, "interval_now": p.get(session),
+                         "last_run_ago_sec": round(time.time() - last, 1) if last else None,
+                         "last_session": st.get("last_session"),
+                         "calls_per_run": round(st["calls_per_run"], 2) if st.get("calls_per_run") is not None else None}
+        days = {}
+        for d, per_job in sorted(_days.items()):
+            days[d] = {"jobs": {j: {**c, "calls_saved": round(c["calls_saved"], 1)} for j, c in per_job.items()},
+                       "calls_saved": round(sum(c["calls_saved"] for c in per_job.values()), 1),
+                       "skipped": sum(c["skipped"] for c in per_job.values())}
+    nxt = None
+    d = now_ny.date()
+    if session == mcal.CLOSED:
+        b = mcal.session_bounds(d)
+        if not b or now_ny >= b["post_close"]:
+            b = mcal.session_bounds(mcal.next_trading_day(d))
+        nxt = b["pre_open"].strftime('%Y-%m-%d %H:%M %Z') if b else None
+    return {"session": session, "next_pre_open": nxt, "jobs": jobs, "days": days}
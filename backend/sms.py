@@ -1,57 +1,241 @@
+"""
+SMS Outbox
+send_sms() only queues the message in memory (sub-millisecond) and wakes the
+dispatcher thread. The dispatcher persists queued messages to sms_outbox, waits
+BATCH_WINDOW_SEC so the signals of one scheduler cycle arrive together, merges
+them per receiver into one message and posts it from a small worker pool with
+timeouts. Failed sends are retried with exponential backoff up to MAX_ATTEMPTS;
+rows left PENDING by a restart are picked up again at startup.
+
+Usage:
+  send_sms("SOXL", "매수", 45.2, time_str, "85점")   # True = queued
+  send_sms_now(format_sms(...))                      # blocking (test endpoint)
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
 import requests
-from datetime import datetime
 
-def send_sms(stock_name, signal_type, price, signal_time, reason=""):
+import bar_trigger
+import metrics
+from applog import get_logger
+
+log = get_logger("sms")
+
+SMS_URL = "http://sms.nanuminet.com/utf8.php"
+DEFAULT_RECEIVER = "01044900528"
+SMS_TIMEOUT = (3, 10)        # connect, read seconds
+SMS_WORKERS = 2
+BATCH_WINDOW_SEC = 2.0       # signals queued within this window go out as one message
+MAX_BATCH = 10               # lines per merged message
+MAX_ATTEMPTS = 5
+BASE_BACKOFF = 10            # seconds, doubled per failed attempt
+MAX_BACKOFF = 600
+POLL_SEC = 5                 # retry scan interval while rows are pending
+ENABLED_TTL = 30             # seconds the sms_enabled flag is cached
+
+_queue = deque()             # (receiver, message, queued_at)
+_wake = threading.Event()
+_lock = threading.Lock()
+_pool = ThreadPoolExecutor(max_workers=SMS_WORKERS, thread_name_prefix="sms")
+_inflight = set()            # outbox ids being sent
+_state = {"thread": None, "pending": True, "busy": False, "retry_until": 0.0, "enabled": None, "enabled_at": 0.0}
+
+
+def format_sms(stock_name, signal_type, price, reason=""):
+    # Msg Format: [SOXL] [매수] [45.20] [85점] (time is not part of the body)
+    return f"[{stock_name}] [{signal_type}] [${price}] [{reason}]"
+
+
+# --- Global switch (cached; DB read at most every ENABLED_TTL) ---
+def sms_enabled():
+    now = time.time()
+    if _state["enabled"] is None or now - _state["enabled_at"] > ENABLED_TTL:
+        try:
+            from db import get_global_config
+            _state["enabled"] = bool(get_global_config("sms_enabled", True))
+        except ImportError:
+            _state["enabled"] = True  # Fallback if db import fails (e.g. testing)
+        _state["enabled_at"] = now
+    return _state["enabled"]
+
+
+def set_sms_enabled(enabled):
+    """Called by the settings endpoint so the toggle applies without waiting for the TTL"""
+    _state.update(enabled=bool(enabled), enabled_at=time.time())
+
+
+# --- Enqueue ---
+@metrics.timed("sms")
+def send_sms(stock_name, signal_type, price, signal_time=None, reason="", receiver=DEFAULT_RECEIVER):
     """
-    Send SMS using the provided API endpoint.
-    Format: [신호 발생시간] [종목이름] [매수/매도] [가격] [사유]
+    Queue one signal SMS. Format: [종목] [매수/매도] [가격] [사유]
+    Returns True when queued, False when SMS is globally off.
     """
-    url = "http://sms.nanuminet.com/utf8.php"
-    
-    # Format current time for senddate
-    now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # [FIX] Enforce Global SMS Check
-    try:
-        from db import get_global_config
-        if not get_global_config("sms_enabled", True):
-            print(f"SMS Skipped (Global OFF): {stock_name} {signal_type}")
-            return False
-    except ImportError:
-        pass # Fallback if db import fails (e.g. testing)
-
-    # Format message
-    # User Request: Remove Time from Body.
-    # Msg Format: [SOXL] [매수] [45.20] [85점]
-    msg = f"[{stock_name}] [{signal_type}] [${price}] [{reason}]"
-    
+    if not sms_enabled():
+        print(f"SMS Skipped (Global OFF): {stock_name} {signal_type}")
+        return False
+    _queue.append((receiver, format_sms(stock_name, signal_type, price, reason), time.time()))
+    metrics.inc("sms_enqueued_total")
+    bar_trigger.mark("sms")
+    _ensure_dispatcher()
+    _wake.set()
+    return True
+
+
+# --- Transport ---
+def send_sms_now(message, receiver=DEFAULT_RECEIVER):
+    """Blocking POST to the gateway with timeouts -> (ok, error)"""
     data = {
         "sms_id": "leeyw94",
         "sms_pw": "blueeye0037!",
         "callback": "070-8244-8202",
-        "senddate": now_str,
+        "senddate": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "return_url": "https://myworkpage.kr/sys/sms_end",
         "return_data": "",
         "use_mms": "Y",
         "upFile": "",
-        # "phone[]": "01044900528", # Target Phone Number? User code commented it out, but usually required. 
-        # Assuming the API might use a default or it was hidden. 
-        # Let's use the number from the comment assuming it's the valid target.
-        "phone[]": "01044900528", 
-        "msg[]": msg
+        "phone[]": receiver,
+        "msg[]": message
     }
-    
     try:
         # requests.post default content-type is form-urlencoded for dict data
-        response = requests.post(url, data=data)
-        
+        with metrics.external("sms", "send"):
+            response = requests.post(SMS_URL, data=data, timeout=SMS_TIMEOUT)
         if response.status_code == 200:
-            print(f"SMS Sent: {msg}")
-            return True
-        else:
-            print(f"SMS Failed: {response.text}")
-            return False
-            
+            print(f"SMS Sent: {message}")
+            return True, None
+        print(f"SMS Failed: {response.text}")
+        return False, f"HTTP {response.status_code}"
     except Exception as e:
         print(f"SMS Error: {e}")
-        return False
+        return False, str(e)
+
+
+def _backoff(attempts):
+    return min(MAX_BACKOFF, BASE_BACKOFF * 2 ** max(0, attempts - 1))
+
+
+def _deliver(rows):
+    """Send one merged message for outbox rows of a receiver and record the outcome"""
+    from db import update_sms_outbox
+    message = "\n".join(r['message'] for r in rows)
+    ok, err = send_sms_now(message, rows[0]['receiver'])
+    updates = []
+    for r in rows:
+        attempts = int(r['attempts'] or 0) + 1
+        if ok:
+            updates.append((r['id'], 'SENT', attempts, None, None))
+        elif attempts >= MAX_ATTEMPTS:
+            updates.append((r['id'], 'FAILED', attempts, None, err))
+        else:
+            wait = _backoff(attempts)
+            updates.append((r['id'], 'PENDING', attempts, datetime.now() + timedelta(seconds=wait), err))
+            _state["retry_until"] = max(_state["retry_until"], time.time() + wait + POLL_SEC)
+    metrics.inc("sms_sent_total" if ok else "sms_send_failures_total", value=len(rows))
+    if not ok:
+        log.warning("sms.send_failed", every=60, rows=len(rows), error=err)
+    try:
+        update_sms_outbox(updates)
+    except Exception as e:
+        log.error("sms.outbox_update_failed", error=e)
+    finally:
+        with _lock:
+            _inflight.difference_update(r['id'] for r in rows)
+        _wake.set()
+
+
+# --- Dispatcher ---
+def _persist_queued():
+    """Queued messages -> sms_outbox (kept in memory and retried if the DB is unavailable)"""
+    from db import add_sms_outbox
+    items = []
+    while _queue:
+        items.append(_queue.popleft())
+    if not items: return
+    try:
+        add_sms_outbox([(receiver, msg) for receiver, msg, _ in items])
+        _state["pending"] = True
+    except Exception as e:
+        _queue.extendleft(reversed(items))
+        log.error("sms.outbox_write_failed", every=60, queued=len(items), error=e)
+
+
+def _dispatch_due():
+    from db import get_due_sms_outbox
+    rows = get_due_sms_outbox()
+    with _lock:
+        rows = [r for r in rows if r['id'] not in _inflight]
+        # keep scanning while anything is due, in flight or waiting out a backoff
+        _state["pending"] = bool(rows) or bool(_inflight) or time.time() < _state["retry_until"]
+        _inflight.update(r['id'] for r in rows)
+    groups = {}
+    for r in rows:
+        groups.setdefault(r['receiver'], []).append(r)
+    for receiver_rows in groups.values():
+        for i in range(0, len(receiver_rows), MAX_BATCH):
+            _pool.submit(_deliver, receiver_rows[i:i + MAX_BATCH])
+    metrics.set_gauge("sms_outbox_pending", len(rows) + len(_queue))
+
+
+def _run():
+    while True:
+        _wake.wait(timeout=POLL_SEC)
+        _wake.clear()
+        _state["busy"] = True
+        try:
+            if _queue:
+                # Let the rest of this cycle's signals arrive, then send them together
+                delay = BATCH_WINDOW_SEC - (time.time() - _queue[0][2])
+                if delay > 0: time.sleep(delay)
+                _persist_queued()
+            if _state["pending"]:
+                _dispatch_due()
+        except Exception as e:
+            log.error("sms.dispatch_failed", every=60, error=e)
+        finally:
+            _state["busy"] = False
+
+
+def _ensure_dispatcher():
+    if _state["thread"] is not None: return
+    with _lock:
+        if _state["thread"] is None:
+            t = threading.Thread(target=_run, name="sms-dispatcher", daemon=True)
+            t.start()
+            _state["thread"] = t
+
+
+def start_dispatcher():
+    """Startup hook: resume rows left PENDING by a previous process (including ones in backoff)"""
+    _state.update(pending=True, retry_until=time.time() + MAX_BACKOFF + POLL_SEC)
+    _ensure_dispatcher()
+    _wake.set()
+
+
+def flush(timeout=15):
+    """Wait until queued and in-flight messages are handed to the gateway (tests / shutdown)"""
+    _wake.set()
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with _lock:
+            busy = bool(_queue) or bool(_inflight) or _state["busy"]
+        if not busy: return True
+        time.sleep(0.05)
+    return False
+
+
+def outbox_status():
+    from db import get_sms_outbox_summary
+    counts, failed = get_sms_outbox_summary()
+    for r in failed:
+        if isinstance(r.get('created_at'), datetime):
+            r['created_at'] = r['created_at'].strftime('%Y-%m-%d %H:%M:%S')
+    with _lock:
+        inflight = len(_inflight)
+    return {"queued": len(_queue), "inflight": inflight, "counts": counts, "recent_failed": failed,
+            "enabled": sms_enabled(), "batch_window_sec": BATCH_WINDOW_SEC}
@@ -0,0 +1,66 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("pandas_ta")
+pd = pytest.importorskip("pandas")
+
+import analysis
+import db
+
+
+def frame(tickers, periods, freq):
+    """yfinance group_by='ticker' shaped download"""
+    idx = pd.date_range("2026-10-16 09:30", periods=periods, freq=freq, tz="America/New_York")
+    cols = pd.MultiIndex.from_product([tickers, ["Open", "High", "Low", "Close", "Volume"]])
+    return pd.DataFrame(1.0, index=idx, columns=cols)
+
+
+@pytest.fixture
+def candles(monkeypatch):
+    """In-memory market_candles; yfinance / KIS / Ver3 tables faked"""
+    store = {}
+
+    def download(tickers, interval, **kw):
+        names = tickers.split() if isinstance(tickers, str) else list(tickers)
+        return frame(names, 20, {"30m": "30min", "5m": "5min", "1d": "1D"}[interval])
+
+    monkeypatch.setattr(analysis.yf, "download", download)
+    monkeypatch.setattr(db, "save_market_candles", lambda t, tf, df, src: store.__setitem__((t, tf), df.copy()))
+    monkeypatch.setattr(db, "load_market_candles", lambda t, tf, limit=None: store.get((t, tf)))
+    monkeypatch.setattr(db, "cleanup_old_candles", lambda t, days=None: None)
+    monkeypatch.setattr(db, "get_market_indices", lambda: {})
+    monkeypatch.setattr(analysis, "refresh_market_indices", lambda: None)
+    monkeypatch.setattr(analysis, "get_quotes", lambda tickers, exchanges=None: {})
+    monkeypatch.setattr(analysis, "_load_ver3_candles", lambda t: None)
+    for key in ("30m", "5m", "1d"):
+        monkeypatch.setitem(analysis._DATA_CACHE, key, None)
+    analysis._LOADED_TICKERS.clear()
+    yield store
+    analysis._LOADED_TICKERS.clear()
+
+
+def test_forced_update_keeps_non_core_managed_ticker(candles):
+    d30, d5, d1, _, _ = analysis.fetch_data(["SOXL", "AAPL"], force=True)
+    assert ("AAPL", "30m") in candles and ("AAPL", "5m") in candles
+    assert not d30["AAPL"].empty and not d5["AAPL"].empty and not d1["AAPL"].empty
+
+
+def test_partial_reload_does_not_evict_other_tickers(candles):
+    analysis.fetch_data(["SOXL", "AAPL"], force=True)
+    analysis.load_data_from_db(["SOXL"])
+    d30, d5, _, _, _ = analysis.fetch_data()
+    assert {"SOXL", "AAPL"} <= set(d30) and {"SOXL", "AAPL"} <= set(d5)
+
+
+def test_new_managed_ticker_is_loaded_once(candles, monkeypatch):
+    analysis.fetch_data(["SOXL"], force=True)
+    loads = []
+    orig = analysis.load_data_from_db
+    monkeypatch.setattr(analysis, "load_data_from_db", lambda tl=None: (loads.append(list(tl or [])), orig(tl)))
+    analysis.fetch_data(["SOXL", "MSFT"])
+    analysis.fetch_data(["SOXL", "MSFT"])         # no rows for MSFT yet: not re-queried every call
+    assert loads == [["MSFT"]]
@@ -0,0 +1,107 @@
+import os
+import random
+import sys
+import types
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import lot_ledger
+
+
+def fifo_replay(rows):
+    """Reference: the old full FIFO replay over every transaction"""
+    out, lots = [], {}
+    for r in sorted(rows.values(), key=lambda r: (r['trade_date'], r['id'])):
+        q = lots.setdefault(r['ticker'], [])
+        if r['trade_type'] == 'BUY' and r['qty'] > 0:
+            q.append([r['qty'], r['price']])
+        elif r['trade_type'] == 'SELL':
+            need, cost, filled = r['qty'], 0.0, 0
+            while need > 0 and q:
+                take = min(need, q[0][0])
+                cost += take * q[0][1]
+                filled += take
+                need -= take
+                q[0][0] -= take
+                if q[0][0] == 0: q.pop(0)
+            if filled:
+                avg = cost / filled
+                out.append({"ticker": r['ticker'], "qty": filled,
+                            "profit": round((r['price'] - avg) * filled, 2)})
+    return out
+
+
+@pytest.fixture
+def journal(monkeypatch):
+    rows = {}
+    fake = types.SimpleNamespace(get_journal_transactions=lambda: list(rows.values()),
+                                 get_journal_transaction=lambda i: rows.get(i))
+    monkeypatch.setitem(sys.modules, "db", fake)
+    lot_ledger.reset()
+    yield rows
+    lot_ledger.reset()
+
+
+def _check(rows):
+    got = [{"ticker": r["ticker"], "qty": r["qty"], "profit": r["profit"]} for r in lot_ledger.realized_trades()]
+    want = fifo_replay(rows)
+    assert sorted(got, key=str) == sorted(want, key=str)
+    per_ticker = {}
+    for r in want:
+        per_ticker[r["ticker"]] = round(per_ticker.get(r["ticker"], 0) + r["profit"], 2)
+    for ticker, s in lot_ledger.summary().items():
+        assert s["realized_profit"] == per_ticker.get(ticker, 0)
+
+
+def test_deleted_sell_leaves_no_realized_profit(journal):
+    t0 = datetime(2026, 1, 5, 10)
+    journal[1] = {"id": 1, "ticker": "A", "trade_type": "BUY", "qty": 10, "price": 10.0, "trade_date": t0}
+    lot_ledger.realized_trades()                       # load
+    journal[2] = {"id": 2, "ticker": "A", "trade_type": "SELL", "qty": 5, "price": 12.0, "trade_date": t0 + timedelta(hours=1)}
+    lot_ledger.refresh(2)
+    assert lot_ledger.summary()["A"]["realized_profit"] == 10.0
+    del journal[2]
+    lot_ledger.remove(2)
+    assert lot_ledger.realized_trades() == []
+    assert lot_ledger.summary()["A"]["realized_profit"] == 0
+
+
+def test_sell_moved_to_other_ticker(journal):
+    t0 = datetime(2026, 1, 5, 10)
+    journal[1] = {"id": 1, "ticker": "A", "trade_type": "BUY", "qty": 10, "price": 10.0, "trade_date": t0}
+    journal[2] = {"id": 2, "ticker": "B", "trade_type": "BUY", "qty": 10, "price": 20.0, "trade_date": t0}
+    journal[3] = {"id": 3, "ticker": "A", "trade_type": "SELL", "qty": 4, "price": 11.0, "trade_date": t0 + timedelta(hours=1)}
+    _check(journal)
+    journal[3] = {**journal[3], "ticker": "B", "price": 25.0}
+    lot_ledger.refresh(3)
+    _check(journal)
+    assert lot_ledger.summary()["A"]["realized_profit"] == 0
+
+
+def test_random_add_edit_delete_backdated_matches_full_replay(journal):
+    rnd = random.Random(7)
+    t0 = datetime(2026, 1, 1, 9)
+    lot_ledger.realized_trades()                       # load (empty)
+    next_id = 1
+    for _ in range(400):
+        op = rnd.random()
+        if op < 0.55 or not journal:                   # add, often back-dated
+            row = {"id": next_id, "ticker": rnd.choice("AB"), "trade_type": rnd.choice(["BUY", "BUY", "SELL"]),
+                   "qty": rnd.randint(1, 20), "price": round(rnd.uniform(5, 50), 2),
+                   "trade_date": t0 + timedelta(minutes=rnd.randint(0, 5000))}
+            journal[next_id] = row
+            lot_ledger.refresh(next_id)
+            next_id += 1
+        elif op < 0.8:                                 # edit (qty / price / date / ticker)
+            tid = rnd.choice(list(journal))
+            journal[tid] = {**journal[tid], "qty": rnd.randint(1, 20), "price": round(rnd.uniform(5, 50), 2),
+                            "ticker": rnd.choice("AB"), "trade_date": t0 + timedelta(minutes=rnd.randint(0, 5000))}
+            lot_ledger.refresh(tid)
+        else:                                          # delete
+            tid = rnd.choice(list(journal))
+            del journal[tid]
+            lot_ledger.remove(tid)
+        _check(journal)
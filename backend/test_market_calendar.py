@@ -0,0 +1,36 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import market_calendar as mcal
+
+
+@pytest.mark.parametrize("latest, now, stale", [
+    # overnight / weekend gaps are not session time
+    (datetime(2026, 10, 16, 19, 30), datetime(2026, 10, 19, 4, 10), False),   # Fri post -> Mon 04:10
+    (datetime(2026, 10, 19, 19, 30), datetime(2026, 10, 20, 4, 5), False),    # Mon post -> Tue 04:05
+    (datetime(2026, 10, 16, 19, 55), datetime(2026, 10, 18, 12, 0), False),   # Sunday
+    (datetime(2026, 11, 25, 19, 30), datetime(2026, 11, 27, 4, 10), False),   # across Thanksgiving
+    # inside a session the gap counts as is
+    (datetime(2026, 10, 19, 10, 0), datetime(2026, 10, 19, 15, 0), False),
+    (datetime(2026, 10, 19, 10, 0), datetime(2026, 10, 19, 17, 0), True),
+    (datetime(2026, 10, 16, 10, 0), datetime(2026, 10, 19, 12, 0), True),    # Fri 10h + Mon 8h
+    (datetime(2026, 10, 16, 19, 30), datetime(2026, 10, 19, 10, 30), True),   # Mon 6h30 without a bar
+    (None, datetime(2026, 10, 19, 12, 0), True),
+])
+def test_is_stale_counts_session_time(latest, now, stale):
+    assert mcal.is_stale(latest, now=now) is stale
+
+
+def test_session_time_skips_closed_hours():
+    assert mcal.session_time(datetime(2026, 10, 16, 19, 30), datetime(2026, 10, 19, 4, 10)) == timedelta(minutes=40)
+    assert mcal.session_time(datetime(2026, 10, 17, 9), datetime(2026, 10, 18, 9)) == timedelta(0)
+
+
+def test_is_stale_accepts_aware_timestamps():
+    latest = mcal.NY.localize(datetime(2026, 10, 16, 19, 30)).astimezone(mcal.KST)
+    assert mcal.is_stale(latest, now=datetime(2026, 10, 19, 4, 10)) is False
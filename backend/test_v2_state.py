@@ -0,0 +1,114 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from v2_state import (SignalState, V2Inputs, buy_transitions, sell_transitions, needs_sell_record,
+                      can_start_new, SIG1, SIG2, SIG3, FINAL)
+
+# (ma10, ma30, prev_ma10, prev_ma30) per timeframe
+UP = (11, 10, 11, 10)        # trend up, no fresh cross
+GC = (11, 10, 9, 10)         # golden cross on this bar
+DOWN = (9, 10, 9, 10)        # trend down, no fresh cross
+DC = (9, 10, 11, 10)         # dead cross on this bar
+
+
+def bar(m5, m30, price=100.0, prev_close=100.0):
+    return V2Inputs(price, prev_close, *m5, *m30)
+
+
+def buy_row(flags="", sig1_price=100.0, target=None, final_price=None, real_price=None, manage_id="SOXL20260101_1000"):
+    row = {"ticker": "SOXL", "manage_id": manage_id, "target_box_price": target,
+           "buy_sig1_price": sig1_price, "final_buy_price": final_price, "real_buy_price": real_price}
+    for step, col in (("1", "buy_sig1_yn"), ("2", "buy_sig2_yn"), ("3", "buy_sig3_yn"),
+                      ("F", "final_buy_yn"), ("R", "real_buy_yn")):
+        row[col] = 'Y' if step in flags else 'N'
+    return SignalState.from_row("buy", row)
+
+
+def sell_row(flags="", target=None, manage_id="SOXL20260101_1000"):
+    row = {"ticker": "SOXL", "manage_id": manage_id, "target_stop_price": target}
+    for step, col in (("1", "sell_sig1_yn"), ("2", "sell_sig2_yn"), ("3", "sell_sig3_yn"), ("F", "final_sell_yn")):
+        row[col] = 'Y' if step in flags else 'N'
+    return SignalState.from_row("sell", row)
+
+
+def steps(transitions):
+    return [(t.step, t.on) for t in transitions]
+
+
+@pytest.mark.parametrize("buy, sell, x, expected", [
+    # sig1: no record, 5m cross or trend up opens a cycle
+    (None, None, bar(GC, DOWN), [("sig1", True)]),
+    (None, None, bar(UP, DOWN), [("sig1", True)]),
+    (None, None, bar(DOWN, UP), []),
+    # sig2: +2% over the sig1 price
+    (buy_row("1"), None, bar(DOWN, DOWN, price=101.0), []),
+    (buy_row("1"), None, bar(DOWN, DOWN, price=102.0), [("sig2", True)]),
+    # sig2 with a user target takes precedence over +2%
+    (buy_row("1", target=110.0), None, bar(DOWN, DOWN, price=105.0), []),
+    (buy_row("1", target=110.0), None, bar(DOWN, DOWN, price=110.0), [("sig2", True)]),
+    # sig3: 30m cross / trend up; completes the filter -> final in the same pass
+    (buy_row("12"), None, bar(DOWN, GC), [("sig3", True), ("final", True)]),
+    (buy_row("1"), None, bar(DOWN, UP, price=103.0), [("sig2", True), ("sig3", True), ("final", True)]),
+    (buy_row("13"), None, bar(DOWN, DOWN, price=102.5), [("sig2", True), ("final", True)]),
+    # finalized and still holding: nothing, no new cycle
+    (buy_row("123F"), sell_row(""), bar(UP, UP, price=200.0), []),
+    # finalized and sold: a new cycle may start
+    (buy_row("123F"), sell_row("3F"), bar(UP, UP), [("sig1", True)]),
+])
+def test_buy_transitions(buy, sell, x, expected):
+    assert steps(buy_transitions(buy, sell, x)) == expected
+
+
+@pytest.mark.parametrize("sell, x, expected", [
+    # sig1 on 5m dead cross / trend down, reset when the trend recovers
+    (sell_row(""), bar(DC, UP), [("sig1", True)]),
+    (sell_row("1"), bar(DOWN, UP), []),
+    (sell_row("1"), bar(UP, UP), [("sig1", False)]),
+    # sig2 below the entry (final buy) price
+    (sell_row(""), bar(UP, UP, price=99.0), [("sig2", True)]),
+    (sell_row("2"), bar(UP, UP, price=99.0), []),
+    # sig2 with a user stop price
+    (sell_row("", target=95.0), bar(UP, UP, price=96.0), []),
+    (sell_row("", target=95.0), bar(UP, UP, price=94.0), [("sig2", True)]),
+    # sig3 on the 30m dead cross; final only once sig3 was latched on an earlier pass
+    (sell_row(""), bar(UP, DC), [("sig3", True)]),
+    (sell_row("3"), bar(UP, DOWN), [("final", True)]),
+    # sig3-reset fix: sig3 lost in this pass -> reset, and the cycle is NOT finalized
+    (sell_row("3"), bar(UP, UP), [("sig3", False)]),
+    # already finalized: sig3 still down produces nothing more
+    (sell_row("3F"), bar(UP, DOWN), []),
+])
+def test_sell_transitions(sell, x, expected):
+    buy = buy_row("123F", final_price=100.0)
+    assert steps(sell_transitions(buy, sell, x)) == expected
+
+
+def test_sell_stop_uses_real_fill_over_final_price():
+    buy = buy_row("123FR", final_price=100.0, real_price=98.0)
+    assert steps(sell_transitions(buy, sell_row(""), bar(UP, UP, price=99.0))) == []
+    assert steps(sell_transitions(buy, sell_row(""), bar(UP, UP, price=97.0))) == [("sig2", True)]
+
+
+def test_full_buy_cycle_replayed_without_db():
+    """sig1 -> sig2 -> sig3 -> final over successive bars, applying each pass like the DB write"""
+    buy, sell = None, None
+    passes = [bar(GC, DOWN, price=100.0), bar(UP, DOWN, price=101.0),
+              bar(UP, DOWN, price=102.5), bar(UP, GC, price=103.0)]
+    seen = []
+    for x in passes:
+        ts = buy_transitions(buy, sell, x)
+        seen.append(steps(ts))
+        for t in ts:
+            buy = SignalState("buy", "SOXL", "SOXL20260101_1000") if t.step == "sig1" else buy
+            buy.apply(t)
+    assert seen == [[("sig1", True)], [], [("sig2", True)], [("sig3", True), ("final", True)]]
+    assert buy.has(SIG1 | SIG2 | SIG3 | FINAL)
+    assert buy.price(FINAL) == 103.0
+    assert needs_sell_record(buy, None)
+    assert not can_start_new(buy, None)
+    # next bar: the sell record exists and the cycle is held
+    assert buy_transitions(buy, sell_row(""), bar(UP, UP, price=120.0)) == []
@@ -0,0 +1,183 @@
+"""
+System Trade Stats
+In-memory position and performance state for the simulated system trades
+(system_trades). Per ticker plus an 'ALL' aggregate: last trade, open entry,
+closed trades, wins, sum of returns and max drawdown of the cumulative return.
+
+db.log_system_trade takes the entry price from here instead of querying the
+last BUY, and writes the trade together with the updated system_trade_summary
+rows in one transaction. get_last_system_trade / get_system_performance_summary
+are served from memory. At load the summary table is read and only trades
+newer than its watermark are replayed.
+
+Usage:
+  profit_pct, realized_pl = sell_profit("SOXL", 45.2)
+  summary()            # O(1): {'total_trades', 'wins', 'win_rate', ...}
+"""
+
+import threading
+
+ALL = "ALL"
+
+_lock = threading.Lock()
+_states = {}             # ticker -> TradeState (ALL included)
+_state = {"loaded": False}
+
+
+class TradeState:
+    """Position + running aggregates for one ticker (or ALL)"""
+    __slots__ = ("ticker", "last_trade", "last_buy_price", "trades", "wins", "returns_n",
+                 "sum_return", "peak_return", "max_drawdown", "last_id")
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+        self.last_trade = None       # last system_trades row (dict)
+        self.last_buy_price = None
+        self.trades = 0              # SELL rows
+        self.wins = 0
+        self.returns_n = 0           # SELL rows with a profit_pct
+        self.sum_return = 0.0
+        self.peak_return = 0.0       # running max of sum_return
+        self.max_drawdown = 0.0      # max(peak - sum_return), in return %
+        self.last_id = 0
+
+    def copy(self):
+        c = TradeState(self.ticker)
+        for k in self.__slots__:
+            setattr(c, k, getattr(self, k))
+        return c
+
+    def apply(self, row):
+        """Fold one system_trades row in (rows arrive in trade order)"""
+        if row['trade_type'] == 'BUY':
+            self.last_buy_price = float(row['price'])
+        elif row['trade_type'] == 'SELL':
+            self.trades += 1
+            pct = row.get('profit_pct')
+            if pct is not None:
+                pct = float(pct)
+                self.returns_n += 1
+                self.sum_return += pct
+                if pct > 0: self.wins += 1
+                self.peak_return = max(self.peak_return, self.sum_return)
+                self.max_drawdown = max(self.max_drawdown, self.peak_return - self.sum_return)
+        self.last_trade = row
+        self.last_id = max(self.last_id, int(row.get('id') or 0))
+
+    def to_row(self):
+        """system_trade_summary row (see db.upsert_system_trade_summary)"""
+        lt = self.last_trade or {}
+        return (self.ticker, self.last_id, lt.get('trade_type'), lt.get('price'), lt.get('trade_time'),
+                self.last_buy_price, self.trades, self.wins, self.returns_n,
+                round(self.sum_return, 4), round(self.peak_return, 4), round(self.max_drawdown, 4))
+
+    @classmethod
+    def from_row(cls, r):
+        s = cls(r['ticker'])
+        s.last_id = int(r['last_trade_id'] or 0)
+        if r.get('last_type'):
+            s.last_trade = {"id": s.last_id, "ticker": r['ticker'], "trade_type": r['last_type'],
+                            "price": r['last_price'], "trade_time": r['last_trade_time']}
+        s.last_buy_price = float(r['last_buy_price']) if r.get('last_buy_price') is not None else None
+        s.trades, s.wins, s.returns_n = int(r['trades'] or 0), int(r['wins'] or 0), int(r['returns_n'] or 0)
+        s.sum_return = float(r['sum_return'] or 0)
+        s.peak_return = float(r['peak_return'] or 0)
+        s.max_drawdown = float(r['max_drawdown'] or 0)
+        return s
+
+    def to_dict(self):
+        return {"total_trades": self.trades, "wins": self.wins,
+                "win_rate": (self.wins / self.trades * 100) if self.trades > 0 else 0,
+                "avg_return": (self.sum_return / self.returns_n) if self.returns_n else 0,
+                "total_return": round(self.sum_return, 4), "max_drawdown": round(self.max_drawdown, 4),
+                "position": "OPEN" if self.last_trade and self.last_trade['trade_type'] == 'BUY' else "FLAT"}
+
+
+def _load():
+    """Summary table + trades after its watermark -> memory"""
+    from db import get_system_trade_summaries, get_system_trades_after
+    for r in get_system_trade_summaries():
+        _states[r['ticker']] = TradeState.from_row(r)
+    total = _states.setdefault(ALL, TradeState(ALL))
+    # every trade updates ALL in the same transaction as its ticker row, so ALL is the newest watermark
+    watermark = total.last_id
+    replayed = 0
+    for row in get_system_trades_after(watermark):
+        s = _states.setdefault(row['ticker'], TradeState(row['ticker']))
+        if row['id'] > s.last_id:
+            s.apply(row)
+            replayed += 1
+        if row['id'] > total.last_id:
+            total.apply(row)
+    if replayed:
+        from db import upsert_system_trade_summary
+        upsert_system_trade_summary([s.to_row() for s in _states.values()])
+        print(f"📊 System trade stats: replayed {replayed} trades past the summary watermark")
+    _state["loaded"] = True
+    return replayed
+
+
+def _ensure_loaded():
+    if _state["loaded"]: return
+    with _lock:
+        if not _state["loaded"]:
+            _load()
+
+
+def warm():
+    """Load before the first trade insert (so the load never sees the row being written)"""
+    _ensure_loaded()
+
+
+# --- Used by db.log_system_trade ---
+def sell_profit(ticker, sell_price):
+    """(profit_pct, realized_pl per unit) against the last BUY, or (None, None)"""
+    _ensure_loaded()
+    s = _states.get(ticker)
+    if s is None or not s.last_buy_price: return None, None
+    buy = s.last_buy_price
+    sell = float(sell_price)
+    return (sell - buy) / buy * 100, sell - buy
+
+
+def preview(row):
+    """Updated (ticker, ALL) states for a new trade row, not yet visible"""
+    _ensure_loaded()
+    with _lock:
+        out = []
+        for key in (row['ticker'], ALL):
+            s = (_states.get(key) or TradeState(key)).copy()
+            s.apply(row)
+            out.append(s)
+        return out
+
+
+def commit(states):
+    """Publish states returned by preview() once their DB transaction committed"""
+    with _lock:
+        for s in states:
+            _states[s.ticker] = s
+
+
+def reset():
+    with _lock:
+        _states.clear()
+        _state["loaded"] = False
+
+
+# --- Reads ---
+def last_trade(ticker):
+    _ensure_loaded()
+    s = _states.get(ticker)
+    return s.last_trade if s else None
+
+
+def summary(ticker=ALL):
+    _ensure_loaded()
+    s = _states.get(ticker)
+    return s.to_dict() if s else TradeState(ticker).to_dict()
+
+
+def all_summaries():
+    _ensure_loaded()
+    return {t: s.to_dict() for t, s in sorted(_states.items())}
@@ -0,0 +1,345 @@
+"""
+Cheongan V2 Signal State
+Slotted state for one buy_stock / sell_stock cycle and for the triple filter
+latch (global_config "triple_filter_states"). Signal steps are bit flags,
+prices sit in a float array, and the V2 transitions are pure functions over
+(state, inputs) returning the steps to record - no DB access, so a cycle can be
+replayed over thousands of bars without a connection.
+
+serialize() is the single JSON view of a V2 record (state or DictCursor row)
+used by /api/v2/status and the report.
+
+Usage:
+  buy = SignalState.from_row("buy", get_v2_buy_status("SOXL"))
+  for t in buy_transitions(buy, sell, V2Inputs.from_frames(df_5, df_30, price, prev_close)):
+      ...  # persist t.step for t.side
+"""
+
+from array import array
+from collections import namedtuple
+from datetime import datetime
+
+# --- Flags ---
+SIG1, SIG2, SIG3, FINAL, REAL, CLOSED = 1, 2, 4, 8, 16, 32
+ALL_SIGS = SIG1 | SIG2 | SIG3
+STEP_FLAGS = {"sig1": SIG1, "sig2": SIG2, "sig3": SIG3, "final": FINAL}
+
+# Float slots: one per flag with a price, then target / quantity / current price
+_PRICE_SLOT = {SIG1: 0, SIG2: 1, SIG3: 2, FINAL: 3, REAL: 4}
+P_TARGET, P_QTY, P_CURRENT = 5, 6, 7
+_N_PRICES = 8
+
+# (flag, Y/N column, price column, time column) per side - same layout as buy_stock / sell_stock
+_COLUMNS = {
+    "buy": (
+        (SIG1, 'buy_sig1_yn', 'buy_sig1_price', 'buy_sig1_dt'),
+        (SIG2, 'buy_sig2_yn', 'buy_sig2_price', 'buy_sig2_dt'),
+        (SIG3, 'buy_sig3_yn', 'buy_sig3_price', 'buy_sig3_dt'),
+        (FINAL, 'final_buy_yn', 'final_buy_price', 'final_buy_dt'),
+        (REAL, 'real_buy_yn', 'real_buy_price', 'real_buy_dt'),
+    ),
+    "sell": (
+        (SIG1, 'sell_sig1_yn', 'sell_sig1_price', 'sell_sig1_dt'),
+        (SIG2, 'sell_sig2_yn', 'sell_sig2_price', 'sell_sig2_dt'),
+        (SIG3, 'sell_sig3_yn', 'sell_sig3_price', 'sell_sig3_dt'),
+        (FINAL, 'final_sell_yn', 'final_sell_price', 'final_sell_dt'),
+        (REAL, 'real_hold_yn', 'real_sell_avg_price', 'real_sell_dt'),
+    ),
+}
+_TARGET_COL = {"buy": 'target_box_price', "sell": 'target_stop_price'}
+_QTY_COL = {"buy": 'real_buy_qn', "sell": 'real_sell_qn'}
+_CORE_COLS = {side: {c for spec in cols for c in spec[1:]} | {_TARGET_COL[side], _QTY_COL[side],
+                                                            'ticker', 'manage_id', 'current_price', 'close_yn'}
+              for side, cols in _COLUMNS.items()}
+
+TIME_FMT = '%Y-%m-%d %H:%M:%S'
+
+
+def _num(v):
+    """Decimal / str / None -> float (0.0 for missing)"""
+    if v is None or v == '': return 0.0
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _json_value(v):
+    if isinstance(v, datetime):      # pandas Timestamp is a datetime subclass
+        return v.strftime(TIME_FMT)
+    if v is not None and not isinstance(v, (bool, int, float, str)) and hasattr(v, '__float__'):
+        return float(v)              # Decimal
+    return v
+
+
+class SignalState:
+    """One V2 cycle (buy or sell side): flags + float prices + step times"""
+    __slots__ = ("side", "ticker", "manage_id", "flags", "prices", "times", "extra")
+
+    def __init__(self, side, ticker=None, manage_id=None, flags=0, prices=None, times=None, extra=None):
+        self.side = side
+        self.ticker = ticker
+        self.manage_id = manage_id
+        self.flags = flags
+        self.prices = prices if prices is not None else array('d', bytes(8 * _N_PRICES))
+        self.times = times if times is not None else [None] * len(_PRICE_SLOT)
+        self.extra = extra          # other columns (idx, row_dt, sell_ratio*, ...) passed through to serialize
+
+    @classmethod
+    def from_row(cls, side, row):
+        """DictCursor row -> state (None stays None)"""
+        if not row: return None
+        st = cls(side, row.get('ticker'), row.get('manage_id'))
+        for flag, yn, price, at in _COLUMNS[side]:
+            if row.get(yn) == 'Y': st.flags |= flag
+            st.prices[_PRICE_SLOT[flag]] = _num(row.get(price))
+            st.times[_PRICE_SLOT[flag]] = row.get(at)
+        if row.get('close_yn') == 'Y': st.flags |= CLOSED
+        st.prices[P_TARGET] = _num(row.get(_TARGET_COL[side]))
+        st.prices[P_QTY] = _num(row.get(_QTY_COL[side]))
+        st.prices[P_CURRENT] = _num(row.get('current_price'))
+        st.extra = {k: v for k, v in row.items() if k not in _CORE_COLS[side]}
+        return st
+
+    def has(self, flag):
+        return self.flags & flag == flag
+
+    def price(self, flag):
+        return self.prices[_PRICE_SLOT[flag]]
+
+    @property
+    def target(self):
+        return self.prices[P_TARGET]
+
+    @property
+    def qty(self):
+        return self.prices[P_QTY]
+
+    def copy(self):
+        return SignalState(self.side, self.ticker, self.manage_id, self.flags, array('d', self.prices),
+                           list(self.times), dict(self.extra) if self.extra else self.extra)
+
+    def apply(self, t, at=None):
+        """Record a Transition in place (mirrors what the DB write does)"""
+        flag = STEP_FLAGS[t.step]
+        if t.on:
+            self.flags |= flag
+            self.prices[_PRICE_SLOT[flag]] = t.price
+            self.times[_PRICE_SLOT[flag]] = at or datetime.now()
+        else:
+            self.flags &= ~flag
+        return self
+
+    def to_dict(self):
+        """Canonical JSON view: buy_stock / sell_stock column names, 'Y'/'N', floats, 'YYYY-MM-DD HH:MM:SS'"""
+        out = {k: _json_value(v) for k, v in (self.extra or {}).items()}
+        out['ticker'] = self.ticker
+        out['manage_id'] = self.manage_id
+        for flag, yn, price, at in _COLUMNS[self.side]:
+            slot = _PRICE_SLOT[flag]
+            out[yn] = 'Y' if self.flags & flag else 'N'
+            out[price] = self.prices[slot] or None
+            out[at] = _json_value(self.times[slot])
+        if self.side == "sell":
+            out['close_yn'] = 'Y' if self.flags & CLOSED else 'N'
+        out[_TARGET_COL[self.side]] = self.prices[P_TARGET] or None
+        out[_QTY_COL[self.side]] = self.prices[P_QTY] or None
+        out['current_price'] = self.prices[P_CURRENT] or None
+        return out
+
+
+def serialize(obj):
+    """SignalState or DictCursor row -> JSON-safe dict (None for no record)"""
+    if not obj or isinstance(obj, list): return None
+    if isinstance(obj, SignalState): return obj.to_dict()
+    return {k: _json_value(v) for k, v in dict(obj).items()}
+
+
+# --- Market inputs ---
+class V2Inputs:
+    """Per-bar values the V2 transitions read (last / previous MA10, MA30 on 5m and 30m)"""
+    __slots__ = ("price", "prev_close", "ma10_5", "ma30_5", "prev_ma10_5", "prev_ma30_5",
+                 "ma10_30", "ma30_30", "prev_ma10_30", "prev_ma30_30")
+
+    def __init__(self, price, prev_close, ma10_5, ma30_5, prev_ma10_5, prev_ma30_5,
+                 ma10_30, ma30_30, prev_ma10_30, prev_ma30_30):
+        self.price = float(price)
+        self.prev_close = float(prev_close or 0)
+        self.ma10_5, self.ma30_5 = float(ma10_5), float(ma30_5)
+        self.prev_ma10_5, self.prev_ma30_5 = float(prev_ma10_5), float(prev_ma30_5)
+        self.ma10_30, self.ma30_30 = float(ma10_30), float(ma30_30)
+        self.prev_ma10_30, self.prev_ma30_30 = float(prev_ma10_30), float(prev_ma30_30)
+
+    @classmethod
+    def from_frames(cls, df_5, df_30, price, prev_close):
+        """Frames carrying 'ma10' / 'ma30' columns (NaN compares False, like the raw iloc checks)"""
+        m5, m30 = df_5[['ma10', 'ma30']].to_numpy(), df_30[['ma10', 'ma30']].to_numpy()
+        return cls(price, prev_close, m5[-1, 0], m5[-1, 1], m5[-2, 0], m5[-2, 1],
+                   m30[-1, 0], m30[-1, 1], m30[-2, 0], m30[-2, 1])
+
+    # 5m
+    @property
+    def gc_5m(self): return self.prev_ma10_5 <= self.prev_ma30_5 and self.ma10_5 > self.ma30_5
+    @property
+    def up_5m(self): return self.ma10_5 > self.ma30_5
+    @property
+    def dc_5m(self): return self.prev_ma10_5 >= self.prev_ma30_5 and self.ma10_5 < self.ma30_5
+    @property
+    def down_5m(self): return self.ma10_5 < self.ma30_5
+
+    # 30m
+    @property
+    def gc_30m(self): return self.prev_ma10_30 <= self.prev_ma30_30 and self.ma10_30 > self.ma30_30
+    @property
+    def up_30m(self): return self.ma10_30 > self.ma30_30
+    @property
+    def dc_30m(self): return self.prev_ma10_30 >= self.prev_ma30_30 and self.ma10_30 < self.ma30_30
+    @property
+    def down_30m(self): return self.ma10_30 < self.ma30_30
+
+    @property
+    def day_2pct(self):
+        return self.prev_close > 0 and self.price > self.prev_close * 1.02
+
+
+# --- Transitions (pure) ---
+Transition = namedtuple("Transition", "side step on price reason")
+
+
+def can_start_new(buy, sell):
+    """New buy cycle allowed: no record yet, or the last cycle's sell side is finalized"""
+    if buy is None: return True
+    if not buy.has(FINAL): return False
+    return sell is not None and sell.manage_id == buy.manage_id and sell.has(FINAL)
+
+
+def needs_sell_record(buy, sell):
+    return sell is None and buy is not None and buy.has(FINAL)
+
+
+def entry_price(buy, fallback=0.0):
+    """Real fill when confirmed, else the final signal price"""
+    if buy is None: return fallback
+    if buy.has(REAL) and buy.price(REAL) > 0: return buy.price(REAL)
+    return buy.price(FINAL) or fallback
+
+
+def _sig2_buy(buy, x):
+    """(met, reason): user target > +2% from sig1 price > +2% over previous close"""
+    if buy.target > 0:
+        return x.price >= buy.target, f"지정가도달(${buy.target:g})"
+    base = buy.price(SIG1)
+    if base > 0:
+        return x.price >= base * 1.02, f"진입대비+2%(${base:.2f})"
+    return x.day_2pct, "Box+2%"
+
+
+def buy_transitions(buy, sell, x):
+    """
+    Buy-side steps for one evaluation. A 'sig1' transition always opens a new cycle
+    (the caller assigns the manage_id); 'final' is emitted once all three steps hold.
+    """
+    if can_start_new(buy, sell):
+        if x.gc_5m or x.up_5m:
+            return [Transition("buy", "sig1", True, x.price, "5분봉 GC" if x.gc_5m else "5분봉 상승추세(Catch-up)")]
+        return []
+    if buy is None or buy.has(FINAL): return []
+
+    out, flags = [], buy.flags
+    if not flags & SIG2:
+        met, reason = _sig2_buy(buy, x)
+        if met:
+            out.append(Transition("buy", "sig2", True, x.price, reason))
+            flags |= SIG2
+    if not flags & SIG3 and (x.gc_30m or x.up_30m):
+        out.append(Transition("buy", "sig3", True, x.price, "30분봉 GC" if x.gc_30m else "30분봉 상승추세(Catch-up)"))
+        flags |= SIG3
+    if flags & ALL_SIGS == ALL_SIGS:
+        out.append(Transition("buy", "final", True, x.price, "Triple Filter Complete"))
+    return out
+
+
+def stop_price(buy, sell):
+    """(price, reason) the sell-side sig2 fires below: user stop, else the entry price"""
+    if sell.target > 0:
+        return sell.target, f"지정가이탈(${sell.target:g})"
+    return entry_price(buy), "손절/익절"
+
+
+def sell_transitions(buy, sell, x):
+    """Sell-side steps for one evaluation (sig1 / sig3 latch off again when their trend recovers)"""
+    if sell is None: return []
+    out = []
+    if x.dc_5m or x.down_5m:
+        if not sell.has(SIG1):
+            out.append(Transition("sell", "sig1", True, x.price, "5분봉 DC" if x.dc_5m else "5분봉 하락추세(Catch-up)"))
+    elif sell.has(SIG1):
+        out.append(Transition("sell", "sig1", False, 0.0, "Condition Lost"))
+
+    if not sell.has(SIG2):
+        base, reason = stop_price(buy, sell)
+        if base > 0 and x.price < base:
+            out.append(Transition("sell", "sig2", True, x.price, reason))
+
+    sig3_held = sell.has(SIG3)
+    if x.dc_30m or x.down_30m:
+        if not sig3_held:
+            out.append(Transition("sell", "sig3", True, x.price, "30분봉 DC" if x.dc_30m else "30분봉 하락추세(Catch-up)"))
+    elif sig3_held:
+        out.append(Transition("sell", "sig3", False, 0.0, "Condition Lost"))
+        sig3_held = False
+
+    # sig3 confirmed on an earlier pass and still holding -> exit the cycle
+    if sig3_held and not sell.has(FINAL):
+        out.append(Transition("sell", "final", True, x.price, "30분봉 추세종료"))
+    return out
+
+
+# --- Triple filter latch (global_config "triple_filter_states") ---
+class FilterState:
+    """Per-ticker latch of check_triple_filter; JSON layout unchanged for existing rows"""
+    __slots__ = ("flags", "manage_id", "signal_time", "step1_time", "step2_time", "step2_price",
+                 "step3_time", "step3_pct", "step2_color", "step3_color")
+
+    def __init__(self):
+        self.flags = 0
+        self.manage_id = None
+        self.signal_time = None
+        self.step1_time = self.step2_time = self.step3_time = None
+        self.step2_price = self.step3_pct = None
+        self.step2_color = self.step3_color = None
+
+    @classmethod
+    def from_json(cls, d):
+        st = cls()
+        d = d or {}
+        for flag, key in ((SIG1, "buy_sig1_yn"), (SIG2, "buy_sig2_yn"), (SIG3, "buy_sig3_yn")):
+            if d.get(key) == 'Y': st.flags |= flag
+        if d.get("final_met"): st.flags |= FINAL
+        st.manage_id = d.get("manage_id")
+        st.signal_time = d.get("signal_time")
+        st.step1_time = d.get("step1_done_time")
+        st.step2_time = d.get("step2_done_time")
+        st.step2_price = d.get("step2_done_price")
+        st.step3_time = d.get("step3_done_time")
+        st.step3_pct = d.get("step3_done_pct")
+        st.step2_color = d.get("step2_color")
+        st.step3_color = d.get("step3_color")
+        return st
+
+    def has(self, flag):
+        return self.flags & flag == flag
+
+    def set(self, flag, on=True):
+        self.flags = self.flags | flag if on else self.flags & ~flag
+
+    def to_json(self):
+        d = {"final_met": bool(self.flags & FINAL), "signal_time": self.signal_time,
+             "step1_done_time": self.step1_time, "step2_done_time": self.step2_time,
+             "step2_done_price": self.step2_price, "step3_done_time": self.step3_time,
+             "step3_done_pct": self.step3_pct, "step2_color": self.step2_color,
+             "step3_color": self.step3_color}
+        for flag, key in ((SIG1, "buy_sig1_yn"), (SIG2, "buy_sig2_yn"), (SIG3, "buy_sig3_yn")):
+            d[key] = 'Y' if self.flags & flag else 'N'
+        if self.manage_id: d["manage_id"] = self.manage_id
+        return d
@@ -0,0 +1,136 @@
+"""
+Write-Behind Buffer
+save_signal / log_history / log_market_indicators only append a row tuple here;
+a background thread writes the buffer with one connection and one COMMIT per
+batch (multi-row INSERT per table) once FLUSH_ROWS rows are waiting or
+FLUSH_SEC has passed. Critical events (final entry / exit) flush synchronously
+together with everything queued before them, and the buffer is flushed at exit.
+
+Rows whose batch failed stay at the front of the buffer and go out with the
+next flush; beyond MAX_BUFFER the oldest rows are dropped (counted).
+
+Usage:
+  enqueue("signal_history", row)                  # returns immediately
+  enqueue("history", row, critical=True)          # written before returning
+  flush()                                         # shutdown / tests
+"""
+
+import atexit
+import threading
+import time
+from collections import deque
+
+import metrics
+from applog import get_logger
+
+log = get_logger("write_behind")
+
+FLUSH_ROWS = 50          # size trigger
+FLUSH_SEC = 2.0          # time trigger (oldest row waits at most this long)
+MAX_BATCH = 500          # rows per transaction
+MAX_BUFFER = 10000       # oldest rows are dropped beyond this (DB down for a long time)
+
+_buffer = deque()        # (table, row, queued_at)
+_wake = threading.Event()
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_state = {"thread": None, "flushed_at": 0.0, "last_error": None}
+
+
+def enqueue(table, row, critical=False):
+    """Buffer one INSERT row for `table`; critical=True writes it (and everything before it) now"""
+    with _lock:
+        _buffer.append((table, row, time.time()))
+        dropped = len(_buffer) - MAX_BUFFER
+        for _ in range(max(0, dropped)):
+            _buffer.popleft()
+    metrics.inc("writebehind_rows_total", table=table)
+    if dropped > 0:
+        metrics.inc("writebehind_dropped_total", value=dropped)
+        log.error("write_behind.dropped", every=60, rows=dropped, buffered=MAX_BUFFER)
+    if critical:
+        return flush()
+    _ensure_thread()
+    if len(_buffer) >= FLUSH_ROWS:
+        _wake.set()
+    return True
+
+
+def _take(limit):
+    with _lock:
+        items = []
+        while _buffer and len(items) < limit:
+            items.append(_buffer.popleft())
+    return items
+
+
+def _flush_once():
+    """Write one batch -> rows written (0 when empty); failed rows go back to the front"""
+    from db import write_batch
+    items = _take(MAX_BATCH)
+    if not items: return 0
+    batches = {}
+    for table, row, _ in items:
+        batches.setdefault(table, []).append(row)
+    try:
+        with metrics.stage("writebehind_flush"):
+            write_batch(batches)
+    except Exception as e:
+        with _lock:
+            _buffer.extendleft(reversed(items))
+        _state["last_error"] = str(e)
+        metrics.inc("writebehind_flush_failures_total")
+        log.error("write_behind.flush_failed", every=60, rows=len(items), error=e)
+        raise
+    metrics.inc("writebehind_flushes_total")
+    metrics.observe("writebehind_delay_seconds", time.time() - items[0][2])
+    return len(items)
+
+
+def flush():
+    """Write everything buffered so far; False when the DB write failed (rows kept for retry)"""
+    with _flush_lock:
+        try:
+            while _flush_once():
+                pass
+        except Exception:
+            return False
+        finally:
+            _state["flushed_at"] = time.time()
+            metrics.set_gauge("writebehind_pending", len(_buffer))
+    return True
+
+
+def _run():
+    while True:
+        _wake.wait(timeout=FLUSH_SEC)
+        _wake.clear()
+        if not _buffer: continue
+        # time trigger: wait until the oldest row is FLUSH_SEC old unless the size trigger fired
+        age = time.time() - _buffer[0][2]
+        if len(_buffer) < FLUSH_ROWS and age < FLUSH_SEC:
+            time.sleep(FLUSH_SEC - age)
+        if not flush():
+            time.sleep(FLUSH_SEC)    # DB unavailable: don't spin
+
+
+def _ensure_thread():
+    if _state["thread"] is not None: return
+    with _lock:
+        if _state["thread"] is None:
+            t = threading.Thread(target=_run, name="write-behind", daemon=True)
+            t.start()
+            _state["thread"] = t
+
+
+def status():
+    with _lock:
+        by_table = {}
+        for table, _, _ in _buffer:
+            by_table[table] = by_table.get(table, 0) + 1
+        oldest = round(time.time() - _buffer[0][2], 2) if _buffer else 0
+    return {"pending": by_table, "oldest_sec": oldest, "last_flush": _state["flushed_at"],
+            "last_error": _state["last_error"], "flush_rows": FLUSH_ROWS, "flush_sec": FLUSH_SEC}
+
+
+atexit.register(flush)
@@ -9,6 +9,7 @@ import ManagedStocksPage from './ManagedStocksPage';
 import BacktestPage from './BacktestPage';
 import './index.css';
 import packageJson from '../package.json'; // Version Import
+import { applyDelta, subscribeReport } from './reportStream';
 
 function Dashboard() {
     const [data, setData] = useState(null);
@@ -18,10 +19,33 @@ function Dashboard() {
 
     useEffect(() => {
         fetchData();
-        const interval = setInterval(fetchData, 10000); // 10 seconds
-        return () => clearInterval(interval);
+
+        // Push updates (SSE). Poll only while the stream is down.
+        let interval = null;
+        const startPolling = () => { if (!interval) interval = setInterval(fetchData, 10000); };
+        const stopPolling = () => { if (interval) { clearInterval(interval); interval = null; } };
+
+        const close = subscribeReport({
+            onOpen: stopPolling,
+            onError: startPolling,
+            onSnapshot: (report) => { if (!report.error) setData(report); setLoading(false); },
+            onDelta: (delta) => setData(prev => applyDelta(prev, delta)),
+            onSignal: () => fetchSignalHistory()
+        });
+        if (!close) startPolling();
+
+        return () => { stopPolling(); if (close) close(); };
     }, []);
 
+    const fetchSignalHistory = async () => {
+        try {
+            const historyRes = await fetch('/api/signals?limit=5');
+            if (historyRes.ok) setSignalHistory(await historyRes.json());
+        } catch (err) {
+            console.error(err);
+        }
+    };
+
     const fetchData = async () => {
         try {
             const response = await fetch('/api/report');
@@ -129,7 +153,7 @@ function Dashboard() {
                             {/* Sync Button */}
                             <button
                                 onClick={async () => {
-                                    if (confirm("최근 30일 데이터를 다시 가져와 DB를 갱신하시겠습니까? (약 10초 소요)")) {
+                                    if (confirm("누락된 캔들 구간을 찾아 보충하시겠습니까?")) {
                                         try {
                                             const res = await fetch('/api/system/backfill', { method: 'POST' });
                                             const data = await res.json();
@@ -144,7 +168,7 @@ function Dashboard() {
                                     padding: '0.4rem 0.8rem', background: 'rgba(255,255,255,0.05)', border: '1px solid rgba(255,255,255,0.2)',
                                     borderRadius: '8px', color: '#e2e8f0', cursor: 'pointer', fontSize: '0.8rem'
                                 }}
-                                title="데이터 전체 동기화 (30일)"
+                                title="누락 캔들 구간 보충"
                             >
                                 <span style={{ fontSize: '1rem' }}>🔄</span> 동기화
                             </button>
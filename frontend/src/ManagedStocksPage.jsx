@@ -182,7 +182,7 @@ const ManagedStocksPage = () => {
             <div style={{ marginBottom: '2rem', display: 'flex', gap: '1rem', justifyContent: 'flex-end' }}>
                 <button
                     onClick={async () => {
-                        if (confirm("최근 30일 데이터를 다시 가져와 DB를 갱신하시겠습니까? (약 10초 소요)")) {
+                        if (confirm("누락된 캔들 구간을 찾아 보충하시겠습니까?")) {
                             try {
                                 const res = await fetch('/api/system/backfill', { method: 'POST' });
                                 const data = await res.json();
@@ -1,5 +1,6 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
+import { subscribeReport, applyDelta } from './reportStream';
 
 const SignalPage = () => {
     const [signals, setSignals] = useState([]);
@@ -10,6 +11,7 @@ const SignalPage = () => {
 
     const [smsEnabled, setSmsEnabled] = useState(true);
     const [prices, setPrices] = useState({}); // {ticker: price}
+    const reportRef = useRef(null); // last streamed report, deltas are folded into it
 
     // Filters (Default: Today)
     const getTodayString = () => {
@@ -31,6 +33,35 @@ const SignalPage = () => {
         fetchSmsSetting();
     }, []);
 
+    // Live prices / new signals via push channel (no polling)
+    useEffect(() => {
+        const close = subscribeReport({
+            onSnapshot: (report) => {
+                reportRef.current = report;
+                setPrices(extractPrices(report));
+            },
+            onDelta: (delta) => {
+                if (!reportRef.current) return;   // no snapshot yet: the next one brings the full report
+                reportRef.current = applyDelta(reportRef.current, delta);
+                setPrices(extractPrices(reportRef.current));
+            },
+            onSignal: () => fetchSignals()
+        });
+        return () => { if (close) close(); };
+    }, [filters]);
+
+    // {ticker: current_price} from MASTER CONTROL TOWER (market_regime details)
+    const extractPrices = (reportData) => {
+        const priceMap = {};
+        const details = reportData?.market_regime?.details;
+        if (details) {
+            if (details.soxl && details.soxl.current_price) priceMap['SOXL'] = details.soxl.current_price;
+            if (details.soxs && details.soxs.current_price) priceMap['SOXS'] = details.soxs.current_price;
+            if (details.upro && details.upro.current_price) priceMap['UPRO'] = details.upro.current_price;
+        }
+        return priceMap;
+    };
+
     const fetchSmsSetting = async () => {
         try {
             const res = await fetch('/api/settings/sms');
@@ -81,31 +112,7 @@ const SignalPage = () => {
             }
 
             if (reportRes.ok) {
-                const reportData = await reportRes.json();
-                // Create map {ticker: current_price} from MASTER CONTROL TOWER
-                const priceMap = {};
-
-                // Ver 3.0: Get prices from market_regime details
-                if (reportData.market_regime && reportData.market_regime.details) {
-                    const details = reportData.market_regime.details;
-
-                    // SOXL price
-                    if (details.soxl && details.soxl.current_price) {
-                        priceMap['SOXL'] = details.soxl.current_price;
-                    }
-
-                    // SOXS price
-                    if (details.soxs && details.soxs.current_price) {
-                        priceMap['SOXS'] = details.soxs.current_price;
-                    }
-
-                    // UPRO price (from upro_status or separate field)
-                    if (details.upro && details.upro.current_price) {
-                        priceMap['UPRO'] = details.upro.current_price;
-                    }
-                }
-
-                setPrices(priceMap);
+                setPrices(extractPrices(await reportRes.json()));
             }
 
         } catch (e) {
@@ -481,10 +488,10 @@ const SignalPage = () => {
                                         <td style={{ padding: '1rem', textAlign: 'center', display: 'flex', alignItems: 'center', justifyContent: 'center', gap: '8px' }}>
                                             <span style={{
                                                 padding: '2px 8px', borderRadius: '4px', fontSize: '0.75rem', fontWeight: 'bold',
-                                                background: log.status === 'Success' ? 'rgba(16, 185, 129, 0.1)' : 'rgba(239, 68, 68, 0.1)',
-                                                color: log.status === 'Success' ? '#10b981' : '#ef4444'
+                                                background: log.status === 'Success' ? 'rgba(16, 185, 129, 0.1)' : log.status === 'Queued' ? 'rgba(245, 158, 11, 0.1)' : 'rgba(239, 68, 68, 0.1)',
+                                                color: log.status === 'Success' ? '#10b981' : log.status === 'Queued' ? '#f59e0b' : '#ef4444'
                                             }}>
-                                                OK
+                                                {log.status === 'Success' ? 'OK' : log.status === 'Queued' ? '대기' : log.status}
                                             </span>
                                             <button onClick={() => deleteSmsLog(log.id)} style={{ background: 'transparent', border: 'none', color: '#ef4444', cursor: 'pointer' }}>🗑️</button>
                                         </td>
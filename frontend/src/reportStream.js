@@ -0,0 +1,48 @@
+// Report push channel (/api/stream, Server-Sent Events)
+// Server sends 'snapshot' on connect, then per-cycle 'delta' (changed fields only)
+// and 'signal' (new signal_history rows). Delta format: see backend/report_stream.py
+
+const isDict = (v) => v !== null && typeof v === 'object' && !Array.isArray(v);
+
+export const applyDelta = (target, delta) => {
+    // Scalars, full lists and whole values ($set) replace the old value outright
+    if (!isDict(delta)) return delta;
+    if ('$set' in delta) return delta.$set;
+
+    if ('$idx' in delta) {
+        if (!Array.isArray(target)) return target;   // out of sync: the next snapshot fixes it
+        const next = [...target];
+        Object.entries(delta.$idx).forEach(([i, d]) => { next[Number(i)] = applyDelta(next[Number(i)], d); });
+        return next;
+    }
+    // Only a dict delta merges, and only into a dict
+    if (!isDict(target)) target = {};
+
+    const next = { ...target };
+    Object.entries(delta).forEach(([k, d]) => {
+        if (k === '$del') return;
+        next[k] = applyDelta(next[k], d);
+    });
+    (delta.$del || []).forEach(k => { delete next[k]; });
+    return next;
+};
+
+// handlers: { onSnapshot(report), onDelta(delta), onSignal(rows), onOpen(), onError() }
+// Returns a close function. EventSource reconnects on its own (server sends retry: 5000).
+export const subscribeReport = (handlers = {}) => {
+    if (typeof EventSource === 'undefined') return null;
+    const es = new EventSource('/api/stream');
+
+    const parse = (fn) => (e) => {
+        if (!fn) return;
+        try { fn(JSON.parse(e.data)); } catch (err) { console.error('Stream parse error', err); }
+    };
+
+    es.addEventListener('snapshot', parse(handlers.onSnapshot));
+    es.addEventListener('delta', parse(handlers.onDelta));
+    es.addEventListener('signal', parse(handlers.onSignal));
+    es.onopen = () => handlers.onOpen && handlers.onOpen();
+    es.onerror = () => handlers.onError && handlers.onError();
+
+    return () => es.close();
+};